@@ -5,6 +5,7 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 BUILD_DIR = os.path.join(BASE_DIR, "build")
 OUTPUT_DIR = os.path.join(BASE_DIR, "output")
 TRACE_DIR = os.path.join(OUTPUT_DIR, "traces")
+TRACE_WORK_DIR = os.path.join(TRACE_DIR, ".work")
 KLEE_OUTPUT = os.path.join(OUTPUT_DIR, "klee-output")
 KLEE_RESULTS = os.path.join(OUTPUT_DIR, "klee-results")
 ANALYSIS_DIR = os.path.join(OUTPUT_DIR, "analysis")
@@ -16,6 +17,12 @@ GDB_SCRIPT = os.path.join(BASE_DIR, "core", "gdb", "gdb_trace.py")
 GDB_SCRIPT_ARM = os.path.join(BASE_DIR, "core", "gdb", "gdb_trace_arm.py")
 GDB_SCRIPT_RISCV = os.path.join(BASE_DIR, "core", "gdb", "gdb_trace_riscv.py")
 GDB_SCRIPT_ARM_BM = os.path.join(BASE_DIR, "core", "gdb", "gdb_trace_bare_arm.py")
+GDB_SCRIPT_REPLAY = os.path.join(BASE_DIR, "core", "gdb", "gdb_replay.py")
+
+TRACE_CONFIG = os.path.join(BASE_DIR, "config", "trace_config.json")
+
+# Hlavičky vkládané do překládaných programů (značky oblastí `profiler_regions.h`)
+PROFILER_INCLUDE_DIR = os.path.join(BASE_DIR, "core", "include")
 
 LOOKOUT_DIR = os.path.join(BASE_DIR, "tests")
 
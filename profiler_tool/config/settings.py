@@ -1,2 +1,62 @@
 # Mazání generovaných main.c souborů po ukončení
-REMOVE_GENERATED_MAIN = True
\ No newline at end of file
+REMOVE_GENERATED_MAIN = True
+
+# Název složky (vytvářené vedle binárky), do které se ukládá cache symbolů a řádkových informací
+SYMBOL_CACHE_DIRNAME = ".symcache"
+
+# objdump pro jednotlivé architektury (statická disassemblace binárek při analýze bez GDB)
+OBJDUMP_EXECUTABLES = {
+    "native": "objdump",
+    "arm": "arm-linux-gnueabihf-objdump",
+    "riscv": "riscv64-linux-gnu-objdump",
+}
+
+# Cesta ke QEMU TCG pluginu logujícímu každou vykonanou instrukci (např. contrib/plugins/libexeclog.so).
+# Pokud není nastavena, použije se `-one-insn-per-tb -d exec,nochain`.
+QEMU_EXECLOG_PLUGIN = None
+
+# Metoda záznamu běhu v GDB pro `--capture record`: "auto" (btrace, jinak full), "btrace" nebo "full".
+# Jen záznam metodou "full" lze uložit (`record save`) a později přehrát příkazem `replay-record`.
+GDB_RECORD_METHOD = "auto"
+
+# Počet souběžně zpracovávaných sad parametrů v `trace-analysis` (1 = postupně, None = počet jader)
+TRACE_JOBS = 1
+# Časový limit (v sekundách) pro trace a analýzu jedné sady parametrů při souběžném zpracování (None = bez limitu)
+TRACE_JOB_TIMEOUT = None
+
+# Počet souběžně analyzovaných trace logů v `analyze_traces_in_folder` (1 = postupně, None = počet jader)
+ANALYSIS_JOBS = None
+# Textový trace alespoň dvojnásobné velikosti (v bajtech) se analyzuje po úsecích této velikosti souběžně
+# v `ANALYSIS_JOBS` procesech (viz `core/engine/trace_analysis.py`, `scan_trace_chunks`)
+TRACE_CHUNK_SIZE = 256 * 1024 * 1024
+# Ukládat do JSON analýzy trace profil volání celého programu (`"call_graph"`, viz `core/engine/call_graph.py`,
+# `trace-analysis --call-graph`); profil zpracuje každý řádek trace, takže analýzu několikanásobně zpomalí
+TRACE_CALL_GRAPH = False
+
+# Nejvyšší počet současně otevřených GDB relací při `trace-analysis --reuse-gdb` (viz `core/engine/gdb_session.py`)
+GDB_SESSION_POOL_SIZE = 2
+
+# Interval (v sekundách) průběžných JSON výsledků při `trace-analysis --stream` (viz `analyze_trace_stream`)
+TRACE_SNAPSHOT_INTERVAL = 2.0
+
+# Limity jednoho běhu traceru (viz `core/engine/trace_limits.py`): rozpočet zaznamenaných instrukcí
+# a časový limit v sekundách (None = bez limitu). Trace přerušený limitem se analyzuje do místa
+# přerušení a výstupní JSON má `"truncated": true`.
+TRACE_INSTRUCTION_BUDGET = None
+TRACE_RUN_TIMEOUT = None
+# Po kolika dalších sekundách se GDB, které se po vypršení `TRACE_RUN_TIMEOUT` samo neukončilo
+# (např. čeká na program v dlouhém systémovém volání), zabije i s laděným programem
+TRACE_KILL_GRACE = 10
+
+# Statistické vzorkování (`trace-analysis --capture sample`, viz `core/engine/sampling.py`):
+# interval mezi vzorky zásobníku v sekundách, nejvyšší hloubka odvinutého zásobníku
+# a hladina spolehlivosti intervalů podílů řádků a funkcí ve výstupním JSON
+SAMPLE_INTERVAL = 0.001
+SAMPLE_MAX_DEPTH = 64
+SAMPLE_CONFIDENCE = 0.95
+
+# Přecházení volání knihovních funkcí při nativním krokování (`trace-analysis --step-over-library`,
+# viz `core/engine/library_costs.py`): výchozí zapnutí a počet krokovaných volání každé funkce,
+# ze kterých se průměrem odhadne cena dalších (přejitých) volání
+TRACE_STEP_OVER_LIBRARY = False
+LIBRARY_COST_SAMPLES = 3
@@ -7,6 +7,8 @@ Tento skript poskytuje několik příkazů pro:
 - porovnání více běhů podle výstupních JSON souborů (`compare-runs`)
 - analýzu funkcí pomocí nástroje KLEE pro konkolické testování (`prepare-klee`)
 - kombinovanou analýzu s automatickým výběrem a trasováním funkce (`func-analysis`)
+- převod textového trace do binárního formátu (`convert-trace`)
+- analýzu uloženého záznamu běhu bez nového spuštění programu (`replay-record`)
 
 Použití:
     python cli.py <command> [volby]
@@ -17,6 +19,8 @@ Dostupné příkazy:
 - compare-runs     : Porovná výstupy z několika analýz na úrovni instrukcí
 - prepare-klee     : Spustí analýzu funkce pomocí nástroje KLEE
 - func-analysis    : Spojí výběr funkce, její kompilaci a analýzu do jednoho kroku
+- convert-trace    : Převede textový trace (.log) do binárního formátu (.trc)
+- replay-record    : Přehraje záznam běhu z `--capture record` a analyzuje jej
 
 Argumenty pro jednotlivé příkazy se zobrazí pomocí:
     python cli.py <command> --help
@@ -24,8 +28,10 @@ Argumenty pro jednotlivé příkazy se zobrazí pomocí:
 
 import argparse
 from core.cli.function_preparation import prepare_function, prepare_klee
-from core.cli.trace_analysis import trace_analysis
+from core.cli.trace_analysis import trace_analysis, convert_trace, replay_record
 from core.cli.comparison import compare_json_runs
+from config import TRACE_JOBS, TRACE_JOB_TIMEOUT, TRACE_INSTRUCTION_BUDGET, TRACE_RUN_TIMEOUT, SAMPLE_INTERVAL
+from config import TRACE_STEP_OVER_LIBRARY, TRACE_CALL_GRAPH
 
 def main():
     parser = argparse.ArgumentParser(description="CLI nástroj pro analýzu binárek.")
@@ -45,6 +51,22 @@ def main():
     trace_parser = subparsers.add_parser("trace-analysis", help="Spusť binárku, vytvoř trace.log a proveď analýzu")
     trace_parser.add_argument("-b", "--binary", help="Cesta k binárnímu souboru")
     trace_parser.add_argument("-f", "--file", help="Soubor obsahující sady parametrů (každý řádek = jedna sada)")
+    trace_parser.add_argument("--capture", choices=["full", "function", "record", "sample", "count", "region"], default="full", help="Rozsah trace: celý program, jen volání cílové funkce, volání cílové funkce zachycené záznamem běhu v GDB (record), statistické vzorkování volání cílové funkce (sample), jen počty instrukcí volání cílové funkce bez trace (count), nebo jen oblasti vyznačené makry PROFILER_REGION_BEGIN/END (region)")
+    trace_parser.add_argument("--backend", choices=["gdb", "qemu", "ptrace"], default="gdb", help="Způsob zachycení trace: krokování v GDB, log vykonaných instrukcí z QEMU nebo nativní krokování přes ptrace")
+    trace_parser.add_argument("--trace-format", choices=["text", "binary"], default="text", help="Formát trace souboru: textový (.log) nebo binární (.trc)")
+    trace_parser.add_argument("-j", "--jobs", type=int, default=TRACE_JOBS, help="Počet souběžně zpracovávaných sad parametrů (0 = počet jader)")
+    trace_parser.add_argument("--timeout", type=float, default=TRACE_JOB_TIMEOUT, help="Časový limit jedné sady parametrů v sekundách")
+    trace_parser.add_argument("--stream", action="store_true", help="Analyzovat trace průběžně z roury během běhu programu (bez uložení trace na disk)")
+    trace_parser.add_argument("--batch", action="store_true", help="Zachytit všechny sady parametrů jedním spuštěním binárky (dávkový `main`)")
+    trace_parser.add_argument("--reuse-gdb", action="store_true", help="Zpracovat všechny sady parametrů v jedné dlouhodobě běžící GDB relaci (GDB/MI)")
+    trace_parser.add_argument("--budget", type=int, default=TRACE_INSTRUCTION_BUDGET, help="Rozpočet instrukcí jednoho běhu traceru, poté se trace přeruší (JSON s \"truncated\": true)")
+    trace_parser.add_argument("--run-timeout", type=float, default=TRACE_RUN_TIMEOUT, help="Časový limit krokování jednoho běhu v sekundách, poté se trace přeruší")
+    trace_parser.add_argument("--extrapolate", type=int, help="Očekávaný počet iterací smyčky přerušeného trace pro odhad celkového počtu instrukcí")
+    trace_parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL, help="Interval vzorkování zásobníku v sekundách pro --capture sample")
+    trace_parser.add_argument("--step", choices=["instruction", "block"], default="instruction", help="Krokování v GDB: po jednotlivých instrukcích nebo po základních blocích (mezi větveními)")
+    trace_parser.add_argument("--step-over-library", action=argparse.BooleanOptionalAction, default=TRACE_STEP_OVER_LIBRARY, help="Nativně nekrokovat volání knihovních funkcí (PLT, blacklist), jejich cenu odhadnout z tabulky naměřených cen (--no-step-over-library je vypne i při zapnutém TRACE_STEP_OVER_LIBRARY)")
+    trace_parser.add_argument("--callgrind", choices=["line", "instruction"], help="Uložit k JSON i profil ve formátu callgrind (KCachegrind) s cenami řádků, nebo jednotlivých instrukcí s adresami")
+    trace_parser.add_argument("--call-graph", action=argparse.BooleanOptionalAction, default=TRACE_CALL_GRAPH, help="Uložit do JSON i profil volání celého programu (\"call_graph\"); trace se kvůli němu zpracuje celý, analýza je několikanásobně pomalejší (výchozí: TRACE_CALL_GRAPH)")
 
     # Porovnání běhů
     compare_parser = subparsers.add_parser("compare-runs", help="Porovnej běhy na základě JSON souborů")
@@ -66,6 +88,19 @@ def main():
     combined_parser.add_argument("--own-main-file", required=False, help="Cesta k vlastnímu main souboru pokud použijete --main-mode own")
     combined_parser.add_argument("--result-file", required=False, help="Cesta k výstupnímu JSON souboru")
 
+    # Převod textového trace do binárního formátu
+    convert_parser = subparsers.add_parser("convert-trace", help="Převeď textový trace do binárního formátu (.trc)")
+    convert_parser.add_argument("-i", "--input", required=True, help="Textový trace soubor (.log)")
+    convert_parser.add_argument("-o", "--output", required=False, help="Výstupní binární trace (výchozí: stejný název s příponou .trc)")
+
+
+    # Přehrání uloženého záznamu běhu
+    replay_parser = subparsers.add_parser("replay-record", help="Přehraj záznam běhu (.gdbrec) a proveď analýzu bez spuštění programu")
+    replay_parser.add_argument("-r", "--record", required=True, help="Záznam uložený při --capture record (.gdbrec)")
+    replay_parser.add_argument("-b", "--binary", help="Binární soubor, ze kterého záznam pochází")
+    replay_parser.add_argument("-f", "--function", required=False, help="Funkce zájmu (výchozí: funkce z názvu binárky)")
+    replay_parser.add_argument("--trace-format", choices=["text", "binary"], default="text", help="Formát trace souboru: textový (.log) nebo binární (.trc)")
+
 
     args = parser.parse_args()
 
@@ -75,7 +110,12 @@ def main():
     elif args.command == "prepare-klee":
         prepare_klee(header_file=args.header, src_file=args.source, function_name=args.function)    
     elif args.command == "trace-analysis":
-        trace_analysis(args.binary, args.file)
+        trace_analysis(args.binary, args.file, capture_mode=args.capture, backend=args.backend,
+                       trace_format=args.trace_format, step_mode=args.step, jobs=args.jobs, timeout=args.timeout, reuse_gdb=args.reuse_gdb,
+                       batch=args.batch, stream=args.stream, budget=args.budget, run_timeout=args.run_timeout,
+                       extrapolate=args.extrapolate, sample_interval=args.sample_interval,
+                       step_over_library=args.step_over_library, callgrind=args.callgrind,
+                       call_graph=args.call_graph)
     elif args.command == "compare-runs":
         compare_json_runs(folder=args.directory, files=args.files)
     elif args.command == "func-analysis":
@@ -88,6 +128,10 @@ def main():
                 f.write(json_result)
 
         print(json_result)
+    elif args.command == "convert-trace":
+        convert_trace(args.input, args.output)
+    elif args.command == "replay-record":
+        replay_record(args.record, args.binary, args.function, trace_format=args.trace_format)
     else:
         parser.print_help()
 
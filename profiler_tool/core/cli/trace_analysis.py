@@ -2,9 +2,21 @@ import os
 import re
 import shlex
 from core.cli.file_selection import fzf_select_file
-from core.engine.tracer import run_gdb_trace, run_gdb_trace_qemu
-from core.engine.trace_analysis import analyze_trace
-from config import BUILD_DIR, TRACE_DIR, ANALYSIS_DIR, ACTIVE_ARCHITECTURE
+from core.engine.tracer import run_gdb_trace, run_gdb_trace_qemu, run_qemu_exec_trace, run_ptrace_trace, run_gdb_replay
+from core.engine.tracer import run_ptrace_sample, run_ptrace_count, run_qemu_count
+from core.engine.trace_analysis import analyze_trace, analyze_trace_stream, analyze_region_trace, build_call_graph
+from core.engine.trace_stream import stream_trace
+from core.engine.sampling import analyze_samples, samples_path, remove_samples
+from core.engine.call_counts import save_call_counts
+from core.engine.trace_format import convert_text_trace, BINARY_TRACE_EXTENSION
+from core.engine.scheduler import run_jobs
+from core.engine.gdb_session import GdbSessionPool
+from core.engine.batch_trace import write_param_sets, split_batch_trace, BATCH_BEGIN_MARKER, BATCH_END_MARKER
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.callgrind import export_callgrind, callgrind_output_path
+from config import BUILD_DIR, TRACE_DIR, TRACE_WORK_DIR, ANALYSIS_DIR, ACTIVE_ARCHITECTURE, GDB_RECORD_METHOD
+from config import TRACE_JOBS, TRACE_JOB_TIMEOUT, TRACE_INSTRUCTION_BUDGET, TRACE_RUN_TIMEOUT, SAMPLE_INTERVAL
+from config import TRACE_STEP_OVER_LIBRARY, ANALYSIS_JOBS, TRACE_CALL_GRAPH
 from config import log_info, log_debug, log_warning, log_error
 
 
@@ -57,49 +69,345 @@ def prompt_param_sets_from_user():
     return param_sets or [[]]
 
 
-def generate_trace_and_analyze(binary_file, func_name, params, architecture):
+def get_output_names(func_name, params, architecture, trace_format="text"):
     """
-    Spustí trace a analýzu pro jednu sadu parametrů a vrátí cestu k výstupnímu JSON souboru.
+    Vrátí cestu k trace souboru a jméno výstupního JSON souboru pro jednu sadu parametrů.
     """
     safe_params = [re.sub(r'\W+', '_', p) for p in params]
     param_str = "_".join(safe_params) if params else "no_params"
-    quoted_params = [f"'{p}'" if ' ' in p else p for p in params]
-    quoted_params_str = " ".join(quoted_params)
 
     # Volba názvu a cesty pro trace
+    trace_extension = BINARY_TRACE_EXTENSION if trace_format == "binary" else ".log"
     if architecture == "arm":
-        trace_file = os.path.join(TRACE_DIR, f"traceArm_{func_name}_{param_str}.log")
+        trace_file = os.path.join(TRACE_DIR, f"traceArm_{func_name}_{param_str}{trace_extension}")
         json_filename = f"instructionsArm_{func_name}_{param_str}.json"
-        run_gdb_trace_qemu(binary_file, trace_file, quoted_params, architecture)
     elif architecture == "riscv":
-        trace_file = os.path.join(TRACE_DIR, f"traceRiscv_{func_name}_{param_str}.log")
+        trace_file = os.path.join(TRACE_DIR, f"traceRiscv_{func_name}_{param_str}{trace_extension}")
         json_filename = f"instructionsRiscv_{func_name}_{param_str}.json"
-        run_gdb_trace_qemu(binary_file, trace_file, quoted_params, architecture)
     else:
-        trace_file = os.path.join(TRACE_DIR, f"trace_{func_name}_{param_str}.log")
+        trace_file = os.path.join(TRACE_DIR, f"trace_{func_name}_{param_str}{trace_extension}")
         json_filename = f"instructions_{func_name}_{param_str}.json"
-        run_gdb_trace(binary_file, trace_file, quoted_params)
+    return trace_file, json_filename
 
-    log_info(f"\nSpouštím trace pro {binary_file} s parametry {quoted_params}")
-    log_info(f"Trace dokončen! Výstup: {trace_file}")
 
-    # Analýza trace
+def get_output_json_path(func_name, json_filename):
+    """
+    Vrátí cestu k výstupnímu JSON souboru analýzy (a vytvoří pro něj složku).
+    """
     output_json_dir = os.path.join(ANALYSIS_DIR, func_name)
     os.makedirs(output_json_dir, exist_ok=True)
-    output_json = os.path.join(output_json_dir, json_filename)
+    return os.path.join(output_json_dir, json_filename)
+
+
+def export_set_callgrind(trace_file, binary_file, output_json, quoted_params_str, callgrind, graph=None):
+    """
+    Uloží z trace profil ve formátu callgrind vedle výstupního JSON (`callgrind.out.<jméno JSON>`).
+    `callgrind` je "line" (ceny řádků) nebo "instruction" (ceny instrukcí s adresami), `graph` je profil
+    volání už sestavený z trace (viz `export_callgrind`).
+    """
+    export_callgrind(trace_file, binary_file, callgrind_output_path(output_json), callgrind == "instruction",
+                     f"{binary_file} {quoted_params_str}".strip(), graph)
+
+
+def analyze_set_trace(trace_file, binary_file, func_name, params, json_filename, extrapolate=None, callgrind=None,
+                      analysis_jobs=ANALYSIS_JOBS, call_graph=TRACE_CALL_GRAPH):
+    """
+    Analyzuje trace jedné sady parametrů a vrátí cestu k výstupnímu JSON souboru.
+    `extrapolate` je očekávaný počet iterací smyčky pro odhad celku přerušeného trace (viz `save_json`).
+    Při zadaném `callgrind` se z trace uloží i profil ve formátu callgrind (viz `export_set_callgrind`).
+    `analysis_jobs` je počet procesů pro souběžné čtení velkého trace (viz `parse_trace`).
+    Při `call_graph` se do JSON uloží i profil volání celého programu (viz `analyze_trace`); s `callgrind`
+    se tentýž profil sestaví jediným průchodem trace pro JSON i export.
+    """
+    quoted_params_str = " ".join(f"'{p}'" if ' ' in p else p for p in params)
+    output_json = get_output_json_path(func_name, json_filename)
 
     log_info(f"\nProbíhá analýza pro trace soubor: {trace_file}")
-    analyze_trace(trace_file, binary_file, func_name, output_json, quoted_params_str)
+    graph = None
+    if callgrind:
+        graph = build_call_graph(trace_file, binary_file, instructions=True)
+        if call_graph:
+            call_graph = graph
+    analyze_trace(trace_file, binary_file, func_name, output_json, quoted_params_str, extrapolate, call_graph,
+                  analysis_jobs)
+    if callgrind:
+        export_set_callgrind(trace_file, binary_file, output_json, quoted_params_str, callgrind, graph)
     log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
+    return output_json
+
+
+def generate_trace_and_analyze(binary_file, func_name, params, architecture, capture_mode="full", backend="gdb",
+                               trace_format="text", step_mode="instruction", session_pool=None, stream=False,
+                               budget=None, run_timeout=None, extrapolate=None, sample_interval=None,
+                               step_over_library=False, callgrind=None, analysis_jobs=ANALYSIS_JOBS,
+                               call_graph=TRACE_CALL_GRAPH):
+    """
+    Spustí trace a analýzu pro jednu sadu parametrů a vrátí cestu k výstupnímu JSON souboru.
+
+    `capture_mode` určuje rozsah trace: "full" krokuje celý program (od `starti`, resp. `main`),
+    "function" doběhne plnou rychlostí na vstup do `func_name` a krokuje jen do jejího návratu,
+    "record" místo krokování zaznamená volání `func_name` přes `record` v GDB (`GDB_RECORD_METHOD`)
+    a záznam metodou `full` uloží vedle trace (`.gdbrec`) pro pozdější `replay_record`,
+    "sample" volání `func_name` místo krokování statisticky vzorkuje s intervalem `sample_interval`
+    sekund (viz `sample_and_analyze`), "count" jen změří počet instrukcí každého volání `func_name`
+    bez trace a mapování na řádky (viz `count_and_analyze`), "region" krokuje jen oblasti zájmu
+    vyznačené ve zdrojovém kódu makry `PROFILER_REGION_BEGIN`/`END` a mezi nimi nechá program běžet
+    plnou rychlostí (`core.engine.regions`, funkce `func_name` pak určuje jen jméno výstupu).
+    `backend` volí způsob zachycení: "gdb" (krokování v GDB), "qemu" (log vykonaných
+    instrukcí z QEMU user-mode, viz `run_qemu_exec_trace`) nebo "ptrace" (nativní krokování
+    bez GDB, jen pro architekturu native, viz `run_ptrace_trace`).
+    `trace_format` určuje formát trace souboru: "text" (`.log`) nebo "binary" (`.trc`, viz `core.engine.trace_format`).
+    `step_mode` platí jen pro backend "gdb": "instruction" (jeden `stepi` na instrukci) nebo "block"
+    (rovné úseky kódu proběhnou naráz, v trace jsou jako záznamy `[BLOCK]`).
+    `session_pool` (`GdbSessionPool`) – pokud je zadán, backend "gdb" použije již běžící GDB relaci
+    místo spuštění nového GDB (neplatí pro capture "record").
+    Při `stream` tracer zapisuje textový trace do roury a analýza jej čte současně s během programu
+    (`core.engine.trace_stream.stream_trace`); trace se neukládá na disk a výstupní JSON se během
+    analýzy průběžně přepisuje (`"partial": true`).
+    `budget` (rozpočet instrukcí) a `run_timeout` (časový limit krokování v sekundách) omezují
+    jeden běh traceru (`core.engine.trace_limits`); přerušený trace se analyzuje do místa přerušení
+    a JSON má `"truncated": true`. `extrapolate` je očekávaný počet iterací smyčky, ve které byl
+    trace přerušen – z něj se odhadne celkový počet instrukcí (viz `save_json`).
+    Při `step_over_library` nativní backendy "gdb" a "ptrace" volání knihovních funkcí nekrokují, ale
+    přejdou plnou rychlostí; jejich odhadnutá cena se připíše řádku volání (`core.engine.library_costs`).
+    `callgrind` ("line" nebo "instruction") uloží z trace i profil ve formátu callgrind pro KCachegrind
+    (`core.engine.callgrind`).
+    `analysis_jobs` je počet procesů pro souběžné čtení velkého trace při analýze (v úlohách `run_jobs` 1,
+    proces úlohy nesmí vytvářet další procesy).
+    `call_graph` uloží do JSON i profil volání celého programu (`core.engine.call_graph`, další průchod trace).
+    """
+    scope_function = func_name if capture_mode in ("function", "record") else None
+    record_method = GDB_RECORD_METHOD if capture_mode == "record" else None
+    regions = capture_mode == "region"
+
+    quoted_params = [f"'{p}'" if ' ' in p else p for p in params]
+    trace_file, json_filename = get_output_names(func_name, params, architecture, trace_format)
+
+    if backend == "ptrace" and architecture != "native":
+        log_warning(f"Backend `ptrace` podporuje jen nativní binárky, pro `{architecture}` použiji GDB.")
+        backend = "gdb"
+    if callgrind and (capture_mode in ("count", "sample") or stream):
+        log_warning("Profil callgrind se vytváří z trace uloženého na disku, pro tento režim se nevytvoří.")
+        callgrind = None
+    if capture_mode == "count":
+        if stream:
+            log_warning("Počty volání nevytvářejí trace, průběžná analýza se nepoužije.")
+        return count_and_analyze(binary_file, func_name, params, architecture, backend, json_filename, budget, run_timeout)
+    if capture_mode == "sample":
+        if stream:
+            log_warning("Vzorkování nevytváří trace, průběžná analýza se nepoužije.")
+        return sample_and_analyze(binary_file, func_name, params, architecture, backend, trace_file, json_filename,
+                                  sample_interval or SAMPLE_INTERVAL, run_timeout)
+    if regions and backend == "qemu":
+        log_warning("Log vykonaných instrukcí QEMU neobsahuje jména oblastí, oblasti zájmu zachytí GDB.")
+        backend = "gdb"
+    if regions and (stream or step_over_library):
+        log_warning("Oblasti zájmu se analyzují až po skončení trace, knihovní volání se v nich krokují.")
+        stream = step_over_library = False
+    if regions and step_mode == "block":
+        log_warning("Oblasti zájmu se krokují po instrukcích, krokování po blocích se nepoužije.")
+        step_mode = "instruction"
+    if record_method and backend != "gdb":
+        log_warning(f"Záznam běhu je dostupný jen pro backend `gdb`, backend `{backend}` zachytí jen volání funkce.")
+    if step_mode == "block" and backend != "gdb":
+        log_warning(f"Krokování po blocích je dostupné jen pro backend `gdb`, backend `{backend}` jej ignoruje.")
+    if step_over_library and (architecture != "native" or backend == "qemu"):
+        log_warning("Přecházení knihovních volání je dostupné jen pro nativní binárky (backend `gdb` nebo `ptrace`).")
+        step_over_library = False
+    if stream and record_method and backend == "gdb":
+        log_warning("Záznam běhu se ukládá do souboru, průběžná analýza se nepoužije.")
+        stream = False
+    if stream and trace_format == "binary":
+        log_warning("Průběžná analýza čte jen textový trace, formát `binary` se nepoužije.")
+        trace_file, json_filename = get_output_names(func_name, params, architecture, "text")
+
+    def run_tracer(trace_path):
+        if backend == "qemu":
+            run_qemu_exec_trace(binary_file, trace_path, params, architecture, scope_function, budget, run_timeout)
+        elif backend == "ptrace":
+            run_ptrace_trace(binary_file, trace_path, params, scope_function, budget, run_timeout, step_over_library,
+                             regions=regions)
+        elif session_pool is not None and not record_method and not step_over_library and not regions:
+            session_pool.trace(binary_file, architecture, trace_path, quoted_params, scope_function, step_mode,
+                               budget, run_timeout)
+        elif architecture in ("arm", "riscv"):
+            run_gdb_trace_qemu(binary_file, trace_path, quoted_params, architecture, scope_function, step_mode, record_method,
+                               budget, run_timeout, regions=regions)
+        else:
+            run_gdb_trace(binary_file, trace_path, quoted_params, scope_function, step_mode, record_method,
+                          budget, run_timeout, step_over_library=step_over_library, regions=regions)
+
+    if stream:
+        output_json = get_output_json_path(func_name, json_filename)
+        quoted_params_str = " ".join(quoted_params)
+        log_info(f"\nSpouštím průběžný trace a analýzu pro {binary_file} s parametry {quoted_params}")
+        stream_trace(run_tracer,
+                     lambda trace_stream: analyze_trace_stream(trace_stream, binary_file, func_name, output_json, quoted_params_str,
+                                                               extrapolate_iterations=extrapolate),
+                     os.path.basename(trace_file), TRACE_WORK_DIR)
+        log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
+        return output_json
+
+    run_tracer(trace_file)
+
+    log_info(f"\nSpouštím trace pro {binary_file} s parametry {quoted_params}")
+    log_info(f"Trace dokončen! Výstup: {trace_file}")
+
+    if regions:
+        output_json = get_output_json_path(func_name, json_filename)
+        log_info(f"\nProbíhá analýza oblastí zájmu pro trace soubor: {trace_file}")
+        if analyze_region_trace(trace_file, binary_file, func_name, output_json, " ".join(quoted_params)):
+            log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
+        if callgrind:
+            export_set_callgrind(trace_file, binary_file, output_json, " ".join(quoted_params), callgrind)
+        return output_json
+
+    # Analýza trace
+    return analyze_set_trace(trace_file, binary_file, func_name, params, json_filename, extrapolate, callgrind,
+                             analysis_jobs, call_graph)
+
+
+def sample_and_analyze(binary_file, func_name, params, architecture, backend, trace_file, json_filename, interval,
+                       run_timeout=None):
+    """
+    Statisticky vzorkuje jedno volání `func_name` a vrátí cestu k výstupnímu JSON souboru.
+
+    Program běží plnou rychlostí a každých `interval` sekund se zaznamená zásobník volání
+    (backend "ptrace" přímo přes `ptrace`, jinak přes GDB, u ARM a RISC-V v QEMU). Hodnoty
+    ve výstupním JSON jsou počty vzorků a objekt `"sampling"` obsahuje podíly řádků a funkcí
+    s intervaly spolehlivosti (viz `core.engine.sampling`).
+    """
+    samples_file = samples_path(trace_file)
+    quoted_params = [f"'{p}'" if ' ' in p else p for p in params]
+    log_info(f"\nSpouštím vzorkování pro {binary_file} s parametry {quoted_params}")
+
+    if backend == "qemu":
+        log_warning("QEMU user-mode nemá režim `-icount` pro vzorkování, vzorkuje se přes GDB server QEMU.")
+    if backend == "ptrace":
+        run_ptrace_sample(binary_file, samples_file, params, func_name, interval, run_timeout)
+    elif architecture in ("arm", "riscv"):
+        run_gdb_trace_qemu(binary_file, samples_file, quoted_params, architecture, func_name, timeout=run_timeout,
+                           sample_interval=interval)
+    else:
+        run_gdb_trace(binary_file, samples_file, quoted_params, func_name, timeout=run_timeout, sample_interval=interval)
+
+    output_json = get_output_json_path(func_name, json_filename)
+    if analyze_samples(samples_file, binary_file, func_name, output_json, " ".join(quoted_params), architecture):
+        log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
+    remove_samples(samples_file)
+    return output_json
+
+
+def count_and_analyze(binary_file, func_name, params, architecture, backend, json_filename, budget=None, run_timeout=None):
+    """
+    Změří počet instrukcí každého volání `func_name` a vrátí cestu k výstupnímu JSON souboru.
+
+    Program běží plnou rychlostí a zastavuje se jen na vstupu do funkce a na návratových adresách
+    jejích volání (viz `core.engine.call_counts`): nativní binárky pod `ptrace` (pro libovolný backend),
+    ARM a RISC-V v QEMU user-mode s GDB.
+    Trace se nezapisuje a instrukce se nesymbolizují; JSON obsahuje jen celkový počet (`"summary": true`)
+    a počty jednotlivých volání. `budget` omezuje instrukce nevnořených volání, `run_timeout` celý běh.
+    """
+    quoted_params = [f"'{p}'" if ' ' in p else p for p in params]
+    log_info(f"\nSpouštím počítání volání `{func_name}` pro {binary_file} s parametry {quoted_params}")
+
+    if architecture == "native":
+        if backend != "ptrace":
+            log_warning("Počty volání nativní binárky zjišťuje backend `ptrace`.")
+        calls, method, truncated = run_ptrace_count(binary_file, params, func_name, budget, run_timeout)
+    else:
+        calls, method, truncated = run_qemu_count(binary_file, quoted_params, architecture, func_name, budget, run_timeout)
 
+    output_json = get_output_json_path(func_name, json_filename)
+    if save_call_counts(calls, binary_file, func_name, output_json, " ".join(quoted_params), method, truncated):
+        log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
     return output_json
 
 
-def trace_analysis(binary_file=None, param_file=None, architecture=ACTIVE_ARCHITECTURE):
+def has_batch_markers(binary_file):
+    """
+    Zjistí, zda binárka obsahuje dávkový `main` (značkovací funkce `core.engine.batch_trace`).
+    """
+    symbols = load_binary_symbols(binary_file)
+    return all(symbols.function_address(marker) is not None for marker in (BATCH_BEGIN_MARKER, BATCH_END_MARKER))
+
+
+def generate_batch_trace_and_analyze(binary_file, func_name, param_sets, architecture, backend="gdb",
+                                     trace_format="text", step_mode="instruction", budget=None, run_timeout=None,
+                                     extrapolate=None, callgrind=None, call_graph=TRACE_CALL_GRAPH):
+    """
+    Spustí binárku jednou pro všechny sady parametrů (`main` v režimu `--batch`, viz
+    `core.engine.generator.generate_main`), trace celé dávky rozdělí podle značek mezi sadami
+    (`core.engine.batch_trace.split_batch_trace`) a každou sadu analyzuje zvlášť. Trace i JSON
+    jednotlivých sad mají stejná jména jako při samostatných spuštěních.
+
+    Dávka se vždy zachytí celá (capture "full"), `backend`, `trace_format`, `step_mode`, `extrapolate`,
+    `callgrind` a `call_graph` mají stejný význam jako u `generate_trace_and_analyze`. Limity `budget` a `run_timeout` platí
+    pro celý běh dávky; po přerušení se analyzují sady zachycené do místa přerušení.
+
+    :return: Seznam cest k výstupním JSON souborům (None pro sady, které se nepodařilo analyzovat).
+    """
+    if backend == "ptrace" and architecture != "native":
+        log_warning(f"Backend `ptrace` podporuje jen nativní binárky, pro `{architecture}` použiji GDB.")
+        backend = "gdb"
+    if step_mode == "block" and backend != "gdb":
+        log_warning(f"Krokování po blocích je dostupné jen pro backend `gdb`, backend `{backend}` jej ignoruje.")
+
+    trace_prefix = {"arm": "traceArm", "riscv": "traceRiscv"}.get(architecture, "trace")
+    trace_extension = BINARY_TRACE_EXTENSION if trace_format == "binary" else ".log"
+    batch_trace_file = os.path.join(TRACE_DIR, f"{trace_prefix}_batch_{func_name}{trace_extension}")
+    param_file = os.path.splitext(batch_trace_file)[0] + ".params"
+    write_param_sets(param_sets, param_file)
+    batch_params = ["--batch", os.path.abspath(param_file)]
+
+    log_info(f"\nSpouštím dávkový trace pro {binary_file} ({len(param_sets)} sad parametrů)")
+    if backend == "qemu":
+        run_qemu_exec_trace(binary_file, batch_trace_file, batch_params, architecture, budget=budget, timeout=run_timeout)
+    elif backend == "ptrace":
+        run_ptrace_trace(binary_file, batch_trace_file, batch_params, budget=budget, timeout=run_timeout)
+    elif architecture in ("arm", "riscv"):
+        run_gdb_trace_qemu(binary_file, batch_trace_file, batch_params, architecture, step_mode=step_mode,
+                           budget=budget, timeout=run_timeout)
+    else:
+        run_gdb_trace(binary_file, batch_trace_file, batch_params, step_mode=step_mode, budget=budget, timeout=run_timeout)
+    log_info(f"Trace dokončen! Výstup: {batch_trace_file}")
+
+    names = [get_output_names(func_name, params, architecture, trace_format) for params in param_sets]
+    segments = split_batch_trace(batch_trace_file, [trace_file for trace_file, _ in names])
+
+    outputs = []
+    for index, (params, (trace_file, json_filename)) in enumerate(zip(param_sets, names)):
+        if index >= segments:
+            log_error(f"Sada parametrů {params} chybí v trace dávky, analýza přeskočena.")
+            outputs.append(None)
+            continue
+        outputs.append(analyze_set_trace(trace_file, binary_file, func_name, params, json_filename, extrapolate, callgrind,
+                                         call_graph=call_graph))
+    return outputs
+
+
+def trace_analysis(binary_file=None, param_file=None, architecture=ACTIVE_ARCHITECTURE, capture_mode="full", backend="gdb",
+                   trace_format="text", step_mode="instruction", jobs=TRACE_JOBS, timeout=TRACE_JOB_TIMEOUT, reuse_gdb=False,
+                   batch=False, stream=False, budget=TRACE_INSTRUCTION_BUDGET, run_timeout=TRACE_RUN_TIMEOUT,
+                   extrapolate=None, sample_interval=SAMPLE_INTERVAL, step_over_library=TRACE_STEP_OVER_LIBRARY,
+                   callgrind=None, call_graph=TRACE_CALL_GRAPH):
     """
     Hlavní funkce, která umožňuje provést trace a analýzu binárního souboru pro různé sady parametrů.
 
     Pokud není zadán binární soubor ani parametry, je možné je interaktivně zadat.
+    `capture_mode`, `backend`, `trace_format` a `step_mode` se předávají do `generate_trace_and_analyze`.
+    Při `jobs` různém od 1 nebo zadaném `timeout` se sady parametrů zpracují souběžně
+    (`core.engine.scheduler.run_jobs`), každá s vlastní pracovní složkou a časovým limitem `timeout`.
+    Při `reuse_gdb` se sady parametrů zpracují postupně v jedné dlouhodobě běžící GDB relaci
+    (`core.engine.gdb_session.GdbSessionPool`).
+    Při `batch` se všechny sady parametrů zachytí jediným spuštěním binárky v dávkovém režimu
+    (`generate_batch_trace_and_analyze`); binárka musí mít `main` z `generate_main`.
+    Při `stream` se každá sada analyzuje průběžně během trace (viz `generate_trace_and_analyze`).
+    `budget`, `run_timeout` a `extrapolate` omezují každý běh traceru a odhadují celek přerušeného
+    trace (viz `generate_trace_and_analyze`). `sample_interval` je interval vzorkování pro capture "sample".
+    `step_over_library` zapne přecházení volání knihovních funkcí (viz `generate_trace_and_analyze`).
+    `callgrind` uloží ke každé sadě i profil ve formátu callgrind a `call_graph` do JSON profil volání celého
+    programu (viz `generate_trace_and_analyze`).
     """
     if not binary_file:
         log_info("\nVyber binární soubor:")
@@ -116,8 +424,112 @@ def trace_analysis(binary_file=None, param_file=None, architecture=ACTIVE_ARCHIT
     if not param_sets:
         param_sets = [[]]  # Prázdná sada jako výchozí
 
+    if batch and not has_batch_markers(binary_file):
+        log_warning(f"Binárka `{binary_file}` nemá dávkový `main` (chybí `{BATCH_BEGIN_MARKER}`), "
+                    f"sady parametrů se spustí samostatně.")
+        batch = False
+    if batch:
+        if capture_mode != "full":
+            log_warning(f"Dávkový režim zachytí celý běh programu, capture `{capture_mode}` se nepoužije.")
+        if reuse_gdb or jobs != 1 or timeout:
+            log_warning("Dávkový režim spouští binárku jen jednou, `reuse_gdb`, `jobs` a `timeout` se nepoužijí.")
+        if stream:
+            log_warning("Trace dávky se před analýzou dělí podle sad, průběžná analýza se nepoužije.")
+        if step_over_library:
+            log_warning("Dávkový režim krokuje celý program, knihovní volání se nepřejdou.")
+        outputs = [output for output in generate_batch_trace_and_analyze(binary_file, func_name, param_sets, architecture,
+                                                                         backend, trace_format, step_mode, budget,
+                                                                         run_timeout, extrapolate, callgrind,
+                                                                         call_graph) if output]
+        return outputs[-1] if outputs else ""
+
+    if reuse_gdb and backend != "gdb":
+        log_warning(f"Sdílená GDB relace se pro backend `{backend}` nepoužije.")
+    if reuse_gdb and backend == "gdb":
+        if jobs != 1 or timeout:
+            log_warning("Sdílená GDB relace zpracovává sady parametrů postupně, `jobs` a `timeout` se nepoužijí.")
+        last_output = ""
+        with GdbSessionPool() as pool:
+            for params in param_sets:
+                last_output = generate_trace_and_analyze(binary_file, func_name, params, architecture, capture_mode, backend,
+                                                         trace_format, step_mode, pool, stream, budget, run_timeout, extrapolate,
+                                                         sample_interval, step_over_library, callgrind,
+                                                         call_graph=call_graph)
+        return last_output
+
+    if jobs != 1 or timeout:
+        job_args = [dict(binary_file=os.path.abspath(binary_file), func_name=func_name, params=params,
+                         architecture=architecture, capture_mode=capture_mode, backend=backend,
+                         trace_format=trace_format, step_mode=step_mode, stream=stream, budget=budget,
+                         run_timeout=run_timeout, extrapolate=extrapolate, sample_interval=sample_interval,
+                         step_over_library=step_over_library, callgrind=callgrind, analysis_jobs=1,
+                         call_graph=call_graph)
+                    for params in param_sets]
+        outputs = [output for output in run_jobs(generate_trace_and_analyze, job_args, jobs, timeout, TRACE_WORK_DIR) if output]
+        return outputs[-1] if outputs else ""
+
     last_output = ""
     for params in param_sets:
-        last_output = generate_trace_and_analyze(binary_file, func_name, params, architecture)
+        last_output = generate_trace_and_analyze(binary_file, func_name, params, architecture, capture_mode, backend,
+                                                 trace_format, step_mode, stream=stream, budget=budget,
+                                                 run_timeout=run_timeout, extrapolate=extrapolate,
+                                                 sample_interval=sample_interval, step_over_library=step_over_library,
+                                                 callgrind=callgrind, call_graph=call_graph)
 
     return last_output
+
+
+def convert_trace(input_file, output_file=None, architecture=ACTIVE_ARCHITECTURE):
+    """
+    Převede textový trace (`.log`) do binárního formátu (`.trc`).
+
+    Pokud není zadán výstupní soubor, použije se název vstupního souboru s příponou `.trc`.
+    """
+    if not input_file or not os.path.exists(input_file):
+        log_error(f"Trace soubor `{input_file}` neexistuje!")
+        return None
+
+    if not output_file:
+        output_file = os.path.splitext(input_file)[0] + BINARY_TRACE_EXTENSION
+
+    count = convert_text_trace(input_file, output_file, architecture)
+    log_info(f"Převedeno {count} instrukcí: `{input_file}` ({os.path.getsize(input_file)} B) -> "
+             f"`{output_file}` ({os.path.getsize(output_file)} B)")
+    return output_file
+
+
+def replay_record(record_file, binary_file=None, function_name=None, architecture=ACTIVE_ARCHITECTURE, trace_format="text"):
+    """
+    Přehraje záznam běhu uložený při `--capture record` a analyzuje jej bez nového spuštění programu.
+
+    `function_name` volí funkci zájmu (výchozí je funkce z názvu binárky); může jít i o funkci
+    volanou uvnitř zaznamenaného volání. Blacklist (`trace_config.json`) se použije aktuální.
+    """
+    if not record_file or not os.path.exists(record_file):
+        log_error(f"Záznam `{record_file}` neexistuje!")
+        return None
+
+    if not binary_file:
+        log_info("\nVyber binární soubor, ze kterého záznam pochází:")
+        binary_file = fzf_select_file(".out", BUILD_DIR)
+    if not binary_file or not os.path.exists(binary_file):
+        log_error("Nebyl vybrán binární soubor!")
+        return None
+
+    func_name = function_name or extract_function_name(binary_file)
+    record_name = os.path.splitext(os.path.basename(record_file))[0]
+    trace_extension = BINARY_TRACE_EXTENSION if trace_format == "binary" else ".log"
+    trace_file = os.path.join(TRACE_DIR, f"{record_name}_replay_{func_name}{trace_extension}")
+
+    if not run_gdb_replay(binary_file, record_file, trace_file, func_name, architecture):
+        log_error(f"Ze záznamu `{record_file}` se nepodařilo sestavit trace.")
+        return None
+
+    output_json_dir = os.path.join(ANALYSIS_DIR, func_name)
+    os.makedirs(output_json_dir, exist_ok=True)
+    output_json = os.path.join(output_json_dir, f"{record_name.replace('trace', 'instructions', 1)}_replay_{func_name}.json")
+
+    log_info(f"\nProbíhá analýza pro trace soubor: {trace_file}")
+    analyze_trace(trace_file, binary_file, func_name, output_json, record_name)
+    log_info(f"Analýza dokončena! Výstupní soubor: {output_json}")
+    return output_json
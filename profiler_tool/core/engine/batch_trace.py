@@ -0,0 +1,160 @@
+from core.engine.trace_format import BinaryTrace, BinaryTraceWriter, is_binary_trace
+from core.engine.trace_format import RECORD_INSTRUCTION, RECORD_BLOCK, RECORD_END, RECORD_TRUNCATED, RECORD_LIBRARY
+from core.engine.trace_format import RECORD_THREAD, THREAD_PREFIX, parse_thread_line
+from core.engine.trace_format import FLAG_CALL
+from config import log_debug, log_warning
+
+"""
+Dávkové spouštění: jeden běh binárky (a jeden trace) pro mnoho sad parametrů.
+
+Vygenerovaný `main` (viz `core.engine.generator.generate_main`) při spuštění s `--batch <soubor>`
+načte sady parametrů po řádcích a pro každou zavolá cílovou funkci. Před a po každé sadě zavolá
+značkovací funkce `profiler_batch_begin(index)` a `profiler_batch_end(index)`. Trace celé dávky
+se podle instrukcí volání těchto značek rozdělí na trace jednotlivých sad – úsek mezi voláním
+`profiler_batch_begin` a voláním `profiler_batch_end` – a ty se analyzují stejně jako trace
+ze samostatných spuštění.
+
+Sady sdílejí jeden proces, takže jednorázové práce knihoven (líné navázání PLT, inicializace
+alokátoru) proběhnou jen v první sadě. Instrukce samotné cílové funkce se shodují se samostatnými
+spuštěními, počty instrukcí připsané voláním knihovních funkcí mohou být u dalších sad nižší.
+"""
+
+BATCH_BEGIN_MARKER = "profiler_batch_begin"
+BATCH_END_MARKER = "profiler_batch_end"
+BATCH_MAX_ARGS = 64
+
+
+def _quote_param(param):
+    """
+    Uzavře parametr do uvozovek, pokud obsahuje mezery (rozdělení řádku v `main` zná jen
+    jednoduché a dvojité uvozovky bez escapování).
+    """
+    if param and not any(c.isspace() for c in param):
+        return param
+    return f'"{param}"' if "'" in param else f"'{param}'"
+
+
+def write_param_sets(param_sets, path):
+    """
+    Zapíše sady parametrů do souboru pro `--batch` (jedna sada na řádek, i prázdná).
+    """
+    with open(path, "w") as f:
+        for params in param_sets:
+            f.write(" ".join(_quote_param(p) for p in params) + "\n")
+
+
+def _marker_of(text):
+    """
+    Vrátí značku (`BATCH_BEGIN_MARKER`/`BATCH_END_MARKER`), kterou volá instrukce nebo řádek `[CALL]`
+    s textem `text`, jinak None.
+    """
+    target = text.rsplit(None, 1)[-1] if text else ""
+    if target == f"<{BATCH_BEGIN_MARKER}>":
+        return BATCH_BEGIN_MARKER
+    if target == f"<{BATCH_END_MARKER}>":
+        return BATCH_END_MARKER
+    return None
+
+
+def _split_text_trace(trace_file, output_files):
+    segment = -1
+    out = None
+    header = []
+    thread = 1
+    with open(trace_file, "r", errors="replace") as f:
+        for line in f:
+            if line.startswith("TEXT_BASE"):
+                header.append(line)
+                continue
+            if line.startswith(THREAD_PREFIX):
+                thread = parse_thread_line(line)
+
+            # Řádek `[CALL] main -> <značka>` i samotná instrukce volání končí jménem značky
+            marker = _marker_of(line.rstrip("\n"))
+            if marker is None:
+                if out is not None:
+                    out.write(line)
+                continue
+
+            if out is not None:
+                out.close()
+                out = None
+            if marker == BATCH_BEGIN_MARKER and not line.startswith("[CALL] "):
+                segment += 1
+                if segment < len(output_files):
+                    out = open(output_files[segment], "w")
+                    out.writelines(header)
+                    if thread != 1:
+                        out.write(f"{THREAD_PREFIX}{thread}\n")
+
+    if out is not None:
+        out.close()
+    return segment + 1
+
+
+def _split_binary_trace(trace_file, output_files):
+    segment = -1
+    writer = None
+    thread = 1
+    with BinaryTrace(trace_file) as trace:
+        markers = [_marker_of(asm) for asm in trace.asm_texts]
+        records = trace.records()
+        for kind, pc, function_id, flags, asm_id in records:
+            if kind == RECORD_INSTRUCTION and markers[asm_id] is not None:
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                if markers[asm_id] == BATCH_BEGIN_MARKER:
+                    segment += 1
+                    if segment < len(output_files):
+                        writer = BinaryTraceWriter(output_files[segment], trace.architecture, trace.text_base)
+                        if thread != 1:
+                            writer.thread(thread)
+                continue
+            if kind == RECORD_THREAD:
+                thread = asm_id
+
+            if writer is None:
+                continue
+            if kind == RECORD_BLOCK:
+                writer.block(pc, asm_id)
+            elif kind == RECORD_END:
+                writer.end(trace.functions[function_id])
+            elif kind == RECORD_TRUNCATED:
+                writer.truncated(trace.functions[function_id], asm_id)
+            elif kind == RECORD_LIBRARY:
+                writer.library(trace.functions[function_id], asm_id)
+            elif kind == RECORD_THREAD:
+                writer.thread(asm_id)
+            else:
+                function_name = trace.functions[function_id]
+                asm = trace.asm_texts[asm_id]
+                if flags & FLAG_CALL:
+                    writer.call(function_name, asm.split()[-1])
+                writer.instruction(function_name, pc, asm)
+        records.close()
+
+    if writer is not None:
+        writer.close()
+    return segment + 1
+
+
+def split_batch_trace(trace_file, output_files):
+    """
+    Rozdělí trace dávkového běhu na trace jednotlivých sad parametrů.
+
+    :param trace_file: Trace celé dávky (textový nebo binární formát).
+    :param output_files: Cesty k trace souborům sad v pořadí sad (formát odpovídá vstupu).
+    :return: Počet sad nalezených v trace (méně než `len(output_files)`, pokud program skončil předčasně).
+    """
+    if is_binary_trace(trace_file):
+        segments = _split_binary_trace(trace_file, output_files)
+    else:
+        segments = _split_text_trace(trace_file, output_files)
+
+    log_debug(f"Trace `{trace_file}` rozdělen na {segments} sad parametrů")
+    if segments < len(output_files):
+        log_warning(f"Trace dávky obsahuje jen {segments} z {len(output_files)} sad parametrů (program skončil předčasně?).")
+    elif segments > len(output_files):
+        log_warning(f"Trace dávky obsahuje {segments} sad parametrů, očekáváno {len(output_files)}.")
+    return segments
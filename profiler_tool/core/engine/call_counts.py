@@ -0,0 +1,91 @@
+import json
+import os
+import re
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.trace_analysis import save_json
+from config import log_info, log_warning, log_error
+
+"""
+Souhrnné počty instrukcí jednotlivých volání cílové funkce (`trace-analysis --capture count`).
+
+Když stačí vědět, kolik instrukcí trvalo volání funkce pro daný vstup, není potřeba trace
+ani mapování na řádky. Program běží plnou rychlostí s breakpointy jen na vstupu do funkce a na
+návratových adresách jejích volání; počet instrukcí každého volání (včetně volaných funkcí) je
+rozdíl čítače instrukcí při návratu a při vstupu:
+    icount       QEMU se záznamem běhu (`-icount ...,rr=record`), ke kterému se připojí GDB: GDB přečte
+                 čítač vykonaných instrukcí QEMU (viz `core/gdb/trace_count.py`)
+    step         QEMU user-mode (`-icount` je dostupné jen v systémové emulaci): GDB krokuje
+                 jen uvnitř rozpracovaných volání a kroky počítá
+    perf         nativní binárky pod `ptrace` s hardwarovým čítačem instrukcí (`perf_event_open`),
+                 volání běží plnou rychlostí (viz `core.engine.ptrace_tracer.count_function_calls`)
+    ptrace       nativní binárky bez hardwarového čítače: krokuje se jen uvnitř volání
+Rozpočet instrukcí platí pro instrukce nevnořených volání.
+
+Výstupní JSON má tvar výsledků `save_json`: celkový počet instrukcí prvních (nevnořených) volání
+je připsán řádku, na kterém funkce začíná, `"summary": true` a objekt `"call_counts"` obsahuje
+metodu a seznam volání (pořadí, hloubka rekurze, počet instrukcí, zda volání skončilo návratem).
+"""
+
+COUNT_METHOD_ICOUNT = "icount"
+COUNT_METHOD_STEP = "step"
+COUNT_METHOD_PERF = "perf"
+COUNT_METHOD_PTRACE = "ptrace"
+
+
+def read_call_counts(counts_file):
+    """
+    Načte počty volání zapsané GDB skriptem (`core/gdb/trace_count.py`, jeden JSON objekt na řádek).
+
+    :return: Trojice (seznam volání, metoda `COUNT_METHOD_*` nebo None, důvod přerušení limitem nebo None).
+    """
+    if not os.path.exists(counts_file):
+        log_error(f"Soubor s počty volání `{counts_file}` nebyl vytvořen.")
+        return [], None, None
+    calls = []
+    method = None
+    truncated = None
+    with open(counts_file, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "call" in record:
+                calls.append(record)
+            method = record.get("method", method)
+            truncated = record.get("truncated", truncated)
+    # Skript zapisuje volání v pořadí návratů
+    return sorted(calls, key=lambda call: call["call"]), method, truncated
+
+
+def save_call_counts(calls, binary_file, function_name, output_json, params, method, truncated=None):
+    """
+    Uloží počty instrukcí volání funkce do JSON souboru (viz popis modulu).
+
+    :param calls: Seznam volání z `count_function_calls` nebo `read_call_counts`.
+    :param method: Metoda zjištění počtů (`COUNT_METHOD_*`).
+    :param truncated: Důvod předčasného ukončení běhu (`LIMIT_BUDGET`, `LIMIT_TIMEOUT`), nebo None.
+    :return: True, pokud byly výsledky uloženy.
+    """
+    if not calls:
+        log_error(f"Nebylo zaznamenáno žádné volání `{function_name}`, výsledky nebyly uloženy.")
+        return False
+
+    symbols = load_binary_symbols(binary_file)
+    entry_pc = symbols.function_address(function_name)
+    entry_line = symbols.source_line(entry_pc) if entry_pc is not None else None
+    if entry_line is None:
+        entry_line = f"??:{function_name}"
+    source_file = entry_line.split(":")[0]
+
+    total = sum(call["instructions"] for call in calls if call["depth"] == 0)
+    incomplete = [call for call in calls if not call["complete"]]
+    if incomplete:
+        log_warning(f"{len(incomplete)} volání `{function_name}` neskončilo návratem, jejich počty jsou neúplné.")
+    crash_detected = bool(incomplete) and truncated is None
+
+    save_json({re.sub(r" \(discriminator \d+\)", "", entry_line): total}, crash_detected, entry_line if crash_detected else None,
+              output_json, function_name, params, source_file,
+              truncation={"reason": truncated, "traced_instructions": total} if truncated else None,
+              call_counts={"method": method, "calls": calls})
+    log_info(f"{len(calls)} volání `{function_name}`, celkem {total} instrukcí ({method})")
+    return True
@@ -0,0 +1,257 @@
+import collections
+import re
+from config import ACTIVE_ARCHITECTURE, get_return_instructions_regex
+from core.engine.trace_format import TRUNCATED_PREFIX, LIBRARY_PREFIX, THREAD_PREFIX, BLOCK_PREFIX
+from core.engine.trace_format import parse_truncated_line, parse_library_line, parse_thread_line
+
+"""
+Profil volání celého programu z jednoho průchodu trace.
+
+Analýza funkce (`core.engine.trace_analysis.parse_trace`) počítá instrukce jen pro jednu cílovou
+funkci. `CallGraph` z téhož trace sestaví pro každou funkci v trace vlastní počet instrukcí (`self`),
+počet instrukcí včetně volaných funkcí (`inclusive`) a počet volání, a pro každou dvojici
+volající → volaná funkce počet volání a počet instrukcí těchto volání včetně dalšího zanoření.
+
+Zásobník volání se rekonstruuje z posloupnosti instrukcí (pro každé vlákno zvlášť, řádky `[THREAD]`):
+    - instrukce označená řádkem `[CALL]` otevře rámec funkce následující instrukce (skok uvnitř
+      funkce, tj. cíl `<funkce+posun>`, rámec neotevře),
+    - po návratové instrukci se rámec uzavře,
+    - instrukce funkce, která je níže na zásobníku, uzavře rámce nad ní (návrat přes více úrovní,
+      např. z funkce vyvolané skokem z PLT),
+    - přechod do funkce mimo zásobník bez volání (skok z PLT do zavaděče nebo do knihovní funkce,
+      koncové volání) se započte jako volání z horní funkce.
+
+Počty `inclusive` se při rekurzi započtou jen nejvnějšímu rámci funkce (resp. dvojice funkcí),
+takže žádná instrukce není u jedné funkce započtena vícekrát. Odhady přejitých knihovních volání
+(`[LIBRARY]`, viz `core.engine.library_costs`) se započtou jako volání knihovní funkce s daným
+počtem instrukcí (ve výsledku `"library": true`).
+
+S `instructions=True` se navíc počítají instrukce jednotlivých adres (`pc_counts`) a volání
+z jednotlivých míst volání (`site_calls`, `site_counts`) pro export do formátu callgrind
+(`core.engine.callgrind`). Cena místa volání je součtem cen všech jeho volání, při rekurzi se tedy
+zanořená volání započtou vícekrát (stejně jako v callgrind, cykly rozpozná prohlížeč). Paměť roste
+jen s počtem různých adres a míst volání, ne s délkou trace.
+"""
+
+_INSTRUCTION = re.compile(r"^(.+?), (0x[0-9a-fA-F]+): (.*)$")
+_CALL_MARKER = re.compile(r"^\[CALL\] .* -> (\S+)")
+
+
+class _ThreadStack:
+    """
+    Rekonstruovaný zásobník volání jednoho vlákna.
+    """
+
+    def __init__(self):
+        # Rámce (funkce, čas otevření, započítat funkci, dvojice volající → volaná, započítat dvojici)
+        self.stack = []
+        self.clock = 0                                    # počet instrukcí vykonaných vláknem
+        self.active_functions = collections.defaultdict(int)
+        self.active_edges = collections.defaultdict(int)
+        self.marked = None     # cíl z řádku `[CALL]` pro následující instrukci
+        self.entering = None   # cíl volání vykonaného předchozí instrukcí
+        self.last_pc = None    # adresa předchozí instrukce (místo volání, jen s `instructions=True`)
+        self.returning = False
+
+
+class CallGraph:
+    """
+    Počty instrukcí a volání všech funkcí v trace (viz popis modulu).
+    """
+
+    def __init__(self, architecture=ACTIVE_ARCHITECTURE, instructions=False):
+        self.self_counts = collections.defaultdict(int)
+        self.inclusive_counts = collections.defaultdict(int)
+        self.call_counts = collections.defaultdict(int)
+        self.edge_calls = collections.defaultdict(int)
+        self.edge_counts = collections.defaultdict(int)
+        self.library_functions = set()
+        # Počty pro callgrind: (funkce, adresa), (volající, adresa volání, volaná) a adresy vstupu do funkcí
+        self.pc_counts = collections.defaultdict(int) if instructions else None
+        self.site_calls = collections.defaultdict(int) if instructions else None
+        self.site_counts = collections.defaultdict(int) if instructions else None
+        self.entries = {}
+        self.truncated = None
+        self.threads = {}
+        self.thread = self._select_thread(1)
+        self._returns = re.compile(get_return_instructions_regex(architecture))
+        self._lines = {}
+
+    def _select_thread(self, number):
+        thread = self.threads.get(number)
+        if thread is None:
+            thread = self.threads[number] = _ThreadStack()
+        self.thread = thread
+        return thread
+
+    def _push(self, thread, function, call):
+        caller = thread.stack[-1][0] if thread.stack else None
+        counted = thread.active_functions[function] == 0
+        thread.active_functions[function] += 1
+        edge = site = None
+        counted_edge = False
+        if call and caller is not None:
+            edge = (caller, function)
+            self.call_counts[function] += 1
+            self.edge_calls[edge] += 1
+            counted_edge = thread.active_edges[edge] == 0
+            thread.active_edges[edge] += 1
+            if self.site_calls is not None:
+                site = (caller, thread.last_pc, function)
+                self.site_calls[site] += 1
+        thread.stack.append((function, thread.clock, counted, edge, counted_edge, site))
+
+    def _pop(self, thread):
+        function, opened, counted, edge, counted_edge, site = thread.stack.pop()
+        elapsed = thread.clock - opened
+        thread.active_functions[function] -= 1
+        if counted:
+            self.inclusive_counts[function] += elapsed
+        if edge is not None:
+            thread.active_edges[edge] -= 1
+            if counted_edge:
+                self.edge_counts[edge] += elapsed
+        if site is not None:
+            self.site_counts[site] += elapsed
+
+    def _classify(self, line):
+        """
+        Vrátí trojici (funkce, návratová instrukce, adresa) pro řádek instrukce, jinak None.
+        """
+        match = _INSTRUCTION.match(line)
+        if not match:
+            return None
+        return match.group(1), self._returns.match(match.group(3)) is not None, int(match.group(2), 16)
+
+    def instruction(self, function, is_return, pc=None):
+        """
+        Započte jednu instrukci funkce `function` (na adrese `pc`) v aktuálním vlákně.
+        """
+        thread = self.thread
+        stack = thread.stack
+        if thread.returning:
+            thread.returning = False
+            if stack:
+                self._pop(thread)
+
+        entering = thread.entering
+        thread.entering = None
+        if not stack:
+            self._push(thread, function, False)
+        elif entering is not None and (stack[-1][0] != function or entering == function):
+            self._push(thread, function, True)
+            if entering == function and function not in self.entries:
+                self.entries[function] = pc
+        elif stack[-1][0] != function:
+            for position in range(len(stack) - 2, -1, -1):
+                if stack[position][0] == function:
+                    while len(stack) > position + 1:
+                        self._pop(thread)
+                    break
+            else:
+                # Přechod do funkce mimo zásobník bez volání (skok) se počítá jako volání
+                self._push(thread, function, True)
+
+        thread.clock += 1
+        self.self_counts[function] += 1
+        if self.pc_counts is not None:
+            self.pc_counts[function, pc] += 1
+            thread.last_pc = pc
+        if is_return:
+            thread.returning = True
+        if thread.marked is not None:
+            thread.entering = thread.marked
+            thread.marked = None
+
+    def library(self, function, count):
+        """
+        Započte přejité volání knihovní funkce s odhadem `count` instrukcí.
+        """
+        thread = self.thread
+        thread.entering = None
+        self._push(thread, function, True)
+        thread.clock += count
+        self.self_counts[function] += count
+        if self.pc_counts is not None:
+            self.pc_counts[function, None] += count
+        self.library_functions.add(function)
+        self._pop(thread)
+
+    def scan(self, lines, expand_block=None):
+        """
+        Zpracuje řádky textového trace (iterovatelný objekt), až do konce nebo přerušení trace limitem.
+        `expand_block` převede řádek `[BLOCK]` na řádky instrukcí bloku (bez něj se bloky přeskočí).
+        """
+        cache = self._lines
+        self_counts = self.self_counts
+        pc_counts = self.pc_counts
+        thread = self.thread
+        for line in lines:
+            if line.startswith("["):
+                if line.startswith("[CALL]"):
+                    match = _CALL_MARKER.match(line)
+                    if match:
+                        self.thread.marked = match.group(1).strip("<>")
+                elif line.startswith(LIBRARY_PREFIX):
+                    self.library(*parse_library_line(line))
+                elif line.startswith(THREAD_PREFIX):
+                    thread = self._select_thread(parse_thread_line(line))
+                elif line.startswith(BLOCK_PREFIX) and expand_block is not None:
+                    self.scan(expand_block(line))
+                elif line.startswith(TRUNCATED_PREFIX):
+                    self.truncated = parse_truncated_line(line)
+                    break
+                continue
+
+            instruction = cache.get(line)
+            if instruction is None:
+                if line in cache:
+                    continue
+                instruction = cache[line] = self._classify(line)
+                if instruction is None:
+                    continue
+
+            # Další instrukce téže funkce bez volání a návratu zásobník nemění
+            function, is_return, pc = instruction
+            if not is_return and thread.marked is None and thread.entering is None and not thread.returning \
+                    and thread.stack and thread.stack[-1][0] == function:
+                thread.clock += 1
+                self_counts[function] += 1
+                if pc_counts is not None:
+                    pc_counts[function, pc] += 1
+                    thread.last_pc = pc
+                continue
+            self.instruction(function, is_return, pc)
+
+    def close(self):
+        """
+        Uzavře rámce, které zůstaly otevřené na konci trace (program skončil uvnitř funkcí).
+        """
+        for thread in self.threads.values():
+            while thread.stack:
+                self._pop(thread)
+
+    def summary(self):
+        """
+        Uzavře otevřené rámce a vrátí výsledek pro JSON:
+        `{"total_instructions", "functions": {funkce: {"self", "inclusive", "calls"}}, "edges": [...]}`,
+        funkce a dvojice jsou seřazené sestupně podle počtu instrukcí včetně volaných funkcí.
+        """
+        self.close()
+
+        functions = {}
+        for function in sorted(self.self_counts, key=lambda name: (-self.inclusive_counts[name], name)):
+            functions[function] = {"self": self.self_counts[function],
+                                   "inclusive": self.inclusive_counts[function],
+                                   "calls": self.call_counts.get(function, 0)}
+            if function in self.library_functions:
+                functions[function]["library"] = True
+
+        edges = [{"caller": caller, "callee": callee, "calls": self.edge_calls[(caller, callee)],
+                  "inclusive": self.edge_counts[(caller, callee)]}
+                 for caller, callee in sorted(self.edge_calls, key=lambda edge: (-self.edge_counts[edge], edge))]
+
+        summary = {"total_instructions": sum(self.self_counts.values()), "functions": functions, "edges": edges}
+        if self.truncated:
+            summary["truncated"] = True
+        return summary
@@ -0,0 +1,195 @@
+import collections
+import os
+import re
+from config import log_info, log_error
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.trace_analysis import build_call_graph
+
+"""
+Export profilu z trace do formátu callgrind (KCachegrind, QCachegrind, `callgrind_annotate`).
+
+Trace (textový i binární) se projde jedním průchodem po řádcích profilem volání
+(`core.engine.call_graph.CallGraph` s `instructions=True`, viz `build_call_graph`; tentýž profil může
+posloužit i pro `"call_graph"` v JSON analýzy), který si pamatuje jen počty instrukcí
+jednotlivých adres a místa volání – paměť tedy nezávisí na délce trace a export zvládne i trace
+o velikosti několika GB. Adresy funkcí binárky se přes cache symbolů (`core.engine.symbol_cache`)
+mapují na soubory a řádky zdrojového kódu, funkce bez řádkových informací (knihovny, zavaděč)
+mají soubor `???` a řádek 0.
+
+Výstup obsahuje jednu událost `Ir` (vykonané instrukce). Pro každou funkci (`fn=`) cenu jejích
+řádků, případně (`instructions=True`) jednotlivých instrukcí s adresami (`positions: instr line`),
+a pro každé místo volání volanou funkci (`cfn=`), počet volání (`calls=`) a počet instrukcí
+volání včetně dalšího zanoření. Odhady přejitých knihovních volání (`[LIBRARY]`) jsou cenou
+volané funkce na pozici 0. Vlákna se sčítají do jednoho profilu.
+
+Runtime adresy binárky (PIE) se na statické přepočítají podle adres vstupu do funkcí binárky
+v trace (`_load_bias`).
+"""
+
+CALLGRIND_PREFIX = "callgrind.out."
+_UNKNOWN_FILE = "???"
+_DISCRIMINATOR = re.compile(r" \(discriminator \d+\)$")
+
+
+class _Names:
+    """
+    Komprese jmen (`fn=(1) jméno`, při dalším výskytu jen `fn=(1)`).
+    """
+
+    def __init__(self):
+        self.ids = {}
+
+    def __call__(self, name):
+        if name in self.ids:
+            return f"({self.ids[name]})"
+        self.ids[name] = len(self.ids) + 1
+        return f"({self.ids[name]}) {name}"
+
+
+def _load_bias(graph, symbols):
+    """
+    Vrátí posun runtime adres binárky proti statickým: nejčastější rozdíl adresy vstupu do funkce
+    binárky v trace a její statické adresy (0, pokud trace obsahuje statické adresy nebo žádný vstup).
+    """
+    offsets = collections.Counter()
+    for function, pc in graph.entries.items():
+        address = symbols.function_address(function)
+        if pc is not None and address is not None:
+            offsets[pc - address] += 1
+    return offsets.most_common(1)[0][0] if offsets else 0
+
+
+class _SourceLocator:
+    """
+    Mapování (funkce, adresa) na (soubor, řádek) s cache pro opakované adresy.
+    """
+
+    def __init__(self, symbols, bias):
+        self.symbols = symbols
+        self.bias = bias
+        self.cache = {}
+
+    def __call__(self, function, pc):
+        key = (function, pc)
+        location = self.cache.get(key)
+        if location is None:
+            location = self.cache[key] = self._locate(function, pc)
+        return location
+
+    def _locate(self, function, pc):
+        if pc is None or self.symbols.function_address(function) is None:
+            return _UNKNOWN_FILE, 0
+        source = self.symbols.source_line(pc - self.bias)
+        if not source:
+            return _UNKNOWN_FILE, 0
+        path, _, line = _DISCRIMINATOR.sub("", source).rpartition(":")
+        return (path, int(line)) if path and line.isdigit() else (_UNKNOWN_FILE, 0)
+
+
+def callgrind_output_path(output_json):
+    """
+    Vrátí cestu k profilu callgrind vedle výstupního JSON analýzy (`callgrind.out.<jméno JSON>`),
+    podle předpony jej rozpozná KCachegrind.
+    """
+    name = os.path.splitext(os.path.basename(output_json))[0]
+    return os.path.join(os.path.dirname(output_json), CALLGRIND_PREFIX + name)
+
+
+def write_callgrind(graph, binary_file, output_file, instructions=False, command=None):
+    """
+    Zapíše profil `graph` (`CallGraph` s `instructions=True` po průchodu trace) ve formátu callgrind.
+
+    :param graph: Profil volání s počty adres a míst volání.
+    :param binary_file: Binárka, ze které trace pochází (symboly a řádkové informace).
+    :param output_file: Cesta k výstupnímu souboru.
+    :param instructions: Ceny jednotlivých instrukcí s adresami, jinak jen ceny řádků.
+    :param command: Příkaz, kterým byl trace vytvořen (řádek `cmd:`).
+    """
+    graph.close()
+    symbols = load_binary_symbols(binary_file)
+    locate = _SourceLocator(symbols, _load_bias(graph, symbols))
+    files = _Names()
+    functions = _Names()
+
+    def position(location, pc):
+        return f"{hex(pc) if pc is not None else 0} {location[1]}" if instructions else str(location[1])
+
+    # Ceny adres a místa volání seskupené podle funkce
+    costs = collections.defaultdict(dict)
+    for (function, pc), count in graph.pc_counts.items():
+        costs[function][pc] = count
+    sites = collections.defaultdict(list)
+    for (caller, call_pc, callee), calls in graph.site_calls.items():
+        sites[caller].append((call_pc, callee, calls, graph.site_counts[(caller, call_pc, callee)]))
+
+    def home_file(function):
+        pc = graph.entries.get(function)
+        if pc is None:
+            pc = min((pc for pc in costs[function] if pc is not None), default=None)
+        return locate(function, pc)[0]
+
+    total = sum(graph.self_counts.values())
+    with open(output_file, "w") as f:
+        f.write("# callgrind format\n")
+        f.write("version: 1\n")
+        f.write("creator: profiler_tool trace-analysis\n")
+        f.write(f"cmd: {command or binary_file}\n")
+        if graph.truncated:
+            reason, count = graph.truncated
+            f.write(f"desc: Trace: truncated ({reason}{f' {count}' if count is not None else ''})\n")
+        f.write(f"positions: {'instr line' if instructions else 'line'}\n")
+        f.write("events: Ir\n")
+        f.write(f"summary: {total}\n")
+
+        for function in sorted(graph.self_counts, key=lambda name: (-graph.self_counts[name], name)):
+            main_file = current_file = home_file(function)
+            f.write(f"\nfl={files(main_file)}\nfn={functions(function)}\n")
+
+            # Ceny instrukcí, nebo řádků (součet instrukcí řádku) v pořadí adres
+            lines = {}
+            for pc in sorted(costs[function], key=lambda pc: -1 if pc is None else pc):
+                location = locate(function, pc)
+                key = (location, pc) if instructions else (location, None)
+                lines[key] = lines.get(key, 0) + costs[function][pc]
+            for (location, pc), count in lines.items():
+                if location[0] != current_file:
+                    current_file = location[0]
+                    f.write(f"fi={files(current_file)}\n")
+                f.write(f"{position(location, pc)} {count}\n")
+
+            for call_pc, callee, calls, inclusive in sorted(sites[function], key=lambda site: (site[0] or 0, site[1])):
+                location = locate(function, call_pc)
+                if location[0] != current_file:
+                    current_file = location[0]
+                    f.write(f"fi={files(current_file)}\n")
+                entry = graph.entries.get(callee)
+                callee_location = locate(callee, entry)
+                f.write(f"cfi={files(home_file(callee))}\ncfn={functions(callee)}\n")
+                f.write(f"calls={calls} {position(callee_location, entry)}\n")
+                f.write(f"{position(location, call_pc)} {inclusive}\n")
+
+        f.write(f"\ntotals: {total}\n")
+
+
+def export_callgrind(trace_file, binary_file, output_file, instructions=False, command=None, graph=None):
+    """
+    Vytvoří z trace profil ve formátu callgrind (viz popis modulu).
+
+    :param trace_file: Cesta k textovému nebo binárnímu trace.
+    :param binary_file: Binárka, ze které trace pochází.
+    :param output_file: Cesta k výstupnímu souboru (`callgrind_output_path`).
+    :param instructions: Ceny jednotlivých instrukcí s adresami, jinak jen ceny řádků.
+    :param command: Příkaz, kterým byl trace vytvořen (řádek `cmd:`).
+    :param graph: Profil volání už sestavený z `trace_file` (`build_call_graph` s `instructions=True`);
+                  None = trace se projde znovu.
+    :return: Cesta k výstupnímu souboru, nebo None, pokud trace neobsahuje žádné instrukce.
+    """
+    if graph is None:
+        graph = build_call_graph(trace_file, binary_file, instructions=True)
+    if not graph.self_counts:
+        log_error(f"Trace `{trace_file}` neobsahuje žádné instrukce, profil callgrind se nevytvoří.")
+        return None
+
+    write_callgrind(graph, binary_file, output_file, instructions, command)
+    log_info(f"Profil callgrind ({len(graph.self_counts)} funkcí) uložen do `{output_file}`.")
+    return output_file
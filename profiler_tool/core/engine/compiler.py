@@ -4,7 +4,7 @@ import re
 import subprocess
 from core.engine.generator import get_generated_main_path, get_generated_main_klee_path
 from config import log_info, log_debug
-from config import BM_STARTUP, BM_LINKER
+from config import BM_STARTUP, BM_LINKER, PROFILER_INCLUDE_DIR
 
 # Tento skript se zabývá kompilací C programů pro různé architektury a platformy,
 # včetně generování bitového kódu pro KLEE a kompilace pro ARM, x86 a bare-metal.
@@ -104,6 +104,7 @@ def compile_klee(klee_dir, src_file, src_dir, target_arch="native"):
             "-static" if target_arch != "native" else "",  # Statická kompilace pro cizí platformu (ne pro native)
             *arch_flags,
             "-DMAIN_DEFINED",
+            "-I", PROFILER_INCLUDE_DIR,  # Značky oblastí se pro KLEE přeloží na nic
             src, "-o", bc_file
         ], check=True)
         bc_files.append(bc_file)
@@ -147,6 +148,9 @@ def compile_binary(binary_file, src_file, src_dir, platform="arm"):
     else:
         raise ValueError(f"Neznámá platforma: {platform}")
 
+    # Značky oblastí zájmu (`profiler_regions.h`) se přeloží na volání značkovacích funkcí
+    flags += ["-I", PROFILER_INCLUDE_DIR, "-DPROFILER_REGIONS"]
+
     compile_cmd = [compiler] + flags + ["-o", binary_file] + list(needed_sources)
 
     log_debug(f"Kompiluji pro platformu '{platform}': {' '.join(compile_cmd)}")
@@ -0,0 +1,280 @@
+import collections
+import json
+import os
+import re
+import subprocess
+from core.engine.elf_reader import ElfFile, ET_DYN
+from core.engine.symbol_cache import hash_binary
+from config import OBJDUMP_EXECUTABLES, SYMBOL_CACHE_DIRNAME
+from config import log_debug, log_warning
+
+"""
+Statická disassemblace binárky pomocí `objdump -d` (index instrukcí binárky).
+
+Používá se tam, kde trace obsahuje jen vykonané adresy (např. výstup QEMU) a text instrukcí
+spolu se jménem funkce je potřeba doplnit až dodatečně, a také v GDB skriptech, které díky
+indexu nemusí v každém kroku volat `disassemble()` a `frame.name()`. Výstup `objdump` se
+převádí do podoby, jakou vypisuje GDB (cílové adresy skoků s prefixem `0x`), aby výsledné
+trace soubory byly zaměnitelné s trace soubory z GDB skriptů.
+
+Index traceované binárky se ukládá do složky `.symcache` (klíčem je SHA-256 binárky stejně
+jako u cache symbolů), takže se `objdump` spouští jen jednou pro každé sestavení binárky.
+"""
+
+DISASSEMBLY_CACHE_VERSION = 1
+
+_FUNCTION_HEADER = re.compile(r"^([0-9a-f]+) <(.+)>:$")
+_INSTRUCTION_ADDRESS = re.compile(r"^\s*([0-9a-f]+):$")
+_SYMBOLIC_TARGET = re.compile(r"\b([0-9a-f]+) <([^>]+)>")
+
+# Třídy instrukcí
+CLASS_OTHER = "other"
+CLASS_CALL = "call"
+CLASS_RETURN = "return"
+CLASS_JUMP = "jump"
+CLASS_SYSTEM = "system"  # systémové volání nebo úmyslná výjimka (může ukončit program)
+
+_SYSTEM_MNEMONICS = {
+    "native": {"syscall", "sysenter", "int", "int3", "hlt", "ud2"},
+    "arm": {"svc", "swi", "udf", "bkpt"},
+    "riscv": {"ecall", "ebreak", "c.ebreak", "unimp"},
+}
+
+_ARM_BRANCH = re.compile(r"^(b|bx|cbn?z)(eq|ne|cs|hs|cc|lo|mi|pl|vs|vc|hi|ls|ge|lt|gt|le|al)?(\.[nw])?$")
+_RISCV_BRANCHES = {"j", "jr", "beq", "bne", "blt", "bge", "bltu", "bgeu", "beqz", "bnez", "blez", "bgez", "bltz",
+                   "bgtz", "bgt", "ble", "bgtu", "bleu", "c.j", "c.jr", "c.beqz", "c.bnez"}
+
+
+class Instruction(collections.namedtuple("Instruction", ["function", "asm", "length", "iclass"])):
+    """
+    Jedna instrukce indexu: jméno funkce, text instrukce (v syntaxi GDB), délka v bajtech a třída.
+    """
+    __slots__ = ()
+
+    @property
+    def mnemonic(self):
+        return self.asm.split(None, 1)[0] if self.asm else ""
+
+    @property
+    def operands(self):
+        parts = self.asm.split(None, 1)
+        return parts[1] if len(parts) > 1 else ""
+
+
+def classify_instruction(asm, architecture):
+    """
+    Určí třídu instrukce (`CLASS_CALL`, `CLASS_RETURN`, `CLASS_JUMP`, `CLASS_SYSTEM`, `CLASS_OTHER`).
+
+    :param asm: Text instrukce.
+    :param architecture: Architektura ('native', 'arm', 'riscv').
+    """
+    parts = asm.split(None, 1)
+    if not parts:
+        return CLASS_OTHER
+    mnemonic = parts[0]
+    operands = parts[1].replace(" ", "") if len(parts) > 1 else ""
+
+    # Prefixy x86 (`bnd jmp`, `notrack call`)
+    if mnemonic in ("bnd", "notrack") and len(parts) > 1:
+        return classify_instruction(parts[1], architecture)
+
+    if mnemonic in _SYSTEM_MNEMONICS.get(architecture, _SYSTEM_MNEMONICS["native"]):
+        return CLASS_SYSTEM
+
+    if architecture == "arm":
+        if mnemonic in ("bl", "blx") and operands != "lr":
+            return CLASS_CALL
+        if mnemonic in ("bx", "blx") and operands == "lr" or mnemonic == "mov" and operands.startswith("pc,lr") \
+                or mnemonic in ("pop", "ldmia", "ldm") and "pc}" in operands:
+            return CLASS_RETURN
+        if _ARM_BRANCH.match(mnemonic):
+            return CLASS_JUMP
+        return CLASS_OTHER
+
+    if architecture == "riscv":
+        if mnemonic == "ret" or mnemonic == "jr" and operands == "ra" or mnemonic == "jalr" and operands.startswith("zero,ra"):
+            return CLASS_RETURN
+        if mnemonic in ("jal", "jalr", "c.jal", "c.jalr", "call"):
+            return CLASS_CALL
+        if mnemonic in _RISCV_BRANCHES:
+            return CLASS_JUMP
+        return CLASS_OTHER
+
+    if mnemonic in ("call", "callq"):
+        return CLASS_CALL
+    if mnemonic in ("ret", "retq"):
+        return CLASS_RETURN
+    if mnemonic.startswith("j") or mnemonic.startswith("loop"):
+        return CLASS_JUMP
+    return CLASS_OTHER
+
+
+def _to_gdb_syntax(asm):
+    """
+    Převede cílové adresy ve tvaru `objdump` (`1080 <printf@plt>`) na tvar GDB (`0x1080 <printf@plt>`).
+    """
+    return _SYMBOLIC_TARGET.sub(lambda m: f"0x{m.group(1)} <{m.group(2)}>", asm)
+
+
+def parse_objdump_output(output, architecture="native"):
+    """
+    Zpracuje výstup `objdump -d`.
+
+    :param output: Textový výstup `objdump -d`.
+    :param architecture: Architektura binárky (pro určení tříd instrukcí).
+    :return: Slovník statická adresa → `Instruction`.
+    """
+    instructions = {}
+    function_name = None
+    last_pc = None
+
+    for line in output.split("\n"):
+        header = _FUNCTION_HEADER.match(line)
+        if header:
+            # Verzované symboly knihoven (`printf@@GLIBC_2.2.5`) GDB vypisuje bez verze
+            function_name = header.group(2)
+            if "@" in function_name and not function_name.endswith("@plt"):
+                function_name = function_name.split("@")[0]
+            last_pc = None
+            continue
+
+        parts = line.split("\t")
+        if len(parts) < 2 or function_name is None:
+            continue
+
+        address = _INSTRUCTION_ADDRESS.match(parts[0])
+        if not address:
+            continue
+
+        length = sum(len(byte_group) // 2 for byte_group in parts[1].split())
+
+        # Dlouhé x86 instrukce pokračují na dalším řádku jen s bajty
+        if len(parts) < 3:
+            if last_pc is not None:
+                previous = instructions[last_pc]
+                instructions[last_pc] = previous._replace(length=previous.length + length)
+            continue
+
+        pc = int(address.group(1), 16)
+        asm = _to_gdb_syntax("\t".join(parts[2:]).strip())
+        instructions[pc] = Instruction(function_name, asm, length, classify_instruction(asm, architecture))
+        last_pc = pc
+
+    return instructions
+
+
+def get_disassembly_cache_path(binary_file, architecture):
+    """
+    Vrátí cestu k indexu instrukcí binárky (`<složka binárky>/.symcache/<jméno>.<arch>.disasm.json`).
+    """
+    binary_file = os.path.abspath(binary_file)
+    return os.path.join(os.path.dirname(binary_file), SYMBOL_CACHE_DIRNAME,
+                        f"{os.path.basename(binary_file)}.{architecture}.disasm.json")
+
+
+def _load_disassembly_cache(cache_path, sha256):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log_warning(f"Index instrukcí `{cache_path}` nelze načíst: {e}")
+        return None
+
+    if data.get("version") != DISASSEMBLY_CACHE_VERSION or data.get("sha256") != sha256:
+        log_debug(f"Index instrukcí `{cache_path}` je zastaralý, bude sestaven znovu.")
+        return None
+
+    functions = data["functions"]
+    return {pc: Instruction(functions[function_id], asm, length, iclass)
+            for pc, function_id, asm, length, iclass in data["instructions"]}
+
+
+def _save_disassembly_cache(cache_path, binary_file, architecture, sha256, instructions):
+    function_ids = {}
+    records = []
+    for pc, instruction in sorted(instructions.items()):
+        function_id = function_ids.setdefault(instruction.function, len(function_ids))
+        records.append([pc, function_id, instruction.asm, instruction.length, instruction.iclass])
+
+    data = {
+        "version": DISASSEMBLY_CACHE_VERSION,
+        "binary": os.path.abspath(binary_file),
+        "sha256": sha256,
+        "architecture": architecture,
+        "pie": ElfFile(binary_file).type == ET_DYN,
+        "functions": list(function_ids),
+        "instructions": records,
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+        log_debug(f"Index instrukcí uložen do `{cache_path}`")
+    except OSError as e:
+        log_warning(f"Index instrukcí `{cache_path}` nelze uložit: {e}")
+
+
+def _run_objdump(binary_file, architecture):
+    objdump = OBJDUMP_EXECUTABLES.get(architecture, "objdump")
+    try:
+        output = subprocess.run([objdump, "-d", "-w", binary_file], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        log_warning(f"Disassemblace `{binary_file}` pomocí `{objdump}` selhala: {e}")
+        return None
+    return parse_objdump_output(output, architecture)
+
+
+_disassemblies = {}
+
+
+def load_disassembly(binary_file, architecture, persistent=False):
+    """
+    Vrátí (a při prvním použití vytvoří) statickou disassemblaci binárky.
+
+    :param binary_file: Cesta k binárnímu souboru.
+    :param architecture: Architektura binárky ('native', 'arm', 'riscv') – určuje použitý `objdump`.
+    :param persistent: Ukládat index do `.symcache` vedle binárky (jen pro traceované binárky,
+                       ne pro systémové knihovny).
+    :return: Slovník statická adresa → `Instruction`.
+    """
+    key = (os.path.abspath(binary_file), architecture)
+    stat = os.stat(key[0])
+    memo = _disassemblies.get(key)
+    if memo and memo[0] == (stat.st_mtime_ns, stat.st_size):
+        return memo[1]
+
+    instructions = None
+    if persistent:
+        sha256 = hash_binary(binary_file)
+        cache_path = get_disassembly_cache_path(binary_file, architecture)
+        instructions = _load_disassembly_cache(cache_path, sha256)
+
+    if instructions is None:
+        instructions = _run_objdump(binary_file, architecture)
+        if instructions is None:
+            return {}
+        if persistent:
+            _save_disassembly_cache(cache_path, binary_file, architecture, sha256, instructions)
+
+    log_debug(f"Disassemblováno {len(instructions)} instrukcí z `{binary_file}`")
+    _disassemblies[key] = ((stat.st_mtime_ns, stat.st_size), instructions)
+    return instructions
+
+
+def build_instruction_index(binary_file, architecture):
+    """
+    Zajistí, že pro binárku existuje aktuální index instrukcí na disku, a vrátí cestu k němu
+    (nebo None, pokud disassemblace selhala). Soubor načítají GDB skripty (`trace_index.py`).
+    """
+    instructions = load_disassembly(binary_file, architecture, persistent=True)
+    if not instructions:
+        return None
+
+    cache_path = get_disassembly_cache_path(binary_file, architecture)
+    if not os.path.exists(cache_path):
+        _save_disassembly_cache(cache_path, binary_file, architecture, hash_binary(binary_file), instructions)
+    return cache_path if os.path.exists(cache_path) else None
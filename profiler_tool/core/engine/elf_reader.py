@@ -0,0 +1,156 @@
+import struct
+import zlib
+
+"""
+Minimalistická čtečka ELF souborů bez externích závislostí.
+
+Slouží analýze trace souborů k tomu, aby nemusela pro každou instrukci spouštět
+nástroje z binutils (`addr2line`, `nm`). Podporuje 32bitové i 64bitové ELF soubory
+v obou endianitách (x86-64, ARM, RISC-V) a komprimované ladicí sekce (SHF_COMPRESSED).
+"""
+
+ET_EXEC = 2
+ET_DYN = 3
+
+SHF_EXECINSTR = 0x4
+SHF_COMPRESSED = 0x800
+ELFCOMPRESS_ZLIB = 1
+
+STB_LOCAL = 0
+STB_GLOBAL = 1
+STB_WEAK = 2
+
+STT_NOTYPE = 0
+STT_FUNC = 2
+
+
+class ElfFile:
+    """
+    Načtený ELF soubor s přístupem k jednotlivým sekcím podle jména.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+
+        if self.data[:4] != b"\x7fELF":
+            raise ValueError(f"Soubor `{path}` není ELF.")
+
+        self.path = path
+        self.is_64 = self.data[4] == 2
+        self.endian = "<" if self.data[5] == 1 else ">"
+        self.address_size = 8 if self.is_64 else 4
+
+        if self.is_64:
+            (self.type, self.machine, _, self.entry, _, shoff, _, _, _, _,
+             shentsize, shnum, shstrndx) = struct.unpack_from(self.endian + "HHIQQQIHHHHHH", self.data, 16)
+        else:
+            (self.type, self.machine, _, self.entry, _, shoff, _, _, _, _,
+             shentsize, shnum, shstrndx) = struct.unpack_from(self.endian + "HHIIIIIHHHHHH", self.data, 16)
+
+        self.sections = {}
+        headers = []
+        for i in range(shnum):
+            offset = shoff + i * shentsize
+            if self.is_64:
+                name, sh_type, flags, addr, sh_offset, size, link, info, _, entsize = \
+                    struct.unpack_from(self.endian + "IIQQQQIIQQ", self.data, offset)
+            else:
+                name, sh_type, flags, addr, sh_offset, size, link, info, _, entsize = \
+                    struct.unpack_from(self.endian + "IIIIIIIIII", self.data, offset)
+            headers.append((name, sh_type, flags, addr, sh_offset, size, link, info, entsize))
+
+        if shstrndx >= len(headers):
+            return
+
+        names_offset = headers[shstrndx][4]
+        for index, (name, sh_type, flags, addr, sh_offset, size, link, info, entsize) in enumerate(headers):
+            section_name = self._read_cstring(names_offset + name)
+            self.sections[section_name] = {
+                "index": index,
+                "type": sh_type,
+                "flags": flags,
+                "addr": addr,
+                "offset": sh_offset,
+                "size": size,
+                "link": link,
+                "info": info,
+                "entsize": entsize,
+            }
+
+    def _read_cstring(self, offset):
+        end = self.data.find(b"\0", offset)
+        return self.data[offset:end].decode("utf-8", errors="replace")
+
+    def has_section(self, name):
+        return name in self.sections
+
+    def section_data(self, name):
+        """
+        Vrátí obsah sekce `name` (případně dekomprimovaný), nebo None, pokud sekce neexistuje.
+        """
+        section = self.sections.get(name)
+        if section is None or section["type"] == 8:  # SHT_NOBITS
+            return None
+
+        raw = self.data[section["offset"]:section["offset"] + section["size"]]
+        if not section["flags"] & SHF_COMPRESSED:
+            return raw
+
+        if self.is_64:
+            ch_type, _, ch_size, _ = struct.unpack_from(self.endian + "IIQQ", raw, 0)
+            header_size = 24
+        else:
+            ch_type, ch_size, _ = struct.unpack_from(self.endian + "III", raw, 0)
+            header_size = 12
+
+        if ch_type != ELFCOMPRESS_ZLIB:
+            raise ValueError(f"Nepodporovaná komprese sekce `{name}` ({ch_type}).")
+        return zlib.decompress(raw[header_size:])[:ch_size]
+
+    def function_symbols(self):
+        """
+        Vrátí seznam funkcí ze symbolové tabulky (`.symtab`, případně `.dynsym`)
+        jako n-tice `(jméno, adresa, velikost)` seřazené podle adresy.
+
+        Adresa odpovídá hodnotě symbolu stejně jako ve výstupu `nm` (u ARM Thumb funkcí
+        tedy včetně nejnižšího bitu). Pokud je stejné jméno definováno vícekrát, přednost
+        má globální symbol před slabým a lokálním.
+        """
+        section_name = ".symtab" if ".symtab" in self.sections else ".dynsym"
+        section = self.sections.get(section_name)
+        if section is None:
+            return []
+
+        strtab_offset = None
+        for other in self.sections.values():
+            if other["index"] == section["link"]:
+                strtab_offset = other["offset"]
+                break
+        if strtab_offset is None:
+            return []
+
+        executable_sections = {s["index"] for s in self.sections.values() if s["flags"] & SHF_EXECINSTR}
+        entry_size = 24 if self.is_64 else 16
+        binding_rank = {STB_GLOBAL: 0, STB_WEAK: 1, STB_LOCAL: 2}
+
+        functions = {}
+        for offset in range(section["offset"], section["offset"] + section["size"], entry_size):
+            if self.is_64:
+                name, info, _, shndx, value, size = struct.unpack_from(self.endian + "IBBHQQ", self.data, offset)
+            else:
+                name, value, size, info, _, shndx = struct.unpack_from(self.endian + "IIIBBH", self.data, offset)
+
+            symbol_type = info & 0xf
+            binding = info >> 4
+            if not name or shndx not in executable_sections or binding not in binding_rank:
+                continue
+            if symbol_type != STT_FUNC and not (symbol_type == STT_NOTYPE and binding == STB_GLOBAL):
+                continue
+
+            symbol_name = self._read_cstring(strtab_offset + name)
+            rank = binding_rank[binding]
+            if symbol_name not in functions or rank < functions[symbol_name][0]:
+                functions[symbol_name] = (rank, value, size)
+
+        return sorted(((name, value, size) for name, (_, value, size) in functions.items()), key=lambda f: f[1])
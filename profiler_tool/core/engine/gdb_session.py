@@ -0,0 +1,324 @@
+import collections
+import itertools
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+import time
+from core.engine.disassembly import build_instruction_index
+from core.engine.tracer import find_free_port, wait_for_qemu_ready, stop_process
+from core.engine.trace_limits import limit_options
+from config import GDB_SCRIPT, GDB_SCRIPT_ARM, GDB_SCRIPT_RISCV, GDB_SESSION_POOL_SIZE
+from config import log_info, log_debug, log_error
+
+"""
+Dlouhodobě běžící GDB relace ovládané přes strojové rozhraní (GDB/MI), sdílené mezi sadami parametrů.
+
+Jednorázové spouštění (`run_gdb_trace`, `run_gdb_trace_qemu`) pro každou sadu parametrů znovu
+startuje GDB, načítá trace skript, symboly binárky a index instrukcí. Relace z `GdbSessionPool`
+to udělá jen jednou pro každou binárku a pro další běhy jen:
+    native      nastaví nové argumenty a spustí program znovu, nebo – pro stejné argumenty
+                při trace omezeném na funkci – obnoví `checkpoint` pořízený na vstupu do funkce
+    arm/riscv   spustí nové QEMU (user-mode GDB server restart programu neumí) a připojí se k němu
+
+Příkazy se posílají jako MI příkazy s číselným tokenem. Za každým příkazem následuje značka
+(`-gdb-show confirm` s vlastním tokenem); GDB v synchronním režimu načte další příkaz až po
+dokončení předchozího, takže odpověď na značku znamená, že příkaz doběhl – i u CLI příkazů
+spouštějících program, u kterých MI místo `^done` hlásí jen `^running`.
+"""
+
+_PLATFORMS = {
+    # platforma: (GDB, architektura GDB, trace skript, trace příkaz, QEMU)
+    "native": ("gdb", None, GDB_SCRIPT, "trace-asm", None),
+    "arm": ("gdb-multiarch", "arm", GDB_SCRIPT_ARM, "trace-asm-arm", "qemu-arm"),
+    "riscv": ("gdb-multiarch", "riscv:rv64", GDB_SCRIPT_RISCV, "trace-asm-riscv", "qemu-riscv64"),
+}
+
+_MI_ESCAPES = re.compile(r'\\(.)')
+_CHECKPOINT = re.compile(r"checkpoint (\d+):")
+_ERROR_MESSAGE = re.compile(r'msg="((?:[^"\\]|\\.)*)"')
+
+
+def _mi_quote(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _mi_unquote(text):
+    text = text.strip()
+    if text.startswith('"') and text.endswith('"'):
+        text = text[1:-1]
+    return _MI_ESCAPES.sub(lambda m: "\n" if m.group(1) == "n" else "\t" if m.group(1) == "t" else m.group(1), text)
+
+
+class GdbMiSession:
+    """
+    Jedna GDB relace s načtenou binárkou, trace skriptem a indexem instrukcí.
+    """
+
+    def __init__(self, binary_file, platform="native", timeout=None):
+        if platform not in _PLATFORMS:
+            raise ValueError(f"Neznámá platforma: {platform}")
+        gdb_name, gdb_arch, gdb_script, self.trace_command, qemu_name = _PLATFORMS[platform]
+
+        gdb_executable = shutil.which(gdb_name)
+        if not gdb_executable:
+            raise FileNotFoundError(f"[ERROR] `{gdb_name}` nebyl nalezen. Zkontrolujte instalaci.")
+        self.qemu_executable = shutil.which(qemu_name) if qemu_name else None
+        if qemu_name and not self.qemu_executable:
+            raise FileNotFoundError(f"[ERROR] QEMU pro platformu `{platform}` nebyl nalezen.")
+
+        self.binary_file = os.path.abspath(binary_file)
+        self.platform = platform
+        self.timeout = timeout
+        self.tokens = itertools.count(1)
+        self.lines = queue.Queue()
+        self.arguments = None
+        self.checkpoints = {}
+        self.runs = 0
+
+        self.process = subprocess.Popen([gdb_executable, "--interpreter=mi", "-q", "-nx"], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1)
+        self.reader = threading.Thread(target=self._read_output, daemon=True)
+        self.reader.start()
+
+        started = time.monotonic()
+        self.execute("-gdb-set pagination off")
+        self.execute("-gdb-set confirm off")
+        if gdb_arch:
+            self.console(f"set architecture {gdb_arch}")
+        self.execute(f"-file-exec-and-symbols {_mi_quote(self.binary_file)}")
+        # Výstup laděného programu by se jinak míchal do MI výstupu
+        self.execute("-inferior-tty-set /dev/null")
+        self.console(f"source {gdb_script}")
+        self.index_path = build_instruction_index(self.binary_file, platform)
+        log_debug(f"GDB relace pro `{self.binary_file}` připravena za {time.monotonic() - started:.2f} s")
+
+    def _read_output(self):
+        for line in self.process.stdout:
+            self.lines.put(line.rstrip("\n"))
+        self.lines.put(None)
+
+    def _next_line(self, deadline):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            line = self.lines.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError(f"[ERROR] GDB relace nedokončila příkaz do {self.timeout} s.")
+        if line is None:
+            raise RuntimeError("[ERROR] GDB relace neočekávaně skončila.")
+        return line
+
+    def execute(self, command):
+        """
+        Pošle MI příkaz a počká na jeho dokončení.
+
+        :return: Výstup konzole (`~` záznamy) vypsaný během příkazu.
+        :raises RuntimeError: Pokud GDB příkaz odmítne (`^error`).
+        """
+        token = next(self.tokens)
+        marker = next(self.tokens)
+        self.process.stdin.write(f"{token}{command}\n{marker}-gdb-show confirm\n")
+        self.process.stdin.flush()
+
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        result_prefix = f"{token}^"
+        marker_prefix = f"{marker}^"
+        console = []
+        error = None
+        while True:
+            line = self._next_line(deadline)
+            if line.startswith("~"):
+                console.append(_mi_unquote(line[1:]))
+            elif line.startswith(result_prefix + "error"):
+                message = _ERROR_MESSAGE.search(line)
+                error = _mi_unquote(message.group(1)) if message else line
+            elif line.startswith(marker_prefix):
+                break
+
+        if error is not None:
+            raise RuntimeError(f"[ERROR] GDB příkaz `{command}` selhal: {error}")
+        return "".join(console)
+
+    def console(self, command):
+        """Provede CLI příkaz GDB (přes `-interpreter-exec console`) a vrátí jeho výstup."""
+        return self.execute(f"-interpreter-exec console {_mi_quote(command)}")
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def _trace_command(self, trace_file, function_name, step_mode, budget=None, timeout=None):
+        trace_cmd = f"{self.trace_command} {trace_file}"
+        if function_name:
+            trace_cmd += f" {function_name}"
+        if self.index_path:
+            trace_cmd += f" --index={self.index_path}"
+            if step_mode == "block":
+                trace_cmd += " --blocks"
+        return trace_cmd + limit_options(budget, timeout)
+
+    def _take_checkpoint(self):
+        match = _CHECKPOINT.search(self.console("checkpoint"))
+        return int(match.group(1)) if match else None
+
+    def _at_function_entry(self, function_name):
+        try:
+            output = self.console(f"print $pc == (long) &{function_name}")
+        except RuntimeError:
+            return False
+        return output.strip().endswith("= 1")
+
+    def _restore_checkpoint(self, checkpoint, function_name):
+        """
+        Vrátí program do stavu na vstupu do funkce. Po skončení trasovaného procesu GDB sám
+        přepne na poslední zbývající checkpoint (ten pak už není v seznamu checkpointů),
+        proto `restart` smí selhat, pokud program na vstupu do funkce už stojí.
+        """
+        try:
+            self.console(f"restart {checkpoint}")
+        except RuntimeError as e:
+            log_debug(f"Checkpoint {checkpoint} nelze obnovit: {e}")
+        return self._at_function_entry(function_name)
+
+    def _run_native(self, trace_cmd, args, function_name):
+        key = tuple(args)
+        checkpoint = self.checkpoints.get(key) if function_name else None
+
+        if checkpoint is not None and self._restore_checkpoint(checkpoint, function_name):
+            # Obnovený stav se během trace změní, proto si hned pořídíme jeho kopii
+            self.checkpoints = {key: self._take_checkpoint()}
+            log_debug(f"Obnoven checkpoint {checkpoint} na vstupu do `{function_name}`")
+        else:
+            if self.arguments != key:
+                self.execute(f"-exec-arguments {' '.join(args)}")
+                self.arguments = key
+            # Nový proces ukončí i procesy dřívějších checkpointů
+            self.checkpoints = {}
+            if function_name:
+                self.console(f"tbreak *{function_name}")
+                self.console("run")
+                checkpoint = self._take_checkpoint()
+                if checkpoint is not None:
+                    self.checkpoints[key] = checkpoint
+            else:
+                self.console("starti")
+
+        self.console(trace_cmd)
+
+    def _run_qemu(self, trace_cmd, args, function_name):
+        port = find_free_port()
+        qemu_cmd = [self.qemu_executable, "-g", str(port), self.binary_file, *args]
+        log_info(f"Spouštím QEMU: {' '.join(qemu_cmd)}")
+        qemu_proc = subprocess.Popen(qemu_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_qemu_ready(port, process=qemu_proc):
+                raise RuntimeError("[ERROR] QEMU není připraveno na připojení během timeoutu.")
+            self.execute(f"-target-select remote localhost:{port}")
+            if not function_name:
+                self.console("tbreak main")
+                self.console("continue")
+            self.console(trace_cmd)
+        finally:
+            try:
+                self.execute("-target-disconnect")
+            except (RuntimeError, TimeoutError) as e:
+                log_debug(f"Odpojení od QEMU selhalo: {e}")
+            stop_process(qemu_proc)
+
+    def trace(self, trace_file, args, function_name=None, step_mode="instruction", budget=None, timeout=None):
+        """
+        Provede jeden trace – obdoba `run_gdb_trace` / `run_gdb_trace_qemu` v již běžící relaci.
+
+        :param trace_file: Cesta k výstupnímu trace souboru.
+        :param args: Argumenty programu (stejně jako u `run_gdb_trace`, s uvozovkami pro shell).
+        :param function_name: Pokud je zadáno, krokuje se jen jedno volání této funkce.
+        :param step_mode: 'instruction' nebo 'block'.
+        :param budget: Rozpočet instrukcí jednoho trace (hlídá jej trace skript).
+        :param timeout: Časový limit krokování v sekundách (hlídá jej trace skript; celková doba
+                        příkazu je navíc omezena limitem relace `timeout`).
+        """
+        trace_cmd = self._trace_command(trace_file, function_name, step_mode, budget, timeout)
+        started = time.monotonic()
+        if self.qemu_executable:
+            self._run_qemu(trace_cmd, args, function_name)
+        else:
+            self._run_native(trace_cmd, args, function_name)
+        self.runs += 1
+        log_debug(f"Trace v GDB relaci (běh {self.runs}) trval {time.monotonic() - started:.2f} s")
+
+    def close(self):
+        """Ukončí GDB (i s laděným programem a checkpointy)."""
+        if not self.is_alive():
+            return
+        try:
+            self.process.stdin.write("-gdb-exit\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+class GdbSessionPool:
+    """
+    Pool GDB relací (jedna relace pro každou dvojici binárka–platforma, nejvýše `max_sessions`).
+    Nejdéle nepoužitá relace se při překročení počtu ukončí. Relace se znovu vytvoří, pokud
+    byla binárka mezitím přeložena znovu nebo relace havarovala.
+    """
+
+    def __init__(self, max_sessions=GDB_SESSION_POOL_SIZE, timeout=None):
+        self.max_sessions = max(1, max_sessions)
+        self.timeout = timeout
+        self.sessions = collections.OrderedDict()
+
+    @staticmethod
+    def _key(binary_file, platform):
+        binary_file = os.path.abspath(binary_file)
+        stat = os.stat(binary_file)
+        return binary_file, stat.st_mtime_ns, stat.st_size, platform
+
+    def session(self, binary_file, platform="native"):
+        """Vrátí (a případně vytvoří) relaci pro binárku a platformu."""
+        key = self._key(binary_file, platform)
+        session = self.sessions.get(key)
+        if session is not None and session.is_alive():
+            self.sessions.move_to_end(key)
+            return session
+
+        if session is not None:
+            del self.sessions[key]
+        while len(self.sessions) >= self.max_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            evicted.close()
+
+        log_info(f"Spouštím GDB relaci pro `{binary_file}` ({platform})")
+        session = GdbMiSession(binary_file, platform, self.timeout)
+        self.sessions[key] = session
+        return session
+
+    def trace(self, binary_file, platform, trace_file, args, function_name=None, step_mode="instruction",
+              budget=None, timeout=None):
+        """
+        Provede trace v relaci pro danou binárku. Pokud relace selže, ukončí se (další běh
+        založí novou) a chyba se předá volajícímu.
+        """
+        session = self.session(binary_file, platform)
+        try:
+            session.trace(trace_file, args, function_name, step_mode, budget, timeout)
+        except (RuntimeError, TimeoutError, OSError) as e:
+            log_error(f"Trace v GDB relaci selhal: {e}")
+            self.sessions.pop(self._key(binary_file, platform), None)
+            session.close()
+            raise
+
+    def close(self):
+        while self.sessions:
+            _, session = self.sessions.popitem()
+            session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -2,6 +2,7 @@ import os
 from config import DEFAULT_GENERATED_MAIN, DEFAULT_GENERATED_MAIN_KLEE
 from config import log_debug
 from config import KLEE_SYMBOLIC_SIZE
+from core.engine.batch_trace import BATCH_BEGIN_MARKER, BATCH_END_MARKER, BATCH_MAX_ARGS
 
 # Skript pro generování hlavních souborů (`generated_main.c`, `generated_main_klee.c`, `generated_main_arm.c`)
 # pro různé typy kompilací a analýz (KLEE, ARM bare-metal, x86/ARM).
@@ -281,6 +282,73 @@ def generate_param_code(params, bm=False):
     return code, ", ".join(converted_params)
 
 
+def generate_batch_support():
+    """
+    Generuje pomocný kód dávkového režimu `main` funkce (`--batch <soubor>`).
+
+    Značkovací funkce `profiler_batch_begin` a `profiler_batch_end` se volají před a po každé sadě
+    parametrů, aby šel trace celé dávky rozdělit na trace jednotlivých sad
+    (viz `core.engine.batch_trace`). Jsou `noinline` a obsahují prázdný `asm`, takže je
+    překladač nevynechá ani při optimalizaci.
+
+    Returns:
+    - str: Generovaný kód (definice značek a funkce pro rozdělení řádku na argumenty).
+    """
+    code = f"#define PROFILER_BATCH_MAX_ARGS {BATCH_MAX_ARGS}\n\n"
+    for marker in (BATCH_BEGIN_MARKER, BATCH_END_MARKER):
+        code += f"__attribute__((noinline)) void {marker}(int index) {{\n"
+        code += '    __asm__ volatile ("" : : "r" (index) : "memory");\n'
+        code += "}\n\n"
+    # Argumenty jsou oddělené mezerami, hodnoty s mezerami mohou být v jednoduchých či dvojitých uvozovkách
+    code += "static int profiler_split_args(char *line, char **args, int max_args) {\n"
+    code += "    int count = 0;\n"
+    code += "    char *p = line;\n"
+    code += "    while (count < max_args) {\n"
+    code += "        while (*p == ' ' || *p == '\\t' || *p == '\\r' || *p == '\\n') ++p;\n"
+    code += "        if (!*p) break;\n"
+    code += "        char quote = (*p == '\\'' || *p == '\"') ? *p++ : 0;\n"
+    code += "        args[count++] = p;\n"
+    code += "        while (*p && (quote ? *p != quote : !(*p == ' ' || *p == '\\t' || *p == '\\r' || *p == '\\n'))) ++p;\n"
+    code += "        if (*p) *p++ = '\\0';\n"
+    code += "    }\n"
+    code += "    return count;\n"
+    code += "}\n\n"
+    return code
+
+
+def _indent(code, indent):
+    return "".join(indent + line for line in code.splitlines(keepends=True))
+
+
+def generate_call_code(target_function, params, has_void, batch=False):
+    """
+    Generuje kód jednoho volání cílové funkce s parametry z `argc`/`argv`.
+
+    Args:
+    - target_function (str): Název testované funkce.
+    - params (list): Seznam parametrů funkce.
+    - has_void (bool): Funkce nemá žádné parametry.
+    - batch (bool): Kód pro jednu sadu dávky – při chybějících argumentech se sada jen přeskočí
+      místo ukončení programu.
+
+    Returns:
+    - str: Generovaný kód (kontrola počtu argumentů, převod parametrů a volání funkce) bez odsazení.
+    """
+    param_code, args = generate_param_code(params, bm=False)
+    # Kód převodu parametrů je odsazený pro tělo `main`, odsazení doplní volající
+    body = "".join(line[4:] if line.startswith("    ") else line for line in param_code.splitlines(keepends=True))
+    body += f'printf("Spouštím test funkce: {target_function}\\n");\n'
+    body += f"{target_function}({args});\n"
+    if has_void:
+        return body
+
+    check = f"if (argc < {len(params) + 1}) {{\n"
+    check += f'    printf("Použití: %s {" ".join(["<param>" for _ in params])}\\n", argv[0]);\n'
+    if batch:
+        return check + "} else {\n" + _indent(body, "    ") + "}\n"
+    return check + "    return 1;\n}\n" + body
+
+
 def generate_main(target_function, params, header_file):
     """
     Vytvoří `generated_main.c` pro volání vybrané funkce s argumenty z příkazové řádky.
@@ -288,6 +356,12 @@ def generate_main(target_function, params, header_file):
     Tento soubor obsahuje funkci `main`, která přijímá argumenty z příkazové řádky,
     konvertuje je do odpovídajících typů a volá cílovou funkci s těmito parametry.
 
+    Při spuštění `<binárka> --batch <soubor>` (nebo `--batch -` pro standardní vstup) načte
+    `main` sady parametrů po řádcích a zavolá cílovou funkci pro každou z nich. Volání jsou
+    oddělena značkami `profiler_batch_begin`/`profiler_batch_end`, takže celou dávku zachytí
+    jediný trace (viz `core.engine.batch_trace`). Cílová funkce se v obou režimech volá přímo
+    z `main`, analýza tedy pro každou sadu počítá totéž co při samostatném spuštění.
+
     Args:
     - target_function (str): Název testované funkce.
     - params (list): Seznam parametrů funkce.
@@ -303,19 +377,36 @@ def generate_main(target_function, params, header_file):
 
     with open(generated_main_path, "w") as f:
         f.write(generate_main_header_includes(header_filename, bm=False))
+        f.write(generate_batch_support())
         f.write("int main(int argc, char *argv[]) {\n")
-        if not has_void:
-            f.write(f"    if (argc < {len(params) + 1}) {{\n")
-            f.write(f'        printf("Použití: %s {" ".join(["<param>" for _ in params])}\\n", argv[0]);\n')
-            f.write("        return 1;\n    }\n")
-        code, args = generate_param_code(params, bm=False)
-        f.write(code)
-        f.write(f'    printf("Spouštím test funkce: {target_function}\\n");\n')
-        f.write(f"    {target_function}({args});\n")
+        f.write('    if (argc > 1 && strcmp(argv[1], "--batch") == 0) {\n')
+        f.write('        FILE *input = (argc > 2 && strcmp(argv[2], "-") != 0) ? fopen(argv[2], "r") : stdin;\n')
+        f.write("        if (!input) {\n")
+        f.write("            perror(argv[2]);\n")
+        f.write("            return 1;\n        }\n")
+        f.write("        char *line = NULL;\n")
+        f.write("        size_t line_size = 0;\n")
+        f.write("        int index = 0;\n")
+        f.write("        while (getline(&line, &line_size, input) != -1) {\n")
+        f.write("            char *batch_argv[PROFILER_BATCH_MAX_ARGS + 1];\n")
+        f.write("            batch_argv[0] = argv[0];\n")
+        f.write("            int batch_argc = 1 + profiler_split_args(line, batch_argv + 1, PROFILER_BATCH_MAX_ARGS);\n")
+        f.write(f"            {BATCH_BEGIN_MARKER}(index);\n")
+        # Vnořený blok zastíní `argc`/`argv`, kód převodu parametrů je tak stejný jako u jednoho spuštění
+        f.write("            {\n")
+        f.write("                int argc = batch_argc;\n")
+        f.write("                char **argv = batch_argv;\n")
+        f.write(_indent(generate_call_code(target_function, params, has_void, batch=True), " " * 16))
+        f.write("            }\n")
+        f.write(f"            {BATCH_END_MARKER}(index);\n")
+        f.write("            ++index;\n        }\n")
+        f.write("        free(line);\n")
+        f.write("        if (input != stdin) fclose(input);\n")
+        f.write("        return 0;\n    }\n\n")
+        f.write(_indent(generate_call_code(target_function, params, has_void), "    "))
         f.write("    return 0;\n}\n")
 
 
-
 def generate_main_bm(target_function, params, header_file):
     """
     Vytvoří `generated_main.c` pro volání vybrané funkce v bare-metal režimu.
@@ -0,0 +1,136 @@
+import json
+import os
+import statistics
+
+"""
+Přecházení volání knihovních funkcí při nativním krokování (`--step-over-library`).
+
+Nativní trace jinak krokuje i každé volání `printf`, `malloc` a jejich PLT stubů, přestože
+uživatele zajímá jen kód vlastní funkce. Tracer (GDB skript `gdb_trace.py` nebo `ptrace_tracer`)
+proto volání funkce přes PLT nebo funkce odpovídající `function_blacklist_patterns`
+(`config/trace_config.json`) přejde plnou rychlostí (obdoba `nexti`) a za instrukci volání zapíše
+řádek `[LIBRARY] <funkce> <počet>` s odhadem počtu jejích instrukcí.
+
+Odhad pochází z tabulky cen knihovních funkcí uložené vedle binárky (`.symcache`). Prvních
+`samples` volání každé funkce, která v tabulce ještě nemá dost měření, se krokuje bez zápisu
+do trace a spočítají se jeho instrukce; další volání (i v dalších bězích) dostanou medián
+naměřených hodnot (první volání funkce v procesu zahrnuje i navázání symbolu dynamickým linkerem
+a inicializaci knihovny, průměr by jím byl zkreslený). Analýza odhad připíše řádku volání a zároveň jej vykáže zvlášť jako
+knihovní část (`"library"` ve výstupním JSON).
+
+Modul nemá žádné závislosti mimo standardní knihovnu, aby jej mohly importovat i GDB skripty.
+"""
+
+PLT_SUFFIX = "@plt"
+LIBRARY_COSTS_VERSION = 2
+DEFAULT_COST_SAMPLES = 3
+
+# Knihovní funkce, přes které program teprve vstupuje do vlastního kódu
+ENTRY_FUNCTIONS = ("__libc_start_main", "__libc_start_call_main")
+
+
+def library_call_target(asm, is_blacklisted):
+    """
+    Vrátí jméno funkce volané instrukcí `asm`, pokud se volání má přejít, jinak None.
+
+    Přecházejí se jen přímá volání (`call 0x1070 <printf@plt>`). Funkce, které volají zpět
+    do programu (`__libc_start_main` volá `main`), se krokují vždy; instrukce zpětných volání
+    z jiných knihovních funkcí (komparátor `qsort`) se započtou do ceny knihovní funkce.
+
+    :param asm: Text instrukce volání.
+    :param is_blacklisted: Funkce `(jméno) -> bool` podle `function_blacklist_patterns`.
+    """
+    parts = asm.split()
+    if len(parts) != 3 or not parts[0].startswith("call") or not parts[1].startswith("0x") or not parts[2].startswith("<"):
+        return None
+    name = parts[2].strip("<>")
+    if "+" in name or name.split("@")[0] in ENTRY_FUNCTIONS:
+        return None
+    if name.endswith(PLT_SUFFIX) or is_blacklisted(name):
+        return name
+    return None
+
+
+def find_library_calls(instructions, is_blacklisted):
+    """
+    Najde ve statické disassemblaci binárky přímá volání, která se mají přejít.
+
+    :param instructions: Statická adresa → instrukce (`core.engine.disassembly.load_disassembly`).
+    :return: Slovník statická adresa instrukce volání → (jméno volané funkce, návratová adresa).
+    """
+    calls = {}
+    for pc, instruction in instructions.items():
+        name = library_call_target(instruction.asm, is_blacklisted)
+        if name:
+            calls[pc] = (name, pc + instruction.length)
+    return calls
+
+
+class LibraryCostTable:
+    """
+    Naměřené počty instrukcí volání knihovních funkcí (`{"funkce": [počet instrukcí jednotlivých volání]}`).
+    """
+
+    def __init__(self, path, samples=DEFAULT_COST_SAMPLES):
+        self.path = path
+        self.samples = samples
+        self.functions = {}
+        self.changed = False
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == LIBRARY_COSTS_VERSION:
+                    self.functions = data.get("functions", {})
+            except (OSError, ValueError):
+                self.functions = {}
+
+    def needs_measurement(self, function_name):
+        """Zjistí, zda má tabulka pro funkci méně než `samples` měření (volání se pak krokuje)."""
+        return len(self.functions.get(function_name, ())) < self.samples
+
+    def add_measurement(self, function_name, instructions):
+        self.functions.setdefault(function_name, []).append(instructions)
+        self.changed = True
+
+    def estimate(self, function_name):
+        """Vrátí medián naměřených počtů instrukcí volání funkce (0, pokud nebyla změřena)."""
+        measurements = self.functions.get(function_name)
+        if not measurements:
+            return 0
+        return round(statistics.median(measurements))
+
+    def save(self):
+        if not self.path or not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": LIBRARY_COSTS_VERSION, "functions": self.functions}, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+def parse_library_option(argv):
+    """
+    Odebere z argumentů příkazu volby `--step-over=<tabulka cen>` a `--cost-samples=<volání>`
+    a vrátí `(zbylé argumenty, cesta nebo None, počet měřených volání každé funkce)`.
+    """
+    path = None
+    samples = DEFAULT_COST_SAMPLES
+    rest = []
+    for arg in argv:
+        if arg.startswith("--step-over="):
+            path = arg[len("--step-over="):]
+        elif arg.startswith("--cost-samples="):
+            samples = int(arg[len("--cost-samples="):])
+        else:
+            rest.append(arg)
+    return rest, path, samples
+
+
+def library_options(path, samples=DEFAULT_COST_SAMPLES):
+    """
+    Sestaví volby trace příkazu GDB skriptu pro přecházení knihovních volání (viz `parse_library_option`).
+    """
+    return f" --step-over={path} --cost-samples={int(samples)}"
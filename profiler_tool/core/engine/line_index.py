@@ -0,0 +1,558 @@
+import bisect
+import os
+import struct
+from core.engine.elf_reader import ElfFile
+from config import log_debug, log_warning
+
+"""
+Index adres → řádek zdrojového kódu sestavený přímo z DWARF sekce `.debug_line`.
+
+Nahrazuje volání `addr2line` pro každou instrukci zvlášť. Line-table programy všech
+kompilačních jednotek se jednou projdou stavovým automatem podle specifikace DWARF (verze 2–5),
+výsledné řádky se převedou na seřazené nepřekrývající se rozsahy adres a dotaz
+se pak vyřeší binárním vyhledáváním. Formát výsledku odpovídá výstupu `addr2line`
+(`/cesta/soubor.c:řádek`, případně s příponou ` (discriminator N)`).
+"""
+
+# Standardní opkódy line programu
+DW_LNS_copy = 1
+DW_LNS_advance_pc = 2
+DW_LNS_advance_line = 3
+DW_LNS_set_file = 4
+DW_LNS_const_add_pc = 8
+DW_LNS_fixed_advance_pc = 9
+
+# Rozšířené opkódy line programu
+DW_LNE_end_sequence = 1
+DW_LNE_set_address = 2
+DW_LNE_define_file = 3
+DW_LNE_set_discriminator = 4
+
+# Typy obsahu v tabulkách adresářů a souborů (DWARF 5)
+DW_LNCT_path = 1
+DW_LNCT_directory_index = 2
+
+# Atributy potřebné z `.debug_info`
+DW_AT_stmt_list = 0x10
+DW_AT_comp_dir = 0x1b
+
+# Formy atributů
+DW_FORM_addr = 0x01
+DW_FORM_block2 = 0x03
+DW_FORM_block4 = 0x04
+DW_FORM_data2 = 0x05
+DW_FORM_data4 = 0x06
+DW_FORM_data8 = 0x07
+DW_FORM_string = 0x08
+DW_FORM_block = 0x09
+DW_FORM_block1 = 0x0a
+DW_FORM_data1 = 0x0b
+DW_FORM_flag = 0x0c
+DW_FORM_sdata = 0x0d
+DW_FORM_strp = 0x0e
+DW_FORM_udata = 0x0f
+DW_FORM_ref_addr = 0x10
+DW_FORM_ref1 = 0x11
+DW_FORM_ref2 = 0x12
+DW_FORM_ref4 = 0x13
+DW_FORM_ref8 = 0x14
+DW_FORM_ref_udata = 0x15
+DW_FORM_indirect = 0x16
+DW_FORM_sec_offset = 0x17
+DW_FORM_exprloc = 0x18
+DW_FORM_flag_present = 0x19
+DW_FORM_data16 = 0x1e
+DW_FORM_line_strp = 0x1f
+DW_FORM_ref_sig8 = 0x20
+DW_FORM_implicit_const = 0x21
+
+# Formy s pevnou velikostí, které nás nezajímají a jen se přeskočí
+_FIXED_FORM_SIZES = {
+    DW_FORM_data1: 1, DW_FORM_ref1: 1, DW_FORM_flag: 1,
+    DW_FORM_data2: 2, DW_FORM_ref2: 2,
+    DW_FORM_data4: 4, DW_FORM_ref4: 4, 0x1c: 4,             # ref_sup4
+    DW_FORM_data8: 8, DW_FORM_ref8: 8, DW_FORM_ref_sig8: 8, 0x24: 8,  # ref_sup8
+    DW_FORM_data16: 16,
+    DW_FORM_flag_present: 0, DW_FORM_implicit_const: 0,
+    0x25: 1, 0x26: 2, 0x27: 3, 0x28: 4,                     # strx1-4
+    0x29: 1, 0x2a: 2, 0x2b: 3, 0x2c: 4,                     # addrx1-4
+}
+# Formy kódované jako ULEB128
+_ULEB_FORMS = {DW_FORM_udata, DW_FORM_ref_udata, 0x1a, 0x1b, 0x22, 0x23, 0x1f01, 0x1f02}
+# Formy s velikostí offsetu (4 nebo 8 bajtů dle 32/64bit DWARF)
+_OFFSET_FORMS = {DW_FORM_strp, DW_FORM_sec_offset, DW_FORM_line_strp, 0x1d, 0x1f20, 0x1f21}
+
+
+def _read_uleb(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def _read_sleb(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            if byte & 0x40:
+                result -= 1 << shift
+            return result, offset
+
+
+def _read_cstring(data, offset):
+    end = data.find(b"\0", offset)
+    return data[offset:end].decode("utf-8", errors="replace"), end + 1
+
+
+def _read_cstring_at(data, offset):
+    if data is None or offset >= len(data):
+        return None
+    return _read_cstring(data, offset)[0]
+
+
+class _DwarfReader:
+    """
+    Pomocník pro čtení hodnot z ladicích sekcí jednoho ELF souboru.
+    """
+
+    def __init__(self, elf):
+        self.endian = elf.endian
+        self.address_size = elf.address_size
+        self.debug_str = elf.section_data(".debug_str")
+        self.debug_line_str = elf.section_data(".debug_line_str")
+
+    def read_unsigned(self, data, offset, size):
+        if size == 1:
+            return data[offset], offset + 1
+        fmt = {2: "H", 4: "I", 8: "Q"}.get(size)
+        if fmt is None:
+            return int.from_bytes(data[offset:offset + size], "little" if self.endian == "<" else "big"), offset + size
+        return struct.unpack_from(self.endian + fmt, data, offset)[0], offset + size
+
+    def read_initial_length(self, data, offset):
+        length, offset = self.read_unsigned(data, offset, 4)
+        if length == 0xffffffff:
+            length, offset = self.read_unsigned(data, offset, 8)
+            return length, 8, offset
+        return length, 4, offset
+
+    def read_form(self, data, offset, form, offset_size, address_size, version=4, implicit=None):
+        """
+        Přečte hodnotu atributu ve formě `form`. Řetězce vrací jako `str`,
+        čísla jako `int`, ostatní hodnoty (bloky) jako None.
+        """
+        if form == DW_FORM_string:
+            return _read_cstring(data, offset)
+        if form == DW_FORM_strp:
+            value, offset = self.read_unsigned(data, offset, offset_size)
+            return _read_cstring_at(self.debug_str, value), offset
+        if form == DW_FORM_line_strp:
+            value, offset = self.read_unsigned(data, offset, offset_size)
+            return _read_cstring_at(self.debug_line_str, value), offset
+        if form in (DW_FORM_data1, DW_FORM_data2, DW_FORM_data4, DW_FORM_data8):
+            size = {DW_FORM_data1: 1, DW_FORM_data2: 2, DW_FORM_data4: 4, DW_FORM_data8: 8}[form]
+            return self.read_unsigned(data, offset, size)
+        if form in _OFFSET_FORMS:
+            return self.read_unsigned(data, offset, offset_size)
+        if form in _ULEB_FORMS:
+            return _read_uleb(data, offset)
+        if form == DW_FORM_sdata:
+            return _read_sleb(data, offset)
+        if form == DW_FORM_addr:
+            return self.read_unsigned(data, offset, address_size)
+        if form == DW_FORM_ref_addr:
+            return self.read_unsigned(data, offset, address_size if version <= 2 else offset_size)
+        if form == DW_FORM_implicit_const:
+            return implicit, offset
+        if form in _FIXED_FORM_SIZES:
+            return None, offset + _FIXED_FORM_SIZES[form]
+        if form in (DW_FORM_block, DW_FORM_exprloc):
+            size, offset = _read_uleb(data, offset)
+            return None, offset + size
+        if form == DW_FORM_block1:
+            return None, offset + 1 + data[offset]
+        if form == DW_FORM_block2:
+            size, offset = self.read_unsigned(data, offset, 2)
+            return None, offset + size
+        if form == DW_FORM_block4:
+            size, offset = self.read_unsigned(data, offset, 4)
+            return None, offset + size
+        if form == DW_FORM_indirect:
+            real_form, offset = _read_uleb(data, offset)
+            return self.read_form(data, offset, real_form, offset_size, address_size, version, implicit)
+        raise ValueError(f"Nepodporovaná DWARF forma {hex(form)}")
+
+
+def _find_abbrev(debug_abbrev, offset, code):
+    """
+    Najde v tabulce zkratek (`.debug_abbrev`) od `offset` záznam s kódem `code`
+    a vrátí seznam jeho atributů `(atribut, forma, implicitní hodnota)`.
+    """
+    while offset < len(debug_abbrev):
+        entry_code, offset = _read_uleb(debug_abbrev, offset)
+        if entry_code == 0:
+            return None
+        _, offset = _read_uleb(debug_abbrev, offset)  # tag
+        offset += 1  # children
+        attributes = []
+        while True:
+            name, offset = _read_uleb(debug_abbrev, offset)
+            form, offset = _read_uleb(debug_abbrev, offset)
+            implicit = None
+            if form == DW_FORM_implicit_const:
+                implicit, offset = _read_sleb(debug_abbrev, offset)
+            if name == 0 and form == 0:
+                break
+            attributes.append((name, form, implicit))
+        if entry_code == code:
+            return attributes
+    return None
+
+
+def _read_comp_dirs(elf, reader):
+    """
+    Projde kořenové DIE všech kompilačních jednotek v `.debug_info` a vrátí mapu
+    offset line programu (DW_AT_stmt_list) → kompilační adresář (DW_AT_comp_dir).
+
+    Potřebné pro DWARF < 5, kde adresář s indexem 0 v line tabulce není uveden.
+    """
+    debug_info = elf.section_data(".debug_info")
+    debug_abbrev = elf.section_data(".debug_abbrev")
+    comp_dirs = {}
+    if not debug_info or not debug_abbrev:
+        return comp_dirs
+
+    offset = 0
+    while offset < len(debug_info):
+        unit_start = offset
+        try:
+            unit_length, offset_size, offset = reader.read_initial_length(debug_info, offset)
+            unit_end = offset + unit_length
+            version, offset = reader.read_unsigned(debug_info, offset, 2)
+
+            if version >= 5:
+                unit_type = debug_info[offset]
+                address_size = debug_info[offset + 1]
+                abbrev_offset, offset = reader.read_unsigned(debug_info, offset + 2, offset_size)
+                if unit_type in (4, 5):          # skeleton, split_compile
+                    offset += 8
+                elif unit_type in (2, 6):        # type, split_type
+                    offset += 8 + offset_size
+            else:
+                abbrev_offset, offset = reader.read_unsigned(debug_info, offset, offset_size)
+                address_size = debug_info[offset]
+                offset += 1
+
+            code, offset = _read_uleb(debug_info, offset)
+            attributes = _find_abbrev(debug_abbrev, abbrev_offset, code) if code else None
+
+            stmt_list = None
+            comp_dir = None
+            for name, form, implicit in attributes or []:
+                value, offset = reader.read_form(debug_info, offset, form, offset_size, address_size, version, implicit)
+                if name == DW_AT_stmt_list:
+                    stmt_list = value
+                elif name == DW_AT_comp_dir and isinstance(value, str):
+                    comp_dir = value
+
+            if stmt_list is not None and comp_dir:
+                comp_dirs[stmt_list] = comp_dir
+        except (ValueError, IndexError, struct.error) as e:
+            log_debug(f"Kompilační jednotku na offsetu {hex(unit_start)} nelze přečíst: {e}")
+            break
+
+        offset = unit_end
+
+    return comp_dirs
+
+
+def _join_path(comp_dir, directory, file_name):
+    """
+    Sestaví cestu ke zdrojovému souboru stejně jako `addr2line` (BFD).
+    """
+    if os.path.isabs(file_name):
+        return file_name
+    base = None
+    if not directory or not os.path.isabs(directory):
+        base = comp_dir
+    if not base:
+        base, directory = directory, None
+    if not base:
+        return file_name
+    if directory:
+        return f"{base}/{directory}/{file_name}"
+    return f"{base}/{file_name}"
+
+
+def _read_entry_table(reader, data, offset, offset_size, address_size):
+    """
+    Přečte tabulku adresářů nebo souborů ve formátu DWARF 5.
+    Vrací seznam dvojic `(cesta, index adresáře)`.
+    """
+    format_count = data[offset]
+    offset += 1
+    entry_format = []
+    for _ in range(format_count):
+        content_type, offset = _read_uleb(data, offset)
+        form, offset = _read_uleb(data, offset)
+        entry_format.append((content_type, form))
+
+    count, offset = _read_uleb(data, offset)
+    entries = []
+    for _ in range(count):
+        path = ""
+        directory_index = 0
+        for content_type, form in entry_format:
+            value, offset = reader.read_form(data, offset, form, offset_size, address_size, 5)
+            if content_type == DW_LNCT_path and isinstance(value, str):
+                path = value
+            elif content_type == DW_LNCT_directory_index and isinstance(value, int):
+                directory_index = value
+        entries.append((path, directory_index))
+    return entries, offset
+
+
+def _parse_line_program(reader, data, offset, comp_dir, rows):
+    """
+    Zpracuje jeden line program začínající na `offset` a přidá jeho řádky do `rows`
+    jako n-tice `(adresa, konec sekvence, soubor, řádek, discriminator)`.
+
+    Vrací offset následujícího line programu.
+    """
+    unit_length, offset_size, offset = reader.read_initial_length(data, offset)
+    unit_end = offset + unit_length
+    version, offset = reader.read_unsigned(data, offset, 2)
+
+    address_size = reader.address_size
+    if version >= 5:
+        address_size = data[offset]
+        offset += 2  # address_size, segment_selector_size
+
+    header_length, offset = reader.read_unsigned(data, offset, offset_size)
+    program_start = offset + header_length
+
+    min_inst_length = data[offset]
+    offset += 1
+    if version >= 4:
+        offset += 1  # maximum_operations_per_instruction (VLIW), ignorujeme
+    default_is_stmt = data[offset]
+    line_base = struct.unpack_from("b", data, offset + 1)[0]
+    line_range = data[offset + 2]
+    opcode_base = data[offset + 3]
+    offset += 4
+    standard_opcode_lengths = list(data[offset:offset + opcode_base - 1])
+    offset += opcode_base - 1
+
+    if version >= 5:
+        directory_entries, offset = _read_entry_table(reader, data, offset, offset_size, address_size)
+        file_entries, offset = _read_entry_table(reader, data, offset, offset_size, address_size)
+        directories = [path for path, _ in directory_entries]
+        if not comp_dir and directories:
+            comp_dir = directories[0]
+        files = []
+        for name, directory_index in file_entries:
+            directory = directories[directory_index] if directory_index < len(directories) else None
+            files.append(_join_path(comp_dir, directory, name))
+    else:
+        directories = []
+        while data[offset] != 0:
+            directory, offset = _read_cstring(data, offset)
+            directories.append(directory)
+        offset += 1
+
+        # Soubory se v DWARF < 5 číslují od 1
+        files = [None]
+        while data[offset] != 0:
+            name, offset = _read_cstring(data, offset)
+            directory_index, offset = _read_uleb(data, offset)
+            _, offset = _read_uleb(data, offset)  # mtime
+            _, offset = _read_uleb(data, offset)  # length
+            directory = directories[directory_index - 1] if 0 < directory_index <= len(directories) else None
+            files.append(_join_path(comp_dir, directory, name))
+
+    def file_path(index):
+        if 0 <= index < len(files) and files[index] is not None:
+            return files[index]
+        return "??"
+
+    offset = program_start
+    address = 0
+    file_index = 1
+    line = 1
+    discriminator = 0
+
+    while offset < unit_end:
+        opcode = data[offset]
+        offset += 1
+
+        if opcode >= opcode_base:
+            adjusted = opcode - opcode_base
+            address += (adjusted // line_range) * min_inst_length
+            line += line_base + adjusted % line_range
+            rows.append((address, False, file_path(file_index), line, discriminator))
+            discriminator = 0
+        elif opcode == 0:
+            length, offset = _read_uleb(data, offset)
+            extended_end = offset + length
+            sub_opcode = data[offset] if length else 0
+            if sub_opcode == DW_LNE_end_sequence:
+                rows.append((address, True, None, 0, 0))
+                address = 0
+                file_index = 1
+                line = 1
+                discriminator = 0
+            elif sub_opcode == DW_LNE_set_address:
+                address, _ = reader.read_unsigned(data, offset + 1, length - 1)
+            elif sub_opcode == DW_LNE_define_file:
+                name, next_offset = _read_cstring(data, offset + 1)
+                directory_index, _ = _read_uleb(data, next_offset)
+                directory = directories[directory_index - 1] if 0 < directory_index <= len(directories) else None
+                files.append(_join_path(comp_dir, directory, name))
+            elif sub_opcode == DW_LNE_set_discriminator:
+                discriminator, _ = _read_uleb(data, offset + 1)
+            offset = extended_end
+        elif opcode == DW_LNS_copy:
+            rows.append((address, False, file_path(file_index), line, discriminator))
+            discriminator = 0
+        elif opcode == DW_LNS_advance_pc:
+            value, offset = _read_uleb(data, offset)
+            address += value * min_inst_length
+        elif opcode == DW_LNS_advance_line:
+            value, offset = _read_sleb(data, offset)
+            line += value
+        elif opcode == DW_LNS_set_file:
+            file_index, offset = _read_uleb(data, offset)
+        elif opcode == DW_LNS_const_add_pc:
+            address += ((255 - opcode_base) // line_range) * min_inst_length
+        elif opcode == DW_LNS_fixed_advance_pc:
+            value, offset = reader.read_unsigned(data, offset, 2)
+            address += value
+        else:
+            # Ostatní opkódy (sloupec, is_stmt, ...) mapování adresa → řádek neovlivňují, přeskočíme jejich argumenty
+            for _ in range(standard_opcode_lengths[opcode - 1]):
+                _, offset = _read_uleb(data, offset)
+
+    return unit_end
+
+
+def _format_line(file_name, line, discriminator):
+    """
+    Zformátuje záznam stejně jako `addr2line`.
+    """
+    text = f"{file_name}:{line if line else '?'}"
+    if discriminator:
+        text += f" (discriminator {discriminator})"
+    return text
+
+
+class LineIndex:
+    """
+    Seřazené rozsahy adres `[start, end)` s odpovídajícími řádky zdrojového kódu.
+    """
+
+    def __init__(self, starts, ends, lines):
+        self.starts = starts
+        self.ends = ends
+        self.lines = lines
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Vytvoří index z řádků line programů (viz `_parse_line_program`).
+
+        V rámci jedné sekvence platí řádek od své adresy do adresy následujícího řádku.
+        Pro více řádků se stejnou adresou platí poslední z nich (stejně jako v BFD).
+        """
+        ranges = []
+        sequence = []
+        for row in rows:
+            address, end_sequence = row[0], row[1]
+            if end_sequence:
+                for i, (start, text) in enumerate(sequence):
+                    end = sequence[i + 1][0] if i + 1 < len(sequence) else address
+                    if end > start:
+                        ranges.append((start, end, text))
+                sequence = []
+                continue
+
+            text = _format_line(row[2], row[3], row[4])
+            if sequence and sequence[-1][0] == address:
+                sequence[-1] = (address, text)
+            else:
+                sequence.append((address, text))
+
+        ranges.sort(key=lambda r: r[0])
+        return cls([r[0] for r in ranges], [r[1] for r in ranges], [r[2] for r in ranges])
+
+    def to_dict(self):
+        """
+        Převede index do podoby vhodné pro uložení do JSON (viz `core.engine.symbol_cache`).
+        Názvy souborů se ukládají jen jednou a řádky na ně odkazují indexem.
+        """
+        files = {}
+        lines = []
+        for text in self.lines:
+            file_name = text.split(" (discriminator")[0].rpartition(":")[0]
+            file_id = files.setdefault(file_name, len(files))
+            lines.append([file_id, text[len(file_name) + 1:]])
+        return {"starts": self.starts, "ends": self.ends, "files": list(files), "lines": lines}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Obnoví index uložený pomocí `to_dict`.
+        """
+        files = data["files"]
+        lines = [f"{files[file_id]}:{rest}" for file_id, rest in data["lines"]]
+        return cls(data["starts"], data["ends"], lines)
+
+    def lookup(self, addr):
+        """
+        Vrátí řádek zdrojového kódu pro statickou adresu `addr`, nebo None.
+        """
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.ends[i]:
+            return self.lines[i]
+        return None
+
+
+def build_line_index(binary_path):
+    """
+    Sestaví `LineIndex` z DWARF informací binárního souboru.
+
+    :param binary_path: Cesta k binárnímu souboru.
+    :return: Index adres na řádky; prázdný, pokud binárka nemá `.debug_line`.
+    """
+    elf = ElfFile(binary_path)
+    data = elf.section_data(".debug_line")
+    if not data:
+        log_warning(f"Binárka `{binary_path}` neobsahuje sekci .debug_line (chybí -g?).")
+        return LineIndex([], [], [])
+
+    reader = _DwarfReader(elf)
+    comp_dirs = _read_comp_dirs(elf, reader)
+
+    rows = []
+    offset = 0
+    while offset < len(data):
+        program_offset = offset
+        try:
+            offset = _parse_line_program(reader, data, offset, comp_dirs.get(program_offset), rows)
+        except (ValueError, IndexError, struct.error) as e:
+            log_warning(f"Chyba při čtení line programu na offsetu {hex(program_offset)}: {e}")
+            break
+
+    index = LineIndex.from_rows(rows)
+    log_debug(f"Line index pro `{binary_path}`: {len(index.starts)} rozsahů adres")
+    return index
+
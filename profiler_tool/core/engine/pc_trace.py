@@ -0,0 +1,268 @@
+import array
+import bisect
+import json
+import os
+import re
+from core.engine.disassembly import load_disassembly, CLASS_CALL
+from core.engine.elf_reader import ElfFile, ET_DYN, SHF_EXECINSTR
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.trace_format import open_trace_writer
+from core.engine.trace_limits import LIMIT_BUDGET
+from config import TRACE_CONFIG
+from config import log_info, log_debug, log_warning
+
+"""
+Převod posloupnosti vykonaných adres (PC) na trace ve formátu GDB skriptů.
+
+Backendy, které zaznamenávají jen adresy vykonaných instrukcí (QEMU exec log, TCG plugin),
+nemusí během běhu nic disassemblovat ani zjišťovat jména funkcí – text instrukcí a jména
+funkcí se doplní až zde ze statické disassemblace binárky. Výsledný soubor má stejný formát
+jako výstup `trace-asm*` příkazů (`funkce, 0xadresa: instrukce` a `[CALL] a -> <b>`),
+takže jej `parse_trace` zpracuje beze změny.
+"""
+
+# Řádek `-d exec` logu QEMU: "Trace 0: 0x7f... [00000000/0000000000010468/00000000/ff200000] recurse"
+_QEMU_EXEC_LINE = re.compile(r"^Trace \d+: (?:0x)?[0-9a-f]+ \[[0-9a-f]+/([0-9a-f]+)/")
+# Řádek výstupu pluginu execlog: "0, 0x10468, 0xe92d4800, "push {fp, lr}""
+_QEMU_PLUGIN_LINE = re.compile(r"^\d+, 0x([0-9a-f]+), ")
+
+
+def read_qemu_exec_log(log_path):
+    """
+    Postupně vrací adresy vykonaných instrukcí z logu QEMU.
+
+    Podporuje výstup `-one-insn-per-tb -d exec,nochain` (jeden překladový blok = jedna instrukce)
+    i výstup TCG pluginu `execlog`.
+
+    :param log_path: Cesta k logu QEMU.
+    :return: Generátor adres (int).
+    """
+    with open(log_path, "r", errors="replace") as f:
+        for line in f:
+            match = _QEMU_EXEC_LINE.match(line) or _QEMU_PLUGIN_LINE.match(line)
+            if match:
+                yield int(match.group(1), 16)
+
+
+def read_qemu_load_bias(log_path, binary_file):
+    """
+    Zjistí posun, na který QEMU zavedlo position-independent binárku (PIE).
+
+    Využívá řádek `start_code` z výpisu `-d page`. U binárek typu ET_EXEC vrací vždy 0.
+
+    :param log_path: Cesta k logu QEMU.
+    :param binary_file: Cesta k binárnímu souboru.
+    :return: Posun (int), který je potřeba odečíst od vykonaných adres.
+    """
+    elf = ElfFile(binary_file)
+    if elf.type != ET_DYN:
+        return 0
+
+    code_addresses = [s["addr"] for s in elf.sections.values() if s["flags"] & SHF_EXECINSTR]
+    if not code_addresses:
+        return 0
+
+    with open(log_path, "r", errors="replace") as f:
+        for line in f:
+            if line.startswith("start_code"):
+                start_code = int(line.split()[1], 16)
+                return (start_code & ~0xfff) - (min(code_addresses) & ~0xfff)
+            if _QEMU_EXEC_LINE.match(line) or _QEMU_PLUGIN_LINE.match(line):
+                break
+
+    log_warning(f"V logu `{log_path}` chybí `start_code`, adresy PIE binárky nebudou posunuty.")
+    return 0
+
+
+def read_pc_history(history_file):
+    """
+    Načte historii vykonaných adres zapsanou záznamem běhu v GDB (`core/gdb/trace_record.py`).
+
+    :param history_file: Cesta k souboru historie (pole 64bitových adres).
+    :return: Dvojice (adresy jako `array('Q')`, metadata ze souboru `<history_file>.json`).
+    """
+    with open(f"{history_file}.json", "r") as f:
+        metadata = json.load(f)
+    pcs = array.array("Q")
+    with open(history_file, "rb") as f:
+        pcs.frombytes(f.read())
+    return pcs, metadata
+
+
+def load_blacklist_regexes():
+    """
+    Načte vzory funkcí, přes které GDB skripty přeskakují (`function_blacklist_patterns`).
+    """
+    if not os.path.exists(TRACE_CONFIG):
+        return []
+    with open(TRACE_CONFIG, "r") as f:
+        config = json.load(f)
+    return [re.compile(p) for p in config.get("function_blacklist_patterns", [])]
+
+
+def is_traced_call(asm, architecture):
+    """
+    Rozhodne, zda GDB skript pro danou architekturu před instrukcí zapisuje řádek `[CALL]`.
+    """
+    if architecture == "arm":
+        return asm.startswith("bl") or asm.startswith("blx") or asm.startswith("b ")
+    if architecture == "riscv":
+        return asm.startswith("jal") or asm.startswith("jalr")
+    return asm.startswith("call") or asm.startswith("jmp")
+
+
+def find_library_instruction(pc, libraries, library_starts, architecture):
+    """
+    Najde instrukci na runtime adrese `pc` ve sdílených knihovnách procesu.
+
+    :param libraries: Seznam `(začátek, konec, cesta, posun zavedení)` seřazený podle začátku.
+    :param library_starts: Začátky rozsahů z `libraries` (pro binární vyhledávání).
+    """
+    index = bisect.bisect_right(library_starts, pc) - 1
+    if index < 0:
+        return None
+    start, end, path, bias = libraries[index]
+    if pc >= end:
+        return None
+    return load_disassembly(path, architecture).get(pc - bias)
+
+
+def write_trace_from_pcs(pcs, trace_file, binary_file, architecture, function_name=None, skip_blacklisted=None, load_bias=0,
+                         libraries=None, budget=None, truncated=None, library_calls=None, threads=None, regions=None):
+    """
+    Zapíše trace z posloupnosti vykonaných adres (formát podle přípony, viz `open_trace_writer`).
+
+    :param pcs: Iterovatelná posloupnost adres vykonaných instrukcí.
+    :param trace_file: Cesta k výstupnímu trace souboru.
+    :param binary_file: Cesta k binárnímu souboru.
+    :param architecture: Architektura binárky ('native', 'arm', 'riscv').
+    :param function_name: Pokud je zadáno, zapíše se jen první volání této funkce
+                          (stejně jako trace omezený na funkci v GDB skriptech).
+    :param skip_blacklisted: Vynechat instrukce funkcí volaných přes blacklist (`trace_config.json`).
+                             Výchozí je stejné chování jako GDB skripty – jen pro ARM a RISC-V.
+    :param load_bias: Posun zavedení binárky, který se odečte od adres (trace pak obsahuje statické adresy).
+    :param libraries: Volitelný seznam sdílených knihoven procesu `(začátek, konec, cesta, posun zavedení)`.
+                      Instrukce knihoven se zapíší s runtime adresou a jménem funkce z jejich disassemblace.
+    :param budget: Nejvyšší počet zapsaných instrukcí; zbytek posloupnosti se nezapíše a trace
+                   skončí značkou `[TRUNCATED] budget` (viz `core.engine.trace_limits`).
+    :param truncated: Důvod, kvůli kterému tracer posloupnost adres předčasně ukončil (`LIMIT_BUDGET`,
+                      `LIMIT_TIMEOUT`); pokud trace neskončí návratem z funkce, zapíše se na jeho konec.
+    :param library_calls: Volitelný slovník přejitých volání knihovních funkcí (`PcBuffer.library_calls`):
+                          index adresy v `pcs` → (jméno funkce, odhad počtu instrukcí). Za instrukci
+                          volání se zapíše řádek `[LIBRARY]`.
+    :param threads: Volitelný slovník přepnutí vláken (`PcBuffer.threads`): index adresy v `pcs` → číslo
+                    vlákna, kterému patří tato a následující adresy. Před záznamy vlákna se zapíše řádek
+                    `[THREAD]`; volání funkce se sleduje jen ve vlákně, ve kterém do ní program vstoupil.
+    :param regions: Volitelný slovník začátků a konců oblastí zájmu (`PcBuffer.regions`): index adresy
+                    v `pcs` → seznam dvojic (druh, jméno oblasti). Před adresu se zapíšou řádky `[REGION]`.
+    :return: Počet zapsaných instrukcí.
+    """
+    instructions = load_disassembly(binary_file, architecture, persistent=True)
+    if skip_blacklisted is None:
+        skip_blacklisted = architecture in ("arm", "riscv")
+    blacklist = load_blacklist_regexes() if skip_blacklisted else []
+
+    entry_pc = None
+    if function_name:
+        entry_pc = load_binary_symbols(binary_file).function_address(function_name)
+        if entry_pc is None:
+            log_warning(f"Funkce `{function_name}` nebyla nalezena v `{binary_file}`, zapisuji celý trace.")
+        elif architecture == "arm":
+            entry_pc &= ~1  # Thumb bit
+
+    libraries = sorted(libraries or [])
+    library_starts = [library[0] for library in libraries]
+
+    written = 0
+    unknown = 0
+    skip_until = skip_thread = None
+    inside = entry_pc is None
+    return_address = None
+    previous = None
+    threads = threads or {}
+    regions = regions or {}
+    thread = written_thread = scope_thread = 1
+
+    with open_trace_writer(trace_file, architecture) as f:
+
+        for index, runtime_pc in enumerate(pcs):
+            if budget is not None and written >= budget:
+                truncated = LIMIT_BUDGET
+                break
+            thread = threads.get(index, thread)
+            if index in regions:
+                if thread != written_thread:
+                    f.thread(thread)
+                    written_thread = thread
+                for kind, name in regions[index]:
+                    f.region(kind, name)
+
+            pc = runtime_pc - load_bias
+            instruction = instructions.get(pc)
+            if instruction is None and libraries:
+                pc = runtime_pc
+                instruction = find_library_instruction(pc, libraries, library_starts, architecture)
+            if instruction is None:
+                unknown += 1
+                continue
+
+            if skip_until is not None and thread == skip_thread:
+                if pc != skip_until:
+                    continue
+                skip_until = None
+
+            function, asm, length, iclass = instruction
+
+            if thread != written_thread and (inside or pc == entry_pc):
+                f.thread(thread)
+                written_thread = thread
+
+            if not inside:
+                if pc == entry_pc and previous is not None:
+                    # Volání cílové funkce z volající funkce
+                    previous_pc, previous_instruction = previous
+                    scope_thread = thread
+                    call_asm = previous_instruction.asm
+                    if "*" in call_asm:
+                        # Nepřímé volání (např. vstupní funkce vlákna) – analýza hledá přímé volání funkce
+                        call_asm = f"call   {hex(pc)} <{function_name}>"
+                    f.call(previous_instruction.function, f"<{function_name}>")
+                    f.instruction(previous_instruction.function, previous_pc, call_asm)
+                    return_address = previous_pc + previous_instruction.length
+                    inside = True
+                else:
+                    previous = (pc, instruction)
+                    continue
+            elif return_address is not None and pc == return_address and thread == scope_thread:
+                f.end(function_name)
+                truncated = None
+                break
+
+            if is_traced_call(asm, architecture):
+                called_function = asm.split()[-1]
+                f.call(function, called_function)
+
+                # Přeskočit lze jen skutečné volání (obdoba `nexti` v GDB skriptech)
+                if blacklist and iclass == CLASS_CALL and \
+                        any(regex.search(called_function.strip("<>")) for regex in blacklist):
+                    skip_until = pc + length
+                    skip_thread = thread
+
+            f.instruction(function, pc, asm)
+            written += 1
+
+            if library_calls and index in library_calls:
+                f.library(*library_calls[index])
+
+        if regions and not truncated:
+            # Konec oblasti za poslední zaznamenanou adresou
+            for kind, name in regions.get(len(pcs), ()):
+                f.region(kind, name)
+
+        if truncated:
+            f.truncated(truncated, written)
+
+    if unknown:
+        log_debug(f"Přeskočeno {unknown} adres mimo disassemblaci binárky")
+    log_info(f"Trace z vykonaných adres zapsán do `{trace_file}` ({written} instrukcí)")
+    return written
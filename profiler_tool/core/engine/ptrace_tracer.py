@@ -0,0 +1,1227 @@
+import array
+import collections
+import ctypes
+import os
+import platform
+import signal
+import struct
+import threading
+import time
+from core.engine.elf_reader import ElfFile, ET_DYN
+from core.engine.disassembly import load_disassembly, CLASS_CALL
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.pc_trace import find_library_instruction
+from core.engine.trace_limits import LIMIT_TIMEOUT
+from core.engine.trace_format import REGION_BEGIN, REGION_END
+from core.engine.regions import REGION_BEGIN_MARKER, REGION_END_MARKER, close_region
+from config import log_info, log_debug, log_warning, log_error
+
+"""
+Nativní tracer pro x86-64 Linux postavený přímo na `ptrace` (přes ctypes), bez GDB.
+
+Potomek se krokuje po jedné instrukci a do předalokovaného bufferu se ukládají jen hodnoty
+registru RIP. Jména funkcí ani text instrukcí se během běhu nezjišťují – doplní se až po
+skončení programu ze statické disassemblace binárky a sdílených knihoven (`write_trace_from_pcs`).
+Na jeden krok tak připadá jen trojice systémových volání (PTRACE_SINGLESTEP, waitpid, PTRACE_PEEKUSER)
+místo `newest_frame()`, `name()`, `disassemble()` a `execute("si")` v Python API GDB.
+
+Volání knihovních funkcí lze přecházet (`core.engine.library_costs`): na instrukci volání se vloží
+breakpoint na návratovou adresu a knihovní funkce proběhne plnou rychlostí; jen dokud pro ni tabulka
+cen nemá dost měření, se krokuje bez záznamu adres a spočítají se její instrukce.
+
+Vícevláknový program se krokuje celý: s `PTRACE_O_TRACECLONE` se pod trasování dostane každé nové
+vlákno a všechna vlákna se krokují souběžně (po každém zastavení libovolného vlákna se zaznamená jeho PC
+a vlákno se znovu krokuje). Buffer adres si pamatuje místa přepnutí vláken (`PcBuffer.threads`),
+ze kterých `write_trace_from_pcs` zapíše řádky `[THREAD]`.
+
+Oblasti zájmu vyznačené ve zdrojovém kódu (`trace_region_pcs`, viz `core.engine.regions`) se krokují
+jen uvnitř oblastí: program běží plnou rychlostí k breakpointu na vstupu do značky začátku oblasti
+a krokuje se jen vlákno, které do oblasti vstoupilo, do uzavření oblasti.
+
+Počty instrukcí jednotlivých volání funkce (`count_function_calls`) se zjistí bez trace: program
+běží plnou rychlostí s breakpointy na vstupu do funkce a na návratových adresách a instrukce volání
+se odečtou z hardwarového čítače (`perf_event_open`); bez čítače se krokuje jen uvnitř volání.
+
+Pro velmi dlouhé běhy modul nabízí i statistické vzorkování (`sample_stacks`): program běží plnou
+rychlostí a v pravidelných intervalech se zastaví signálem `SIGSTOP`, zaznamená se PC a zásobník
+volání odvinutý přes řetězec ukazatelů rámce (binárky se překládají s `-fno-omit-frame-pointer`).
+"""
+
+PTRACE_TRACEME = 0
+PTRACE_PEEKTEXT = 1
+PTRACE_PEEKUSER = 3
+PTRACE_POKETEXT = 4
+PTRACE_POKEUSER = 6
+PTRACE_CONT = 7
+PTRACE_SINGLESTEP = 9
+PTRACE_SETOPTIONS = 0x4200
+PTRACE_GETEVENTMSG = 0x4201
+
+PTRACE_O_TRACECLONE = 0x8
+PTRACE_O_TRACEEXIT = 0x40
+PTRACE_EVENT_CLONE = 3
+PTRACE_EVENT_EXIT = 6
+
+# perf_event_open: čítač instrukcí vykonaných v uživatelském režimu (struct perf_event_attr, PERF_ATTR_SIZE_VER0)
+SYS_PERF_EVENT_OPEN = 298
+PERF_TYPE_HARDWARE = 0
+PERF_COUNT_HW_INSTRUCTIONS = 1
+PERF_ATTR_SIZE = 64
+PERF_EXCLUDE_KERNEL = 1 << 5
+PERF_EXCLUDE_HV = 1 << 6
+
+# `waitpid` čeká i na vlákna (ne jen na potomky vytvořené `fork`)
+WAIT_ALL = 0x40000000
+SYS_TGKILL = 234
+
+ADDR_NO_RANDOMIZE = 0x0040000
+
+# Offsety registrů ve `struct user_regs_struct` (x86-64)
+RBP_OFFSET = 4 * 8
+RDI_OFFSET = 14 * 8
+RIP_OFFSET = 16 * 8
+RSP_OFFSET = 19 * 8
+
+# Kolik slov zásobníku se při vzorkování prohledá, když je program uvnitř knihovní funkce bez rámce
+STACK_SCAN_WORDS = 256
+
+# Počet adres v jednom bloku bufferu
+PC_BUFFER_CHUNK = 1 << 20
+
+# Nejdelší čtené jméno oblasti zájmu
+REGION_NAME_LIMIT = 256
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.ptrace.argtypes = [ctypes.c_long, ctypes.c_long, ctypes.c_void_p, ctypes.c_void_p]
+        _libc.ptrace.restype = ctypes.c_long
+    return _libc
+
+
+def _ptrace(request, pid, addr=0, data=0):
+    ctypes.set_errno(0)
+    result = _get_libc().ptrace(request, pid, ctypes.c_void_p(addr), ctypes.c_void_p(data))
+    if result == -1 and ctypes.get_errno():
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"ptrace({request}) selhal: {os.strerror(errno)}")
+    return result
+
+
+def _peek(request, pid, addr):
+    return _ptrace(request, pid, addr) & 0xffffffffffffffff
+
+
+class PcBuffer:
+    """
+    Předalokovaný buffer 64bitových adres, který se rozšiřuje po blocích pevné velikosti.
+
+    Atribut `library_calls` obsahuje přejitá volání knihovních funkcí: index instrukce volání
+    v bufferu → (jméno funkce, odhad počtu instrukcí). Atribut `threads` obsahuje přepnutí vláken:
+    index první adresy po přepnutí → číslo vlákna (1 = hlavní vlákno, prázdný u jednovláknového programu).
+    Atribut `regions` obsahuje začátky a konce oblastí zájmu: index následující adresy → seznam
+    dvojic (`REGION_BEGIN` nebo `REGION_END`, jméno oblasti).
+    """
+
+    def __init__(self, chunk_size=PC_BUFFER_CHUNK):
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.current = array.array("Q", bytes(8 * chunk_size))
+        self.used = 0
+        self.library_calls = {}
+        self.threads = {}
+        self.regions = {}
+
+    def append(self, pc):
+        if self.used == self.chunk_size:
+            self.chunks.append(self.current)
+            self.current = array.array("Q", bytes(8 * self.chunk_size))
+            self.used = 0
+        self.current[self.used] = pc
+        self.used += 1
+
+    def __len__(self):
+        return len(self.chunks) * self.chunk_size + self.used
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+        yield from self.current[:self.used]
+
+
+def read_process_mappings(pid):
+    """
+    Načte souborová mapování procesu z `/proc/<pid>/maps`.
+
+    :return: Slovník cesta → (nejnižší adresa, nejvyšší adresa, adresa mapování s offsetem 0).
+    """
+    mappings = {}
+    with open(f"/proc/{pid}/maps", "r") as f:
+        for line in f:
+            parts = line.split(maxsplit=5)
+            if len(parts) < 6 or not parts[5].startswith("/"):
+                continue
+            start, end = (int(x, 16) for x in parts[0].split("-"))
+            path = parts[5].strip()
+            low, high, base = mappings.get(path, (start, end, None))
+            if int(parts[2], 16) == 0 and base is None:
+                base = start
+            mappings[path] = (min(low, start), max(high, end), base)
+    return mappings
+
+
+def _exec_child(binary_file, args):
+    """
+    Běží v potomkovi po `fork()`: povolí trasování rodičem a spustí binárku.
+    """
+    try:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        libc = _get_libc()
+        # Stejně jako GDB vypneme randomizaci adres
+        libc.personality(ADDR_NO_RANDOMIZE)
+        if libc.ptrace(PTRACE_TRACEME, 0, None, None) != 0:
+            os._exit(126)
+        os.execv(binary_file, [binary_file, *args])
+    finally:
+        os._exit(127)
+
+
+class ThreadGroup:
+    """
+    Trasovaná vlákna procesu (s `PTRACE_O_TRACECLONE`).
+
+    Vlákna se číslují v pořadí, v jakém je tracer uvidí (1 = hlavní vlákno). Každé nové vlákno
+    se hlásí úvodním `SIGSTOP` a signály `SIGSTOP` poslané tracerem se programu nedoručují.
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.numbers = {pid: 1}
+        self.live = {pid}
+        self.waiting = set()       # nová vlákna zastavená při běhu plnou rychlostí, čekají na krokování
+        self.ignored_stops = set()  # vlákna, jejichž příští SIGSTOP vyvolal tracer
+        self.signals = {}          # vlákno → signál, který se doručí při dalším pokračování
+
+    def add(self, tid):
+        if tid not in self.numbers:
+            self.numbers[tid] = len(self.numbers) + 1
+            self.live.add(tid)
+            self.ignored_stops.add(tid)
+
+    def wait(self):
+        """
+        Počká na zastavení nebo ukončení libovolného vlákna.
+
+        :return: Trojice (tid, druh, signál); druh je `exited` (vlákno skončilo), `exit` (vlákno
+                 končí, `PTRACE_EVENT_EXIT`), `clone` (vlákno vytvořilo nové vlákno), `stop`
+                 (úvodní nebo tracerem vyvolaný SIGSTOP), `trap` (krok nebo breakpoint) nebo
+                 `signal` (signál, který se má programu doručit).
+        """
+        tid, status = os.waitpid(-1, WAIT_ALL)
+        if not os.WIFSTOPPED(status):
+            self.live.discard(tid)
+            self.waiting.discard(tid)
+            return tid, "exited", 0
+        self.add(tid)
+        event = status >> 16
+        if event == PTRACE_EVENT_CLONE:
+            message = ctypes.c_ulong()
+            _ptrace(PTRACE_GETEVENTMSG, tid, 0, ctypes.addressof(message))
+            self.add(message.value)
+            return tid, "clone", 0
+        if event == PTRACE_EVENT_EXIT:
+            return tid, "exit", 0
+        signal_number = os.WSTOPSIG(status)
+        if signal_number == signal.SIGSTOP and tid in self.ignored_stops:
+            self.ignored_stops.discard(tid)
+            return tid, "stop", 0
+        if signal_number == signal.SIGTRAP:
+            return tid, "trap", 0
+        return tid, "signal", signal_number
+
+    def resume(self, tid, request=PTRACE_CONT):
+        """Nechá vlákno pokračovat (`PTRACE_CONT` nebo `PTRACE_SINGLESTEP`) s odloženým signálem."""
+        _ptrace(request, tid, 0, self.signals.pop(tid, 0))
+
+    def stop(self, running):
+        """
+        Zastaví běžící vlákna `running` a počká na jejich zastavení.
+
+        :return: Vlákna, která se při tom zastavila na breakpointu (SIGTRAP).
+        """
+        trapped = set()
+        running = set(running) & self.live
+        for tid in running:
+            self.ignored_stops.add(tid)
+            _tgkill(self.pid, tid, signal.SIGSTOP)
+        while running:
+            tid, kind, signal_number = self.wait()
+            if kind == "trap":
+                trapped.add(tid)
+            elif kind == "signal":
+                self.signals[tid] = signal_number
+            elif kind in ("clone", "exit"):
+                continue
+            running.discard(tid)
+        return trapped
+
+
+def _tgkill(pid, tid, signal_number):
+    if _get_libc().syscall(SYS_TGKILL, pid, tid, signal_number) != 0:
+        raise OSError(ctypes.get_errno(), f"tgkill({tid}) selhal")
+
+
+def _run_to_address(pid, address, threads=None, resume_new=True):
+    """
+    Nechá potomka doběhnout plnou rychlostí na `address` (dočasný breakpoint `int3`).
+
+    :param threads: Volitelná `ThreadGroup` vícevláknového potomka. Breakpoint pak může dosáhnout
+                    kterékoli vlákno; ostatní vlákna se poté zastaví (vlákno, které na breakpoint
+                    narazilo současně, se vrátí na jeho adresu).
+    :param resume_new: Nová vlákna běží také plnou rychlostí; jinak zůstanou zastavená na svém
+                       začátku v `threads.waiting` (volání knihovní funkce, které vlákno vytvoří).
+    :return: tid vlákna, které breakpoint dosáhlo, nebo None (program skončil).
+    """
+    original = _peek(PTRACE_PEEKTEXT, pid, address)
+    _ptrace(PTRACE_POKETEXT, pid, address, (original & ~0xff) | 0xcc)
+
+    if threads is None:
+        signal_number = 0
+        while True:
+            _ptrace(PTRACE_CONT, pid, 0, signal_number)
+            _, status = os.waitpid(pid, 0)
+            if not os.WIFSTOPPED(status):
+                return None
+            if status >> 16 == PTRACE_EVENT_EXIT:
+                return None
+            signal_number = os.WSTOPSIG(status)
+            if signal_number == signal.SIGTRAP and _peek(PTRACE_PEEKUSER, pid, RIP_OFFSET) == address + 1:
+                break
+            if signal_number == signal.SIGTRAP:
+                signal_number = 0
+        hit = pid
+    else:
+        running = {pid}
+        threads.resume(pid)
+        while True:
+            tid, kind, signal_number = threads.wait()
+            if kind in ("exited", "exit") and tid == pid:
+                return None
+            if kind == "exited":
+                running.discard(tid)
+                continue
+            if kind == "trap" and _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET) == address + 1:
+                hit = tid
+                running.discard(tid)
+                break
+            if kind == "stop" and tid not in running and not resume_new:
+                threads.waiting.add(tid)
+                continue
+            if kind == "signal":
+                threads.signals[tid] = signal_number
+            threads.resume(tid)
+            running.add(tid)
+
+        for tid in threads.stop(running):
+            if _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET) == address + 1:
+                _ptrace(PTRACE_POKEUSER, tid, RIP_OFFSET, address)
+
+    _ptrace(PTRACE_POKETEXT, pid, address, original)
+    _ptrace(PTRACE_POKEUSER, hit, RIP_OFFSET, address)
+    return hit
+
+
+def _count_until_return(pid, return_address, call_sp, threads=None):
+    """
+    Krokuje potomka stojícího na instrukci volání až k návratu na `return_address` a vrátí
+    dvojici (počet instrukcí volané funkce, True/False – zda se funkce vrátila, nebo proces skončil).
+
+    :param threads: Volitelná `ThreadGroup`; vlákna vytvořená volanou funkcí zůstanou zastavená
+                    v `threads.waiting`.
+    """
+    count = 0
+    signal_number = 0
+    while True:
+        _ptrace(PTRACE_SINGLESTEP, pid, 0, signal_number)
+        if threads is None:
+            _, status = os.waitpid(pid, 0)
+            if not os.WIFSTOPPED(status) or status >> 16 == PTRACE_EVENT_EXIT:
+                return count, False
+            signal_number = os.WSTOPSIG(status)
+            if signal_number == signal.SIGTRAP:
+                signal_number = 0
+        else:
+            while True:
+                tid, kind, signal_number = threads.wait()
+                if tid == pid:
+                    break
+                if kind == "stop":
+                    threads.waiting.add(tid)
+                elif kind == "signal":
+                    threads.signals[tid] = signal_number
+            if kind in ("exited", "exit"):
+                return count, False
+            if kind == "clone":
+                continue
+        if _peek(PTRACE_PEEKUSER, pid, RIP_OFFSET) == return_address and \
+                _peek(PTRACE_PEEKUSER, pid, RSP_OFFSET) >= call_sp:
+            return count, True
+        count += 1
+
+
+def _kill(pid):
+    """Ukončí potomka (se všemi vlákny) a počká na jeho ukončení."""
+    os.kill(pid, signal.SIGKILL)
+    while True:
+        try:
+            tid, status = os.waitpid(-1, WAIT_ALL)
+        except ChildProcessError:
+            return
+        if tid == pid and not os.WIFSTOPPED(status):
+            return
+        if os.WIFSTOPPED(status):
+            # Vlákno zastavené před ukončením (`PTRACE_EVENT_EXIT`) nebo v rozpracovaném zastavení
+            try:
+                _ptrace(PTRACE_CONT, tid)
+            except OSError:
+                pass
+
+
+def _find_call_before(instructions, return_address):
+    """
+    Najde ve statické disassemblaci instrukci, která končí na `return_address`.
+    """
+    for length in (5, 2, 3, 4, 6, 7):
+        instruction = instructions.get(return_address - length)
+        if instruction and instruction.length == length:
+            return return_address - length
+    return None
+
+
+def _find_library_call_before(mappings, binary_file, return_address):
+    """
+    Najde ve sdílených knihovnách procesu instrukci volání, která končí na runtime adrese `return_address`.
+    """
+    libraries = sorted(shared_libraries(mappings, binary_file))
+    library_starts = [library[0] for library in libraries]
+    for length in (2, 3, 6, 5, 7):
+        instruction = find_library_instruction(return_address - length, libraries, library_starts, "native")
+        if instruction and instruction.length == length and instruction.iclass == CLASS_CALL:
+            return return_address - length
+    return None
+
+
+def trace_pcs(binary_file, args, function_name=None, limits=None, library_calls=None, library_costs=None):
+    """
+    Spustí binárku pod `ptrace` a zaznamená adresy všech vykonaných instrukcí.
+
+    :param binary_file: Cesta k binárnímu souboru (x86-64 Linux).
+    :param args: Argumenty programu (předávají se bez shellu).
+    :param function_name: Pokud je zadáno, program doběhne plnou rychlostí na vstup do této funkce
+                          a krokuje se jen do jejího návratu. Na začátek bufferu se vloží adresa
+                          instrukce volání, aby `write_trace_from_pcs` zapsal řádek `[CALL]`.
+                          U vícevláknového programu se do návratu krokují všechna vlákna.
+    :param limits: Volitelné `TraceLimits` (rozpočet instrukcí, časový limit). Po jejich překročení
+                   se krokování přeruší a program se ukončí (nenechá se doběhnout).
+    :param library_calls: Volitelný slovník volání knihovních funkcí, která se přejdou
+                          (`library_costs.find_library_calls`); vyžaduje `library_costs`. Volání
+                          se přecházejí, jen dokud program nevytvořil další vlákno.
+    :param library_costs: Tabulka cen knihovních funkcí (`library_costs.LibraryCostTable`), ze které
+                          se odhadne počet instrukcí přejitých volání a do které se zapíší nová měření.
+    :return: Čtveřice (`PcBuffer`, posun zavedení binárky, slovník mapování z `read_process_mappings`,
+             důvod přerušení limitem nebo None).
+    """
+    if platform.system() != "Linux" or platform.machine() != "x86_64":
+        raise RuntimeError("Nativní ptrace tracer je podporován jen na x86-64 Linuxu.")
+
+    binary_file = os.path.abspath(binary_file)
+    pid = os.fork()
+    if pid == 0:
+        _exec_child(binary_file, args)
+
+    _, status = os.waitpid(pid, 0)
+    if not os.WIFSTOPPED(status):
+        raise RuntimeError(f"Spuštění `{binary_file}` pod ptrace selhalo (status {status}).")
+    _ptrace(PTRACE_SETOPTIONS, pid, 0, PTRACE_O_TRACEEXIT | PTRACE_O_TRACECLONE)
+    threads = ThreadGroup(pid)
+
+    mappings = read_process_mappings(pid)
+    real_path = os.path.realpath(binary_file)
+    load_bias = 0
+    if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+        load_bias = mappings[real_path][2] or 0
+    log_debug(f"Posun zavedení `{binary_file}`: {hex(load_bias)}")
+
+    pcs = PcBuffer()
+    scope_tid = pid
+    return_address = None
+    entry_sp = None
+
+    if function_name:
+        static_entry = load_binary_symbols(binary_file).function_address(function_name)
+        scope_tid = _run_to_address(pid, static_entry + load_bias, threads) if static_entry is not None else None
+        if scope_tid is None:
+            log_error(f"Funkce `{function_name}` nebyla dosažena.")
+            _kill(pid)
+            return pcs, load_bias, mappings, None
+
+        entry_sp = _peek(PTRACE_PEEKUSER, scope_tid, RSP_OFFSET)
+        return_address = _peek(PTRACE_PEEKTEXT, scope_tid, entry_sp)
+        call_pc = _find_call_before(load_disassembly(binary_file, "native", persistent=True), return_address - load_bias)
+        if call_pc is not None:
+            call_pc += load_bias
+        else:
+            # Funkci volá knihovna (vstupní funkce vlákna z `pthread_create`, callback)
+            call_pc = _find_library_call_before(read_process_mappings(pid), binary_file, return_address)
+        if threads.numbers[scope_tid] != 1:
+            pcs.threads[0] = threads.numbers[scope_tid]
+        if call_pc is not None:
+            pcs.append(call_pc)
+
+    # Zastavená vlákna čekající na krokování, druh jejich zastavení a naposledy zaznamenané PC
+    stopped = [scope_tid] + sorted(threads.live - {scope_tid}, key=threads.numbers.get)
+    stop_kinds = {}
+    last_pcs = {}
+    current = threads.numbers[scope_tid]
+    running = set()
+    truncated = None
+    finished = False
+
+    while not finished:
+        if not stopped:
+            tid, kind, signal_number = threads.wait()
+            running.discard(tid)
+            if kind == "exited":
+                if tid == pid:
+                    # Proces skončil (např. signálem), mapování už nejsou dostupná
+                    return pcs, load_bias, mappings, None
+                continue
+            if kind == "exit":
+                if tid == pid or tid == scope_tid:
+                    # Proces (nebo sledované vlákno) končí, ale mapování jsou stále dostupná
+                    mappings = read_process_mappings(pid)
+                    threads.waiting.add(tid)
+                    break
+                threads.resume(tid)
+                continue
+            if kind == "signal":
+                threads.signals[tid] = signal_number
+            stopped.append(tid)
+            stop_kinds[tid] = kind
+
+        tid = stopped.pop(0)
+        pc = _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET)
+        # Po kroku se PC zaznamená vždy (i opakovaně, např. iterace `rep`); událost vytvoření vlákna
+        # instrukci nevykonala a po signálu nebo zastavení se zaznamená jen nové PC
+        kind = stop_kinds.pop(tid, "stop")
+        record = kind == "trap" or (kind != "clone" and pc != last_pcs.get(tid))
+
+        if tid == scope_tid and return_address is not None and pc == return_address and \
+                _peek(PTRACE_PEEKUSER, tid, RSP_OFFSET) > entry_sp:
+            finished = True
+        else:
+            truncated = limits.exceeded(len(pcs)) if limits else None
+            if truncated:
+                log_warning(f"Krokování přerušeno ({truncated}) po {len(pcs)} instrukcích, program se ukončí.")
+                mappings = read_process_mappings(pid)
+                _kill(pid)
+                return pcs, load_bias, mappings, truncated
+
+        if record:
+            if threads.numbers[tid] != current:
+                current = threads.numbers[tid]
+                pcs.threads[len(pcs)] = current
+            pcs.append(pc)
+        last_pcs[tid] = pc
+        if finished:
+            stopped.append(tid)
+            break
+
+        library_call = library_calls.get(pc - load_bias) if library_calls and len(threads.numbers) == 1 else None
+        if library_call is not None:
+            library_function, static_return = library_call
+            if library_costs.needs_measurement(library_function):
+                cost, returned = _count_until_return(pid, static_return + load_bias,
+                                                     _peek(PTRACE_PEEKUSER, pid, RSP_OFFSET), threads)
+                library_costs.add_measurement(library_function, cost)
+            else:
+                returned = _run_to_address(pid, static_return + load_bias, threads, resume_new=False) is not None
+                cost = library_costs.estimate(library_function)
+            pcs.library_calls[len(pcs) - 1] = (library_function, cost)
+            if returned:
+                # Vlákna vytvořená knihovní funkcí se začnou krokovat od svého začátku
+                stopped.append(pid)
+                stopped.extend(sorted(threads.waiting, key=threads.numbers.get))
+                threads.waiting.clear()
+                continue
+            # Program skončil uvnitř knihovní funkce (např. `exit`)
+            try:
+                mappings = read_process_mappings(pid)
+            except OSError:
+                pass
+            running.discard(pid)
+            break
+
+        threads.resume(tid, PTRACE_SINGLESTEP)
+        running.add(tid)
+
+    # Zbytek programu doběhne bez krokování
+    if return_address is not None:
+        mappings = read_process_mappings(pid)
+    _continue_to_exit(pid, threads, set(stopped) | threads.waiting)
+
+    log_info(f"Zaznamenáno {len(pcs)} vykonaných instrukcí" +
+             (f" ve {len(threads.numbers)} vláknech" if len(threads.numbers) > 1 else ""))
+    return pcs, load_bias, mappings, None
+
+
+def _continue_to_exit(pid, threads, stopped):
+    """
+    Nechá všechna vlákna potomka doběhnout plnou rychlostí až do skončení procesu.
+
+    :param stopped: Vlákna, která právě stojí (ostatní se ještě zastaví po rozpracovaném kroku).
+    """
+    for tid in stopped:
+        try:
+            threads.resume(tid)
+        except OSError:
+            pass
+    while True:
+        try:
+            tid, kind, signal_number = threads.wait()
+        except ChildProcessError:
+            break
+        if kind == "exited":
+            if tid == pid:
+                break
+            continue
+        if kind == "signal":
+            threads.signals[tid] = signal_number
+        try:
+            threads.resume(tid)
+        except OSError:
+            pass
+
+
+def _read_string(pid, address, limit=REGION_NAME_LIMIT):
+    """Přečte z paměti potomka řetězec ukončený nulou (nejvýše `limit` bajtů)."""
+    data = b""
+    while len(data) < limit:
+        try:
+            word = _peek(PTRACE_PEEKTEXT, pid, address + len(data)).to_bytes(8, "little")
+        except OSError:
+            break
+        if b"\0" in word:
+            return (data + word[:word.index(b"\0")]).decode(errors="replace")
+        data += word
+    return data[:limit].decode(errors="replace")
+
+
+def trace_region_pcs(binary_file, args, limits=None):
+    """
+    Spustí binárku pod `ptrace` a zaznamená adresy instrukcí vykonaných uvnitř oblastí zájmu
+    (`PROFILER_REGION_BEGIN` / `PROFILER_REGION_END`, viz `core.engine.regions`).
+
+    Program běží plnou rychlostí s breakpointem na vstupu do `REGION_BEGIN_MARKER`. Vlákno, které
+    na něj narazí, se krokuje, dokud se neuzavře poslední otevřená oblast (zanořené oblasti se
+    rozpoznají podle vstupu do značkovacích funkcí); ostatní vlákna mezitím běží plnou rychlostí
+    a jejich oblasti se zachytí, až když žádná oblast není otevřená. Instrukce značkovacích funkcí
+    se nezaznamenají, jméno oblasti se přečte z prvního argumentu (RDI).
+
+    :param binary_file: Cesta k binárnímu souboru (x86-64 Linux) přeložená s `-DPROFILER_REGIONS`.
+    :param args: Argumenty programu (předávají se bez shellu).
+    :param limits: Volitelné `TraceLimits` pro všechny oblasti dohromady; po jejich překročení
+                   se program ukončí.
+    :return: Čtveřice jako `trace_pcs`; začátky a konce oblastí jsou v `PcBuffer.regions`.
+    """
+    if platform.system() != "Linux" or platform.machine() != "x86_64":
+        raise RuntimeError("Nativní ptrace tracer je podporován jen na x86-64 Linuxu.")
+
+    binary_file = os.path.abspath(binary_file)
+    pid = os.fork()
+    if pid == 0:
+        _exec_child(binary_file, args)
+
+    _, status = os.waitpid(pid, 0)
+    if not os.WIFSTOPPED(status):
+        raise RuntimeError(f"Spuštění `{binary_file}` pod ptrace selhalo (status {status}).")
+    _ptrace(PTRACE_SETOPTIONS, pid, 0, PTRACE_O_TRACEEXIT | PTRACE_O_TRACECLONE)
+    threads = ThreadGroup(pid)
+
+    mappings = read_process_mappings(pid)
+    real_path = os.path.realpath(binary_file)
+    load_bias = 0
+    if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+        load_bias = mappings[real_path][2] or 0
+
+    pcs = PcBuffer()
+    symbols = load_binary_symbols(binary_file)
+    begin = symbols.function_address(REGION_BEGIN_MARKER)
+    end = symbols.function_address(REGION_END_MARKER)
+    if begin is None or end is None:
+        log_error(f"Binárka `{binary_file}` neobsahuje značky oblastí (`{REGION_BEGIN_MARKER}`), "
+                  f"přeložte ji s `-DPROFILER_REGIONS`.")
+        _kill(pid)
+        return pcs, load_bias, mappings, None
+    begin += load_bias
+    end += load_bias
+
+    original = _insert_breakpoint(pid, begin)
+    breakpoint_set = True
+    open_regions = []
+    region_tid = None
+    skip_until = None  # návratová adresa právě probíhající značkovací funkce
+    current = 1
+    regions = 0
+    threads.resume(pid)
+
+    while True:
+        tid, kind, signal_number = threads.wait()
+        if kind == "exited":
+            if tid == region_tid:
+                log_warning(f"Vlákno skončilo uvnitř oblasti `{open_regions[-1]}`.")
+                open_regions, region_tid = [], None
+            if tid == pid:
+                break
+            continue
+        if kind == "exit":
+            if tid == pid:
+                mappings = read_process_mappings(pid)
+            threads.resume(tid)
+            continue
+        if kind == "signal":
+            threads.signals[tid] = signal_number
+        pc = _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET)
+
+        if tid != region_tid:
+            if kind == "trap" and pc == begin + 1:
+                _ptrace(PTRACE_POKEUSER, tid, RIP_OFFSET, begin)
+                if not breakpoint_set:
+                    # Vlákno narazilo na breakpoint těsně před jeho odebráním, oblast se nezachytí
+                    log_debug(f"Oblast ve vlákně {threads.numbers[tid]} vynechána (probíhá jiná oblast)")
+                    threads.resume(tid)
+                    continue
+                # Vstup do oblasti: breakpoint se odebere a vlákno se začne krokovat
+                _ptrace(PTRACE_POKETEXT, tid, begin, original)
+                breakpoint_set = False
+                region_tid = tid
+                pc = begin
+                mappings = read_process_mappings(pid)
+                if threads.numbers[tid] != current:
+                    current = threads.numbers[tid]
+                    pcs.threads[len(pcs)] = current
+            else:
+                threads.resume(tid)
+                continue
+        elif kind != "trap":
+            # Vytvoření vlákna nebo signál instrukci nevykonaly
+            threads.resume(tid, PTRACE_SINGLESTEP)
+            continue
+
+        if skip_until is not None:
+            if pc != skip_until:
+                threads.resume(tid, PTRACE_SINGLESTEP)
+                continue
+            skip_until = None
+            if not open_regions:
+                # Poslední oblast se uzavřela, program běží plnou rychlostí k další oblasti
+                original = _insert_breakpoint(tid, begin)
+                breakpoint_set = True
+                region_tid = None
+                threads.resume(tid)
+                continue
+
+        # Značkovací funkce se nekrokují, zaznamená se jen začátek nebo konec oblasti
+        if pc in (begin, end):
+            name = _read_string(tid, _peek(PTRACE_PEEKUSER, tid, RDI_OFFSET))
+            if pc == begin:
+                open_regions.append(name)
+                regions += 1
+                pcs.regions.setdefault(len(pcs), []).append((REGION_BEGIN, name))
+            elif close_region(open_regions, name):
+                pcs.regions.setdefault(len(pcs), []).append((REGION_END, name))
+            else:
+                log_warning(f"Konec oblasti `{name}` bez začátku, ignoruji.")
+            skip_until = _peek(PTRACE_PEEKTEXT, tid, _peek(PTRACE_PEEKUSER, tid, RSP_OFFSET))
+            threads.resume(tid, PTRACE_SINGLESTEP)
+            continue
+
+        truncated = limits.exceeded(len(pcs)) if limits else None
+        if truncated:
+            log_warning(f"Krokování přerušeno ({truncated}) po {len(pcs)} instrukcích, program se ukončí.")
+            mappings = read_process_mappings(pid)
+            _kill(pid)
+            return pcs, load_bias, mappings, truncated
+
+        pcs.append(pc)
+        threads.resume(tid, PTRACE_SINGLESTEP)
+
+    log_info(f"Zaznamenáno {len(pcs)} vykonaných instrukcí v {regions} průchodech oblastmi")
+    return pcs, load_bias, mappings, None
+
+
+def _perf_event_open(tid):
+    """Otevře čítač instrukcí vlákna `tid` vykonaných v uživatelském režimu a vrátí jeho deskriptor."""
+    attr = ctypes.create_string_buffer(struct.pack(
+        "=IIQQQQQIIQ", PERF_TYPE_HARDWARE, PERF_ATTR_SIZE, PERF_COUNT_HW_INSTRUCTIONS, 0, 0, 0,
+        PERF_EXCLUDE_KERNEL | PERF_EXCLUDE_HV, 0, 0, 0), PERF_ATTR_SIZE)
+    ctypes.set_errno(0)
+    fd = _get_libc().syscall(SYS_PERF_EVENT_OPEN, attr, tid, -1, -1, 0)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"perf_event_open({tid}) selhal: {os.strerror(errno)}")
+    return fd
+
+
+class InstructionCounters:
+    """
+    Hardwarové čítače instrukcí vykonaných v uživatelském režimu, jeden na vlákno (`perf_event_open`).
+
+    Čítač vlákna se otevře při jeho prvním čtení. Atribut `trap_cost` je počet instrukcí, které čítač
+    započte za zásah breakpointu `int3` (podle procesoru 0 nebo 1, viz `calibrate`).
+    """
+
+    def __init__(self):
+        self.fds = {}
+        self.trap_cost = 0
+
+    @classmethod
+    def open(cls, pid):
+        """Vrátí čítače, nebo None, pokud je jádro ani procesor neposkytují (virtuální stroj, `perf_event_paranoid`)."""
+        counters = cls()
+        try:
+            counters.read(pid)
+        except OSError as e:
+            log_debug(f"Hardwarový čítač instrukcí není dostupný: {e}")
+            return None
+        return counters
+
+    def read(self, tid):
+        fd = self.fds.get(tid)
+        if fd is None:
+            fd = self.fds[tid] = _perf_event_open(tid)
+        return struct.unpack("=Q", os.read(fd, 8))[0]
+
+    def calibrate(self, pid):
+        """Změří `trap_cost` zásahem breakpointu na aktuální adrese zastaveného potomka."""
+        pc = _peek(PTRACE_PEEKUSER, pid, RIP_OFFSET)
+        original = _insert_breakpoint(pid, pc)
+        before = self.read(pid)
+        _ptrace(PTRACE_CONT, pid)
+        os.waitpid(pid, 0)
+        self.trap_cost = self.read(pid) - before
+        _ptrace(PTRACE_POKETEXT, pid, pc, original)
+        _ptrace(PTRACE_POKEUSER, pid, RIP_OFFSET, pc)
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds.clear()
+
+
+def count_function_calls(binary_file, args, function_name, limits=None):
+    """
+    Spustí binárku pod `ptrace` a změří počet instrukcí každého volání `function_name` (včetně
+    volaných funkcí) bez krokování celého programu.
+
+    Program běží plnou rychlostí s breakpointem `int3` na vstupu do funkce. Při vstupu se přečte
+    návratová adresa z vrcholu zásobníku a volání končí, když na ni vlákno dorazí s vyšším ukazatelem
+    zásobníku. Je-li dostupný hardwarový čítač instrukcí (`InstructionCounters`), běží plnou rychlostí
+    i volání a na návratových adresách jsou další breakpointy; jinak se krokuje jen vlákno uvnitř
+    rozpracovaného volání a kroky se počítají. Breakpoint, na kterém vlákno stojí, se překročí
+    jedním krokem s původní instrukcí, zatímco ostatní vlákna stojí.
+
+    :param binary_file: Cesta k binárnímu souboru (x86-64 Linux).
+    :param args: Argumenty programu (předávají se bez shellu).
+    :param function_name: Měřená funkce.
+    :param limits: Volitelné `TraceLimits` pro instrukce nevnořených volání; po jejich překročení
+                   se program ukončí.
+    :return: Trojice (seznam volání – slovníky `call`, `depth`, `instructions`, `complete` v pořadí
+             vstupů, True pokud počty pochází z hardwarového čítače, důvod přerušení limitem nebo None).
+    """
+    if platform.system() != "Linux" or platform.machine() != "x86_64":
+        raise RuntimeError("Nativní ptrace tracer je podporován jen na x86-64 Linuxu.")
+
+    binary_file = os.path.abspath(binary_file)
+    pid = os.fork()
+    if pid == 0:
+        _exec_child(binary_file, args)
+
+    _, status = os.waitpid(pid, 0)
+    if not os.WIFSTOPPED(status):
+        raise RuntimeError(f"Spuštění `{binary_file}` pod ptrace selhalo (status {status}).")
+    _ptrace(PTRACE_SETOPTIONS, pid, 0, PTRACE_O_TRACEEXIT | PTRACE_O_TRACECLONE)
+    threads = ThreadGroup(pid)
+
+    mappings = read_process_mappings(pid)
+    real_path = os.path.realpath(binary_file)
+    load_bias = 0
+    if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+        load_bias = mappings[real_path][2] or 0
+
+    calls = []
+    static_entry = load_binary_symbols(binary_file).function_address(function_name)
+    if static_entry is None:
+        log_error(f"Funkce `{function_name}` nebyla nalezena v `{binary_file}`.")
+        _kill(pid)
+        return calls, False, None
+    entry = static_entry + load_bias
+
+    counters = InstructionCounters.open(pid)
+    if counters is not None:
+        counters.calibrate(pid)
+    breakpoints = {entry: _insert_breakpoint(pid, entry)}  # adresa → původní slovo
+
+    active = collections.defaultdict(list)  # vlákno → [(návratová adresa, ukazatel zásobníku, čítač při vstupu, záznam)]
+    steps = collections.Counter()           # vlákno → počet kroků (bez hardwarového čítače)
+    hits = collections.Counter()            # vlákno → počet zásahů breakpointů
+    stepping = set()                        # vlákna puštěná jedním krokem
+    held = set()                            # vlákna stojící na breakpointu, jehož instrukce se ještě nevykonala
+    running = set()
+    pending = collections.deque()           # zastavení vláken, která se ještě nezpracovala
+    counted = 0                             # instrukce dokončených nevnořených volání
+    truncated = None
+    expired = threading.Event()
+
+    def position(tid):
+        if counters is None:
+            return steps[tid]
+        return counters.read(tid) - counters.trap_cost * hits[tid]
+
+    def resume(tid):
+        if counters is None and active[tid]:
+            stepping.add(tid)
+            threads.resume(tid, PTRACE_SINGLESTEP)
+        else:
+            stepping.discard(tid)
+            threads.resume(tid)
+        running.add(tid)
+
+    def step_over(tid, pc):
+        # Ostatní vlákna se zastaví, aby breakpoint po dobu kroku nepřešla; jiná jejich zastavení
+        # (breakpoint, krok, signál, nové vlákno) se zpracují až po kroku
+        others = running - {tid}
+        for other in list(others):
+            threads.ignored_stops.add(other)
+            try:
+                _tgkill(pid, other, signal.SIGSTOP)
+            except OSError:
+                others.discard(other)
+        stopped = set()
+        while others:
+            event = threads.wait()
+            if event[0] in others and event[1] == "stop":
+                stopped.add(event[0])
+            else:
+                pending.append(event)
+            others.discard(event[0])
+        running.clear()
+
+        _ptrace(PTRACE_POKETEXT, tid, pc, breakpoints[pc])
+        stepping.add(tid)
+        threads.resume(tid, PTRACE_SINGLESTEP)
+        while True:
+            event = threads.wait()
+            if event[0] == tid:
+                break
+            pending.append(event)
+        if event[1] != "exited":
+            _insert_breakpoint(tid, pc)
+        if event[1] == "trap":
+            held.discard(tid)
+        else:
+            held.add(tid)
+        pending.appendleft(event)
+        for other in stopped:
+            resume(other)
+
+    def expire():
+        expired.set()
+        os.kill(pid, signal.SIGKILL)
+
+    timer = threading.Timer(limits.timeout, expire) if limits and limits.timeout else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+
+    try:
+        resume(pid)
+        while True:
+            if pending:
+                tid, kind, signal_number = pending.popleft()
+            else:
+                tid, kind, signal_number = threads.wait()
+                running.discard(tid)
+            if kind == "exited":
+                if tid == pid:
+                    break
+                continue
+            if kind == "exit":
+                threads.resume(tid)
+                continue
+            if kind == "signal":
+                threads.signals[tid] = signal_number
+            if kind != "trap":
+                if tid in held:
+                    step_over(tid, _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET))
+                else:
+                    resume(tid)
+                continue
+
+            stepped = tid in stepping
+            stepping.discard(tid)
+            pc = _peek(PTRACE_PEEKUSER, tid, RIP_OFFSET)
+            hit = not stepped and pc - 1 in breakpoints
+            if hit:
+                pc -= 1
+                _ptrace(PTRACE_POKEUSER, tid, RIP_OFFSET, pc)
+                hits[tid] += 1
+            elif stepped and counters is None:
+                steps[tid] += 1
+
+            now = position(tid)
+            sp = _peek(PTRACE_PEEKUSER, tid, RSP_OFFSET)
+            stack = active[tid]
+            while stack and pc == stack[-1][0] and sp > stack[-1][1]:
+                _, _, start, record = stack.pop()
+                record["instructions"] = now - start
+                record["complete"] = True
+                if record["depth"] == 0:
+                    counted += record["instructions"]
+            if pc == entry and (hit or stepped):
+                return_address = _peek(PTRACE_PEEKTEXT, tid, sp)
+                record = {"call": len(calls) + 1, "depth": len(stack), "instructions": 0, "complete": False}
+                calls.append(record)
+                stack.append((return_address, sp, now, record))
+                if counters is not None and return_address not in breakpoints:
+                    breakpoints[return_address] = _insert_breakpoint(tid, return_address)
+
+            if limits:
+                used = sum(steps.values()) if counters is None else counted + (now - stack[0][2] if stack else 0)
+                truncated = limits.exceeded(used)
+                if truncated:
+                    break
+
+            if pc in breakpoints:
+                step_over(tid, pc)
+            else:
+                resume(tid)
+    except OSError:
+        # Po vypršení časového limitu byl potomek ukončen uprostřed obsluhy zastavení
+        if not expired.is_set():
+            raise
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    # Rozpracovaná volání (přerušení limitem nebo skončení programu uvnitř funkce)
+    for tid, stack in active.items():
+        for _, _, start, record in stack:
+            try:
+                record["instructions"] = position(tid) - start
+            except OSError:
+                pass
+    if counters is not None:
+        counters.close()
+    if expired.is_set():
+        truncated = LIMIT_TIMEOUT
+    elif truncated:
+        _kill(pid)
+    if truncated:
+        log_warning(f"Počítání volání `{function_name}` přerušeno ({truncated}), program byl ukončen.")
+
+    log_info(f"Zaznamenáno {len(calls)} volání `{function_name}`"
+             f" ({'hardwarový čítač' if counters is not None else f'{sum(steps.values())} kroků'})")
+    return calls, counters is not None, truncated
+
+
+def _insert_breakpoint(pid, address):
+    """Vloží `int3` na `address` a vrátí původní obsah slova."""
+    original = _peek(PTRACE_PEEKTEXT, pid, address)
+    _ptrace(PTRACE_POKETEXT, pid, address, (original & ~0xff) | 0xcc)
+    return original
+
+
+def _unwind_stack(pid, pc, instructions, load_bias, binary_range, max_depth):
+    """
+    Odvine zásobník zastaveného potomka přes řetězec ukazatelů rámce (RBP).
+
+    Na první instrukci funkce (`push %rbp`), těsně po ní (`mov %rsp,%rbp`) a na `ret` ještě RBP
+    ukazuje na rámec volající funkce, návratová adresa se proto přečte přímo z vrcholu zásobníku.
+    Knihovní funkce rámec obvykle nevytvářejí; pokud program stojí mimo binárku, za návratovou
+    adresu se považuje první slovo zásobníku, které ukazuje těsně za instrukci volání v binárce.
+
+    :return: Seznam runtime adres od nejvnitřnějšího rámce (PC, návratové adresy).
+    """
+    stack = [pc]
+    rsp = _peek(PTRACE_PEEKUSER, pid, RSP_OFFSET)
+    rbp = _peek(PTRACE_PEEKUSER, pid, RBP_OFFSET)
+    low, high = binary_range
+
+    if low <= pc < high:
+        instruction = instructions.get(pc - load_bias)
+        asm = " ".join(instruction.asm.split()) if instruction else ""
+        if asm in ("push %rbp", "ret", "retq"):
+            stack.append(_peek(PTRACE_PEEKTEXT, pid, rsp))
+        elif asm == "mov %rsp,%rbp":
+            stack.append(_peek(PTRACE_PEEKTEXT, pid, rsp + 8))
+    else:
+        for offset in range(0, STACK_SCAN_WORDS * 8, 8):
+            try:
+                value = _peek(PTRACE_PEEKTEXT, pid, rsp + offset)
+            except OSError:
+                break
+            if low <= value < high and _find_call_before(instructions, value - load_bias) is not None:
+                stack.append(value)
+                break
+
+    while len(stack) < max_depth and rbp:
+        try:
+            return_address = _peek(PTRACE_PEEKTEXT, pid, rbp + 8)
+            next_rbp = _peek(PTRACE_PEEKTEXT, pid, rbp)
+        except OSError:
+            break
+        if not return_address:
+            break
+        stack.append(return_address)
+        if next_rbp <= rbp:
+            break
+        rbp = next_rbp
+    return stack
+
+
+def sample_stacks(binary_file, args, function_name, interval, max_depth=64, timeout=None):
+    """
+    Spustí binárku pod `ptrace`, nechá ji doběhnout plnou rychlostí na vstup do funkce a do jejího
+    návratu ji každých `interval` sekund zastaví a zaznamená PC a zásobník volání.
+
+    :param binary_file: Cesta k binárnímu souboru (x86-64 Linux).
+    :param args: Argumenty programu (předávají se bez shellu).
+    :param function_name: Vzorkovaná funkce.
+    :param interval: Interval mezi vzorky v sekundách.
+    :param max_depth: Nejvyšší počet rámců jednoho vzorku.
+    :param timeout: Časový limit vzorkování v sekundách, poté se program ukončí (None = bez limitu).
+    :return: Pětice (seznam vzorků – seznamů runtime adres od nejvnitřnějšího rámce, posun zavedení
+             binárky, slovník mapování z `read_process_mappings`, True pokud vzorkování skončilo
+             návratem z funkce, `LIMIT_TIMEOUT` pokud bylo přerušeno časovým limitem, jinak None).
+    """
+    if platform.system() != "Linux" or platform.machine() != "x86_64":
+        raise RuntimeError("Nativní ptrace tracer je podporován jen na x86-64 Linuxu.")
+
+    binary_file = os.path.abspath(binary_file)
+    pid = os.fork()
+    if pid == 0:
+        _exec_child(binary_file, args)
+
+    _, status = os.waitpid(pid, 0)
+    if not os.WIFSTOPPED(status):
+        raise RuntimeError(f"Spuštění `{binary_file}` pod ptrace selhalo (status {status}).")
+    _ptrace(PTRACE_SETOPTIONS, pid, 0, PTRACE_O_TRACEEXIT)
+
+    mappings = read_process_mappings(pid)
+    real_path = os.path.realpath(binary_file)
+    load_bias = 0
+    if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+        load_bias = mappings[real_path][2] or 0
+    binary_range = mappings.get(real_path, (0, 0, None))[:2]
+
+    samples = []
+    static_entry = load_binary_symbols(binary_file).function_address(function_name)
+    if static_entry is None or not _run_to_address(pid, static_entry + load_bias):
+        log_error(f"Funkce `{function_name}` nebyla dosažena.")
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        return samples, load_bias, mappings, False, None
+
+    instructions = load_disassembly(binary_file, "native", persistent=True)
+    entry_sp = _peek(PTRACE_PEEKUSER, pid, RSP_OFFSET)
+    return_address = _peek(PTRACE_PEEKTEXT, pid, entry_sp)
+    original = _insert_breakpoint(pid, return_address)
+    deadline = time.monotonic() + timeout if timeout else None
+    finished = False
+    truncated = None
+    signal_number = 0
+
+    while True:
+        _ptrace(PTRACE_CONT, pid, 0, signal_number)
+        time.sleep(interval)
+        stopped, status = os.waitpid(pid, os.WNOHANG)
+        if not stopped:
+            os.kill(pid, signal.SIGSTOP)
+            _, status = os.waitpid(pid, 0)
+        if not os.WIFSTOPPED(status) or status >> 16 == PTRACE_EVENT_EXIT:
+            break
+
+        signal_number = os.WSTOPSIG(status)
+        pc = _peek(PTRACE_PEEKUSER, pid, RIP_OFFSET)
+        if signal_number == signal.SIGTRAP and pc == return_address + 1:
+            # Návrat z funkce – odpovídající volání, nebo jen vnořené rekurzivní volání
+            signal_number = 0
+            _ptrace(PTRACE_POKETEXT, pid, return_address, original)
+            _ptrace(PTRACE_POKEUSER, pid, RIP_OFFSET, return_address)
+            if _peek(PTRACE_PEEKUSER, pid, RSP_OFFSET) > entry_sp:
+                finished = True
+                break
+            _ptrace(PTRACE_SINGLESTEP, pid, 0, 0)
+            os.waitpid(pid, 0)
+            _insert_breakpoint(pid, return_address)
+            continue
+
+        if signal_number in (signal.SIGSTOP, signal.SIGTRAP):
+            # Zastavení vyvolané vzorkováním (SIGSTOP se programu nedoručí)
+            signal_number = 0
+            samples.append(_unwind_stack(pid, pc, instructions, load_bias, binary_range, max_depth))
+        if deadline is not None and time.monotonic() >= deadline:
+            log_warning(f"Vzorkování přerušeno po {timeout:g} s ({len(samples)} vzorků), program se ukončí.")
+            truncated = LIMIT_TIMEOUT
+            break
+
+    if finished:
+        # Zbytek programu doběhne bez vzorkování
+        mappings = read_process_mappings(pid)
+        while True:
+            try:
+                _ptrace(PTRACE_CONT, pid, 0, signal_number)
+            except OSError:
+                break
+            _, status = os.waitpid(pid, 0)
+            if not os.WIFSTOPPED(status):
+                break
+            signal_number = 0 if os.WSTOPSIG(status) in (signal.SIGTRAP, signal.SIGSTOP) else os.WSTOPSIG(status)
+    else:
+        if os.WIFSTOPPED(status):
+            mappings = read_process_mappings(pid)
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+
+    log_info(f"Zaznamenáno {len(samples)} vzorků zásobníku")
+    return samples, load_bias, mappings, finished, truncated
+
+
+def shared_libraries(mappings, binary_file):
+    """
+    Převede mapování procesu na seznam sdílených knihoven pro `write_trace_from_pcs`.
+
+    :return: Seznam `(začátek, konec, cesta, posun zavedení)`.
+    """
+    real_path = os.path.realpath(binary_file)
+    libraries = []
+    for path, (low, high, base) in mappings.items():
+        if path == real_path or base is None or not os.path.exists(path):
+            continue
+        try:
+            bias = base if ElfFile(path).type == ET_DYN else 0
+        except (OSError, ValueError) as e:
+            log_warning(f"Mapování `{path}` nelze načíst jako ELF: {e}")
+            continue
+        libraries.append((low, high, path, bias))
+    return libraries
@@ -0,0 +1,43 @@
+"""
+Uživatelské oblasti zájmu vyznačené ve zdrojovém kódu (`--capture region`).
+
+Hlavička `core/include/profiler_regions.h` nabízí makra `PROFILER_REGION_BEGIN("jméno")`
+a `PROFILER_REGION_END("jméno")`. Při překladu profilerem (`-DPROFILER_REGIONS`, viz
+`core.engine.compiler.compile_binary`) se přeloží na volání prázdných značkovacích funkcí,
+jinak na nic.
+
+Tracer (GDB skripty `gdb_trace*.py` přes `core/gdb/trace_regions.py`, nativně
+`ptrace_tracer.trace_region_pcs`) nechá program běžet plnou rychlostí k breakpointu na vstupu
+do `REGION_BEGIN_MARKER`, jméno oblasti přečte z prvního argumentu a krokuje jen do vstupu
+do odpovídajícího `REGION_END_MARKER`. Samotné značkovací funkce se nekrokují. Do trace zapíše
+řádky `[REGION] begin <jméno>` a `[REGION] end <jméno>` (viz `core.engine.trace_format`)
+a analýza (`core.engine.trace_analysis.parse_region_trace`) z nich sestaví počty instrukcí
+jednotlivých oblastí.
+
+Modul nemá žádné závislosti mimo standardní knihovnu, aby jej mohly importovat i GDB skripty.
+"""
+
+REGION_BEGIN_MARKER = "profiler_region_begin"
+REGION_END_MARKER = "profiler_region_end"
+REGION_HEADER = "profiler_regions.h"
+
+
+def close_region(open_regions, name):
+    """
+    Odebere ze zásobníku otevřených oblastí poslední oblast se jménem `name`.
+
+    :return: True, pokud byla oblast otevřená (značka konce bez začátku se ignoruje).
+    """
+    for position in range(len(open_regions) - 1, -1, -1):
+        if open_regions[position] == name:
+            del open_regions[position]
+            return True
+    return False
+
+
+def parse_regions_option(argv):
+    """
+    Odebere z argumentů trace příkazu volbu `--regions` a vrátí `(zbylé argumenty, True/False)`.
+    """
+    rest = [arg for arg in argv if arg != "--regions"]
+    return rest, len(rest) != len(argv)
@@ -0,0 +1,221 @@
+import bisect
+import collections
+import json
+import math
+import os
+import re
+from statistics import NormalDist
+from core.engine.disassembly import load_disassembly
+from core.engine.elf_reader import ElfFile, ET_DYN
+from core.engine.pc_trace import find_library_instruction
+from core.engine.ptrace_tracer import shared_libraries
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.trace_analysis import save_json
+from core.engine.trace_limits import LIMIT_TIMEOUT
+from config import SAMPLE_CONFIDENCE
+from config import log_info, log_warning, log_error
+
+"""
+Analýza statistických vzorků zásobníku (`trace-analysis --capture sample`).
+
+Místo krokování každé instrukce program běží plnou rychlostí a tracer (ptrace nebo GDB, viz
+`ptrace_tracer.sample_stacks` a `core/gdb/trace_sample.py`) jej v pravidelných intervalech zastaví
+a zaznamená zásobník volání. Každý vzorek se připíše řádku nejvnitřnějšího rámce cílové funkce:
+je-li cílová funkce na vrcholu zásobníku, jejímu vykonávanému řádku, jinak řádku instrukce volání,
+přes kterou se program dostal do volané funkce – stejně jako se v trace připisují instrukce volaných
+funkcí řádku volání.
+
+Výsledky mají stejný tvar jako výsledky trace, hodnoty jsou ale počty vzorků (úměrné času, ne počtu
+instrukcí). Objekt `"sampling"` ve výstupním JSON k nim doplňuje podíly řádků a funkcí (vlastní
+a včetně volaných funkcí) s intervaly spolehlivosti (Wilsonův interval binomického podílu).
+
+Soubor vzorků je textový: jeden vzorek na řádek, runtime adresy rámců od nejvnitřnějšího oddělené
+mezerou. Vedle něj `<soubor>.json` obsahuje metadata (funkce, interval, mapování procesu, zda
+vzorkování skončilo návratem z funkce, případně důvod přerušení).
+"""
+
+SAMPLE_EXTENSION = ".samples"
+
+
+def samples_path(trace_file):
+    """Vrátí cestu k souboru vzorků odpovídajícímu trace souboru `trace_file`."""
+    return f"{os.path.splitext(trace_file)[0]}{SAMPLE_EXTENSION}"
+
+
+def write_samples(samples, samples_file, metadata):
+    """
+    Zapíše vzorky a jejich metadata (`<samples_file>.json`).
+
+    :param samples: Seznam vzorků – seznamů runtime adres od nejvnitřnějšího rámce.
+    :param metadata: Slovník metadat (funkce, interval, mapování, `complete`, `truncated`).
+    """
+    with open(samples_file, "w") as f:
+        for stack in samples:
+            f.write(" ".join(hex(address) for address in stack) + "\n")
+    with open(f"{samples_file}.json", "w") as f:
+        json.dump(metadata, f)
+
+
+def read_samples(samples_file):
+    """
+    Načte vzorky zapsané `write_samples` nebo GDB skriptem.
+
+    :return: Dvojice (seznam vzorků, slovník metadat).
+    """
+    with open(samples_file, "r") as f:
+        samples = [[int(address, 16) for address in line.split()] for line in f if line.strip()]
+
+    metadata = {}
+    if os.path.exists(f"{samples_file}.json"):
+        with open(f"{samples_file}.json", "r") as f:
+            metadata = json.load(f)
+    return samples, metadata
+
+
+def remove_samples(samples_file):
+    for path in (samples_file, f"{samples_file}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def wilson_interval(k, n, confidence=SAMPLE_CONFIDENCE):
+    """
+    Wilsonův interval spolehlivosti podílu `k / n`.
+
+    :return: Seznam [dolní mez, horní mez] zaokrouhlený na 4 desetinná místa.
+    """
+    if n == 0:
+        return [0.0, 1.0]
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = k / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return [round(max(0.0, center - margin), 4), round(min(1.0, center + margin), 4)]
+
+
+def _share(k, n, confidence):
+    return {"samples": k, "share": round(k / n, 4) if n else 0.0, "ci": wilson_interval(k, n, confidence)}
+
+
+class _FrameResolver:
+    """
+    Převádí runtime adresy rámců na statické adresy binárky a jména funkcí.
+    """
+
+    def __init__(self, binary_file, architecture, mappings):
+        real_path = os.path.realpath(binary_file)
+        self.load_bias = 0
+        if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+            self.load_bias = mappings[real_path][2] or 0
+        self.instructions = load_disassembly(binary_file, architecture, persistent=True)
+        self.architecture = architecture
+        self.libraries = sorted(shared_libraries(mappings, binary_file))
+        self.library_starts = [library[0] for library in self.libraries]
+
+    def binary_function(self, pc):
+        """Vrátí jméno funkce binárky na runtime adrese `pc`, nebo None, pokud adresa do binárky nepatří."""
+        instruction = self.instructions.get(pc - self.load_bias)
+        return instruction.function if instruction else None
+
+    def function(self, pc):
+        """Vrátí jméno funkce (binárky nebo sdílené knihovny) na runtime adrese `pc`."""
+        function = self.binary_function(pc)
+        if function:
+            return function
+        if self.libraries:
+            instruction = find_library_instruction(pc, self.libraries, self.library_starts, self.architecture)
+            if instruction:
+                return instruction.function
+            index = bisect.bisect_right(self.library_starts, pc) - 1
+            if index >= 0 and pc < self.libraries[index][1]:
+                return os.path.basename(self.libraries[index][2])
+        return "???"
+
+
+def analyze_samples(samples_file, binary_file, function_name, output_json, params, architecture="native",
+                    confidence=SAMPLE_CONFIDENCE):
+    """
+    Připíše vzorky zásobníku řádkům cílové funkce a uloží výsledky do JSON souboru.
+
+    :param samples_file: Soubor vzorků (vedle něj `<samples_file>.json` s metadaty).
+    :param binary_file: Cesta k binárnímu souboru.
+    :param function_name: Název analyzované funkce.
+    :param output_json: Cesta k výstupnímu JSON souboru.
+    :param params: Parametry, se kterými byl program spuštěn.
+    :param architecture: Architektura binárky ('native', 'arm', 'riscv').
+    :param confidence: Hladina spolehlivosti intervalů podílů.
+    :return: True, pokud byly výsledky uloženy.
+    """
+    if not os.path.exists(samples_file):
+        log_error(f"Soubor vzorků `{samples_file}` nebyl vytvořen.")
+        return False
+
+    samples, metadata = read_samples(samples_file)
+    mappings = {path: tuple(mapping) for path, mapping in metadata.get("mappings", {}).items()}
+    resolver = _FrameResolver(binary_file, architecture, mappings)
+    symbols = load_binary_symbols(binary_file)
+
+    line_counts = collections.defaultdict(int)
+    self_counts = collections.Counter()
+    inclusive_counts = collections.Counter()
+    outside = 0
+    last_line = None
+
+    for stack in samples:
+        # Nejvnitřnější rámec cílové funkce (při rekurzi patří vnořená volání také cílové funkci)
+        depth = next((i for i, pc in enumerate(stack) if resolver.binary_function(pc) == function_name), None)
+        if depth is None:
+            outside += 1
+            continue
+
+        static_pc = stack[depth] - resolver.load_bias
+        # Návratová adresa ukazuje za instrukci volání, řádek se určí podle instrukce volání
+        line = symbols.source_line(static_pc if depth == 0 else static_pc - 1)
+        if line is None:
+            outside += 1
+            continue
+        line = re.sub(r" \(discriminator \d+\)", "", line)
+        line_counts[line] += 1
+        last_line = line
+
+        functions = [resolver.function(pc) for pc in stack[:depth + 1]]
+        self_counts[functions[0]] += 1
+        inclusive_counts.update(set(functions))
+
+    total = sum(line_counts.values())
+    if not total:
+        log_error(f"Žádný z {len(samples)} vzorků nezasáhl funkci `{function_name}`, výsledky nebyly uloženy "
+                  f"(funkce běžela kratší dobu než interval vzorkování?).")
+        return False
+    if outside:
+        log_warning(f"{outside} z {len(samples)} vzorků se nepodařilo připsat funkci `{function_name}`.")
+
+    sampling = {
+        "method": "timer",
+        "interval": metadata.get("interval"),
+        "samples": total,
+        "samples_outside": outside,
+        "unit": "samples",
+        "confidence": confidence,
+        "lines": {line: _share(count, total, confidence) for line, count in line_counts.items()},
+        "functions": {
+            function: {
+                "self": _share(self_counts[function], total, confidence),
+                "inclusive": _share(inclusive_counts[function], total, confidence),
+            }
+            for function in sorted(inclusive_counts, key=inclusive_counts.get, reverse=True)
+        },
+    }
+
+    truncation = None
+    if metadata.get("truncated"):
+        log_warning(f"Vzorkování bylo přerušeno limitem `{metadata['truncated']}`, výsledky pokrývají jen část volání.")
+        truncation = {"reason": metadata["truncated"], "traced_instructions": None}
+    crash_detected = not metadata.get("complete", True) and metadata.get("truncated") != LIMIT_TIMEOUT
+
+    source_file = next(iter(line_counts)).split(":")[0]
+    save_json(line_counts, crash_detected, last_line if crash_detected else None, output_json, function_name, params,
+              source_file, truncation=truncation, sampling=sampling)
+    log_info(f"Analýza {total} vzorků funkce `{function_name}` dokončena.")
+    return True
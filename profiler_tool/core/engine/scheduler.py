@@ -0,0 +1,195 @@
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import tempfile
+import time
+from config import log_info, log_debug, log_warning, log_error
+
+"""
+Souběžné spouštění trace úloh (jedna úloha = jedna sada parametrů, `generate_trace_and_analyze`).
+
+Každá úloha běží ve vlastním procesu, který:
+    - založí novou session (`os.setsid`), takže k ní patří i všechny jí spuštěné procesy
+      (GDB, QEMU, laděný program),
+    - pracuje ve vlastní dočasné složce (sem GDB zapisuje `gdb_log.txt`),
+    - QEMU si volí vlastní volný port (viz `core.engine.tracer.find_free_port`).
+
+Po skončení úlohy – úspěšném, neúspěšném i po vypršení časového limitu – se ukončí všechny
+zbylé procesy její session, aby po úloze nezůstal viset žádný proces `qemu` ani `gdb`.
+Pracovní složka úspěšné úlohy se smaže, u neúspěšné se ponechá kvůli logům. Úlohy bez zadané
+`work_root` (analýza, nezapisují logy) pracují v dočasné složce systému, která se smaže vždy.
+"""
+
+# Jak často hlavní proces kontroluje časové limity běžících úloh (sekundy)
+_POLL_INTERVAL = 0.5
+
+
+def _process_table():
+    """
+    Vrací dvojice `(pid, pole z /proc/<pid>/stat za jménem procesu)` všech běžících procesů.
+    """
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        yield int(entry), fields
+
+
+def _session_processes(session_id):
+    """
+    Vrátí PID všech procesů v dané session (podle `/proc/<pid>/stat`).
+    """
+    # Pole za jménem procesu: stav, ppid, pgrp, session, ...
+    return [pid for pid, fields in _process_table() if int(fields[3]) == session_id]
+
+
+def kill_process_tree(pid):
+    """
+    Zabije proces `pid` i všechny jeho potomky (např. GDB i s laděným programem, který by
+    po zabití samotného GDB pokračoval v běhu). Potomci se zjistí dříve, než se kterýkoli
+    proces ukončí – osiřelé procesy by jinak adoptoval `init`.
+
+    :return: Počet zabitých procesů.
+    """
+    children = collections.defaultdict(list)
+    for child, fields in _process_table():
+        children[int(fields[1])].append(child)
+
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, ()))
+
+    killed = 0
+    for member in tree:
+        try:
+            os.kill(member, signal.SIGKILL)
+            killed += 1
+        except ProcessLookupError:
+            pass
+    return killed
+
+
+def kill_session(session_id):
+    """
+    Zabije všechny procesy session `session_id` (osiřelé QEMU, GDB a laděné programy úlohy).
+
+    :return: Počet zabitých procesů.
+    """
+    killed = 0
+    for pid in _session_processes(session_id):
+        if pid == os.getpid():
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except ProcessLookupError:
+            pass
+    return killed
+
+
+def _job_entry(connection, function, kwargs, work_dir):
+    """
+    Běží v procesu úlohy: oddělí se do vlastní session a složky a zavolá `function(**kwargs)`.
+    """
+    os.setsid()
+    os.chdir(work_dir)
+    try:
+        connection.send((True, function(**kwargs)))
+    except BaseException as e:
+        connection.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+class _RunningJob:
+    def __init__(self, index, process, connection, work_dir, deadline):
+        self.index = index
+        self.process = process
+        self.connection = connection
+        self.work_dir = work_dir
+        self.deadline = deadline
+
+
+def run_jobs(function, jobs, workers=None, timeout=None, work_root=None):
+    """
+    Spustí `function(**kwargs)` pro každý slovník `kwargs` ze seznamu `jobs`, nejvýše `workers` souběžně.
+
+    :param function: Funkce úlohy (musí být definována na úrovni modulu).
+    :param jobs: Seznam slovníků s argumenty funkce. Cesty v argumentech musí být absolutní,
+                 úloha běží ve vlastní pracovní složce.
+    :param workers: Počet souběžných úloh (výchozí: počet jader).
+    :param timeout: Časový limit jedné úlohy v sekundách (None = bez limitu).
+    :param work_root: Složka, ve které se zakládají pracovní složky úloh; pracovní složky neúspěšných
+                      úloh se v ní ponechají kvůli logům (výchozí: dočasná složka systému, složky se smažou vždy).
+    :return: Seznam výsledků ve stejném pořadí jako `jobs` (None pro neúspěšné úlohy).
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    if work_root:
+        os.makedirs(work_root, exist_ok=True)
+
+    # Fork zachová nastavení z CLI (architektura, úroveň logování) i v procesech úloh
+    context = multiprocessing.get_context("fork")
+    pending = collections.deque(enumerate(jobs))
+    running = []
+    results = [None] * len(jobs)
+    failed = 0
+    started_at = time.monotonic()
+
+    log_info(f"Spouštím {len(jobs)} úloh, nejvýše {workers} souběžně")
+
+    while pending or running:
+        while pending and len(running) < workers:
+            index, kwargs = pending.popleft()
+            work_dir = tempfile.mkdtemp(prefix=f"job{index}_", dir=work_root)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_job_entry, args=(sender, function, kwargs, work_dir), daemon=True)
+            process.start()
+            sender.close()
+            deadline = time.monotonic() + timeout if timeout else None
+            running.append(_RunningJob(index, process, receiver, work_dir, deadline))
+            log_debug(f"Úloha {index} spuštěna (PID {process.pid}, složka `{work_dir}`)")
+
+        multiprocessing.connection.wait([job.connection for job in running], timeout=_POLL_INTERVAL)
+
+        for job in list(running):
+            outcome = None
+            if job.connection.poll():
+                try:
+                    outcome = job.connection.recv()
+                except EOFError:
+                    outcome = (False, f"proces úlohy skončil s kódem {job.process.exitcode}")
+            elif job.deadline is not None and time.monotonic() > job.deadline:
+                outcome = (False, f"vypršel časový limit {timeout} s")
+                job.process.kill()
+            else:
+                continue
+
+            job.process.join()
+            orphans = kill_session(job.process.pid)
+            if orphans:
+                log_debug(f"Úloha {job.index}: ukončeno {orphans} zbylých procesů")
+            job.connection.close()
+            running.remove(job)
+
+            success, value = outcome
+            if success:
+                results[job.index] = value
+            else:
+                failed += 1
+                kept = f" (logy ve složce `{job.work_dir}`)" if work_root else ""
+                log_error(f"Úloha {job.index} selhala: {value}{kept}")
+            if success or not work_root:
+                shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    elapsed = time.monotonic() - started_at
+    if failed:
+        log_warning(f"{failed} z {len(jobs)} úloh selhalo")
+    log_info(f"Dokončeno {len(jobs) - failed} úloh za {elapsed:.1f} s")
+    return results
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from core.engine.elf_reader import ElfFile
+from core.engine.line_index import LineIndex, build_line_index
+from config import SYMBOL_CACHE_DIRNAME
+from config import log_debug, log_warning
+
+"""
+Perzistentní cache symbolů a řádkových informací binárek.
+
+Pro každou binárku se do složky `.symcache` vedle ní uloží JSON s mapou adres na řádky
+zdrojového kódu (`LineIndex`) a mapou funkcí na adresy. Cache je klíčovaná SHA-256 hashem
+obsahu ELF souboru – po přeložení binárky se hash změní a cache se automaticky sestaví znovu.
+Opakované analýzy téže binárky (jiné sady parametrů, analýza celé složky trace logů)
+tak nepotřebují žádné volání externích nástrojů ani opětovné čtení DWARF informací.
+"""
+
+CACHE_VERSION = 1
+
+
+class BinarySymbols:
+    """
+    Symbolové informace jedné binárky: řádkový index a adresy funkcí.
+    """
+
+    def __init__(self, sha256, line_index, functions):
+        self.sha256 = sha256
+        self.line_index = line_index
+        # seznam (jméno, adresa, velikost) seřazený podle adresy
+        self.functions = functions
+        self.function_addresses = {name: address for name, address, _ in functions}
+
+    def function_address(self, function_name):
+        """Vrátí statickou adresu funkce `function_name`, nebo None."""
+        return self.function_addresses.get(function_name)
+
+    def source_line(self, addr):
+        """Vrátí řádek zdrojového kódu pro statickou adresu `addr`, nebo None."""
+        return self.line_index.lookup(addr)
+
+
+def hash_binary(binary_path):
+    """
+    Spočítá SHA-256 hash obsahu binárního souboru.
+    """
+    digest = hashlib.sha256()
+    with open(binary_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_cache_path(binary_path):
+    """
+    Vrátí cestu k souboru cache pro binárku `binary_path` (`<složka binárky>/.symcache/<jméno>.json`).
+    """
+    binary_path = os.path.abspath(binary_path)
+    return os.path.join(os.path.dirname(binary_path), SYMBOL_CACHE_DIRNAME, os.path.basename(binary_path) + ".json")
+
+
+def _load_cache_file(cache_path, sha256):
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, "r") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log_warning(f"Cache symbolů `{cache_path}` nelze načíst: {e}")
+        return None
+
+    if data.get("version") != CACHE_VERSION or data.get("sha256") != sha256:
+        log_debug(f"Cache symbolů `{cache_path}` je zastaralá, bude sestavena znovu.")
+        return None
+
+    functions = [tuple(f) for f in data["functions"]]
+    return BinarySymbols(sha256, LineIndex.from_dict(data["line_index"]), functions)
+
+
+def _save_cache_file(cache_path, binary_path, symbols):
+    data = {
+        "version": CACHE_VERSION,
+        "binary": os.path.abspath(binary_path),
+        "sha256": symbols.sha256,
+        "functions": [list(f) for f in symbols.functions],
+        "line_index": symbols.line_index.to_dict(),
+    }
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, cache_path)
+        log_debug(f"Cache symbolů uložena do `{cache_path}`")
+    except OSError as e:
+        log_warning(f"Cache symbolů `{cache_path}` nelze uložit: {e}")
+
+
+def build_binary_symbols(binary_path, sha256=None):
+    """
+    Sestaví symbolové informace přímo z ELF souboru (bez použití cache).
+    """
+    if sha256 is None:
+        sha256 = hash_binary(binary_path)
+    functions = ElfFile(binary_path).function_symbols()
+    return BinarySymbols(sha256, build_line_index(binary_path), functions)
+
+
+_loaded_symbols = {}
+
+
+def load_binary_symbols(binary_path):
+    """
+    Vrátí symbolové informace binárky – z paměti, z cache na disku, nebo je sestaví
+    z ELF souboru a cache uloží.
+
+    :param binary_path: Cesta k binárnímu souboru.
+    :return: Instance `BinarySymbols`.
+    """
+    key = os.path.abspath(binary_path)
+    stat = os.stat(key)
+    memo = _loaded_symbols.get(key)
+    if memo and memo[0] == (stat.st_mtime_ns, stat.st_size):
+        return memo[1]
+
+    sha256 = hash_binary(key)
+    cache_path = get_cache_path(key)
+    symbols = _load_cache_file(cache_path, sha256)
+    if symbols is None:
+        log_debug(f"Sestavuji cache symbolů pro `{binary_path}`")
+        symbols = build_binary_symbols(key, sha256)
+        _save_cache_file(cache_path, key, symbols)
+
+    _loaded_symbols[key] = ((stat.st_mtime_ns, stat.st_size), symbols)
+    return symbols
@@ -0,0 +1,152 @@
+import os
+import re
+from core.engine.trace_format import BinaryTrace, is_binary_trace, THREAD_PREFIX, TRUNCATED_PREFIX
+from core.engine.trace_format import parse_thread_line
+from config import log_debug
+
+"""
+Trace vícevláknového programu: rozdělení na trace jednotlivých vláken.
+
+Nativní tracery (`gdb_trace.py`, `ptrace_tracer`) krokují všechna vlákna a při každém přepnutí
+zapíší řádek `[THREAD] <číslo>` (viz `core.engine.trace_format`). Zanoření volání se sleduje
+v každém vlákně zvlášť, trace se proto před analýzou rozdělí na samostatné trace vláken
+(`split_thread_trace`) a každý se analyzuje stejně jako trace jednovláknového programu.
+
+Vstupní funkci vlákna (`pthread_create(..., worker, ...)`) volá knihovna nepřímo (`call *%rax`)
+a trace tak neobsahuje instrukci volání s jejím jménem. Nepřímou instrukci volání, po které vlákno
+vstoupí do cílové funkce nebo do své vstupní funkce (první funkce binárky, kterou vlákno vykoná),
+rozdělení přepíše na přímé volání (`call 0x<adresa> <funkce>`), aby analýza v trace vlákna našla
+vstup do funkce, a po návratu z ní zpět do knihovny zapíše značku `[END] <funkce>`. Vlákna vytvořená během sledovaného volání, která cílovou funkci nevykonávají, se tak
+dají analyzovat od své vstupní funkce.
+"""
+
+MAIN_THREAD = 1
+
+_INSTRUCTION = re.compile(r"^(.*?), (0x[0-9a-fA-F]+): (.*)$")
+
+
+def _trace_lines(trace_file):
+    if is_binary_trace(trace_file):
+        with BinaryTrace(trace_file) as trace:
+            for line in trace.text_lines():
+                yield line + "\n"
+        return
+    with open(trace_file, "r", errors="replace") as f:
+        yield from f
+
+
+class _ThreadOutput:
+    """
+    Výstupní trace jednoho vlákna. Nepřímá instrukce volání (s řádkem `[CALL]`) se zadrží,
+    dokud není jasné, zda jí vlákno vstoupilo do cílové nebo vstupní funkce (viz popis modulu).
+    """
+
+    def __init__(self, path, header, function_name, binary_functions):
+        self.path = path
+        self.file = open(path, "w")
+        self.file.writelines(header)
+        self.function_name = function_name
+        self.binary_functions = binary_functions
+        self.routine = None   # vstupní funkce vlákna
+        self.in_binary = False  # vlákno už vykonalo instrukci funkce binárky
+        self.held = []
+        self.held_call = None  # (funkce, adresa) zadržené nepřímé instrukce volání
+        self.entered = None    # (funkce, volající) vstupu přepsaného na přímé volání
+        self.returned = False  # předchozí instrukce byla návratem z funkce `entered`
+
+    def write(self, line):
+        if line.startswith("[CALL] "):
+            self._flush()
+            self.held.append(line)
+            return
+
+        match = _INSTRUCTION.match(line.rstrip("\n"))
+        if match is None:
+            if not line.startswith(TRUNCATED_PREFIX):
+                self._flush()
+            if line.startswith("[END]"):
+                self.entered = None
+            self.file.write(line)
+            return
+
+        function, pc, asm = match.groups()
+        if self.entered is not None:
+            if self.returned and function == self.entered[1]:
+                self.file.write(f"[END] {self.entered[0]}\n")
+                self.entered = None
+            else:
+                self.returned = function == self.entered[0] and asm.startswith("ret")
+        if self.held_call is not None:
+            caller, call_pc = self.held_call
+            entered_routine = not self.in_binary and function in self.binary_functions
+            if function != caller and (function == self.function_name or entered_routine):
+                self.held = [f"[CALL] {caller} -> <{function}>\n", f"{caller}, {call_pc}: call   {pc} <{function}>\n"]
+                self.entered = (function, caller)
+                self.returned = False
+                if entered_routine:
+                    self.routine = function
+            self._flush()
+        elif self.held:
+            if asm.startswith("call") and "*" in asm:
+                self.held.append(line)
+                self.held_call = (function, pc)
+                return
+            self._flush()
+        self.in_binary = self.in_binary or function in self.binary_functions
+        self.file.write(line)
+
+    def _flush(self):
+        self.file.writelines(self.held)
+        self.held = []
+        self.held_call = None
+
+    def close(self):
+        self._flush()
+        self.file.close()
+
+
+def split_thread_trace(trace_file, output_dir, function_name, binary_functions=()):
+    """
+    Rozdělí trace vícevláknového programu na textové trace jednotlivých vláken.
+
+    Značka `[TRUNCATED]` (přerušení limitem) platí pro celý běh, zapíše se do trace všech vláken.
+
+    :param trace_file: Textový nebo binární trace s řádky `[THREAD]`.
+    :param output_dir: Složka pro trace vláken (`thread_<číslo>.log`).
+    :param function_name: Cílová funkce (pro přepis nepřímých volání, viz popis modulu).
+    :param binary_functions: Jména funkcí binárky (pro rozpoznání vstupní funkce vlákna).
+    :return: Slovník číslo vlákna → (cesta k jeho trace, vstupní funkce vlákna nebo None) v pořadí prvního
+             záznamu vlákna (první je vlákno, ve kterém trace začíná – u trace omezeného na funkci
+             vlákno sledovaného volání).
+    """
+    outputs = {}
+    header = []
+    current = MAIN_THREAD
+    truncated_line = None
+
+    def output(number):
+        if number not in outputs:
+            outputs[number] = _ThreadOutput(os.path.join(output_dir, f"thread_{number}.log"), header, function_name,
+                                            binary_functions)
+        return outputs[number]
+
+    try:
+        for line in _trace_lines(trace_file):
+            if line.startswith("TEXT_BASE"):
+                header.append(line)
+            elif line.startswith(THREAD_PREFIX):
+                current = parse_thread_line(line)
+            elif line.startswith(TRUNCATED_PREFIX):
+                truncated_line = line
+            else:
+                output(current).write(line)
+
+        for thread in outputs.values():
+            if truncated_line:
+                thread.write(truncated_line)
+    finally:
+        for thread in outputs.values():
+            thread.close()
+
+    log_debug(f"Trace `{trace_file}` rozdělen na {len(outputs)} vláken")
+    return {number: (thread.path, thread.routine) for number, thread in outputs.items()}
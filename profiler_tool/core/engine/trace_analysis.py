@@ -1,11 +1,26 @@
 import os
 import re
 import collections
-import subprocess
 import json
+import mmap
+import multiprocessing
+import tempfile
+import time
 from config import get_call_instructions_regex, get_return_instructions_regex
 from config import log_info, log_debug, log_warning, log_error
-from config import ACTIVE_ARCHITECTURE
+from config import ACTIVE_ARCHITECTURE, TRACE_SNAPSHOT_INTERVAL, ANALYSIS_JOBS, TRACE_CHUNK_SIZE, TRACE_CALL_GRAPH
+from core.engine.symbol_cache import load_binary_symbols
+from core.engine.disassembly import load_disassembly
+from core.engine.trace_format import BinaryTrace, is_binary_trace, parse_block_line, BLOCK_PREFIX
+from core.engine.trace_format import parse_truncated_line, TRUNCATED_PREFIX, parse_library_line, LIBRARY_PREFIX
+from core.engine.trace_format import RECORD_INSTRUCTION, RECORD_END, RECORD_BLOCK, RECORD_TRUNCATED, RECORD_LIBRARY
+from core.engine.trace_format import RECORD_THREAD, RECORD_REGION, FLAG_CALL, THREAD_PREFIX
+from core.engine.trace_format import REGION_PREFIX, REGION_BEGIN, parse_region_line
+from core.engine.thread_trace import split_thread_trace
+from core.engine.regions import REGION_BEGIN_MARKER, REGION_END_MARKER
+from core.engine.trace_tokenizer import get_tokenizer
+from core.engine.scheduler import run_jobs
+from core.engine.call_graph import CallGraph
 
 """
 Tento skript poskytuje funkce pro analýzu trace souborů, které obsahují instrukce generované během traceování vykonávaných funkcí v binárních souborech.
@@ -16,11 +31,41 @@ Hlavní funkce skriptu:
 - Mapování runtime adresy na statickou adresu a následné mapování na konkrétní řádek zdrojového kódu.
 - Počítání instrukcí v rámci sledovaných funkcí.
 - Ukládání výsledků analýzy do JSON formátu.
+
+Trace přerušený limitem traceru (značka `[TRUNCATED]`, viz `core.engine.trace_limits`) se analyzuje
+do místa přerušení. Výsledek pak obsahuje `"truncated": true` a odhad rychlosti smyčky, ve které
+se program nacházel (`estimate_loop_rate`), ze kterého lze celkový počet instrukcí extrapolovat.
+
+Odhady ceny přejitých volání knihovních funkcí (značka `[LIBRARY]`, viz `core.engine.library_costs`)
+se připíší řádku volání stejně jako instrukce krokovaných volaných funkcí a zároveň se vykážou
+zvlášť jako knihovní část výsledku (`"library"` v JSON).
+
+Trace vícevláknového programu (řádky `[THREAD]`, rozpozná je až průchod trace, viz `parse_program_trace`)
+se rozdělí na trace jednotlivých vláken (`core.engine.thread_trace`), každé vlákno se analyzuje
+samostatně a výsledek obsahuje součet všech vláken i počty jednotlivých vláken (`"threads"` v JSON,
+viz `parse_thread_traces`).
+
+Trace oblastí zájmu (`--capture region`, řádky `[REGION]`, viz `core.engine.regions`) se analyzuje
+po oblastech (`parse_region_trace`); výsledek obsahuje počty instrukcí jednotlivých oblastí
+(`"regions"` v JSON).
+
+Na požádání (`TRACE_CALL_GRAPH`, `trace-analysis --call-graph`) se z téhož trace sestaví i profil volání
+celého programu (`build_call_graph`, viz `core.engine.call_graph`): počty instrukcí a volání každé funkce
+a dvojic volající → volaná (`"call_graph"` v JSON), takže libovolnou funkci lze prohlédnout bez nové
+analýzy. Profil zpracuje každý řádek trace (analýza funkce přeskočí vše mimo sledované volání a velký
+trace čte po úsecích souběžně), sestavuje se proto jen na vyžádání.
+
+Velký textový trace (alespoň dvojnásobek `TRACE_CHUNK_SIZE`) se čte po úsecích souběžně
+(`scan_trace_chunks`); stav průchodu na hranicích úseků (otevřené volání a jeho zanoření) se při
+spojování výsledků navazuje, takže výsledek je stejný jako při postupném čtení.
 """
 
 def get_static_function_address(binary_path, function_name):
     """
-    Získá statickou adresu funkce z binárního souboru pomocí příkazu `nm -n`.
+    Získá statickou adresu funkce ze symbolové tabulky binárního souboru.
+
+    Adresy funkcí se čtou z cache symbolů (viz `core.engine.symbol_cache`), takže opakované
+    analýzy téže binárky nespouštějí `nm`.
 
     :param binary_path: Cesta k binárnímu souboru.
     :param function_name: Název funkce, pro kterou chceme zjistit statickou adresu.
@@ -28,11 +73,7 @@ def get_static_function_address(binary_path, function_name):
     """
 
     try:
-        output = subprocess.run(["nm", "-n", binary_path], capture_output=True, text=True).stdout
-        for line in output.split("\n"):
-            parts = line.split()
-            if len(parts) == 3 and parts[1] == "T" and parts[2] == function_name:
-                return int(parts[0], 16)
+        return load_binary_symbols(binary_path).function_address(function_name)
     except Exception as e:
         log_error(f"Chyba při získávání statické adresy `{function_name}`: {e}")
     return None
@@ -49,6 +90,10 @@ def get_runtime_function_address(trace_file, function_name):
     call_instruction_regex = get_call_instructions_regex()
     log_debug(f"call instructions: {call_instruction_regex}")
     try:
+        if is_binary_trace(trace_file):
+            with BinaryTrace(trace_file) as trace:
+                return _find_runtime_address(trace.asm_texts, call_instruction_regex, function_name)
+
         with open(trace_file, "r") as f:
             for line in f:
                 # Upravíme regulární výraz pro RISC-V: ignorujeme 'ra' a získáme adresu
@@ -75,9 +120,31 @@ def get_runtime_function_address(trace_file, function_name):
         log_error(f"Chyba při čtení souboru: {e}")
     return None
 
+def _find_runtime_address(asm_texts, call_instruction_regex, function_name):
+    """
+    Najde runtime adresu funkce v tabulce textů instrukcí binárního trace
+    (tabulka je seřazená podle prvního výskytu, odpovídá tedy průchodu textovým trace).
+    """
+    if ACTIVE_ARCHITECTURE == "riscv":
+        pattern = re.compile(rf"({call_instruction_regex})\s+(?:[a-zA-Z0-9,]+)?\s*(0x[0-9a-fA-F]+)\s+<{re.escape(function_name)}>")
+    else:
+        pattern = re.compile(rf"({call_instruction_regex})\s+(0x[0-9a-fA-F]+)\s+<{re.escape(function_name)}>")
+
+    for asm in asm_texts:
+        match = pattern.search(asm)
+        if match:
+            runtime_addr = int(match.group(2), 16)
+            log_debug(f"Runtime adresa `{function_name}`: {hex(runtime_addr)}")
+            return runtime_addr
+    return None
+
 def get_source_line(binary_path, addr, runtime_addr_target, static_addr_target):
     """
-    Přepočítá runtime adresu na statickou a mapuje ji na zdrojový kód pomocí příkazu `addr2line`.
+    Přepočítá runtime adresu na statickou a mapuje ji na zdrojový kód.
+
+    Místo spouštění `addr2line` pro každou adresu se použije `LineIndex` sestavený
+    jednou pro celou binárku z její sekce `.debug_line` a uložený v cache symbolů
+    (viz `core.engine.line_index` a `core.engine.symbol_cache`).
 
     :param binary_path: Cesta k binárnímu souboru.
     :param addr: Adresa (v hexadecimálním formátu), kterou chceme přeložit.
@@ -91,14 +158,9 @@ def get_source_line(binary_path, addr, runtime_addr_target, static_addr_target):
         
         offset = runtime_addr_target - static_addr_target
         real_addr = addr - offset
-        result = subprocess.run(["addr2line", "-e", binary_path, hex(real_addr)], stdout=subprocess.PIPE, text=True)
-        line = result.stdout.strip()
-        
-        if "??" in line:
-            return None
-        return line
+        return load_binary_symbols(binary_path).source_line(real_addr)
     except Exception as e:
-        log_error(f"Chyba addr2line: {e}")
+        log_error(f"Chyba při mapování adresy na řádek: {e}")
     return None
 
 def normalize_discriminators(source_line_counts):
@@ -123,125 +185,1212 @@ def count_function_instructions(file, called_function, original_function):
     :param file: Otevřený soubor trace logu.
     :param called_function: Název právě volané funkce.
     :param original_function: Název původní funkce, do které se má počítání instrukcí vrátit.
-    :return: Počet instrukcí vykonaných mezi voláním `called_function` a návratem do `original_function`.
+    :return: Počet instrukcí vykonaných mezi voláním `called_function` a návratem do `original_function`
+             (bez odhadů přejitých knihovních volání), součet těchto odhadů a řádek, na kterém počítání skončilo.
+    """
+    lines = iter(file)
+    scanner = TraceScanner(get_tokenizer(ACTIVE_ARCHITECTURE), original_function)
+    instruction_count, library_count, _, last_line = scanner.count_callee(lambda: next(lines, ""), called_function)
+    if last_line is None:
+        log_warning(f"[WARNING] Funkce `{original_function}` se při zanoření do jiné funkce nevrátila, vracíme {instruction_count} instrukcí")
+    return instruction_count, library_count, last_line
+
+
+# Druhy řádků pro `TraceScanner._classify_callee_line`
+_CALLEE_SKIP, _CALLEE_INSTRUCTION, _CALLEE_TARGET, _CALLEE_TARGET_RETURN = range(4)
+
+# Řádek, který není instrukcí, a instrukce funkce `main` pro `TraceScanner._classify_target_line`
+_NOT_INSTRUCTION = False
+_MAIN_INSTRUCTION = (None, None)
+
+# Zástupná adresa pro poslední instrukci cílové funkce z předchozího úseku trace (`scan_trace_chunk`)
+_CARRIED_PC = -1
+
+
+class TraceScanner:
+    """
+    Jeden průchod textovým trace: histogram vykonaných adres cílové funkce, instrukce volaných funkcí
+    připsané adrese instrukce volání a odhady přejitých knihovních volání (viz `parse_trace`).
+
+    Řádky se rozpoznávají předkompilovanými vzory `TraceTokenizer` (řádky `str` i `bytes`). Řádek
+    instrukce má pro danou adresu vždy stejný text, výsledek jeho rozpoznání se proto uloží do slovníku
+    podle textu řádku a regulární výrazy se vyhodnotí jen jednou pro každou vykonanou adresu.
+    Počty jsou atributy objektu, takže je lze číst i během průchodu (průběžné výsledky `parse_text_trace`).
+
+    Stav průchodu (před vstupem do cílové funkce, v cílové funkci, uvnitř volání `open_call`, ukončeno
+    `stopped`) se mezi voláními `scan` zachovává, trace lze tedy číst i po navazujících úsecích
+    (souběžné zpracování úseků viz `scan_trace_chunk` a `merge`).
+
+    Při `detect_records` průchod skončí na prvním řádku `[BLOCK]` nebo `[THREAD]` (jeho prefix je pak
+    v `found_record`): trace s bloky nebo přepnutím vláken se musí číst jinak (viz `parse_trace`).
+    Řádky se rozpoznávají ve větvi pro značky (`[`), trace se kvůli nim nemusí předem prohledávat.
+    """
+
+    def __init__(self, tokenizer, function_name, runtime_addr_target=None, detect_records=False):
+        self.tokenizer = tokenizer
+        self.function_name = function_name
+        self.runtime_addr_target = runtime_addr_target
+        self.pc_counts = collections.defaultdict(int)
+        self.callee_counts = collections.defaultdict(int)
+        self.library_counts = collections.defaultdict(int)
+        self.inside_target_function = False
+        self.last_pc = None
+        self.truncated = None
+        self.stopped = False
+        self.found_record = None
+        # Volání neukončené na konci přečteného vstupu: (adresa instrukce volání, úroveň zanoření, volaná funkce)
+        self.open_call = None
+        # Počet řádků, které na začátku posledního `scan` dočetlo neukončené volání
+        self.resumed_lines = 0
+        self.lines = 0
+        self.seconds = 0.0
+        self._end_depth = 0
+
+        self._function = tokenizer.encode(function_name)
+        self._function_prefix = tokenizer.encode(f"{function_name},")
+        self._marker_prefix = tokenizer.encode("[")
+        self._block_prefix = tokenizer.encode(BLOCK_PREFIX)
+        self._record_prefixes = (self._block_prefix, tokenizer.encode(THREAD_PREFIX)) if detect_records else ()
+        self._call_tag = tokenizer.encode("<")
+        self._target_lines = {}
+        self._callee_lines = {}
+
+    def _classify_target_line(self, line):
+        """
+        Rozpozná řádek uvnitř cílové funkce: `_NOT_INSTRUCTION`, `_MAIN_INSTRUCTION`,
+        nebo dvojice (adresa, volaná funkce nebo None).
+        """
+        match = self.tokenizer.instruction.match(line)
+        if not match:
+            return _NOT_INSTRUCTION
+        if line.startswith(self.tokenizer.main_prefix):
+            return _MAIN_INSTRUCTION
+        call = self.tokenizer.call.match(line) if self._call_tag in line else None
+        return int(match.group(2), 16), call.group(3) if call else None
+
+    def _classify_callee_line(self, line):
+        """
+        Rozpozná řádek (mimo značky) uvnitř volané funkce, viz `_CALLEE_*`.
+        """
+        if line.startswith(self._function_prefix):
+            return _CALLEE_TARGET_RETURN if self.tokenizer.returns.search(line) else _CALLEE_TARGET
+        return _CALLEE_INSTRUCTION if self.tokenizer.instruction.match(line) else _CALLEE_SKIP
+
+    def _found_record(self, line):
+        """
+        Ukončí průchod na řádku `[BLOCK]` nebo `[THREAD]` (viz `detect_records`).
+        """
+        self.found_record = BLOCK_PREFIX if line.startswith(self._block_prefix) else THREAD_PREFIX
+        self.stopped = True
+
+    def _count_call(self, readline, call_pc, called_function, recursion_depth=None):
+        """
+        Připíše instrukce volání adrese `call_pc` (viz `count_callee`).
+
+        :return: Řádek, na kterém počítání skončilo; na konci vstupu prázdný řádek (volání zůstane v `open_call`).
+        """
+        call_instruction_count, library_count, lines, last_read_line = self.count_callee(
+            readline, called_function, recursion_depth)
+        self.lines += lines
+        self.callee_counts[call_pc] += call_instruction_count + library_count
+        if library_count:
+            self.library_counts[call_pc] += library_count
+        if last_read_line:
+            return last_read_line
+        self.open_call = (call_pc, self._end_depth, called_function)
+        return self.tokenizer.empty
+
+    def scan(self, readline):
+        """
+        Přečte trace funkcí `readline` (prázdný řádek = konec) až do návratu ze sledovaného volání,
+        přerušení trace nebo konce vstupu.
+        """
+        if self.stopped:
+            return
+        started = time.perf_counter()
+        tokenizer = self.tokenizer
+        enter_regex = tokenizer.enter(self.function_name, self.runtime_addr_target)
+        enter_tag = tokenizer.encode(f"<{self.function_name}>")
+        marker_prefix = self._marker_prefix
+        record_prefixes = self._record_prefixes
+        truncated_prefix = tokenizer.truncated_prefix
+        library_prefix = tokenizer.library_prefix
+        end_prefix = tokenizer.end_prefix
+        classify = self._classify_target_line
+        target_lines = self._target_lines
+        pc_counts = self.pc_counts
+        callee_counts = self.callee_counts
+        library_counts = self.library_counts
+        inside_target_function = self.inside_target_function
+        last_pc = self.last_pc
+        lines = 0
+
+        # Dokončení volání, které bylo otevřené na konci předchozího úseku trace
+        self.resumed_lines = 0
+        if self.open_call is not None:
+            call_pc, recursion_depth, called_function = self.open_call
+            self.open_call = None
+            resumed_from = self.lines
+            line = self._count_call(readline, call_pc, called_function, recursion_depth)
+            self.resumed_lines = self.lines - resumed_from
+        else:
+            line = readline()
+
+        while line:
+            lines += 1
+
+            if not inside_target_function:
+                if line.startswith(marker_prefix):
+                    # Tracer byl přerušen limitem, dál trace nepokračuje
+                    if line.startswith(truncated_prefix):
+                        self.truncated = parse_truncated_line(tokenizer.decode(line))
+                        self.stopped = True
+                        break
+                    if line.startswith(record_prefixes):
+                        self._found_record(line)
+                        break
+
+                enter_match = enter_regex.search(line) if enter_tag in line else None
+                if enter_match:
+                    inside_target_function = True
+                    if self.runtime_addr_target is None:
+                        self.runtime_addr_target = int(enter_match.group(2), 16)
+                        log_debug(f"Runtime adresa `{self.function_name}`: {hex(self.runtime_addr_target)}")
+                line = readline()
+                continue
+
+            if line.startswith(marker_prefix):
+                if line.startswith(truncated_prefix):
+                    self.truncated = parse_truncated_line(tokenizer.decode(line))
+                    inside_target_function = False
+                    self.stopped = True
+                    break
+                if line.startswith(record_prefixes):
+                    self._found_record(line)
+                    break
+
+                # Konec sledovaného volání při trace omezeném na cílovou funkci
+                if line.startswith(end_prefix):
+                    inside_target_function = False
+                    self.stopped = True
+                    break
+
+                # Přejité volání knihovní funkce přímo z cílové funkce
+                if line.startswith(library_prefix) and last_pc is not None:
+                    library_count = parse_library_line(tokenizer.decode(line))[1]
+                    callee_counts[last_pc] += library_count
+                    library_counts[last_pc] += library_count
+                line = readline()
+                continue
+
+            instruction = target_lines.get(line)
+            if instruction is None:
+                instruction = target_lines[line] = classify(line)
+            if instruction is _NOT_INSTRUCTION:
+                line = readline()
+                continue
+            if instruction is _MAIN_INSTRUCTION:
+                inside_target_function = False
+                self.stopped = True
+                break
+
+            last_pc, called_function = instruction
+            pc_counts[last_pc] += 1
+
+            # Volání funkcí uvnitř testované funkce
+            if called_function is not None:
+                line = self._count_call(readline, last_pc, called_function)
+                continue
+
+            line = readline()
+
+        self.inside_target_function = inside_target_function
+        self.last_pc = last_pc
+        self.lines += lines
+        self.seconds += time.perf_counter() - started
+
+    def count_callee(self, readline, called_function, recursion_depth=None):
+        """
+        Počítá instrukce volané funkce až do návratu zpět do cílové funkce, sleduje zanoření funkcí
+        (viz `count_function_instructions`).
+
+        :param recursion_depth: Počáteční úroveň zanoření cílové funkce (výchozí: 1 při rekurzivním
+                                volání cílové funkce, jinak 0).
+        :return: Počet instrukcí, součet odhadů přejitých knihovních volání, počet přečtených řádků
+                 (bez řádku návratu) a řádek, na kterém počítání skončilo: návrat, přerušení trace,
+                 řádek `[BLOCK]`/`[THREAD]` při `detect_records`, nebo None na konci vstupu (úroveň
+                 zanoření je pak v `_end_depth`).
+        """
+        tokenizer = self.tokenizer
+        marker_prefix = self._marker_prefix
+        record_prefixes = self._record_prefixes
+        truncated_prefix = tokenizer.truncated_prefix
+        library_prefix = tokenizer.library_prefix
+        call_prefix = tokenizer.call_prefix
+        call_marker_match = tokenizer.call_marker.match
+        classify = self._classify_callee_line
+        callee_lines = self._callee_lines
+        function = self._function
+        instruction_count = 0
+        library_count = 0
+        lines = 0
+        if recursion_depth is None:
+            recursion_depth = 1 if called_function == function else 0
+
+        line = readline()
+        while line:
+            if line.startswith(marker_prefix):
+                if line.startswith(truncated_prefix):
+                    called_name = tokenizer.decode(called_function) if called_function is not None else "?"
+                    log_warning(f"Trace byl přerušen uvnitř `{called_name}`, vracíme {instruction_count} instrukcí")
+                    return instruction_count, library_count, lines, line
+                # Řádek `[BLOCK]` nebo `[THREAD]` ukončí průchod v `scan`
+                if line.startswith(record_prefixes):
+                    return instruction_count, library_count, lines, line
+                if line.startswith(library_prefix):
+                    library_count += parse_library_line(tokenizer.decode(line))[1]
+                elif line.startswith(call_prefix):
+                    marker_match = call_marker_match(line)
+                    if marker_match and marker_match.group(2) == function:
+                        recursion_depth += 1
+            else:
+                kind = callee_lines.get(line)
+                if kind is None:
+                    kind = callee_lines[line] = classify(line)
+                if kind == _CALLEE_INSTRUCTION:
+                    instruction_count += 1
+                elif kind != _CALLEE_SKIP:
+                    # Návrat do cílové funkce (při rekurzi až z nejvyšší úrovně zanoření)
+                    if recursion_depth == 0:
+                        return instruction_count, library_count, lines, line
+                    if kind == _CALLEE_TARGET_RETURN:
+                        recursion_depth -= 1
+                        if recursion_depth == 0:
+                            return instruction_count, library_count, lines, line
+                    instruction_count += 1
+
+            lines += 1
+            line = readline()
+
+        self._end_depth = recursion_depth
+        return instruction_count, library_count, lines, None
+
+    def accepts(self, chunk):
+        """
+        True, pokud výsledek `scan_trace_chunk` navazuje na dosavadní stav průchodu: úsek byl zpracován
+        za předpokladu, že začíná uvnitř volání z cílové funkce bez zanoření (nebo přímo instrukcí
+        cílové funkce, pokud volání otevřené není).
+        """
+        if self.stopped:
+            return True
+        if not self.inside_target_function:
+            return False
+        if self.open_call is not None:
+            return self.open_call[1] == 0
+        return chunk["resumed_lines"] == 0
+
+    def merge(self, chunk):
+        """
+        Připojí k dosavadním počtům výsledek `scan_trace_chunk` pro následující úsek trace
+        (jen pokud jej `accepts` přijme). Počty zástupné adresy `_CARRIED_PC` patří poslední
+        instrukci cílové funkce z předchozích úseků.
+        """
+        if self.stopped:
+            return
+        carried_pc = self.open_call[0] if self.open_call is not None else self.last_pc
+        for pc, count in chunk["pc_counts"].items():
+            self.pc_counts[pc] += count
+        for target, counts in ((self.callee_counts, chunk["callee_counts"]), (self.library_counts, chunk["library_counts"])):
+            for pc, count in counts.items():
+                if pc == _CARRIED_PC:
+                    if carried_pc is None:
+                        continue
+                    pc = carried_pc
+                target[pc] += count
+
+        if chunk["last_pc"] != _CARRIED_PC:
+            self.last_pc = chunk["last_pc"]
+        self.open_call = chunk["open_call"]
+        if self.open_call is not None and self.open_call[0] == _CARRIED_PC:
+            self.open_call = (carried_pc,) + self.open_call[1:]
+        if self.runtime_addr_target is None:
+            self.runtime_addr_target = chunk["runtime_addr_target"]
+        self.inside_target_function = chunk["inside_target_function"]
+        self.truncated = chunk["truncated"]
+        self.found_record = chunk["found_record"]
+        self.stopped = chunk["stopped"]
+        self.lines += chunk["lines"]
+
+    def state(self):
+        """
+        Počty a stav průchodu pro `merge` (výsledek úlohy `scan_trace_chunk`).
+        """
+        return dict(pc_counts=dict(self.pc_counts), callee_counts=dict(self.callee_counts),
+                    library_counts=dict(self.library_counts), last_pc=self.last_pc, open_call=self.open_call,
+                    runtime_addr_target=self.runtime_addr_target, inside_target_function=self.inside_target_function,
+                    truncated=self.truncated, found_record=self.found_record, stopped=self.stopped,
+                    resumed_lines=self.resumed_lines, lines=self.lines)
+
+    def result(self, binary_file, static_addr_target):
+        """
+        Převede počty na řádky zdrojového kódu, viz `parse_trace`.
+
+        :return: Stejně jako `parse_trace`.
+        """
+        if self.open_call is not None:
+            log_warning(f"[WARNING] Funkce `{self.function_name}` se při zanoření do jiné funkce nevrátila, "
+                        f"trace končí uvnitř volání z adresy {hex(self.open_call[0])}")
+        if self.seconds > 0:
+            log_info(f"Zpracováno {self.lines} řádků trace za {self.seconds:.2f} s "
+                     f"({self.lines / self.seconds:.0f} řádků/s)")
+        return _trace_result(self.pc_counts, self.callee_counts, self.library_counts, self.last_pc,
+                             self.inside_target_function, self.truncated, binary_file, self.runtime_addr_target,
+                             static_addr_target, self.function_name)
+
+
+def _map_trace_range(trace_file, start, end):
+    """
+    Namapuje do paměti úsek `[start, end)` otevřeného trace; vrácený objekt je nastavený na `start`
+    a jeho `readline()` končí na `end`.
+    """
+    offset = start - start % mmap.ALLOCATIONGRANULARITY
+    data = mmap.mmap(trace_file.fileno(), end - offset, access=mmap.ACCESS_READ, offset=offset)
+    data.seek(start - offset)
+    return data
+
+
+def _trace_chunks(data, count):
+    """
+    Rozdělí namapovaný trace na `count` přibližně stejných úseků `(začátek, konec)` na hranicích řádků.
+    """
+    size = len(data)
+    bounds = [0]
+    for index in range(1, count):
+        newline = data.find(b"\n", max(size * index // count, bounds[-1]))
+        if newline == -1 or newline + 1 >= size:
+            break
+        bounds.append(newline + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_trace_chunk(file_path, start, end, function_name, runtime_addr_target=None, first=False):
+    """
+    Zpracuje úsek `[start, end)` textového trace (úloha souběžné analýzy, viz `parse_trace`).
+
+    Úsek `first` se čte od začátku trace. Ostatní úseky se čtou za předpokladu, že začínají uvnitř
+    volání z cílové funkce bez zanoření (nejčastější případ, řádky cílové funkce jsou v trace řídké);
+    instrukce volání a poslední instrukce cílové funkce z předchozích úseků ještě nejsou známé, počty
+    se proto připisují zástupné adrese `_CARRIED_PC`. Pokud předpoklad neplatí (`TraceScanner.accepts`),
+    úsek se znovu přečte postupně. Čtení úseku skončí i na řádku `[BLOCK]` nebo `[THREAD]` (`detect_records`).
+
+    :return: `TraceScanner.state()` po přečtení úseku.
+    """
+    scanner = TraceScanner(get_tokenizer(ACTIVE_ARCHITECTURE, binary=True), function_name, runtime_addr_target,
+                           detect_records=True)
+    if not first:
+        scanner.inside_target_function = True
+        scanner.last_pc = _CARRIED_PC
+        scanner.open_call = (_CARRIED_PC, 0, None)
+
+    with open(file_path, "rb") as trace_file:
+        data = _map_trace_range(trace_file, start, end)
+        try:
+            scanner.scan(data.readline)
+        finally:
+            data.close()
+    return scanner.state()
+
+
+def _chunk_jobs(jobs):
+    """
+    Počet procesů pro souběžné čtení úseků trace. Proces úlohy `run_jobs` je démon a nesmí vytvářet
+    další procesy, trace se v něm proto čte postupně (souběh zajišťuje rozdělení úloh).
+    """
+    if multiprocessing.current_process().daemon:
+        return 1
+    return jobs or os.cpu_count() or 1
+
+
+def scan_trace_chunks(scanner, file_path, data, jobs):
+    """
+    Přečte namapovaný textový trace po úsecích souběžně v `jobs` procesech (`scan_trace_chunk`)
+    a výsledky úseků postupně připojí ke `scanner` (`TraceScanner.merge`). Úsek, jehož předpoklad
+    o počátečním stavu neplatí (nebo jehož úloha selhala), se přečte znovu v hlavním procesu
+    navázáním na stav předchozích úseků, výsledek je tedy stejný jako při postupném čtení.
+    """
+    started = time.monotonic()
+    chunks = _trace_chunks(data, max(jobs, len(data) // TRACE_CHUNK_SIZE))
+    job_args = [dict(file_path=os.path.abspath(file_path), start=start, end=end, function_name=scanner.function_name,
+                     runtime_addr_target=scanner.runtime_addr_target, first=index == 0)
+                for index, (start, end) in enumerate(chunks)]
+    log_info(f"Trace `{file_path}` rozdělen na {len(chunks)} úseků")
+    results = run_jobs(scan_trace_chunk, job_args, jobs)
+
+    rescanned = 0
+    for index, ((start, end), chunk) in enumerate(zip(chunks, results)):
+        if scanner.stopped:
+            break
+        if chunk is not None and (index == 0 or scanner.accepts(chunk)):
+            scanner.merge(chunk)
+            continue
+        rescanned += 1
+        data.seek(start)
+        scanner.scan(lambda: data.readline() if data.tell() < end else b"")
+
+    if rescanned:
+        log_debug(f"{rescanned} z {len(chunks)} úseků trace přečteno znovu postupně")
+    scanner.seconds = time.monotonic() - started
+
+
+def _trace_result(pc_counts, callee_counts, library_counts, last_pc, inside_target_function, truncated, binary_file,
+                  runtime_addr_target, static_addr_target, function_name):
+    """
+    Společný závěr `parse_text_trace` a `parse_binary_trace`: symbolizace počtů, detekce havárie
+    (trace skončil uvnitř sledovaného volání) a popis přerušení trace limitem.
     """
+    source_line_counts = fold_pc_counts(pc_counts, callee_counts, binary_file, runtime_addr_target, static_addr_target)
+    source_line_counts = normalize_discriminators(source_line_counts)
+
+    last_executed_line = None
+    if last_pc is not None:
+        last_executed_line = get_source_line(binary_file, last_pc, runtime_addr_target, static_addr_target)
+
+    crash_detected = False
+    if inside_target_function:
+        crash_detected = True
+        log_warning(f"Detekováno náhlé ukončení programu! Poslední řádek: `{last_executed_line}`")
+
+    truncation = None
+    if truncated:
+        truncation = describe_truncation(*truncated, pc_counts, callee_counts, binary_file, runtime_addr_target,
+                                         static_addr_target)
+
+    library_line_counts = {}
+    if library_counts:
+        library_line_counts = normalize_discriminators(
+            fold_pc_counts(library_counts, {}, binary_file, runtime_addr_target, static_addr_target))
+
+    log_info(f"Celkem instrukcí ve `{function_name}`: {sum(source_line_counts.values())}")
+    return source_line_counts, crash_detected, last_executed_line, truncation, library_line_counts
+
+
+class BlockExpandingReader:
+    """
+    Obal otevřeného textového trace, který řádky `[BLOCK] <adresa> <počet>` (krokování po
+    základních blocích) nahrazuje řádky jednotlivých instrukcí bloku ze statické disassemblace.
+    Podporuje `readline()` i iteraci, takže jej lze předat `count_function_instructions`.
+    """
+
+    def __init__(self, file, binary_file, architecture=ACTIVE_ARCHITECTURE):
+        self.file = file
+        self.binary_file = binary_file
+        self.architecture = architecture
+        self.instructions = None
+        self.pending = collections.deque()
+
+    def expand(self, line):
+        """
+        Vrátí řádky instrukcí bloku `[BLOCK] <adresa> <počet>` (disassemblace se načte při prvním bloku).
+        """
+        if self.instructions is None:
+            self.instructions = load_disassembly(self.binary_file, self.architecture, persistent=True)
+
+        lines = []
+        pc, count = parse_block_line(line)
+        for _ in range(count):
+            instruction = self.instructions.get(pc)
+            if instruction is None:
+                log_warning(f"Adresa {hex(pc)} bloku není ve statické disassemblaci, blok je zkrácen.")
+                break
+            lines.append(f"{instruction.function}, {hex(pc)}: {instruction.asm}\n")
+            pc += instruction.length
+        return lines
+
+    def readline(self):
+        while not self.pending:
+            line = self.file.readline()
+            if not line.startswith(BLOCK_PREFIX):
+                return line
+            self.pending.extend(self.expand(line))
+        return self.pending.popleft()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+class PeriodicReader:
+    """
+    Obal otevřeného textového trace, který během čtení nejvýše jednou za `interval` sekund zavolá
+    `callback()` (průběžné výsledky při analýze trace čteného z roury, viz `analyze_trace_stream`).
+    """
+
+    # Čas se kontroluje jen jednou za tolik řádků
+    CHECK_EVERY = 1024
+
+    def __init__(self, file, callback, interval):
+        self.file = file
+        self.callback = callback
+        self.interval = interval
+        self.lines = 0
+        self.next_call = time.monotonic() + interval
+
+    def readline(self):
+        self.lines += 1
+        if self.lines % self.CHECK_EVERY == 0 and time.monotonic() >= self.next_call:
+            self.callback()
+            self.next_call = time.monotonic() + self.interval
+        return self.file.readline()
+
+
+def _expand_block_records(records, block_instructions):
+    """
+    Nahradí záznamy `RECORD_BLOCK` binárního trace záznamy jednotlivých instrukcí bloku.
+
+    :param records: Iterátor záznamů (`BinaryTrace.records()`).
+    :param block_instructions: Statická adresa → (id funkce, id textu instrukce, délka instrukce).
+    """
+    try:
+        for record in records:
+            if record[0] != RECORD_BLOCK:
+                yield record
+                continue
+
+            pc = record[1]
+            for _ in range(record[4]):
+                entry = block_instructions.get(pc)
+                if entry is None:
+                    log_warning(f"Adresa {hex(pc)} bloku není ve statické disassemblaci, blok je zkrácen.")
+                    break
+                yield RECORD_INSTRUCTION, pc, entry[0], 0, entry[1]
+                pc += entry[2]
+    finally:
+        records.close()
+
+
+def _intern_block_instructions(trace, binary_file):
+    """
+    Doplní do tabulek binárního trace jména funkcí a texty instrukcí ze statické disassemblace
+    a vrátí slovník pro `_expand_block_records`.
+    """
+    instructions = load_disassembly(binary_file, trace.architecture, persistent=True)
+    function_ids = {name: index for index, name in enumerate(trace.functions)}
+    asm_ids = {asm: index for index, asm in enumerate(trace.asm_texts)}
+
+    block_instructions = {}
+    for pc, instruction in instructions.items():
+        function_id = function_ids.get(instruction.function)
+        if function_id is None:
+            function_id = function_ids[instruction.function] = len(trace.functions)
+            trace.functions.append(instruction.function)
+        asm_id = asm_ids.get(instruction.asm)
+        if asm_id is None:
+            asm_id = asm_ids[instruction.asm] = len(trace.asm_texts)
+            trace.asm_texts.append(instruction.asm)
+        block_instructions[pc] = (function_id, asm_id, instruction.length)
+    return block_instructions
+
+
+class _LineIteratorReader:
+    """
+    Obal iterátoru řádků s metodou `readline()` (řádky binárního trace pro `BlockExpandingReader`).
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def readline(self):
+        line = next(self.lines, None)
+        return f"{line}\n" if line is not None else ""
+
+
+def fold_pc_counts(pc_counts, callee_counts, binary_file, runtime_addr_target, static_addr_target):
+    """
+    Převede histogram vykonaných adres na počty instrukcí pro jednotlivé řádky zdrojového kódu.
+
+    Každá unikátní adresa se na řádek mapuje jen jednou, cena symbolizace tedy závisí
+    na velikosti kódu, ne na délce trace.
+
+    :param pc_counts: Počet vykonání pro každou runtime adresu (int → int).
+    :param callee_counts: Počet instrukcí volaných funkcí připsaný adrese instrukce volání (int → int).
+    :param binary_file: Cesta k binárnímu souboru.
+    :param runtime_addr_target: Runtime adresa cílové funkce.
+    :param static_addr_target: Statická adresa cílové funkce.
+    :return: Slovník počtů instrukcí pro jednotlivé řádky.
+    """
+    source_line_counts = collections.defaultdict(int)
+
+    for pc in set(pc_counts) | set(callee_counts):
+        source_line = get_source_line(binary_file, pc, runtime_addr_target, static_addr_target)
+        if source_line:
+            source_line_counts[source_line] += pc_counts.get(pc, 0) + callee_counts.get(pc, 0)
+
+    log_debug(f"Symbolizováno {len(pc_counts)} unikátních adres")
+    return source_line_counts
+
+
+def estimate_loop_rate(pc_counts, callee_counts, binary_file, runtime_addr_target, static_addr_target):
+    """
+    Odhadne rychlost smyčky (nebo rekurze), ve které byl trace přerušen. Nejčastěji vykonaná adresa
+    cílové funkce se považuje za hlavičku smyčky a její počet vykonání za počet proběhlých iterací;
+    průměrná cena iterace je pak podíl všech dosud vykonaných instrukcí a počtu iterací.
+
+    :return: Slovník s klíči `loop_line`, `iterations_observed` a `instructions_per_iteration`,
+             nebo None, pokud trace neobsahuje opakovaně vykonaný kód.
+    """
+    if not pc_counts:
+        return None
+    loop_pc = max(pc_counts, key=pc_counts.get)
+    iterations = pc_counts[loop_pc]
+    if iterations < 2:
+        return None
+
+    total_instructions = sum(pc_counts.values()) + sum(callee_counts.values())
+    loop_line = get_source_line(binary_file, loop_pc, runtime_addr_target, static_addr_target)
+    return {
+        "loop_line": re.sub(r" \(discriminator \d+\)", "", loop_line) if loop_line else None,
+        "iterations_observed": iterations,
+        "instructions_per_iteration": round(total_instructions / iterations, 2),
+    }
+
+
+def describe_truncation(reason, traced_instructions, pc_counts, callee_counts, binary_file, runtime_addr_target,
+                        static_addr_target):
+    """
+    Sestaví popis přerušení trace limitem pro `save_json`.
+
+    :param reason: Důvod přerušení ze značky `[TRUNCATED]` ("budget", "timeout").
+    :param traced_instructions: Počet instrukcí zaznamenaných tracerem (None, pokud není znám).
+    :return: Slovník s důvodem, počtem zaznamenaných instrukcí a odhadem z `estimate_loop_rate`.
+    """
+    log_warning(f"Trace byl přerušen limitem `{reason}`, výsledky obsahují jen instrukce do místa přerušení.")
+    truncation = {"reason": reason, "traced_instructions": traced_instructions}
+    loop_rate = estimate_loop_rate(pc_counts, callee_counts, binary_file, runtime_addr_target, static_addr_target)
+    if loop_rate:
+        truncation.update(loop_rate)
+    return truncation
+
+
+def parse_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name, jobs=ANALYSIS_JOBS):
+    """
+    Analyzuje trace log soubor a extrahuje instrukce pro funkci `function_name`.
+
+    Analýza probíhá ve dvou fázích: nejprve se při průchodu trace sestaví histogram vykonaných
+    adres (instrukce volaných funkcí se připíší adrese instrukce volání), teprve poté se
+    unikátní adresy namapují na řádky zdrojového kódu (viz `fold_pc_counts`).
+
+    Trace se čte jen jednou (`TraceScanner`). Textový trace se čte z mapované paměti a jeho řádky se
+    nedekódují. Řádky `[BLOCK]` a `[THREAD]` se nehledají předem, rozpozná je až průchod (skončí na prvním
+    z nich): trace s bloky se od začátku přečte znovu po řádcích přes `BlockExpandingReader`, trace
+    s přepnutím vláken se analyzuje po vláknech (`parse_program_trace`).
+
+    :param file_path: Cesta k trace log souboru.
+    :param runtime_addr_target: Runtime adresa cílové funkce (None = zjistí se z první instrukce jejího volání).
+    :param static_addr_target: Statická adresa cílové funkce.
+    :param binary_file: Cesta k binárnímu souboru.
+    :param function_name: Název analyzované funkce.
+    :param jobs: Počet procesů pro souběžné čtení textového trace většího než dvojnásobek `TRACE_CHUNK_SIZE`
+                 (None = počet jader, viz `scan_trace_chunks`); v procesu úlohy `run_jobs` se trace čte vždy postupně.
+    :return: Slovník počtů instrukcí pro jednotlivé řádky, informaci o detekované havárii, poslední vykonaný řádek,
+             popis přerušení trace limitem (`describe_truncation`, None pro úplný trace) a slovník odhadů
+             ceny přejitých knihovních volání pro jednotlivé řádky (už započtených v prvním slovníku);
+             None, pokud trace obsahuje přepnutí vláken (`[THREAD]`).
+    """
+    if is_binary_trace(file_path):
+        return parse_binary_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name)
+
+    # Trace se čte z mapované paměti po řádcích typu `bytes` (bez dekódování), velký trace po úsecích souběžně
+    with open(file_path, "rb") as trace_file:
+        if os.fstat(trace_file.fileno()).st_size:
+            with mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                scanner = TraceScanner(get_tokenizer(ACTIVE_ARCHITECTURE, binary=True), function_name,
+                                       runtime_addr_target, detect_records=True)
+                jobs = _chunk_jobs(jobs)
+                if jobs > 1 and len(data) >= 2 * TRACE_CHUNK_SIZE:
+                    scan_trace_chunks(scanner, file_path, data, jobs)
+                else:
+                    scanner.scan(data.readline)
+                if scanner.found_record is None:
+                    return scanner.result(binary_file, static_addr_target)
+                if scanner.found_record == THREAD_PREFIX:
+                    return None
+                log_debug(f"Trace `{file_path}` obsahuje řádky `[BLOCK]`, čtu jej znovu s instrukcemi bloků")
+
+    with open(file_path, "r") as trace_file:
+        return parse_text_trace(trace_file, runtime_addr_target, static_addr_target, binary_file, function_name,
+                                detect_records=True)
+
+
+def parse_thread_traces(file_path, runtime_addr_target, static_addr_target, binary_file, function_name,
+                        jobs=ANALYSIS_JOBS):
+    """
+    Analyzuje trace vícevláknového programu po jednotlivých vláknech (viz `core.engine.thread_trace`).
+
+    Vlákno, které cílovou funkci nevykonávalo (pracovní vlákno vytvořené během sledovaného volání),
+    se analyzuje od své vstupní funkce. Počty všech vláken se sečtou. Havárii určuje vlákno, ve kterém
+    trace začíná (vlákno sledovaného volání); ostatní vlákna mohla být při návratu ze sledovaného volání
+    ještě uprostřed funkce. `jobs` se předá `parse_trace` pro trace jednotlivých vláken.
+
+    :return: Stejně jako `parse_trace` a navíc slovník číslo vlákna → `{"function", "total_instructions",
+             "instructions"}` pro vlákna, která vykonávala cílovou funkci nebo svou vstupní funkci
+             (vlákno sledovaného volání má navíc `"traced_call": true`).
+    """
+    source_line_counts = collections.defaultdict(int)
+    library_line_counts = collections.defaultdict(int)
+    crash_detected = False
+    last_executed_line = None
+    truncation = None
+    threads = {}
+    binary_functions = load_binary_symbols(binary_file).function_addresses
+
+    with tempfile.TemporaryDirectory(prefix="thread_trace_") as output_dir:
+        thread_traces = split_thread_trace(file_path, output_dir, function_name, binary_functions)
+        scope_thread = next(iter(thread_traces), None)
+
+        for number, (thread_trace, routine) in thread_traces.items():
+            counts, crash, last_line, thread_truncation, library = parse_trace(
+                thread_trace, runtime_addr_target, static_addr_target, binary_file, function_name, jobs)
+            thread_function = function_name
+
+            if not counts and routine and routine != function_name:
+                log_debug(f"Vlákno {number} cílovou funkci nevykonávalo, analyzuji jeho vstupní funkci `{routine}`")
+                counts, crash, last_line, thread_truncation, library = parse_trace(
+                    thread_trace, None, get_static_function_address(binary_file, routine), binary_file, routine, jobs)
+                thread_function = routine
+            if not counts:
+                log_debug(f"Vlákno {number} nevykonávalo cílovou funkci `{function_name}` ani vlastní vstupní funkci")
+                continue
+
+            threads[str(number)] = {"function": thread_function, "total_instructions": sum(counts.values()),
+                                    "instructions": counts}
+            if number == scope_thread:
+                threads[str(number)]["traced_call"] = True
+            for line, count in counts.items():
+                source_line_counts[line] += count
+            for line, count in library.items():
+                library_line_counts[line] += count
+            truncation = truncation or thread_truncation
+
+            if crash and number != scope_thread:
+                log_warning(f"Vlákno {number} bylo při ukončení trace uvnitř `{thread_function}`, jeho počty jsou neúplné.")
+            elif crash:
+                crash_detected = True
+                last_executed_line = last_line
+
+    log_info(f"Celkem instrukcí ve `{function_name}` ({len(threads)} vláken): {sum(source_line_counts.values())}")
+    return dict(source_line_counts), crash_detected, last_executed_line, truncation, dict(library_line_counts), threads
+
+
+def parse_program_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name,
+                        jobs=ANALYSIS_JOBS):
+    """
+    Analyzuje trace jednovláknového i vícevláknového programu. Trace se nejprve čte jako jednovláknový
+    (`parse_trace`); narazí-li průchod na přepnutí vláken (`[THREAD]`), analyzuje se po vláknech
+    (`parse_thread_traces`). Dokud trace přepnutí vláken neobsahuje, patří všechny jeho řádky vláknu,
+    ve kterém začíná, výsledek jednovláknového čtení je tedy platný.
+
+    :return: Stejně jako `parse_thread_traces`, slovník vláken je None pro trace bez přepnutí vláken.
+    """
+    result = parse_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name, jobs)
+    if result is not None:
+        return result + (None,)
+    log_debug(f"Trace `{file_path}` obsahuje přepnutí vláken, analyzuji jej po vláknech")
+    return parse_thread_traces(file_path, runtime_addr_target, static_addr_target, binary_file, function_name, jobs)
+
+
+def parse_text_trace(trace_file, runtime_addr_target, static_addr_target, binary_file, function_name,
+                     on_progress=None, progress_interval=None, detect_records=False):
+    """
+    Analyzuje otevřený textový trace (soubor nebo rouru), viz `parse_trace`.
+
+    :param runtime_addr_target: Runtime adresa cílové funkce; None = zjistí se z první instrukce
+                                volání funkce v trace (trace se tak nemusí číst dvakrát).
+    :param on_progress: Volitelná funkce `(pc_counts, callee_counts, runtime_addr_target)`, která se
+                        během čtení volá nejvýše jednou za `progress_interval` sekund s dosavadními počty.
+    :param detect_records: Ukončit čtení na prvním řádku `[THREAD]` (jinak se přepnutí vláken ignoruje).
+    :return: Stejně jako `parse_trace`.
+    """
+    scanner = TraceScanner(get_tokenizer(ACTIVE_ARCHITECTURE), function_name, runtime_addr_target, detect_records)
+
+    if on_progress is not None:
+        trace_file = PeriodicReader(
+            trace_file,
+            lambda: on_progress(scanner.pc_counts, scanner.callee_counts, scanner.runtime_addr_target),
+            progress_interval)
+
+    scanner.scan(BlockExpandingReader(trace_file, binary_file).readline)
+    if scanner.found_record is not None:
+        return None
+    return scanner.result(binary_file, static_addr_target)
+
+
+def _count_function_instructions_binary(records, tables, called_function, original_function, original_function_id):
+    """
+    Obdoba `count_function_instructions` pro binární trace.
+
+    :param records: Iterátor záznamů binárního trace.
+    :param tables: Předpočítané vlastnosti funkcí a instrukcí (viz `parse_binary_trace`).
+    :param called_function: Název právě volané funkce.
+    :param original_function: Název původní funkce, do které se má počítání instrukcí vrátit.
+    :param original_function_id: Id této funkce v tabulce funkcí trace.
+    :return: Počet instrukcí, součet odhadů přejitých knihovních volání a záznam, na kterém počítání
+             skončilo (návrat, přerušení trace nebo přepnutí vláken; nebo None).
+    """
+    function_is_word, asm_is_word, function_is_return, asm_is_return, asm_call_marker = tables
     instruction_count = 0
+    library_count = 0
     recursion_depth = 1 if called_function == original_function else 0
 
-    log_debug(f"Spuštěno `count_function_instructions`, sledujeme návrat do `{original_function}` rec depth {recursion_depth}")
-    return_instructions_regex = get_return_instructions_regex()
+    for record in records:
+        kind, pc, function_id, flags, asm_id = record
+        if kind == RECORD_TRUNCATED:
+            log_warning(f"Trace byl přerušen uvnitř `{called_function}`, vracíme {instruction_count} instrukcí")
+            return instruction_count, library_count, record
+        if kind == RECORD_LIBRARY:
+            library_count += asm_id
+            continue
+        if kind == RECORD_THREAD:
+            return instruction_count, library_count, record
+        if kind in (RECORD_END, RECORD_REGION):
+            continue
 
-    for line in file:
-        if line.startswith(f"{original_function},"):
+        if flags & FLAG_CALL and function_is_word[function_id] and asm_call_marker[asm_id] == original_function_id:
+            recursion_depth += 1
+
+        if function_id == original_function_id:
             if recursion_depth > 0:
-                if re.search(return_instructions_regex, line):
+                if asm_is_return[asm_id] or function_is_return[function_id]:
                     recursion_depth -= 1
-                    log_debug(f"Zmenšení úrovně zanoření provedeno na řáce: {line}")
                     if recursion_depth == 0:
-                        log_debug(f"Návrat do `{original_function}`, zastavujeme počítání")
-                        return instruction_count, line
-                
+                        return instruction_count, library_count, record
+
                 instruction_count += 1
                 continue
-            else:
-                log_debug(f"Návrat do `{original_function}`, zastavujeme počítání")
-                return instruction_count, line    
-
-        if line.startswith("[CALL]"):
-            match = re.match(r"\[CALL\] (\w+) -> <(\w+)>", line)
-            if match:
-                called_function = match.group(2)
-                if called_function == original_function:
-                    recursion_depth += 1
-                continue
+            return instruction_count, library_count, record
 
-        if re.match(r"(\w+),\s+(0x[0-9a-fA-F]+):\s+(\w+)", line):
+        if function_is_word[function_id] and asm_is_word[asm_id]:
             instruction_count += 1
 
     log_warning(f"[WARNING] Funkce `{original_function}` se při zanoření do jiné funkce nevrátila, vracíme {instruction_count} instrukcí")
-    return instruction_count, None
+    return instruction_count, library_count, None
 
 
-def parse_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name):
+def parse_binary_trace(file_path, runtime_addr_target, static_addr_target, binary_file, function_name):
     """
-    Analyzuje trace log soubor a extrahuje instrukce pro funkci `function_name`.
+    Analyzuje trace v binárním formátu (`.trc`) se stejným výsledkem jako `parse_trace` pro textový trace.
 
-    :param file_path: Cesta k trace log souboru.
-    :param runtime_addr_target: Runtime adresa cílové funkce.
+    Regulární výrazy se nevyhodnocují pro každý záznam, ale jen jednou pro každé jméno funkce
+    a každý unikátní text instrukce z tabulek trace. Záznamy se čtou přímo z mapované paměti.
+
+    :param file_path: Cesta k binárnímu trace souboru.
+    :param runtime_addr_target: Runtime adresa cílové funkce (None = zjistí se z první instrukce jejího volání).
     :param static_addr_target: Statická adresa cílové funkce.
     :param binary_file: Cesta k binárnímu souboru.
     :param function_name: Název analyzované funkce.
-    :return: Slovník počtů instrukcí pro jednotlivé řádky, informaci o detekované havárii a poslední vykonaný řádek.
+    :return: Stejně jako `parse_trace` (None pro trace s přepnutím vláken, čtení skončí na prvním z nich).
     """
-    source_line_counts = collections.defaultdict(int)
+    pc_counts = collections.defaultdict(int)
+    callee_counts = collections.defaultdict(int)
+    library_counts = collections.defaultdict(int)
     inside_target_function = False
-    last_executed_line = None
-    crash_detected = False
-    
+    last_pc = None
+    truncated = None
+    threads = False
+
     call_instructions_regex = get_call_instructions_regex()
     return_instructions_regex = get_return_instructions_regex()
+    enter_regex = get_tokenizer(ACTIVE_ARCHITECTURE).enter(function_name, runtime_addr_target)
+    call_regex = re.compile(rf".*({call_instructions_regex})\s+(?:[a-zA-Z0-9_]+\s*,\s*)?(0x[0-9a-fA-F]+)\s+<(.+?)>")
 
-    with open(file_path, "r") as f:
-        line = f.readline()
-        while line:
-            if re.search(rf"({call_instructions_regex})\s+(?:[a-zA-Z0-9_]+\s*,\s*)?{hex(runtime_addr_target)}\s+<{re.escape(function_name)}>", line) and not inside_target_function:
-                log_debug(f"v parse_trace zaznamenáno volání funkce")
-            #if re.search(rf"({call_instructions_regex})\s+{hex(runtime_addr_target)} <{function_name}>", line) and inside_target_function != True:
-                inside_target_function = True
-                line = f.readline()
+    with BinaryTrace(file_path) as trace:
+        # Instrukce základních bloků se doplní ze statické disassemblace (tabulky se rozšíří předem)
+        block_instructions = _intern_block_instructions(trace, binary_file) if trace.has_blocks() else None
+
+        function_ids = {name: index for index, name in enumerate(trace.functions)}
+        target_id = function_ids.get(function_name)
+        main_id = function_ids.get("main")
+
+        # Vlastnosti jmen funkcí a textů instrukcí odpovídající regulárním výrazům textové analýzy
+        function_is_word = [re.fullmatch(r"\w+", name) is not None for name in trace.functions]
+        function_is_return = [re.search(return_instructions_regex, name) is not None for name in trace.functions]
+        asm_is_word = [re.match(r"\w", asm) is not None for asm in trace.asm_texts]
+        asm_is_return = [re.search(return_instructions_regex, asm) is not None for asm in trace.asm_texts]
+        asm_enters_target = [enter_regex.search(asm) is not None for asm in trace.asm_texts]
+        asm_called_function = []
+        asm_call_marker = []
+        for asm in trace.asm_texts:
+            call_match = call_regex.match(asm)
+            asm_called_function.append(call_match.group(3) if call_match else None)
+            marker_match = re.fullmatch(r"<(\w+)>.*", asm.split()[-1]) if asm.split() else None
+            asm_call_marker.append(function_ids.get(marker_match.group(1)) if marker_match else None)
+        tables = (function_is_word, asm_is_word, function_is_return, asm_is_return, asm_call_marker)
+
+        records = trace.records()
+        if block_instructions is not None:
+            records = _expand_block_records(records, block_instructions)
+        record = next(records, None)
+        while record is not None:
+            kind, pc, function_id, flags, asm_id = record
+
+            # Tracer byl přerušen limitem (důvod je v tabulce funkcí, počet instrukcí v poli textu)
+            if kind == RECORD_TRUNCATED:
+                truncated = (trace.functions[function_id], asm_id)
+                inside_target_function = False
+                break
+
+            # Přepnutí vláken se analyzuje po rozdělení trace (`parse_program_trace`)
+            if kind == RECORD_THREAD:
+                threads = True
+                break
+
+            if not inside_target_function:
+                if kind not in (RECORD_END, RECORD_LIBRARY, RECORD_REGION) and asm_enters_target[asm_id]:
+                    inside_target_function = True
+                    if runtime_addr_target is None:
+                        runtime_addr_target = int(enter_regex.search(trace.asm_texts[asm_id]).group(2), 16)
+                        log_debug(f"Runtime adresa `{function_name}`: {hex(runtime_addr_target)}")
+                record = next(records, None)
                 continue
-            
-            if inside_target_function:
-                match = re.match(r"\w+,\s+(0x[0-9a-fA-F]+):\s+(\w+)", line)
-                if match:
-                    if re.match(r"\bmain\b,", line):
-                        inside_target_function = False
-                        break
 
-                    address, instruction = match.groups()
-                    last_executed_line = get_source_line(binary_file, address, runtime_addr_target, static_addr_target)
-                    
-                    if last_executed_line:
-                        source_line_counts[last_executed_line] += 1
-                    
-                    # volani funkci uvnitr testovane funkce
-                    #call_match = re.match(rf".*({call_instructions_regex})\s+(0x[0-9a-fA-F]+)\s+<(.*?)>", line)
-                    call_match = re.match(rf".*({call_instructions_regex})\s+(?:[a-zA-Z0-9_]+\s*,\s*)?(0x[0-9a-fA-F]+)\s+<(.+?)>", line)
-                    if call_match:
-                        called_function = call_match.group(3)
-                        log_debug(f"Detekováno volání `{called_function}` na řádku `{last_executed_line}`")
-                        
-                        call_instruction_count, last_read_line = count_function_instructions(f, called_function, function_name)    
-                    
-                        if last_executed_line:
-                            log_debug(f"Počet instrukcí pro `{called_function}`: {call_instruction_count}")
-                            source_line_counts[last_executed_line] += call_instruction_count
-                        
-                        if last_read_line:
-                            line = last_read_line
-                            continue
-                        
-                #if re.search(rf"\bret\b", line):
-                #if re.search(return_instructions_regex, line):
-                #    inside_target_function = False
-                #    break
-            
-            line = f.readline()
+            # Konec sledovaného volání při trace omezeném na cílovou funkci
+            if kind == RECORD_END:
+                inside_target_function = False
+                break
 
-    source_line_counts = normalize_discriminators(source_line_counts)
+            # Přejité volání knihovní funkce přímo z cílové funkce
+            if kind == RECORD_LIBRARY:
+                if last_pc is not None:
+                    callee_counts[last_pc] += asm_id
+                    library_counts[last_pc] += asm_id
+                record = next(records, None)
+                continue
 
-    if inside_target_function == True:
-         crash_detected = inside_target_function 
-         log_warning(f"Detekováno náhlé ukončení programu! Poslední řádek: `{last_executed_line}`")
+            # Oblasti zájmu se analyzují zvlášť (`parse_region_trace`)
+            if kind == RECORD_REGION:
+                record = next(records, None)
+                continue
 
-    log_info(f"Celkem instrukcí ve `{function_name}`: {sum(source_line_counts.values())}")
-    return source_line_counts, crash_detected, last_executed_line
+            if function_is_word[function_id] and asm_is_word[asm_id]:
+                if function_id == main_id:
+                    inside_target_function = False
+                    break
+
+                last_pc = pc
+                pc_counts[last_pc] += 1
+
+                called_function = asm_called_function[asm_id]
+                if called_function:
+                    call_instruction_count, library_count, last_record = _count_function_instructions_binary(
+                        records, tables, called_function, function_name, target_id)
+                    callee_counts[last_pc] += call_instruction_count + library_count
+                    if library_count:
+                        library_counts[last_pc] += library_count
 
+                    if last_record:
+                        record = last_record
+                        continue
 
-def save_json(source_line_counts, crash_detected, crash_last_executed_line, json_output_path, function_name, params, source_file):
+            record = next(records, None)
+
+        records.close()
+
+    if threads:
+        return None
+    return _trace_result(pc_counts, callee_counts, library_counts, last_pc, inside_target_function, truncated,
+                         binary_file, runtime_addr_target, static_addr_target, function_name)
+
+
+def scan_call_graph(graph, file_path, binary_file):
+    """
+    Projde textový nebo binární trace po řádcích (bez načtení do paměti) profilem volání `graph`.
+    Řádky `[BLOCK]` textového trace se nehledají předem, instrukce bloků doplní `graph` při jejich výskytu.
+
+    :param graph: `CallGraph`, do kterého se trace započte.
+    :param file_path: Cesta k trace souboru.
+    :param binary_file: Cesta k binárnímu souboru (instrukce bloků ze statické disassemblace).
+    """
+    if is_binary_trace(file_path):
+        with BinaryTrace(file_path) as trace:
+            graph.scan(BlockExpandingReader(_LineIteratorReader(trace.text_lines()), binary_file))
+    else:
+        with open(file_path, "r", errors="replace") as trace:
+            graph.scan(trace, BlockExpandingReader(trace, binary_file).expand)
+
+
+def build_call_graph(file_path, binary_file, instructions=False):
+    """
+    Sestaví profil volání celého programu z textového nebo binárního trace (`core.engine.call_graph`).
+    Týž profil lze uložit do JSON (`CallGraph.summary()` pro `save_json`) i exportovat do formátu
+    callgrind (`core.engine.callgrind.write_callgrind`, vyžaduje `instructions`).
+
+    :param file_path: Cesta k trace souboru.
+    :param binary_file: Cesta k binárnímu souboru (instrukce bloků ze statické disassemblace).
+    :param instructions: Počítat i instrukce jednotlivých adres a míst volání (viz `CallGraph`).
+    :return: `CallGraph` po průchodu celým trace.
+    """
+    graph = CallGraph(instructions=instructions)
+    scan_call_graph(graph, file_path, binary_file)
+    log_info(f"Profil volání: {len(graph.self_counts)} funkcí, {len(graph.edge_calls)} dvojic volající → volaná")
+    return graph
+
+
+def parse_region_trace(file_path, binary_file):
+    """
+    Analyzuje trace oblastí zájmu (řádky `[REGION] begin|end <jméno>`, viz `core.engine.regions`).
+
+    Domovskou funkcí průchodu oblastí je funkce první instrukce po značce začátku. Instrukce domovské
+    funkce se počítají na svých řádcích, instrukce volaných funkcí (i přejitá knihovní volání) se stejně
+    jako u analýzy funkce připíší řádku posledního volání z domovské funkce. Instrukce zanořené oblasti
+    se započtou i všem oblastem, které ji obklopují.
+
+    Runtime adresy se na statické přepočítají podle volání značkovacích funkcí v trace.
+
+    :param file_path: Cesta k textovému nebo binárnímu trace.
+    :param binary_file: Cesta k binárnímu souboru.
+    :return: Pětice (počty instrukcí pro jednotlivé řádky všech vnějších oblastí, detekovaná havárie
+             uvnitř oblasti, poslední vykonaný řádek, popis přerušení trace limitem nebo None,
+             slovník jméno oblasti → `{"function", "executions", "complete", "total_instructions",
+             "instructions"}`).
+    """
+    runtime_addr_target = static_addr_target = 0
+    for marker in (REGION_END_MARKER, REGION_BEGIN_MARKER):
+        runtime_address = get_runtime_function_address(file_path, marker)
+        static_address = get_static_function_address(binary_file, marker)
+        if runtime_address is not None and static_address is not None:
+            runtime_addr_target, static_addr_target = runtime_address, static_address
+            break
+
+    pc_counts = collections.defaultdict(int)
+    region_pcs = collections.defaultdict(lambda: collections.defaultdict(int))
+    region_functions = {}
+    executions = collections.defaultdict(int)
+    open_regions = []  # jména otevřených oblastí (vnější první)
+    homes = []         # [domovská funkce, poslední adresa domovské funkce] otevřených oblastí
+    truncated = None
+    last_pc = None
+    instruction_regex = re.compile(r"^(.+?), (0x[0-9a-fA-F]+): ")
+
+    if is_binary_trace(file_path):
+        trace = BinaryTrace(file_path)
+        lines = BlockExpandingReader(_LineIteratorReader(trace.text_lines()), binary_file)
+    else:
+        trace = open(file_path, "r", errors="replace")
+        lines = BlockExpandingReader(trace, binary_file)
+
+    try:
+        for line in lines:
+            if line.startswith(REGION_PREFIX):
+                kind, name = parse_region_line(line)
+                if kind == REGION_BEGIN:
+                    open_regions.append(name)
+                    homes.append([None, None])
+                    executions[name] += 1
+                elif name in open_regions:
+                    # Uzavře se poslední otevřená oblast tohoto jména
+                    position = len(open_regions) - 1 - open_regions[::-1].index(name)
+                    del open_regions[position]
+                    del homes[position]
+                continue
+
+            if line.startswith(TRUNCATED_PREFIX):
+                truncated = parse_truncated_line(line)
+                break
+            if not open_regions:
+                continue
+
+            if line.startswith(LIBRARY_PREFIX):
+                count = parse_library_line(line)[1]
+                for position, (name, (_, charged_pc)) in enumerate(zip(open_regions, homes)):
+                    if charged_pc is not None:
+                        region_pcs[name][charged_pc] += count
+                        if position == 0:
+                            pc_counts[charged_pc] += count
+                continue
+
+            match = instruction_regex.match(line)
+            if not match:
+                continue
+            function, pc = match.group(1), int(match.group(2), 16)
+            for position, (name, home) in enumerate(zip(open_regions, homes)):
+                if home[0] is None:
+                    home[0] = function
+                    region_functions.setdefault(name, function)
+                if function == home[0]:
+                    home[1] = pc
+                if home[1] is None:
+                    continue
+                region_pcs[name][home[1]] += 1
+                if position == 0:
+                    pc_counts[home[1]] += 1
+                    last_pc = home[1]
+    finally:
+        trace.close()
+
+    regions = {}
+    for name, counts in region_pcs.items():
+        line_counts = normalize_discriminators(
+            fold_pc_counts(counts, {}, binary_file, runtime_addr_target, static_addr_target))
+        regions[name] = {
+            "function": region_functions.get(name),
+            "executions": executions[name],
+            "complete": name not in open_regions,
+            "total_instructions": sum(line_counts.values()),
+            "instructions": line_counts,
+        }
+        log_info(f"Oblast `{name}`: {executions[name]} průchodů, {regions[name]['total_instructions']} instrukcí")
+
+    source_line_counts = normalize_discriminators(
+        fold_pc_counts(pc_counts, {}, binary_file, runtime_addr_target, static_addr_target))
+
+    last_executed_line = None
+    if last_pc is not None:
+        last_executed_line = get_source_line(binary_file, last_pc, runtime_addr_target, static_addr_target)
+
+    crash_detected = bool(open_regions) and not truncated
+    if crash_detected:
+        log_warning(f"Program skončil uvnitř oblasti `{open_regions[-1]}`! Poslední řádek: `{last_executed_line}`")
+
+    truncation = None
+    if truncated:
+        truncation = describe_truncation(*truncated, pc_counts, {}, binary_file, runtime_addr_target, static_addr_target)
+
+    return source_line_counts, crash_detected, last_executed_line, truncation, regions
+
+
+def analyze_region_trace(trace_file, binary_file, function_name, output_json, params):
+    """
+    Analyzuje trace oblastí zájmu (`parse_region_trace`) a uloží výsledky do JSON souboru.
+
+    :param function_name: Název funkce z názvu binárky (pole `"function"` výstupního JSON).
+    :return: True, pokud byla analýza uložena.
+    """
+    source_line_counts, crash_detected, last_executed_line, truncation, regions = parse_region_trace(trace_file, binary_file)
+    if not regions:
+        log_error(f"Trace `{trace_file}` neobsahuje žádnou oblast zájmu (`PROFILER_REGION_BEGIN`), výsledky nebyly uloženy.")
+        return False
+
+    source_file = next(iter(source_line_counts)).split(":")[0] if source_line_counts else None
+    save_json(source_line_counts, crash_detected, last_executed_line, output_json, function_name, params, source_file,
+              truncation=truncation, regions=regions)
+    log_info(f"Analýza `{trace_file}` dokončena a výsledky uloženy do `{output_json}`.")
+    return True
+
+
+def save_json(source_line_counts, crash_detected, crash_last_executed_line, json_output_path, function_name, params, source_file,
+              partial=False, truncation=None, extrapolate_iterations=None, sampling=None, call_counts=None,
+              library=None, threads=None, regions=None, call_graph=None):
     """
     Uloží výsledky analýzy do JSON souboru.
 
+    Soubor se nahrazuje atomicky (zápis do dočasného souboru a přejmenování), takže jej rozšíření
+    VS Code může znovu načíst kdykoli, i během průběžné analýzy (`analyze_trace_stream`).
+
     :param source_line_counts: Počty instrukcí pro jednotlivé řádky.
     :param crash_detected: Detekována havárie programu.
     :param crash_last_executed_line: Poslední vykonaný řádek před havárií.
@@ -249,6 +1398,26 @@ def save_json(source_line_counts, crash_detected, crash_last_executed_line, json
     :param function_name: Název analyzované funkce.
     :param params: Parametry testované funkce.
     :param source_file: Cesta ke zdrojovému souboru.
+    :param partial: Průběžný výsledek analýzy, která ještě běží (v JSON jako `"partial": true`).
+    :param truncation: Popis přerušení trace limitem (`describe_truncation`); v JSON jako
+                       `"truncated": true` a objekt `"truncation"`.
+    :param extrapolate_iterations: Očekávaný celkový počet iterací smyčky, ve které byl trace přerušen.
+                                   Pokud je zadán, doplní se lineární odhad `extrapolated_total_instructions`
+                                   (zbývající iterace × průměrná cena iterace).
+    :param sampling: Souhrn statistického vzorkování (`core.engine.sampling`); hodnoty `source_line_counts`
+                     jsou pak počty vzorků. V JSON jako `"sampled": true` a objekt `"sampling"`.
+    :param call_counts: Souhrnné počty instrukcí jednotlivých volání funkce (`core.engine.call_counts`);
+                        v JSON jako `"summary": true` a objekt `"call_counts"`.
+    :param library: Odhady ceny přejitých knihovních volání pro jednotlivé řádky (už jsou součástí
+                    `source_line_counts`); v JSON jako objekt `"library"` s celkovým součtem.
+    :param threads: Počty jednotlivých vláken vícevláknového programu (`parse_thread_traces`, jejich součet
+                    je `source_line_counts`); v JSON jako objekt `"threads"` a nerovnoměrnost rozložení práce
+                    `"thread_imbalance"` (nejvyšší počet instrukcí vlákna / průměr vláken, 1.0 = rovnoměrné).
+                    Pokud cílovou nebo vstupní funkci vykonávala alespoň dvě další vlákna, počítá se
+                    nerovnoměrnost jen mezi nimi (bez vlákna sledovaného volání, které je vytvořilo).
+    :param regions: Počty instrukcí oblastí zájmu (`parse_region_trace`); `source_line_counts` pak obsahují
+                    instrukce vnějších oblastí. V JSON jako objekt `"regions"`.
+    :param call_graph: Profil volání celého programu (`CallGraph.summary()`); v JSON jako objekt `"call_graph"`.
     """
 
     # Celkový počet provedených instrukcí
@@ -267,41 +1436,112 @@ def save_json(source_line_counts, crash_detected, crash_last_executed_line, json
     if crash_detected:
         json_data["crash_detected"] = True
         json_data["crash_last_executed_line"] = crash_last_executed_line
+    if partial:
+        json_data["partial"] = True
+    if truncation:
+        truncation = dict(truncation)
+        if extrapolate_iterations and "instructions_per_iteration" in truncation:
+            remaining = max(0, extrapolate_iterations - truncation["iterations_observed"])
+            truncation["expected_iterations"] = extrapolate_iterations
+            truncation["extrapolated_total_instructions"] = round(
+                total_instructions + remaining * truncation["instructions_per_iteration"])
+        json_data["truncated"] = True
+        json_data["truncation"] = truncation
+    if sampling:
+        json_data["sampled"] = True
+        json_data["sampling"] = sampling
+    if call_counts:
+        json_data["summary"] = True
+        json_data["call_counts"] = call_counts
+    if library:
+        json_data["library"] = {
+            "estimated": True,
+            "total_instructions": sum(library.values()),
+            "instructions": library,
+        }
+    if threads:
+        thread_totals = [thread["total_instructions"] for thread in threads.values() if not thread.get("traced_call")]
+        if len(thread_totals) < 2:
+            thread_totals = [thread["total_instructions"] for thread in threads.values()]
+        json_data["threads"] = threads
+        json_data["thread_imbalance"] = round(max(thread_totals) * len(thread_totals) / max(1, sum(thread_totals)), 3)
+    if regions:
+        json_data["regions"] = regions
+    if call_graph:
+        json_data["call_graph"] = call_graph
 
-    with open(json_output_path, "w") as f:
+    tmp_path = f"{json_output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
         json.dump(json_data, f, indent=4)
-    
-    log_info(f"Výsledky uloženy do `{json_output_path}`")
+    os.replace(tmp_path, json_output_path)
+
+    if partial:
+        log_debug(f"Průběžné výsledky ({total_instructions} instrukcí) uloženy do `{json_output_path}`")
+    else:
+        log_info(f"Výsledky uloženy do `{json_output_path}`")
 
-def analyze_traces_in_folder(trace_folder, output_folder, binary_file, function_name, source_file):
-    """Analyzuje všechny trace logy ve složce `trace_folder` a uloží JSON výstupy do `output_folder`."""
+def _analyze_folder_trace(trace_path, json_output_path, binary_file, function_name, params_str, source_file,
+                          static_addr_target, jobs=1):
+    """
+    Analyzuje jeden trace log složky a uloží jeho JSON (úloha `analyze_traces_in_folder`).
+    `jobs` je počet procesů pro souběžné čtení velkého trace (viz `parse_trace`).
+
+    :return: Cesta k uloženému JSON, nebo None, pokud trace neobsahuje volání `function_name`.
+    """
+    # Runtime adresa se zjistí během jediného průchodu trace
+    source_line_counts, crash_detected, last_executed_line, truncation, library, threads = parse_program_trace(
+        trace_path, None, static_addr_target, binary_file, function_name, jobs)
+
+    if not source_line_counts:
+        log_error(f"V `{os.path.basename(trace_path)}` nebylo nalezeno volání `{function_name}`, přeskočeno.")
+        return None
+
+    # Uložení do JSON pomocí save_json
+    save_json(source_line_counts, crash_detected, last_executed_line, json_output_path, function_name, params_str, source_file,
+              truncation=truncation, library=library, threads=threads,
+              call_graph=build_call_graph(trace_path, binary_file).summary() if TRACE_CALL_GRAPH else None)
+    return json_output_path
+
+
+def analyze_traces_in_folder(trace_folder, output_folder, binary_file, function_name, source_file, jobs=ANALYSIS_JOBS):
+    """
+    Analyzuje všechny trace logy ve složce `trace_folder` a uloží JSON výstupy do `output_folder`.
+
+    Trace logy jsou na sobě nezávislé: při `jobs` různém od 1 se analyzují souběžně, každý ve vlastním
+    procesu (`core.engine.scheduler.run_jobs`). Symboly binárky se načtou jednou v hlavním procesu
+    a procesy úloh je sdílejí (vznikají voláním `fork`). Selhání analýzy jednoho trace logu dávku
+    nepřeruší, neúspěšné trace logy se vypíšou na konci.
+
+    :param jobs: Počet souběžně analyzovaných trace logů (None = počet jader).
+    :return: Seznam cest k uloženým JSON výstupům.
+    """
     
     if not os.path.exists(trace_folder):
         log_error(f"Složka `{trace_folder}` neexistuje, analýza ukončena!")
-        return
+        return []
 
     os.makedirs(output_folder, exist_ok=True)  # Vytvoří výstupní složku, pokud neexistuje
 
-    trace_files = [f for f in os.listdir(trace_folder) if f.endswith(".log")]
+    trace_files = sorted(f for f in os.listdir(trace_folder) if f.endswith((".log", ".trc")))
 
     if not trace_files:
         log_warning(f"Nebyly nalezeny žádné trace logy ve složce `{trace_folder}`!")
-        return
+        return []
 
     log_info(f"Nalezeno {len(trace_files)} trace logů k analýze v `{trace_folder}`.")
 
-    # Získáme statickou a runtime adresu pro testovanou funkci
+    # Získáme statickou adresu pro testovanou funkci (zároveň se načtou symboly binárky pro všechny úlohy)
     static_addr_target = get_static_function_address(binary_file, function_name)
     
     if static_addr_target is None:
         log_error(f"Nepodařilo se získat statickou adresu pro funkci `{function_name}`, analýza přeskočena!")
-        return
+        return []
 
+    job_files = []
+    job_args = []
     for trace_file in trace_files:
-        trace_path = os.path.join(trace_folder, trace_file)
-
-        # Najdeme parametry z názvu souboru (trace_<function_name>_<params>.log)
-        match = re.match(rf"trace_{re.escape(function_name)}_(.*)\.log", trace_file)
+        # Najdeme parametry z názvu souboru (trace_<function_name>_<params>.log, resp. .trc)
+        match = re.match(rf"trace_{re.escape(function_name)}_(.*)\.(?:log|trc)", trace_file)
         if not match:
             log_warning(f"Soubor `{trace_file}` neodpovídá formátu `trace_{function_name}_<parametry>.log`, přeskočeno.")
             continue
@@ -309,25 +1549,37 @@ def analyze_traces_in_folder(trace_folder, output_folder, binary_file, function_
         params_str = match.group(1)
         json_output_path = os.path.join(output_folder, f"instructions_{function_name}_{params_str}.json")
 
-        params_str = params_str.replace("_", " ")
-        log_info(f"Analyzuji `{trace_file}` (parametry: {params_str})")
-
-        runtime_addr_target = get_runtime_function_address(trace_path, function_name)
-
-        if runtime_addr_target is None:
-            log_error(f"Nepodařilo se získat runtime adresu pro `{trace_file}`, přeskočeno.")
-            continue
+        job_files.append(trace_file)
+        job_args.append(dict(trace_path=os.path.abspath(os.path.join(trace_folder, trace_file)),
+                             json_output_path=os.path.abspath(json_output_path),
+                             binary_file=os.path.abspath(binary_file), function_name=function_name,
+                             params_str=params_str.replace("_", " "), source_file=source_file,
+                             static_addr_target=static_addr_target))
 
-        source_line_counts, crash_detected, last_executed_line = parse_trace(trace_path, runtime_addr_target, static_addr_target, binary_file, function_name)
+    if jobs != 1 and len(job_args) > 1:
+        # Trace logy se rozdělí mezi procesy, každý z nich čte svůj trace postupně
+        results = run_jobs(_analyze_folder_trace, job_args, jobs)
+    else:
+        results = []
+        for trace_file, kwargs in zip(job_files, job_args):
+            log_info(f"Analyzuji `{trace_file}` (parametry: {kwargs['params_str']})")
+            try:
+                results.append(_analyze_folder_trace(**kwargs, jobs=jobs))
+            except Exception as e:
+                log_error(f"Analýza `{trace_file}` selhala: {type(e).__name__}: {e}")
+                results.append(None)
 
-        # Uložení do JSON pomocí save_json
-        save_json(source_line_counts, crash_detected, last_executed_line, json_output_path, function_name, params_str, source_file)
+    failed = [trace_file for trace_file, result in zip(job_files, results) if result is None]
+    if failed:
+        log_warning(f"Analýza {len(failed)} z {len(job_files)} trace logů selhala: {', '.join(failed)}")
 
     log_info(f"Analýza všech trace logů ve složce `{trace_folder}` dokončena!")
+    return [result for result in results if result]
 
 
 
-def analyze_trace(trace_file, binary_file, target_function, output_json, params):
+def analyze_trace(trace_file, binary_file, target_function, output_json, params, extrapolate_iterations=None,
+                  call_graph=TRACE_CALL_GRAPH, jobs=ANALYSIS_JOBS):
     """
     Analyzuje jeden konkrétní trace soubor a uloží výsledky do JSON souboru.
     
@@ -336,22 +1588,25 @@ def analyze_trace(trace_file, binary_file, target_function, output_json, params)
     :param target_function: Název analyzované funkce.
     :param output_json: Cesta k výstupnímu JSON souboru.
     :param params: Parametry s nimiž byl trace_file vytvořen
+    :param extrapolate_iterations: Očekávaný počet iterací smyčky pro odhad celku přerušeného trace (viz `save_json`).
+    :param call_graph: Uložit i profil volání celého programu: True = sestaví se dalším průchodem celým trace
+                       (`build_call_graph`), nebo už sestavený `CallGraph` (sdílený s exportem callgrind).
+    :param jobs: Počet procesů pro souběžné čtení velkého trace (viz `parse_trace`); 1 v procesu úlohy `run_jobs`.
     """
     static_addr_target = get_static_function_address(binary_file, target_function)
     if static_addr_target is None:
         log_error(f"Nepodařilo se získat statickou adresu pro funkci `{target_function}`!")
         return
 
-    runtime_addr_target = get_runtime_function_address(trace_file, target_function)
-    if runtime_addr_target is None:
-        log_error(f"Nepodařilo se získat runtime adresu pro `{trace_file}`, přeskočeno.")
-        return
-
     #register_file = + trace_file + ".regs"
     #registers = load_registers_from_file(register_file)
-    source_line_counts, crash_detected, last_executed_line = parse_trace(
-        trace_file, runtime_addr_target, static_addr_target, binary_file, target_function
-    )
+    # Runtime adresa se zjistí během jediného průchodu trace
+    source_line_counts, crash_detected, last_executed_line, truncation, library, threads = parse_program_trace(
+        trace_file, None, static_addr_target, binary_file, target_function, jobs)
+
+    if not source_line_counts:
+        log_error(f"V `{trace_file}` nebylo nalezeno volání `{target_function}`, přeskočeno.")
+        return
 
     # Extrahování parametrů z názvu souboru (trace_<function_name>_<params>.log)
     match = re.match(rf"trace_{re.escape(target_function)}_(.*)\.log", os.path.basename(trace_file))
@@ -360,10 +1615,61 @@ def analyze_trace(trace_file, binary_file, target_function, output_json, params)
     first_line_key = next(iter(source_line_counts))
     source_file = first_line_key.split(":")[0]
 
-    save_json(source_line_counts, crash_detected, last_executed_line, output_json, target_function, params, source_file)
+    if call_graph is True:
+        call_graph = build_call_graph(trace_file, binary_file)
+
+    save_json(source_line_counts, crash_detected, last_executed_line, output_json, target_function, params, source_file,
+              truncation=truncation, extrapolate_iterations=extrapolate_iterations, library=library, threads=threads,
+              call_graph=call_graph.summary() if call_graph else None)
     log_info(f"Analýza `{trace_file}` dokončena a výsledky uloženy do `{output_json}`.")    
 
 
+def analyze_trace_stream(trace_stream, binary_file, target_function, output_json, params,
+                         snapshot_interval=TRACE_SNAPSHOT_INTERVAL, extrapolate_iterations=None):
+    """
+    Analyzuje textový trace čtený z roury (FIFO) během běhu traceru a uloží výsledky do JSON souboru.
+
+    Trace se čte jen jednou: runtime adresa cílové funkce se zjistí z první instrukce jejího volání.
+    Během čtení se nejvýše jednou za `snapshot_interval` sekund zapíše průběžný JSON
+    (`"partial": true`) se stejnou strukturou jako výsledný; instrukce volané funkce se do něj
+    promítnou až po návratu z ní.
+
+    :param trace_stream: Otevřený textový trace (soubor nebo roura).
+    :param binary_file: Cesta k binárnímu souboru.
+    :param target_function: Název analyzované funkce.
+    :param output_json: Cesta k výstupnímu JSON souboru.
+    :param params: Parametry s nimiž byl trace vytvořen.
+    :param snapshot_interval: Interval průběžných výsledků v sekundách.
+    :param extrapolate_iterations: Očekávaný počet iterací smyčky pro odhad celku přerušeného trace (viz `save_json`).
+    :return: True, pokud byla analýza uložena.
+    """
+    static_addr_target = get_static_function_address(binary_file, target_function)
+    if static_addr_target is None:
+        log_error(f"Nepodařilo se získat statickou adresu pro funkci `{target_function}`!")
+        return False
+
+    def save_snapshot(pc_counts, callee_counts, runtime_addr_target):
+        if runtime_addr_target is None or not pc_counts:
+            return
+        source_line_counts = normalize_discriminators(
+            fold_pc_counts(pc_counts, callee_counts, binary_file, runtime_addr_target, static_addr_target))
+        if source_line_counts:
+            source_file = next(iter(source_line_counts)).split(":")[0]
+            save_json(source_line_counts, False, None, output_json, target_function, params, source_file, partial=True)
+
+    source_line_counts, crash_detected, last_executed_line, truncation, library = parse_text_trace(
+        trace_stream, None, static_addr_target, binary_file, target_function, save_snapshot, snapshot_interval)
+
+    if not source_line_counts:
+        log_error(f"V trace nebylo nalezeno volání `{target_function}`, výsledky nebyly uloženy.")
+        return False
+
+    source_file = next(iter(source_line_counts)).split(":")[0]
+    save_json(source_line_counts, crash_detected, last_executed_line, output_json, target_function, params, source_file,
+              truncation=truncation, extrapolate_iterations=extrapolate_iterations, library=library)
+    return True
+
+
 def load_registers_from_file(regs_file_path):
     """
     Načte registry ze souboru ve formátu generovaném GDB.
@@ -0,0 +1,443 @@
+import mmap
+import re
+import struct
+
+"""
+Zápis a čtení trace souborů v textovém a binárním formátu.
+
+Textový formát (`.log`) je původní výstup GDB skriptů:
+    TEXT_BASE 0x0
+    [CALL] main -> <recurse>
+    main, 0x16bb: call   0x12d3 <recurse>
+    [END] recurse
+    [BLOCK] 0x12d3 4
+    [LIBRARY] printf@plt 412
+    [THREAD] 2
+    [REGION] begin inner_loop
+    [TRUNCATED] budget 100000
+
+Řádek `[BLOCK] <adresa> <počet>` zapisuje krokování po základních blocích: od statické adresy
+se bez přerušení vykonalo `počet` po sobě jdoucích instrukcí binárky (bez instrukcí volání,
+skoků a návratů). Jednotlivé instrukce bloku doplní analýza ze statické disassemblace.
+
+Řádek `[TRUNCATED] <důvod> <počet>` zapisuje tracer, který krokování ukončil po překročení
+limitu (`budget` – rozpočet instrukcí, `timeout` – časový limit, viz `core.engine.trace_limits`);
+`počet` je počet dosud zaznamenaných instrukcí. Za touto značkou už trace nepokračuje.
+
+Řádek `[LIBRARY] <funkce> <počet>` následuje za instrukcí volání knihovní funkce, kterou tracer
+nekrokoval, ale přešel plnou rychlostí (viz `core.engine.library_costs`); `počet` je odhad počtu
+instrukcí volané funkce. Analýza jej připíše řádku volání.
+
+Řádek `[THREAD] <číslo>` zapisuje tracer vícevláknového programu při přepnutí na jiné vlákno
+(1 = hlavní vlákno, další vlákna v pořadí vytvoření); všechny následující záznamy až do dalšího
+přepnutí patří tomuto vláknu. Trace jednovláknového programu tento řádek neobsahuje.
+
+Řádky `[REGION] begin <jméno>` a `[REGION] end <jméno>` zapisuje tracer oblastí zájmu
+(`--capture region`, viz `core.engine.regions`) na vstupu do značek `PROFILER_REGION_BEGIN`
+a `PROFILER_REGION_END`; instrukce mezi nimi patří oblasti (oblasti se mohou zanořovat).
+
+Binární formát (`.trc`) obsahuje stejnou informaci výrazně úsporněji:
+    hlavička     magic `PTRC`, verze, velikost záznamu, TEXT_BASE, architektura,
+                 offset tabulek a počet záznamů (doplní se při uzavření souboru)
+    záznamy      pevná šířka 12 B: rozdíl PC proti předchozímu záznamu (int32), id funkce (uint16),
+                 druh záznamu (uint8), příznaky (uint8), id textu instrukce (uint32)
+    tabulky      jména funkcí (nejvýše 65 536) a texty instrukcí, každý řetězec je uložen jen jednou
+
+Modul nemá žádné závislosti mimo standardní knihovnu, aby jej mohly importovat i GDB skripty.
+"""
+
+TRACE_MAGIC = b"PTRC"
+TRACE_VERSION = 1
+BINARY_TRACE_EXTENSION = ".trc"
+
+_HEADER = struct.Struct("<4sHHQ16sQQ")
+_RECORD = struct.Struct("<iHBBI")
+_RECORD_KIND_OFFSET = 6
+_MAX_FUNCTIONS = 0x10000  # id funkce je v záznamu uint16
+
+# Druhy záznamů
+RECORD_INSTRUCTION = 0
+RECORD_BASE = 1   # absolutní PC (nižších 32 bitů v poli rozdílu, vyšších v poli textu instrukce)
+RECORD_END = 2    # konec sledovaného volání funkce (`[END] <funkce>`)
+RECORD_BLOCK = 3  # základní blok (`[BLOCK] <adresa> <počet>`, počet instrukcí v poli textu instrukce)
+RECORD_TRUNCATED = 4  # přerušení limitem (důvod v tabulce funkcí, počet instrukcí v poli textu instrukce)
+RECORD_LIBRARY = 5    # přejité volání knihovní funkce (funkce v tabulce funkcí, odhad počtu instrukcí v poli textu instrukce)
+RECORD_THREAD = 6     # přepnutí vlákna (`[THREAD] <číslo>`, číslo vlákna v poli textu instrukce)
+RECORD_REGION = 7     # začátek nebo konec oblasti zájmu (jméno v tabulce funkcí, 1 = začátek v poli textu instrukce)
+
+# Příznaky instrukce (návratové instrukce rozpoznává analýza podle tabulky textů instrukcí)
+FLAG_CALL = 0x1    # instrukci předchází řádek `[CALL]`
+
+_TEXT_INSTRUCTION = re.compile(r"^(.*?), (0x[0-9a-fA-F]+): (.*)$")
+BLOCK_PREFIX = "[BLOCK] "
+TRUNCATED_PREFIX = "[TRUNCATED] "
+LIBRARY_PREFIX = "[LIBRARY] "
+THREAD_PREFIX = "[THREAD] "
+REGION_PREFIX = "[REGION] "
+REGION_BEGIN = "begin"
+REGION_END = "end"
+
+
+def parse_block_line(line):
+    """
+    Rozloží řádek `[BLOCK] <adresa> <počet>` na dvojici `(adresa, počet)`.
+    """
+    address, count = line[len(BLOCK_PREFIX):].split()
+    return int(address, 16), int(count)
+
+
+def parse_truncated_line(line):
+    """
+    Rozloží řádek `[TRUNCATED] <důvod> [<počet>]` na dvojici `(důvod, počet)`.
+    Počet chybí, pokud značku doplnil až tracer po násilném ukončení GDB (pak je None).
+    """
+    parts = line[len(TRUNCATED_PREFIX):].split()
+    reason = parts[0] if parts else "unknown"
+    count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+    return reason, count
+
+
+def parse_library_line(line):
+    """
+    Rozloží řádek `[LIBRARY] <funkce> <počet>` na dvojici `(funkce, počet)`.
+    """
+    function_name, count = line[len(LIBRARY_PREFIX):].rsplit(None, 1)
+    return function_name, int(count)
+
+
+def parse_thread_line(line):
+    """
+    Vrátí číslo vlákna z řádku `[THREAD] <číslo>`.
+    """
+    return int(line[len(THREAD_PREFIX):])
+
+
+def parse_region_line(line):
+    """
+    Rozloží řádek `[REGION] <begin|end> <jméno>` na dvojici `(druh, jméno)`.
+    """
+    kind, _, name = line[len(REGION_PREFIX):].rstrip("\n").partition(" ")
+    return kind, name
+
+
+def is_binary_trace(path):
+    """
+    Zjistí, zda soubor `path` je trace v binárním formátu (podle úvodních bajtů).
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+    except OSError:
+        return False
+
+
+class TextTraceWriter:
+    """
+    Zapisuje trace v původním textovém formátu.
+    """
+
+    def __init__(self, path, text_base=0):
+        self.file = open(path, "w")
+        self.file.write(f"TEXT_BASE {hex(text_base)}\n")
+        self.instruction_count = 0
+
+    def call(self, function_name, called_function):
+        self.file.write(f"[CALL] {function_name} -> {called_function}\n")
+
+    def instruction(self, function_name, pc, asm):
+        self.file.write(f"{function_name}, {hex(pc)}: {asm}\n")
+        self.instruction_count += 1
+
+    def end(self, function_name):
+        self.file.write(f"[END] {function_name}\n")
+
+    def block(self, pc, count):
+        self.file.write(f"{BLOCK_PREFIX}{hex(pc)} {count}\n")
+        self.instruction_count += count
+
+    def truncated(self, reason, count):
+        self.file.write(f"{TRUNCATED_PREFIX}{reason} {count}\n")
+
+    def library(self, function_name, count):
+        self.file.write(f"{LIBRARY_PREFIX}{function_name} {count}\n")
+
+    def thread(self, number):
+        self.file.write(f"{THREAD_PREFIX}{number}\n")
+
+    def region(self, kind, name):
+        self.file.write(f"{REGION_PREFIX}{kind} {name}\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinaryTraceWriter:
+    """
+    Zapisuje trace v binárním formátu (`.trc`).
+    """
+
+    def __init__(self, path, architecture, text_base=0):
+        self.file = open(path, "wb")
+        self.architecture = architecture
+        self.text_base = text_base
+        self.functions = {}
+        self.asm_texts = {}
+        self.record_count = 0
+        self.instruction_count = 0
+        self.last_pc = 0
+        self.pending_flags = 0
+        self.file.write(self._header(0))
+
+    def _header(self, tables_offset):
+        return _HEADER.pack(TRACE_MAGIC, TRACE_VERSION, _RECORD.size, self.text_base,
+                            self.architecture.encode()[:16], tables_offset, self.record_count)
+
+    @staticmethod
+    def _intern(table, value):
+        index = table.get(value)
+        if index is None:
+            index = table[value] = len(table)
+        return index
+
+    def _function_id(self, function_name):
+        index = self.functions.get(function_name)
+        if index is None:
+            index = len(self.functions)
+            if index >= _MAX_FUNCTIONS:
+                raise ValueError(f"Binární trace pojme nejvýše {_MAX_FUNCTIONS} různých jmen funkcí, "
+                                 f"pro tento program použijte textový formát trace (`--trace-format text`).")
+            self.functions[function_name] = index
+        return index
+
+    def _write_record(self, delta, function_id, kind, flags, asm_id):
+        self.file.write(_RECORD.pack(delta, function_id, kind, flags, asm_id))
+        self.record_count += 1
+
+    def call(self, function_name, called_function):
+        # Volaná funkce je vždy poslední token následující instrukce, stačí tedy příznak
+        self.pending_flags |= FLAG_CALL
+
+    def _pc_delta(self, pc):
+        delta = pc - self.last_pc
+        if not -0x80000000 <= delta <= 0x7fffffff:
+            self._write_record(struct.unpack("<i", struct.pack("<I", pc & 0xffffffff))[0], 0, RECORD_BASE, 0, pc >> 32)
+            delta = 0
+        self.last_pc = pc
+        return delta
+
+    def instruction(self, function_name, pc, asm):
+        delta = self._pc_delta(pc)
+        self._write_record(delta, self._function_id(function_name), RECORD_INSTRUCTION, self.pending_flags,
+                           self._intern(self.asm_texts, asm))
+        self.pending_flags = 0
+        self.instruction_count += 1
+
+    def block(self, pc, count):
+        self._write_record(self._pc_delta(pc), 0, RECORD_BLOCK, 0, count)
+        self.instruction_count += count
+
+    def truncated(self, reason, count):
+        self._write_record(0, self._function_id(reason), RECORD_TRUNCATED, 0, min(count, 0xffffffff))
+
+    def library(self, function_name, count):
+        self._write_record(0, self._function_id(function_name), RECORD_LIBRARY, 0, min(count, 0xffffffff))
+
+    def thread(self, number):
+        self._write_record(0, 0, RECORD_THREAD, 0, number)
+
+    def region(self, kind, name):
+        self._write_record(0, self._function_id(name), RECORD_REGION, 0, int(kind == REGION_BEGIN))
+
+    def end(self, function_name):
+        self._write_record(0, self._function_id(function_name), RECORD_END, 0, 0)
+
+    def close(self):
+        tables_offset = self.file.tell()
+        for table, length_format in ((self.functions, "<H"), (self.asm_texts, "<I")):
+            self.file.write(struct.pack("<I", len(table)))
+            for value in table:
+                encoded = value.encode("utf-8", errors="replace")
+                self.file.write(struct.pack(length_format, len(encoded)))
+                self.file.write(encoded)
+
+        self.file.seek(0)
+        self.file.write(self._header(tables_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_trace_writer(path, architecture, text_base=0):
+    """
+    Otevře zapisovač trace podle přípony souboru (`.trc` = binární formát, jinak textový).
+
+    :param path: Cesta k výstupnímu trace souboru.
+    :param architecture: Architektura trace ('native', 'arm', 'riscv'), ukládá se jen do hlavičky binárního trace.
+    :param text_base: Adresa začátku kódu binárky (řádek `TEXT_BASE`).
+    """
+    if path.endswith(BINARY_TRACE_EXTENSION):
+        return BinaryTraceWriter(path, architecture, text_base)
+    return TextTraceWriter(path, text_base)
+
+
+class BinaryTrace:
+    """
+    Trace v binárním formátu namapovaný do paměti.
+
+    Atributy `functions` a `asm_texts` obsahují tabulky řetězců, záznamy se čtou
+    postupně přímo z mapované paměti metodou `records()`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, record_size, self.text_base, architecture,
+         tables_offset, self.record_count) = _HEADER.unpack_from(self.data, 0)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION or record_size != _RECORD.size:
+            raise ValueError(f"Soubor `{path}` není podporovaný binární trace.")
+        if tables_offset == 0:
+            raise ValueError(f"Binární trace `{path}` nebyl korektně uzavřen (chybí tabulky).")
+
+        self.architecture = architecture.rstrip(b"\0").decode()
+        self.records_offset = _HEADER.size
+
+        offset = tables_offset
+        self.functions, offset = self._read_table(offset, "<H")
+        self.asm_texts, offset = self._read_table(offset, "<I")
+
+    def _read_table(self, offset, length_format):
+        (count,) = struct.unpack_from("<I", self.data, offset)
+        offset += 4
+        length_size = struct.calcsize(length_format)
+        values = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(length_format, self.data, offset)
+            offset += length_size
+            values.append(self.data[offset:offset + length].decode("utf-8", errors="replace"))
+            offset += length
+        return values, offset
+
+    def records(self):
+        """
+        Postupně vrací záznamy trace jako n-tice `(druh, pc, id funkce, příznaky, id textu instrukce)`.
+        Záznamy `RECORD_BASE` se nevracejí, jen nastaví absolutní PC.
+        """
+        end = self.records_offset + self.record_count * _RECORD.size
+        view = memoryview(self.data)[self.records_offset:end]
+        records = _RECORD.iter_unpack(view)
+        pc = 0
+        try:
+            for delta, function_id, kind, flags, asm_id in records:
+                if kind == RECORD_BASE:
+                    pc = (asm_id << 32) | (delta & 0xffffffff)
+                    continue
+                pc += delta
+                yield kind, pc, function_id, flags, asm_id
+        finally:
+            # Mapovanou paměť lze zavřít, až když na ni neexistují žádné pohledy
+            del records
+            view.release()
+
+    def has_blocks(self):
+        """
+        Zjistí, zda trace obsahuje záznamy základních bloků (prohledá jen bajty s druhem záznamu).
+        """
+        end = self.records_offset + self.record_count * _RECORD.size
+        kinds = self.data[self.records_offset + _RECORD_KIND_OFFSET:end:_RECORD.size]
+        return RECORD_BLOCK in kinds
+
+    def text_lines(self):
+        """
+        Vrací řádky odpovídající textovému formátu trace (bez znaku konce řádku).
+        """
+        yield f"TEXT_BASE {hex(self.text_base)}"
+        for kind, pc, function_id, flags, asm_id in self.records():
+            if kind == RECORD_BLOCK:
+                yield f"{BLOCK_PREFIX}{hex(pc)} {asm_id}"
+                continue
+            if kind == RECORD_THREAD:
+                yield f"{THREAD_PREFIX}{asm_id}"
+                continue
+            function_name = self.functions[function_id]
+            if kind == RECORD_TRUNCATED:
+                yield f"{TRUNCATED_PREFIX}{function_name} {asm_id}"
+                continue
+            if kind == RECORD_LIBRARY:
+                yield f"{LIBRARY_PREFIX}{function_name} {asm_id}"
+                continue
+            if kind == RECORD_REGION:
+                yield f"{REGION_PREFIX}{REGION_BEGIN if asm_id else REGION_END} {function_name}"
+                continue
+            if kind == RECORD_END:
+                yield f"[END] {function_name}"
+                continue
+            asm = self.asm_texts[asm_id]
+            if flags & FLAG_CALL:
+                yield f"[CALL] {function_name} -> {asm.split()[-1]}"
+            yield f"{function_name}, {hex(pc)}: {asm}"
+
+    def close(self):
+        self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_text_trace(text_path, output_path, architecture):
+    """
+    Převede trace z textového formátu do binárního.
+
+    :param text_path: Cesta k textovému trace souboru.
+    :param output_path: Cesta k výstupnímu `.trc` souboru.
+    :param architecture: Architektura trace ('native', 'arm', 'riscv').
+    :return: Počet převedených instrukcí.
+    """
+    count = 0
+    with open(text_path, "r", errors="replace") as f:
+        first_line = f.readline()
+        text_base = 0
+        if first_line.startswith("TEXT_BASE"):
+            text_base = int(first_line.split()[1], 16)
+        else:
+            f.seek(0)
+
+        with BinaryTraceWriter(output_path, architecture, text_base) as writer:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.startswith("[CALL] "):
+                    caller, _, called = line[len("[CALL] "):].partition(" -> ")
+                    writer.call(caller, called)
+                elif line.startswith("[END] "):
+                    writer.end(line[len("[END] "):])
+                elif line.startswith(BLOCK_PREFIX):
+                    writer.block(*parse_block_line(line))
+                elif line.startswith(TRUNCATED_PREFIX):
+                    reason, truncated_count = parse_truncated_line(line)
+                    writer.truncated(reason, truncated_count if truncated_count is not None else count)
+                elif line.startswith(LIBRARY_PREFIX):
+                    writer.library(*parse_library_line(line))
+                elif line.startswith(THREAD_PREFIX):
+                    writer.thread(parse_thread_line(line))
+                elif line.startswith(REGION_PREFIX):
+                    writer.region(*parse_region_line(line))
+                else:
+                    match = _TEXT_INSTRUCTION.match(line)
+                    if match:
+                        writer.instruction(match.group(1), int(match.group(2), 16), match.group(3))
+                        count += 1
+    return count
@@ -0,0 +1,76 @@
+import time
+
+"""
+Limity jednoho běhu traceru: rozpočet instrukcí a časový limit (wall-clock).
+
+Vstup, na kterém se sledovaná funkce zacyklí (nebo jen běží velmi dlouho), by jinak krokování
+blokoval donekonečna. Po překročení limitu tracer krokování ukončí, zapíše do trace značku
+`[TRUNCATED] <důvod> <počet instrukcí>` (viz `core.engine.trace_format`) a analýza pak uloží
+počty instrukcí do okamžiku přerušení s příznakem `"truncated": true`.
+
+Modul nemá žádné závislosti mimo standardní knihovnu, aby jej mohly importovat i GDB skripty.
+"""
+
+LIMIT_BUDGET = "budget"
+LIMIT_TIMEOUT = "timeout"
+
+
+class TraceLimits:
+    """
+    Rozpočet instrukcí a časový limit krokování. Časový limit se počítá od vytvoření objektu.
+    """
+
+    # Čas se kontroluje jen při každém tolikátém volání `exceeded`
+    CHECK_EVERY = 256
+
+    def __init__(self, budget=None, timeout=None):
+        self.budget = budget
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.checks = 0
+
+    def __bool__(self):
+        return self.budget is not None or self.deadline is not None
+
+    def exceeded(self, instruction_count):
+        """
+        Vrátí důvod přerušení (`LIMIT_BUDGET`, `LIMIT_TIMEOUT`), pokud trace s `instruction_count`
+        zaznamenanými instrukcemi překročil některý z limitů, jinak None.
+        """
+        if self.budget is not None and instruction_count >= self.budget:
+            return LIMIT_BUDGET
+        if self.deadline is not None:
+            self.checks += 1
+            if self.checks % self.CHECK_EVERY == 0 and time.monotonic() >= self.deadline:
+                return LIMIT_TIMEOUT
+        return None
+
+
+def limit_options(budget=None, timeout=None):
+    """
+    Sestaví volby trace příkazu GDB skriptů pro zadané limity (viz `parse_limit_options`).
+    """
+    options = ""
+    if budget is not None:
+        options += f" --budget={int(budget)}"
+    if timeout:
+        options += f" --timeout={float(timeout)}"
+    return options
+
+
+def parse_limit_options(argv):
+    """
+    Odebere z argumentů příkazu volby `--budget=<instrukcí>` a `--timeout=<sekund>`
+    a vrátí `(zbylé argumenty, TraceLimits)`.
+    """
+    budget = None
+    timeout = None
+    rest = []
+    for arg in argv:
+        if arg.startswith("--budget="):
+            budget = int(arg[len("--budget="):])
+        elif arg.startswith("--timeout="):
+            timeout = float(arg[len("--timeout="):])
+        else:
+            rest.append(arg)
+    return rest, TraceLimits(budget, timeout)
@@ -0,0 +1,83 @@
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+from config import log_debug
+
+"""
+Průběžná analýza: tracer zapisuje textový trace do pojmenované roury (FIFO) a analýza jej čte
+současně s během programu, trace se tedy vůbec neukládá na disk.
+
+Tracer běží ve vlákně na pozadí (GDB a QEMU jako podprocesy, ptrace tracer přímo ve vlákně),
+analýza čte rouru ve volajícím vlákně. Pokud analýza skončí dříve než tracer (sledované volání
+funkce už skončilo), zavře rouru a tracer při dalším zápisu skončí chybou `EPIPE` – zbytek
+programu se tak zbytečně nekrokuje.
+"""
+
+_RELEASE_POLL = 0.05
+
+
+def _release_reader(fifo_path, reader_done):
+    """
+    Po skončení traceru odblokuje čtenáře roury: pokud tracer rouru vůbec neotevřel (chyba
+    při spuštění GDB apod.), čtenář by v `open()` čekal na zapisovatele donekonečna.
+    Krátké otevření a zavření strany pro zápis mu předá konec souboru.
+    """
+    while not reader_done.is_set():
+        try:
+            os.close(os.open(fifo_path, os.O_WRONLY | os.O_NONBLOCK))
+            return
+        except OSError as e:
+            # ENXIO: čtenář rouru ještě neotevřel (nebo ji už zavřel)
+            if e.errno != errno.ENXIO:
+                return
+        time.sleep(_RELEASE_POLL)
+
+
+def stream_trace(run_tracer, consume, trace_name, work_root=None):
+    """
+    Spustí tracer zapisující do roury a současně s ním analýzu, která z roury čte.
+
+    :param run_tracer: Funkce `(cesta k trace souboru)`, která spustí tracer (např. `run_gdb_trace`).
+    :param consume: Funkce `(otevřená roura)` vracející výsledek analýzy.
+    :param trace_name: Jméno roury (přípona určuje formát trace, musí být textový).
+    :param work_root: Složka pro dočasnou složku s rourou (výchozí: dočasná složka systému).
+    :return: Výsledek `consume`.
+    :raises: Výjimku traceru, pokud tracer selhal jinak než zavřením roury analýzou.
+    """
+    if work_root:
+        os.makedirs(work_root, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="stream_", dir=work_root)
+    fifo_path = os.path.join(work_dir, trace_name)
+    os.mkfifo(fifo_path)
+
+    reader_done = threading.Event()
+    errors = []
+
+    def tracer_entry():
+        try:
+            run_tracer(fifo_path)
+        except BrokenPipeError:
+            log_debug("Analýza skončila dříve než tracer, zbytek běhu se nezaznamenává.")
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            _release_reader(fifo_path, reader_done)
+
+    started = time.monotonic()
+    tracer = threading.Thread(target=tracer_entry, daemon=True)
+    tracer.start()
+    try:
+        with open(fifo_path, "r", errors="replace") as stream:
+            result = consume(stream)
+    finally:
+        reader_done.set()
+        tracer.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    log_debug(f"Průběžný trace a analýza `{trace_name}` trvaly {time.monotonic() - started:.2f} s")
+    if errors:
+        raise errors[0]
+    return result
@@ -0,0 +1,75 @@
+import re
+from config import get_call_instructions_regex, get_return_instructions_regex
+from core.engine.trace_format import TRUNCATED_PREFIX, LIBRARY_PREFIX
+
+"""
+Předkompilované regulární výrazy pro rozpoznávání řádků textového trace.
+
+Analýza (`core.engine.trace_analysis`) dříve sestavovala regulární výrazy (f-řetězce s adresou
+a jménem funkce) a prefixy pro `startswith` znovu pro každý řádek. `TraceTokenizer` je pro danou
+architekturu zkompiluje jen jednou a nabízí je ve dvou variantách: pro řádky typu `str`
+(soubor nebo roura otevřená v textovém režimu) a pro řádky typu `bytes` (soubor namapovaný
+do paměti, řádky se nedekódují).
+"""
+
+_cache = {}
+
+
+class TraceTokenizer:
+    """
+    Předkompilované vzory řádků textového trace pro jednu architekturu.
+
+    Atributy:
+        instruction   `<funkce>, <adresa>: <mnemonika>` na začátku řádku (skupiny: funkce, adresa, mnemonika)
+        call          instrukce volání s cílem `<adresa> <funkce>` (skupiny: mnemonika, adresa, volaná funkce)
+        returns       návratová instrukce (hledá se v celém řádku)
+        call_marker   řádek `[CALL] <volající> -> <volaná>` (skupiny: volající, volaná funkce)
+        *_prefix      prefixy značek (`[TRUNCATED]`, `[LIBRARY]`, `[END]`, `[CALL]`, `main,`)
+    """
+
+    def __init__(self, architecture, binary=False):
+        self.architecture = architecture
+        self.binary = binary
+        self.call_instructions = get_call_instructions_regex(architecture)
+
+        self.instruction = self._compile(r"(\w+),\s+(0x[0-9a-fA-F]+):\s+(\w+)")
+        self.call = self._compile(
+            rf".*({self.call_instructions})\s+(?:[a-zA-Z0-9_]+\s*,\s*)?(0x[0-9a-fA-F]+)\s+<(.+?)>")
+        self.returns = self._compile(get_return_instructions_regex(architecture))
+        self.call_marker = self._compile(r"\[CALL\] (\w+) -> <(\w+)>")
+
+        self.truncated_prefix = self.encode(TRUNCATED_PREFIX)
+        self.library_prefix = self.encode(LIBRARY_PREFIX)
+        self.end_prefix = self.encode("[END]")
+        self.call_prefix = self.encode("[CALL]")
+        self.main_prefix = self.encode("main,")
+        self.empty = self.encode("")
+
+    def encode(self, text):
+        """Převede řetězec na typ řádků tokenizeru."""
+        return text.encode() if self.binary else text
+
+    def decode(self, line):
+        """Převede řádek na `str`."""
+        return line.decode(errors="replace") if self.binary else line
+
+    def _compile(self, pattern):
+        return re.compile(self.encode(pattern))
+
+    def enter(self, function_name, runtime_addr_target=None):
+        """
+        Vzor instrukce volání `function_name` (na adresu `runtime_addr_target`, nebo libovolnou);
+        skupina 2 je adresa volané funkce.
+        """
+        target_address = hex(runtime_addr_target) if runtime_addr_target is not None else "0x[0-9a-fA-F]+"
+        return self._compile(rf"({self.call_instructions})\s+(?:[a-zA-Z0-9_]+\s*,\s*)?({target_address})\s+<{re.escape(function_name)}>")
+
+
+def get_tokenizer(architecture, binary=False):
+    """
+    Vrátí (jednou vytvořený) tokenizer pro architekturu a typ řádků (`binary` = řádky typu `bytes`).
+    """
+    key = (architecture, binary)
+    if key not in _cache:
+        _cache[key] = TraceTokenizer(architecture, binary)
+    return _cache[key]
@@ -1,21 +1,103 @@
+import os
 import shutil
 import subprocess
 import time
 import socket
 import tempfile
 import re
-from config import GDB_SCRIPT, GDB_SCRIPT_ARM, GDB_SCRIPT_RISCV
+from core.engine.pc_trace import read_qemu_exec_log, read_qemu_load_bias, read_pc_history, write_trace_from_pcs
+from core.engine.pc_trace import load_blacklist_regexes
+from core.engine.elf_reader import ElfFile, ET_DYN
+from core.engine.ptrace_tracer import trace_pcs, trace_region_pcs, sample_stacks, shared_libraries, count_function_calls
+from core.engine.sampling import write_samples
+from core.engine.call_counts import read_call_counts, COUNT_METHOD_PERF, COUNT_METHOD_PTRACE
+from core.engine.disassembly import build_instruction_index, load_disassembly
+from core.engine.library_costs import LibraryCostTable, find_library_calls, library_options
+from core.engine.trace_format import BINARY_TRACE_EXTENSION, TRUNCATED_PREFIX
+from core.engine.trace_limits import TraceLimits, limit_options, LIMIT_TIMEOUT
+from core.engine.scheduler import kill_process_tree
+from config import GDB_SCRIPT, GDB_SCRIPT_ARM, GDB_SCRIPT_RISCV, GDB_SCRIPT_REPLAY, QEMU_EXECLOG_PLUGIN, TRACE_KILL_GRACE
+from config import SAMPLE_MAX_DEPTH, SYMBOL_CACHE_DIRNAME, LIBRARY_COST_SAMPLES
 from config import log_info, log_debug, log_warning, log_error
 
 """
 Tento skript obsahuje funkce pro automatizaci traceování ARM binárek v QEMU prostředí s využitím GDB.
 Hlavním účelem skriptu je spuštění binárního souboru v emulátoru QEMU, připojení GDB pro ladění,
 a následné traceování instrukcí ARM. Skript také implementuje čekání na připravenost QEMU pomocí 
-kontroly otevřeného portu 1234 (použití netstat) a provádí traceování jak pro standardní ARM aplikace, 
+kontroly naslouchajícího portu a provádí traceování jak pro standardní ARM aplikace, 
 tak i pro specifické ARM buildy.
+
+Každé spuštění QEMU dostane vlastní volný port pro GDB server (`find_free_port`) a GDB zapisuje
+log do aktuálního pracovního adresáře, takže lze souběžně spouštět více trace
+(viz `core.engine.scheduler`).
+
+Všechny trace funkce přijímají limity jednoho běhu (`budget` – rozpočet instrukcí, `timeout` –
+časový limit v sekundách, viz `core.engine.trace_limits`). Krokování je hlídá samo a přerušený
+trace ukončí značkou `[TRUNCATED]`; GDB, které se ani `TRACE_KILL_GRACE` sekund po vypršení
+časového limitu neukončí, se zabije i s laděným programem (`run_limited`).
 """
 
-def run_gdb_trace(binary_file, trace_file, args):
+
+def run_limited(cmd, timeout=None):
+    """
+    Spustí příkaz (GDB) a počká na jeho dokončení, nejvýše však `timeout` sekund. Poté jej ukončí
+    i se všemi jeho potomky (laděný program by po zabití GDB pokračoval v běhu).
+
+    Parametry:
+    cmd (list): Příkaz a jeho argumenty.
+    timeout (float|None): Časový limit v sekundách (None = bez limitu).
+    Návratová hodnota:
+    bool: True, pokud příkaz doběhl sám, False, pokud byl ukončen po vypršení limitu.
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        process.wait(timeout=timeout)
+        return True
+    except subprocess.TimeoutExpired:
+        killed = kill_process_tree(process.pid)
+        process.wait()
+        log_warning(f"`{os.path.basename(cmd[0])}` neskončil do {timeout:.0f} s, ukončeno {killed} procesů.")
+        return False
+    except BaseException:
+        kill_process_tree(process.pid)
+        process.wait()
+        raise
+
+
+def _kill_timeout(timeout):
+    """Vrátí limit pro `run_limited`: GDB dostane čas na vlastní ukončení trace po `timeout`."""
+    return timeout + TRACE_KILL_GRACE if timeout else None
+
+
+def mark_truncated(trace_file, reason):
+    """
+    Doplní na konec textového trace značku `[TRUNCATED] <důvod>` po násilném ukončení traceru,
+    který ji sám nestihl zapsat (rozepsaný poslední řádek se uzavře). Binární trace bez uzavření
+    nemá tabulky řetězců a analyzovat jej nelze.
+    """
+    if trace_file.endswith(BINARY_TRACE_EXTENSION):
+        log_error(f"Binární trace `{trace_file}` nebyl po ukončení traceru uzavřen a nelze jej analyzovat.")
+        return
+    try:
+        # O_NONBLOCK: trace může být roura (`--stream`), jejíž čtenář už skončil
+        fd = os.open(trace_file, os.O_WRONLY | os.O_APPEND | os.O_NONBLOCK)
+    except OSError as e:
+        log_warning(f"Do trace `{trace_file}` nelze doplnit značku přerušení: {e}")
+        return
+    with os.fdopen(fd, "w") as f:
+        f.write(f"\n{TRUNCATED_PREFIX}{reason}\n")
+
+def get_library_costs_path(binary_file):
+    """
+    Vrátí cestu k tabulce cen knihovních funkcí binárky (`<složka binárky>/.symcache/<jméno>.libcosts.json`).
+    """
+    binary_file = os.path.abspath(binary_file)
+    return os.path.join(os.path.dirname(binary_file), SYMBOL_CACHE_DIRNAME,
+                        f"{os.path.basename(binary_file)}.libcosts.json")
+
+
+def run_gdb_trace(binary_file, trace_file, args, function_name=None, step_mode="instruction", record_method=None,
+                  budget=None, timeout=None, sample_interval=None, step_over_library=False, regions=False):
     """
     Spustí GDB s vybranými parametry a zachytí instrukce do `trace.log`.
 
@@ -23,48 +105,339 @@ def run_gdb_trace(binary_file, trace_file, args):
     binary_file (str): Cesta k binárnímu souboru, který má být traceován.
     trace_file (str): Cesta k souboru, kam budou uloženy trace instrukce.
     args (list): Seznam argumentů, které budou předány binárnímu souboru při spuštění.
+    function_name (str|None): Pokud je zadáno, program doběhne plnou rychlostí na vstup do této funkce
+                              a krokuje se jen do jejího návratu (trace omezený na funkci).
+    step_mode (str): 'instruction' (jeden `stepi` na instrukci) nebo 'block' (rovné úseky kódu
+                     proběhnou naráz až k další instrukci volání, skoku nebo návratu).
+    record_method (str|None): Pokud je zadáno ('auto', 'btrace', 'full'), volání `function_name` se
+                              místo krokování zaznamená přes `record` v GDB (viz `_record_command`).
+    budget (int|None): Nejvyšší počet zaznamenaných instrukcí, poté se krokování přeruší.
+    timeout (float|None): Časový limit krokování v sekundách.
+    sample_interval (float|None): Pokud je zadáno, volání `function_name` se místo krokování vzorkuje
+                                  s tímto intervalem v sekundách a `trace_file` je soubor vzorků
+                                  (viz `_sample_command` a `core.engine.sampling`).
+    step_over_library (bool): Volání knihovních funkcí (PLT, `function_blacklist_patterns`) se nekrokují,
+                              ale přejdou; trace obsahuje jen odhad jejich ceny (`core.engine.library_costs`).
+    regions (bool): Krokují se jen oblasti zájmu vyznačené ve zdrojovém kódu, mezi nimi program běží
+                    plnou rychlostí (`function_name` se nepoužije, viz `core.engine.regions`).
     Návratová hodnota:
     None
     """
+    trace_cmd = f"trace-asm {trace_file}"
+    if regions:
+        function_name = None
+    if function_name:
+        trace_cmd += f" {function_name}"
+    if record_method:
+        trace_cmd = _record_command("trace-asm", trace_file, function_name, record_method)
+    if sample_interval:
+        trace_cmd = _sample_command("trace-asm", trace_file, function_name, sample_interval)
+
+    # Index instrukcí binárky – GDB skript pak v každém kroku nedisassembluje
+    index_path = build_instruction_index(binary_file, "native")
+    if index_path:
+        trace_cmd += f" --index={index_path}"
+        if step_mode == "block":
+            trace_cmd += " --blocks"
+    elif step_mode == "block":
+        log_warning("Krokování po blocích vyžaduje index instrukcí, použije se krokování po instrukcích.")
+    if step_over_library and not (record_method or sample_interval or regions):
+        trace_cmd += library_options(get_library_costs_path(binary_file), LIBRARY_COST_SAMPLES)
+    if regions:
+        trace_cmd += " --regions"
+    trace_cmd += limit_options(budget, timeout)
+
     gdb_cmd = [
         "gdb", "-q", "-ex", f"source {GDB_SCRIPT}",
         "-ex", "set logging file gdb_log.txt",
         "-ex", "set logging on",
+        # Záznam běhu se před `exit_group` ptá, zda program zastavit
+        *(["-ex", "set confirm off"] if record_method else []),
+        # Přerušení vzorkováním se programu nepředává
+        *(["-ex", "handle SIGINT stop nopass"] if sample_interval else []),
         "-ex", "starti",
-        "-ex", f"trace-asm {trace_file}",
+        "-ex", trace_cmd,
         "-ex", "quit",
         "--args", binary_file, *args
     ]
 
     log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
     
+    if not run_limited(gdb_cmd, _kill_timeout(timeout)):
+        mark_truncated(trace_file, LIMIT_TIMEOUT)
+
+    if record_method:
+        write_trace_from_history(f"{trace_file}.history", trace_file, binary_file, "native", function_name)
+        _remove_history(f"{trace_file}.history")
+
+
+def _record_command(command, trace_file, function_name, record_method):
+    """
+    Sestaví trace příkaz GDB skriptu pro zachycení záznamem běhu (`--record`).
+
+    Skript zapíše historii vykonaných adres do `<trace_file>.history` a záznam metodou `full`
+    uloží příkazem `record save` do `<trace_file bez přípony>.gdbrec` (pro `run_gdb_replay`).
+    """
+    if not function_name:
+        raise ValueError("Záznam běhu v GDB vyžaduje cílovou funkci (capture `record`).")
+    save_file = f"{os.path.splitext(trace_file)[0]}.gdbrec"
+    return f"{command} {trace_file}.history {function_name} --record={record_method} --save={save_file}"
+
+
+def _sample_command(command, samples_file, function_name, sample_interval):
+    """
+    Sestaví trace příkaz GDB skriptu pro statistické vzorkování (`--sample`).
+
+    Skript zapíše vzorky zásobníku do `samples_file` a metadata do `<samples_file>.json`.
+    """
+    if not function_name:
+        raise ValueError("Vzorkování vyžaduje cílovou funkci (capture `sample`).")
+    return f"{command} {samples_file} {function_name} --sample={float(sample_interval)} --depth={SAMPLE_MAX_DEPTH}"
+
+
+def write_trace_from_history(history_file, trace_file, binary_file, architecture, function_name=None):
+    """
+    Převede historii adres ze záznamu běhu v GDB na trace (viz `core/gdb/trace_record.py`).
+
+    Parametry:
+    history_file (str): Soubor historie zapsaný GDB skriptem (vedle něj `<history_file>.json`).
+    trace_file (str): Cesta k výstupnímu trace souboru.
+    binary_file (str): Cesta k binárnímu souboru.
+    architecture (str): 'native', 'arm' nebo 'riscv'.
+    function_name (str|None): Funkce zájmu; výchozí je funkce, jejíž volání bylo zaznamenáno.
+                              Lze zvolit i funkci volanou uvnitř zaznamenaného volání.
+    Návratová hodnota:
+    int: Počet zapsaných instrukcí (0, pokud historie neexistuje).
+    """
+    if not os.path.exists(history_file):
+        log_error(f"Historie záznamu `{history_file}` nebyla vytvořena.")
+        return 0
+
+    pcs, metadata = read_pc_history(history_file)
+    if not metadata.get("complete", True):
+        log_warning(f"Záznam v `{history_file}` skončil před návratem z funkce, trace bude neúplný.")
+
+    mappings = {path: tuple(mapping) for path, mapping in metadata.get("mappings", {}).items()}
+    real_path = os.path.realpath(binary_file)
+    load_bias = 0
+    if ElfFile(binary_file).type == ET_DYN and real_path in mappings:
+        load_bias = mappings[real_path][2] or 0
+
+    # Instrukce volání předchází zaznamenanou historii (zapíše se z ní řádek `[CALL]`)
+    if metadata.get("call_pc") is not None:
+        pcs.insert(0, metadata["call_pc"])
+
+    return write_trace_from_pcs(pcs, trace_file, binary_file, architecture, function_name or metadata.get("function"),
+                                load_bias=load_bias, libraries=shared_libraries(mappings, binary_file))
+
+
+def run_gdb_replay(binary_file, record_file, trace_file, function_name=None, platform="native"):
+    """
+    Přehraje záznam uložený při `--capture record` (`record save`) a vytvoří z něj trace,
+    aniž by se program spouštěl znovu.
+
+    Parametry:
+    binary_file (str): Cesta k binárnímu souboru, ze kterého záznam pochází.
+    record_file (str): Uložený záznam (`.gdbrec`).
+    trace_file (str): Cesta k výstupnímu trace souboru.
+    function_name (str|None): Funkce zájmu (výchozí je zaznamenaná funkce).
+    platform (str): 'native', 'arm' nebo 'riscv'.
+    Návratová hodnota:
+    int: Počet zapsaných instrukcí.
+    """
+    gdb_archs = {"arm": "arm", "riscv": "riscv:rv64"}
+    if platform in gdb_archs:
+        gdb_executable = shutil.which("gdb-multiarch")
+        arch_cmds = ["-ex", f"set architecture {gdb_archs[platform]}"]
+    else:
+        gdb_executable = shutil.which("gdb")
+        arch_cmds = []
+    if not gdb_executable:
+        raise FileNotFoundError("[ERROR] GDB pro přehrání záznamu nebyl nalezen.")
+
+    history_file = f"{trace_file}.history"
+    gdb_cmd = [
+        gdb_executable, "-q",
+        "-ex", f"source {GDB_SCRIPT_REPLAY}",
+        "-ex", "set pagination off",
+        "-ex", "set confirm off",
+        *arch_cmds,
+        "-ex", f"file {binary_file}",
+        "-ex", f"trace-replay {record_file} {history_file}",
+        "-ex", "quit"
+    ]
+
+    log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
     subprocess.run(gdb_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
+    written = write_trace_from_history(history_file, trace_file, binary_file, platform, function_name)
+    _remove_history(history_file)
+    return written
+
 
-def wait_for_qemu_ready(timeout=30):
+def _remove_history(history_file):
+    for path in (history_file, f"{history_file}.json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_ptrace_trace(binary_file, trace_file, args, function_name=None, budget=None, timeout=None, step_over_library=False,
+                     regions=False):
     """
-    Čeká na to, až bude QEMU připraveno na připojení (používá netstat).
+    Nativní náhrada `run_gdb_trace`: krokuje binárku přímo přes `ptrace` a zaznamená jen adresy
+    vykonaných instrukcí, které se poté převedou na trace ve formátu GDB skriptů.
 
     Parametry:
+    binary_file (str): Cesta k binárnímu souboru (x86-64 Linux).
+    trace_file (str): Cesta k souboru, kam budou uloženy trace instrukce.
+    args (list): Argumenty programu (předávají se bez shellu, tedy bez uvozovek).
+    function_name (str|None): Pokud je zadáno, krokuje se jen první volání této funkce.
+    budget (int|None): Nejvyšší počet krokovaných instrukcí, poté se program ukončí.
+    timeout (float|None): Časový limit krokování v sekundách.
+    step_over_library (bool): Volání knihovních funkcí se přejdou plnou rychlostí (viz `run_gdb_trace`).
+    regions (bool): Krokují se jen oblasti zájmu (viz `run_gdb_trace` a `ptrace_tracer.trace_region_pcs`).
+    Návratová hodnota:
+    None
+    """
+    log_info(f"Spouštím ptrace tracer: {binary_file} {' '.join(args)}")
+    if regions:
+        pcs, load_bias, mappings, truncated = trace_region_pcs(binary_file, args, TraceLimits(budget, timeout))
+        write_trace_from_pcs(pcs, trace_file, binary_file, "native", load_bias=load_bias,
+                             libraries=shared_libraries(mappings, binary_file), truncated=truncated,
+                             threads=pcs.threads, regions=pcs.regions)
+        return
+
+    library_calls = library_costs = None
+    if step_over_library:
+        blacklist = load_blacklist_regexes()
+        library_calls = find_library_calls(load_disassembly(binary_file, "native", persistent=True),
+                                           lambda name: any(regex.search(name) for regex in blacklist))
+        library_costs = LibraryCostTable(get_library_costs_path(binary_file), LIBRARY_COST_SAMPLES)
+        log_debug(f"Přecházení {len(library_calls)} volání knihovních funkcí v `{binary_file}`")
+
+    pcs, load_bias, mappings, truncated = trace_pcs(binary_file, args, function_name, TraceLimits(budget, timeout),
+                                                    library_calls, library_costs)
+    if library_costs:
+        library_costs.save()
+    write_trace_from_pcs(pcs, trace_file, binary_file, "native", function_name,
+                         load_bias=load_bias, libraries=shared_libraries(mappings, binary_file), truncated=truncated,
+                         library_calls=pcs.library_calls, threads=pcs.threads)
+
+
+def run_ptrace_sample(binary_file, samples_file, args, function_name, interval, timeout=None):
+    """
+    Nativní náhrada vzorkování v GDB: vzorkuje volání funkce přímo přes `ptrace`
+    (viz `ptrace_tracer.sample_stacks`) a zapíše vzorky pro `core.engine.sampling`.
+
+    Parametry:
+    binary_file (str): Cesta k binárnímu souboru (x86-64 Linux).
+    samples_file (str): Cesta k výstupnímu souboru vzorků.
+    args (list): Argumenty programu (předávají se bez shellu, tedy bez uvozovek).
+    function_name (str): Vzorkovaná funkce.
+    interval (float): Interval mezi vzorky v sekundách.
+    timeout (float|None): Časový limit vzorkování v sekundách.
+    Návratová hodnota:
+    int: Počet zaznamenaných vzorků.
+    """
+    log_info(f"Spouštím ptrace vzorkování (interval {interval} s): {binary_file} {' '.join(args)}")
+    samples, load_bias, mappings, finished, truncated = sample_stacks(binary_file, args, function_name, interval,
+                                                                      SAMPLE_MAX_DEPTH, timeout)
+    write_samples(samples, samples_file, {
+        "function": function_name,
+        "interval": interval,
+        "complete": finished,
+        "truncated": truncated,
+        "mappings": {path: list(mapping) for path, mapping in mappings.items()},
+    })
+    return len(samples)
+
+
+def run_ptrace_count(binary_file, args, function_name, budget=None, timeout=None):
+    """
+    Změří počet instrukcí všech volání funkce nativní binárky mezi breakpointy na vstupu
+    do funkce a na návratových adresách (viz `core.engine.ptrace_tracer.count_function_calls`);
+    program se mimo volání nekrokuje a trace se nezapisuje.
+
+    Parametry:
+    binary_file (str): Cesta k binárnímu souboru (x86-64 Linux).
+    args (list): Argumenty programu (předávají se bez shellu, tedy bez uvozovek).
+    function_name (str): Cílová funkce.
+    budget (int|None): Rozpočet instrukcí nevnořených volání.
+    timeout (float|None): Časový limit běhu v sekundách.
+    Návratová hodnota:
+    tuple: (seznam volání, metoda `COUNT_METHOD_PERF` nebo `COUNT_METHOD_PTRACE`, důvod přerušení nebo None)
+    """
+    log_info(f"Spouštím ptrace počítání volání `{function_name}`: {binary_file} {' '.join(args)}")
+    calls, hardware, truncated = count_function_calls(binary_file, args, function_name, TraceLimits(budget, timeout))
+    return calls, COUNT_METHOD_PERF if hardware else COUNT_METHOD_PTRACE, truncated
+
+
+def find_free_port():
+    """
+    Vrátí číslo TCP portu, který je právě volný (přidělí jej jádro).
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def _is_port_listening(port):
+    """
+    Zjistí z `/proc/net/tcp*`, zda na portu `port` některý proces naslouchá (stav LISTEN).
+    K portu se nepřipojuje – GDB server QEMU user-mode by po odpojení spustil program.
+    """
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table, "r") as f:
+                next(f, None)
+                for line in f:
+                    parts = line.split()
+                    if len(parts) > 3 and parts[3] == "0A" and int(parts[1].rsplit(":", 1)[1], 16) == port:
+                        return True
+        except OSError:
+            continue
+    return False
+
+
+def wait_for_qemu_ready(port=1234, timeout=30, process=None):
+    """
+    Čeká na to, až bude QEMU připraveno na připojení (naslouchá na portu GDB serveru).
+
+    Parametry:
+    port (int): Port GDB serveru QEMU.
     timeout (int): Časový limit (v sekundách), po kterém skript přestane čekat. Výchozí je 30 sekund.
+    process (subprocess.Popen|None): Proces QEMU; pokud mezitím skončí, čekání se ukončí.
 
     Návratová hodnota:
     bool: True, pokud je QEMU připraveno na připojení, jinak False.
     """
-    for _ in range(timeout):
-        try:
-            result = subprocess.run(
-                ['netstat', '-tuln'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-            )
-            if '1234' in result.stdout and 'LISTEN' in result.stdout:
-                return True 
-        except subprocess.CalledProcessError:
-            pass
-        time.sleep(2)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _is_port_listening(port):
+            return True
+        if process is not None and process.poll() is not None:
+            return False
+        time.sleep(0.05)
     return False
 
 
-def run_gdb_trace_qemu(binary_file, trace_file, args, platform="arm"):
+def stop_process(process, timeout=5):
+    """
+    Ukončí proces (např. QEMU) a počká na něj; pokud nereaguje na SIGTERM, zabije jej.
+    """
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def run_gdb_trace_qemu(binary_file, trace_file, args, platform="arm", function_name=None, step_mode="instruction",
+                       record_method=None, budget=None, timeout=None, sample_interval=None, regions=False,
+                       count_only=False):
     """
     Spustí binárku v QEMU, připojí GDB a provede tracing pro ARM nebo RISC-V.
 
@@ -73,6 +446,21 @@ def run_gdb_trace_qemu(binary_file, trace_file, args, platform="arm"):
         trace_file (str): Cesta k souboru, kam budou uloženy trace instrukce.
         args (list): Argumenty pro spuštění binárního souboru v QEMU.
         platform (str): 'arm' nebo 'riscv'
+        function_name (str|None): Pokud je zadáno, krokuje se jen jedno volání této funkce
+                                  (místo krokování od `main`).
+        step_mode (str): 'instruction' nebo 'block' (viz `run_gdb_trace`).
+        record_method (str|None): Zachycení záznamem běhu v GDB místo krokování (viz `run_gdb_trace`).
+        budget (int|None): Rozpočet instrukcí (viz `run_gdb_trace`).
+        timeout (float|None): Časový limit krokování v sekundách; QEMU se ukončí nejpozději
+                              s GDB `TRACE_KILL_GRACE` sekund po jeho vypršení.
+        sample_interval (float|None): Vzorkování volání funkce místo krokování (viz `run_gdb_trace`).
+        regions (bool): Krokují se jen oblasti zájmu vyznačené ve zdrojovém kódu (viz `run_gdb_trace`).
+        count_only (bool): Místo trace jen změří počet instrukcí každého volání `function_name`: GDB
+                           zastavuje na vstupu do funkce a návratech z ní a krokuje jen uvnitř volání
+                           (`core/gdb/trace_count.py`). Do `trace_file` se zapíší počty volání.
+    Návratová hodnota:
+        tuple|None: Při `count_only` výsledek `read_call_counts` (při vypršení časového limitu
+                    s důvodem `LIMIT_TIMEOUT`), jinak None.
     """
     # Výběr QEMU a GDB architektury dle platformy
     if platform == "arm":
@@ -95,42 +483,169 @@ def run_gdb_trace_qemu(binary_file, trace_file, args, platform="arm"):
     if not gdb_executable:
         raise FileNotFoundError("[ERROR] `gdb-multiarch` nebyl nalezen. Zkontrolujte instalaci.")
 
+    # Při trace omezeném na funkci si trace příkaz sám doběhne na její vstup
+    if regions:
+        function_name = None
+    if function_name:
+        trace_cmd += f" {function_name}"
+        start_cmds = []
+    else:
+        start_cmds = ["-ex", "break main", "-ex", "continue"]
+
+    index_path = build_instruction_index(binary_file, platform) if not count_only else None
+    if index_path:
+        trace_cmd += f" --index={index_path}"
+        if step_mode == "block":
+            trace_cmd += " --blocks"
+    elif step_mode == "block":
+        log_warning("Krokování po blocích vyžaduje index instrukcí, použije se krokování po instrukcích.")
+
+    if count_only:
+        if not function_name:
+            raise ValueError("Počty volání vyžadují cílovou funkci.")
+        trace_cmd += " --count"
+    if record_method:
+        trace_cmd = _record_command(trace_cmd.split()[0], trace_file, function_name, record_method)
+    if sample_interval:
+        trace_cmd = _sample_command(trace_cmd.split()[0], trace_file, function_name, sample_interval)
+    if regions:
+        trace_cmd += " --regions"
+    trace_cmd += limit_options(budget, timeout)
+
     # Spuštění QEMU v GDB server módu
-    qemu_cmd = [qemu_executable, "-g", "1234", binary_file, *args]
+    port = find_free_port()
+    qemu_cmd = [qemu_executable, "-g", str(port), binary_file, *args]
     log_info(f"Spouštím QEMU: {' '.join(qemu_cmd)}")
     qemu_proc = subprocess.Popen(qemu_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-    if not wait_for_qemu_ready():
-        raise RuntimeError("[ERROR] QEMU není připraveno na připojení během timeoutu.")
+    try:
+        if not wait_for_qemu_ready(port, process=qemu_proc):
+            raise RuntimeError("[ERROR] QEMU není připraveno na připojení během timeoutu.")
 
-    # GDB příkaz
-    gdb_cmd = [
-        gdb_executable, "-q",
-        "-ex", f"source {gdb_script}",
-        "-ex", "set pagination off",
-        "-ex", "set confirm off",
-        "-ex", f"set architecture {gdb_arch}",
-        "-ex", "set logging file gdb_log.txt",
-        "-ex", "set logging overwrite on",
-        "-ex", "set logging enabled on",
-        "-ex", f"file {binary_file}",
-        "-ex", "target remote localhost:1234",
-        "-ex", "break main",
-        "-ex", "continue",
-        "-ex", trace_cmd,
-        "-ex", "set logging enabled off",
-        "-ex", "quit"
-    ]
-
-    log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
-    subprocess.run(gdb_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # GDB příkaz
+        gdb_cmd = [
+            gdb_executable, "-q",
+            "-ex", f"source {gdb_script}",
+            "-ex", "set pagination off",
+            "-ex", "set confirm off",
+            "-ex", f"set architecture {gdb_arch}",
+            *(["-ex", "handle SIGINT stop nopass"] if sample_interval else []),
+            "-ex", "set logging file gdb_log.txt",
+            "-ex", "set logging overwrite on",
+            "-ex", "set logging enabled on",
+            "-ex", f"file {binary_file}",
+            "-ex", f"target remote localhost:{port}",
+            *start_cmds,
+            "-ex", trace_cmd,
+            "-ex", "set logging enabled off",
+            "-ex", "quit"
+        ]
 
-    # Ukončíme QEMU
-    qemu_proc.terminate()
+        log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
+        completed = run_limited(gdb_cmd, _kill_timeout(timeout))
+        if not completed and not count_only:
+            mark_truncated(trace_file, LIMIT_TIMEOUT)
+    finally:
+        # Ukončíme QEMU i při chybě, aby nezůstal viset na portu
+        stop_process(qemu_proc)
     log_info("Trace dokončen, QEMU ukončen.")
 
+    if count_only:
+        calls, method, truncated = read_call_counts(trace_file)
+        return calls, method, truncated if completed else LIMIT_TIMEOUT
+
+    if record_method:
+        write_trace_from_history(f"{trace_file}.history", trace_file, binary_file, platform, function_name)
+        _remove_history(f"{trace_file}.history")
+
+
+def run_qemu_exec_trace(binary_file, trace_file, args, platform="arm", function_name=None, budget=None, timeout=None):
+    """
+    Spustí binárku v QEMU user-mode s logováním vykonaných instrukcí (bez GDB a krokování)
+    a převede log na trace ve stejném formátu, jaký vytváří GDB skripty.
+
+    Použije se TCG plugin `QEMU_EXECLOG_PLUGIN`, pokud je nastaven, jinak
+    `-one-insn-per-tb -d exec,nochain`, kdy každý vykonaný překladový blok odpovídá jedné instrukci.
+
+    Parametry:
+        binary_file (str): Cesta k binárnímu souboru pro Linux.
+        trace_file (str): Cesta k souboru, kam bude uložen trace.
+        args (list): Argumenty pro spuštění binárního souboru (předávají se bez shellu, tedy bez uvozovek).
+        platform (str): 'arm', 'riscv' nebo 'native' (qemu-x86_64)
+        function_name (str|None): Pokud je zadáno, do trace se zapíše jen první volání této funkce.
+        budget (int|None): Nejvyšší počet instrukcí zapsaných do trace (QEMU přitom program nepřerušuje).
+        timeout (float|None): Časový limit běhu QEMU v sekundách, poté se QEMU ukončí a trace
+                              se sestaví z dosud zapsané části logu.
+    """
+    log_file = f"{trace_file}.qemu.log"
+    truncated = _run_qemu_exec_log(binary_file, args, platform, log_file, timeout)
+
+    load_bias = read_qemu_load_bias(log_file, binary_file)
+    write_trace_from_pcs(read_qemu_exec_log(log_file), trace_file, binary_file, platform, function_name, load_bias=load_bias,
+                         budget=budget, truncated=truncated)
+    os.remove(log_file)
+    log_info("Trace z QEMU logu dokončen.")
+
+
+def run_qemu_count(binary_file, args, platform, function_name, budget=None, timeout=None):
+    """
+    Změří počet instrukcí všech volání funkce binárky v QEMU user-mode s GDB
+    (`run_gdb_trace_qemu` s `count_only`); trace se nezapisuje.
+
+    Parametry:
+        binary_file (str): Cesta k binárnímu souboru pro Linux.
+        args (list): Argumenty programu.
+        platform (str): 'arm' nebo 'riscv'
+        function_name (str): Cílová funkce.
+        budget (int|None): Rozpočet instrukcí nevnořených volání.
+        timeout (float|None): Časový limit běhu v sekundách.
+    Návratová hodnota:
+        tuple: (seznam volání, metoda `COUNT_METHOD_*`, důvod přerušení nebo None)
+    """
+    fd, counts_file = tempfile.mkstemp(prefix="count_", suffix=".jsonl", dir=".")
+    os.close(fd)
+    try:
+        return run_gdb_trace_qemu(binary_file, counts_file, args, platform, function_name, budget=budget,
+                                  timeout=timeout, count_only=True)
+    finally:
+        if os.path.exists(counts_file):
+            os.remove(counts_file)
+
+
+def _run_qemu_exec_log(binary_file, args, platform, log_file, timeout=None):
+    """
+    Spustí binárku v QEMU user-mode s logováním vykonaných instrukcí do `log_file`.
+
+    :return: `LIMIT_TIMEOUT`, pokud QEMU nedoběhlo v časovém limitu, jinak None.
+    """
+    qemu_names = {"arm": "qemu-arm", "riscv": "qemu-riscv64", "native": "qemu-x86_64"}
+    if platform not in qemu_names:
+        raise ValueError(f"Neznámá platforma: {platform}")
+
+    qemu_executable = shutil.which(qemu_names[platform])
+    if not qemu_executable:
+        raise FileNotFoundError(f"[ERROR] QEMU pro platformu `{platform}` nebyl nalezen.")
+
+    if QEMU_EXECLOG_PLUGIN:
+        qemu_cmd = [qemu_executable, "-plugin", QEMU_EXECLOG_PLUGIN, "-d", "plugin,page", "-D", log_file, binary_file, *args]
+    else:
+        qemu_cmd = [qemu_executable, "-one-insn-per-tb", "-d", "exec,nochain,page", "-D", log_file, binary_file, *args]
+
+    log_info(f"Spouštím QEMU s logováním instrukcí: {' '.join(qemu_cmd)}")
+    truncated = None
+    try:
+        subprocess.run(qemu_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        log_warning(f"QEMU neskončilo do {timeout:g} s, log vykonaných instrukcí bude zkrácen.")
+        truncated = LIMIT_TIMEOUT
 
-def run_gdb_trace_qemu_bm(binary_file, trace_file, platform="arm_bm", qemu_machine="virt", cpu_model=None, qemu_extra_args=None):
+    if not os.path.exists(log_file):
+        raise RuntimeError(f"[ERROR] QEMU nevytvořilo log `{log_file}`.")
+    return truncated
+
+
+def run_gdb_trace_qemu_bm(binary_file, trace_file, platform="arm_bm", qemu_machine="virt", cpu_model=None, qemu_extra_args=None,
+                          budget=None, timeout=None):
     """
     Spustí bare-metal binárku v QEMU, připojí GDB a provede tracing pro ARM nebo RISC-V.
 
@@ -141,6 +656,8 @@ def run_gdb_trace_qemu_bm(binary_file, trace_file, platform="arm_bm", qemu_machi
         qemu_machine (str): QEMU machine model (např. "virt", "lm3s6965evb", "sifive_e").
         cpu_model (str|None): Volitelný CPU model (např. "cortex-a15" pro ARM).
         qemu_extra_args (list|None): Další argumenty pro QEMU (např. ["-nographic"])
+        budget (int|None): Rozpočet instrukcí (viz `run_gdb_trace`).
+        timeout (float|None): Časový limit GDB v sekundách, poté se GDB i QEMU ukončí.
     """
     if platform == "arm_bm":
         qemu_executable = shutil.which("qemu-system-arm")
@@ -162,47 +679,52 @@ def run_gdb_trace_qemu_bm(binary_file, trace_file, platform="arm_bm", qemu_machi
     if not gdb_executable:
         raise FileNotFoundError("[ERROR] `gdb-multiarch` nebyl nalezen. Zkontrolujte instalaci.")
 
+    port = find_free_port()
     qemu_cmd = [
         qemu_executable,
         "-M", qemu_machine,
         "-nographic",
         "-kernel", binary_file,
-        "-gdb", "tcp::1234",
+        "-gdb", f"tcp::{port}",
         "-S"
     ]
 
     if cpu_model and platform == "arm_bm":
         qemu_cmd += ["-cpu", cpu_model]
 
+    trace_cmd += limit_options(budget, timeout)
+
     if qemu_extra_args:
         qemu_cmd += qemu_extra_args
 
     log_info(f"Spouštím QEMU (bare-metal): {' '.join(qemu_cmd)}")
     qemu_proc = subprocess.Popen(qemu_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
-    if not wait_for_qemu_ready():
-        raise RuntimeError("[ERROR] QEMU není připraveno na připojení během timeoutu.")
+    try:
+        if not wait_for_qemu_ready(port, process=qemu_proc):
+            raise RuntimeError("[ERROR] QEMU není připraveno na připojení během timeoutu.")
 
-    gdb_cmd = [
-        gdb_executable, "-q",
-        "-ex", f"source {gdb_script}",
-        "-ex", "set pagination off",
-        "-ex", "set confirm off",
-        "-ex", f"set architecture {gdb_arch}",
-        "-ex", "set logging file gdb_log.txt",
-        "-ex", "set logging overwrite on",
-        "-ex", "set logging enabled on",
-        "-ex", f"file {binary_file}",
-        "-ex", "target remote localhost:1234",
-        "-ex", "break *0x0",
-        "-ex", "continue",
-        "-ex", trace_cmd,
-        "-ex", "set logging enabled off",
-        "-ex", "quit"
-    ]
-
-    log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
-    subprocess.run(gdb_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        gdb_cmd = [
+            gdb_executable, "-q",
+            "-ex", f"source {gdb_script}",
+            "-ex", "set pagination off",
+            "-ex", "set confirm off",
+            "-ex", f"set architecture {gdb_arch}",
+            "-ex", "set logging file gdb_log.txt",
+            "-ex", "set logging overwrite on",
+            "-ex", "set logging enabled on",
+            "-ex", f"file {binary_file}",
+            "-ex", f"target remote localhost:{port}",
+            "-ex", "break *0x0",
+            "-ex", "continue",
+            "-ex", trace_cmd,
+            "-ex", "set logging enabled off",
+            "-ex", "quit"
+        ]
 
-    qemu_proc.terminate()
+        log_info(f"Spouštím GDB: {' '.join(gdb_cmd)}")
+        if not run_limited(gdb_cmd, _kill_timeout(timeout)):
+            mark_truncated(trace_file, LIMIT_TIMEOUT)
+    finally:
+        stop_process(qemu_proc)
     log_info("Trace dokončen, QEMU ukončen.")
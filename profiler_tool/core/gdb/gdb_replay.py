@@ -0,0 +1,22 @@
+import gdb
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from trace_record import replay_recording
+
+class TraceReplay(gdb.Command):
+    def __init__(self):
+        super().__init__("trace-replay", gdb.COMMAND_USER)
+
+    def invoke(self, argument, from_tty):
+        argv = gdb.string_to_argv(argument)
+        if len(argv) != 2:
+            gdb.write("Použití: trace-replay <record_file> <history_file>\n")
+            return
+
+        gdb.write("Přehrávám uložený záznam běhu...\n")
+        if replay_recording(argv[0], argv[1]):
+            gdb.write(f"Přehrávání dokončeno. Výstup v {argv[1]}\n")
+
+TraceReplay()
@@ -1,21 +1,101 @@
 import gdb
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine"))
+from trace_scope import run_to_function
+from trace_format import open_trace_writer
+from trace_index import InstructionIndex, parse_index_option, parse_blocks_option
+from trace_record import record_function, parse_record_options
+from trace_sample import sample_function, parse_sample_options
+from trace_limits import parse_limit_options
+from trace_config import is_blacklisted_function
+from trace_threads import ThreadScheduler
+from trace_regions import trace_regions
+from regions import parse_regions_option
+from library_costs import LibraryCostTable, library_call_target, parse_library_option
+
+
+def _read_sp():
+    return int(gdb.parse_and_eval("$sp"))
+
+
+def _measure_call(return_address, call_sp):
+    """
+    Krokuje právě volanou funkci (program stojí na instrukci volání) bez zápisu do trace
+    až k návratu na `return_address` a vrátí počet jejích instrukcí.
+    """
+    gdb.execute("si", to_string=True)
+    count = 0
+    try:
+        while gdb.newest_frame().pc() != return_address or _read_sp() < call_sp:
+            gdb.execute("si", to_string=True)
+            count += 1
+    except gdb.error:
+        # Program skončil uvnitř volané funkce (např. `exit`)
+        pass
+    return count
+
 
 class TraceAsm(gdb.Command):
     def __init__(self):
         super().__init__("trace-asm", gdb.COMMAND_USER)
 
     def invoke(self, argument, from_tty):
-        argv = gdb.string_to_argv(argument)
-        if len(argv) != 1:
-            gdb.write("Použití: trace-asm <output_file>\n")
+        argv, index_path = parse_index_option(gdb.string_to_argv(argument))
+        argv, blocks = parse_blocks_option(argv)
+        argv, record_method, save_file = parse_record_options(argv)
+        argv, limits = parse_limit_options(argv)
+        argv, sample_interval, sample_depth = parse_sample_options(argv)
+        argv, library_costs_path, cost_samples = parse_library_option(argv)
+        argv, regions = parse_regions_option(argv)
+        if len(argv) not in (1, 2):
+            gdb.write("Použití: trace-asm <output_file> [function] [--index=<soubor>] [--blocks] [--record[=<metoda>] [--save=<soubor>]] [--sample=<sekund> [--depth=<rámců>]] [--step-over=<tabulka cen> [--cost-samples=<volání>]] [--regions] [--budget=<instrukcí>] [--timeout=<sekund>]\n")
+            return
+        if record_method and len(argv) != 2:
+            gdb.write("[ERROR] Záznam běhu (--record) vyžaduje cílovou funkci.\n")
+            return
+        if sample_interval and len(argv) != 2:
+            gdb.write("[ERROR] Vzorkování (--sample) vyžaduje cílovou funkci.\n")
             return
         
         output_file = argv[0]
         #tested_function = argv[1]
         #regs_file = output_file + ".regs"   # <<< nový soubor pro registry
 
+        # Volitelně krokujeme jen jedno volání zadané funkce
+        scope = None
+        if len(argv) == 2:
+            scope = run_to_function(argv[1], ("call", "callq", "jmp", "jmpq"), "call   {addr} <{function}>")
+            if scope is None:
+                return
+
+        # Záznam běhu v GDB místo krokování: výstupem je historie adres, trace z ní sestaví tracer
+        if record_method:
+            record_function(scope, output_file, record_method, save_file)
+            scope.finish()
+            return
+
+        # Statistické vzorkování zásobníku místo krokování (program běží plnou rychlostí)
+        if sample_interval:
+            if sample_function(scope, output_file, sample_interval, sample_depth, limits):
+                scope.finish()
+            return
+
+        # Krokují se jen oblasti zájmu vyznačené ve zdrojovém kódu, mezi nimi program běží plnou rychlostí
+        if regions:
+            with open_trace_writer(output_file, "native") as f:
+                trace_regions(f, InstructionIndex(index_path), limits, "$rdi", ("call", "jmp"))
+            gdb.write("Analýza dokončena. Výstup v trace.log\n")
+            return
+
         registers_wrote = False
-        thread = gdb.inferiors()[0].threads()[0]
+
+        # Krokují se všechna vlákna programu, sledované volání jen ve vlákně, ve kterém začalo
+        scheduler = ThreadScheduler()
+        scope_thread = gdb.selected_thread().num
+        current_thread = 1
 
         text_base = "0x0"
         text_base_address = gdb.execute("info proc mappings", to_string=True)
@@ -24,22 +104,57 @@ class TraceAsm(gdb.Command):
                 text_base = line.split()[0]
                 break
 
-    
-        with open(output_file, "w") as f:
-            f.write(f"TEXT_BASE {text_base}\n")
+        # Volání knihovních funkcí se přecházejí, jejich cena se odhadne z tabulky
+        library_costs = LibraryCostTable(library_costs_path, cost_samples) if library_costs_path else None
+
+        truncated = None
+        with open_trace_writer(output_file, "native", int(text_base, 16)) as f:
             gdb.write("Spuštěna analýza instrukcí... (běží v pozadí)\n")
 
-            while thread.is_valid():
+            index = InstructionIndex(index_path)
+
+            if scope:
+                if scope_thread != current_thread:
+                    f.thread(scope_thread)
+                    current_thread = scope_thread
+                scope.write_call(f, index)
+
+            while True:
+                thread = scheduler.select()
+                if thread is None:
+                    break
+                if thread.num != current_thread:
+                    f.thread(thread.num)
+                    current_thread = thread.num
+
                 frame = gdb.newest_frame()
-                function_name = frame.name()
+                runtime_pc = frame.pc()
+                pc, function_name, instr = index.lookup(frame, runtime_pc)
 
-                if function_name:
-                    pc = frame.pc()
-                    instr = frame.architecture().disassemble(pc)[0]['asm']
-                    
+                if scope and thread.num == scope_thread and scope.is_finished(runtime_pc):
+                    scope.write_end(f)
+                    break
+
+                # Po překročení rozpočtu instrukcí nebo časového limitu krokování končí
+                truncated = limits.exceeded(f.instruction_count)
+                if truncated:
+                    f.truncated(truncated, f.instruction_count)
+                    gdb.write(f"[WARN] Trace přerušen ({truncated}) po {f.instruction_count} instrukcích.\n")
+                    break
+
+                # Rovný úsek kódu proběhne naráz, větvení pak krokujeme po instrukcích
+                # (jen u jednoho vlákna, `continue` na konec bloku by pustilo i ostatní vlákna)
+                multithreaded = scheduler.is_multithreaded()
+                if blocks and not multithreaded and index.advance_block(f, runtime_pc):
+                    continue
+
+                library_function = None
+                if function_name and instr:
                     if instr.startswith("call") or instr.startswith("jmp"):
                         called_function = instr.split()[-1]
-                        f.write(f"[CALL] {function_name} -> {called_function}\n")
+                        f.call(function_name, called_function)
+                        if library_costs and not multithreaded:
+                            library_function = library_call_target(instr, is_blacklisted_function)
 
                         #called_function = instr.split()[-1].strip('<>')
                         """
@@ -52,9 +167,27 @@ class TraceAsm(gdb.Command):
                             registers_wrote = True    
                         """
 
-                    f.write(f"{function_name}, {hex(pc)}: {instr}\n")
+                    f.instruction(function_name, pc, instr)
+
+                if library_function:
+                    if library_costs.needs_measurement(library_function):
+                        return_address = runtime_pc + gdb.selected_inferior().architecture().disassemble(runtime_pc)[0]["length"]
+                        cost = _measure_call(return_address, _read_sp())
+                        library_costs.add_measurement(library_function, cost)
+                    else:
+                        gdb.execute("nexti", to_string=True)
+                        cost = library_costs.estimate(library_function)
+                    f.library(library_function, cost)
+                    continue
+
+                scheduler.step()
+
+        if library_costs:
+            library_costs.save()
 
-                gdb.execute("si", to_string=True)
+        # Přerušený program nedobíhá (mohl by běžet donekonečna), ukončí jej až `quit`
+        if scope and not truncated:
+            scope.finish()
 
         gdb.write("Analýza dokončena. Výstup v trace.log\n")
 
@@ -2,6 +2,19 @@ import gdb
 import re
 import json
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "engine"))
+from trace_scope import run_to_function
+from trace_format import open_trace_writer
+from trace_index import InstructionIndex, parse_index_option, parse_blocks_option
+from trace_record import record_function, parse_record_options
+from trace_sample import sample_function, parse_sample_options
+from trace_count import count_calls, parse_count_option
+from trace_regions import trace_regions
+from regions import parse_regions_option
+from trace_limits import parse_limit_options
 
 # ---------- trace_config.py LOGIKA ----------
 CONFIG_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "config", "trace_config.json"))
@@ -42,12 +55,51 @@ class TraceAsmARM(gdb.Command):
         super().__init__("trace-asm-arm", gdb.COMMAND_USER)
 
     def invoke(self, argument, from_tty):
-        argv = gdb.string_to_argv(argument)
-        if len(argv) != 1:
-            gdb.write("Použití: trace-asm-arm <output_file> <temp_func_file>\n")
+        argv, index_path = parse_index_option(gdb.string_to_argv(argument))
+        argv, blocks = parse_blocks_option(argv)
+        argv, record_method, save_file = parse_record_options(argv)
+        argv, limits = parse_limit_options(argv)
+        argv, sample_interval, sample_depth = parse_sample_options(argv)
+        argv, count_only = parse_count_option(argv)
+        argv, regions = parse_regions_option(argv)
+        if len(argv) not in (1, 2):
+            gdb.write("Použití: trace-asm-arm <output_file> [function] [--index=<soubor>] [--blocks] [--record[=<metoda>] [--save=<soubor>]] [--sample=<sekund> [--depth=<rámců>]] [--count] [--regions] [--budget=<instrukcí>] [--timeout=<sekund>]\n")
+            return
+        if record_method and len(argv) != 2:
+            gdb.write("[ERROR] Záznam běhu (--record) vyžaduje cílovou funkci.\n")
+            return
+        if sample_interval and len(argv) != 2:
+            gdb.write("[ERROR] Vzorkování (--sample) vyžaduje cílovou funkci.\n")
+            return
+        if count_only and len(argv) != 2:
+            gdb.write("[ERROR] Počty volání (--count) vyžadují cílovou funkci.\n")
             return
 
         output_file = argv[0]
+
+        # Jen počty instrukcí volání funkce mezi breakpointy na vstupu a návratech (viz `trace_count`)
+        if count_only:
+            count_calls(argv[1], output_file, limits=limits)
+            return
+
+        # Volitelně krokujeme jen jedno volání zadané funkce
+        scope = None
+        if len(argv) == 2:
+            scope = run_to_function(argv[1], ("bl", "blx"), "bl\t{addr} <{function}>")
+            if scope is None:
+                return
+
+        # Záznam běhu v GDB místo krokování: výstupem je historie adres, trace z ní sestaví tracer
+        if record_method:
+            record_function(scope, output_file, record_method, save_file)
+            scope.finish()
+            return
+
+        # Statistické vzorkování zásobníku místo krokování (program běží plnou rychlostí)
+        if sample_interval:
+            if sample_function(scope, output_file, sample_interval, sample_depth, limits):
+                scope.finish()
+            return
   
         text_base = "0x0"
         try:
@@ -59,8 +111,15 @@ class TraceAsmARM(gdb.Command):
         except Exception as e:
             gdb.write(f"[WARN] Nepodařilo se získat mappingy: {e}\n")
 
-        with open(output_file, "w") as f:
-            f.write(f"TEXT_BASE {text_base}\n")
+        # Krokují se jen oblasti zájmu vyznačené ve zdrojovém kódu, mezi nimi program běží plnou rychlostí
+        if regions:
+            with open_trace_writer(output_file, "arm", int(text_base, 16)) as f:
+                trace_regions(f, InstructionIndex(index_path), limits, "$r0", ("bl", "b "), skip_blacklisted=True)
+            gdb.write("Analýza dokončena. Výstup v trace.log\n")
+            return
+
+        truncated = None
+        with open_trace_writer(output_file, "arm", int(text_base, 16)) as f:
             gdb.write("Spuštěna analýza instrukcí (ARM)... (běží v pozadí)\n")
 
             try:
@@ -72,28 +131,47 @@ class TraceAsmARM(gdb.Command):
                 thread = inferior.threads()[0]
                 thread.switch()
                 frame = gdb.newest_frame()
+                index = InstructionIndex(index_path)
+
+                if scope:
+                    scope.write_call(f, index)
 
                 while frame is not None and frame.is_valid():
                     try:
                         pc = frame.pc()
-                        disasm = frame.architecture().disassemble(pc)
-                        function_name = frame.name() or "???"
 
-                        if disasm:
-                            instr = disasm[0]['asm']
+                        if scope and scope.is_finished(pc):
+                            scope.write_end(f)
+                            break
+
+                        # Po překročení rozpočtu instrukcí nebo časového limitu krokování končí
+                        truncated = limits.exceeded(f.instruction_count)
+                        if truncated:
+                            f.truncated(truncated, f.instruction_count)
+                            gdb.write(f"[WARN] Trace přerušen ({truncated}) po {f.instruction_count} instrukcích.\n")
+                            break
 
+                        # Rovný úsek kódu proběhne naráz, větvení pak krokujeme po instrukcích
+                        if blocks and index.advance_block(f, pc):
+                            frame = gdb.newest_frame()
+                            continue
+
+                        record_pc, function_name, instr = index.lookup(frame, pc)
+                        function_name = function_name or "???"
+
+                        if instr:
                             if instr.startswith("bl") or instr.startswith("blx") or instr.startswith("b "):
                                 called_function = instr.split()[-1]
-                                f.write(f"[CALL] {function_name} -> {called_function}\n")
+                                f.call(function_name, called_function)
                                 called_function = instr.split()[-1].strip('<>')
 
                                 if is_blacklisted_function(called_function):
-                                    f.write(f"{function_name}, {hex(pc)}: {instr}\n")
+                                    f.instruction(function_name, record_pc, instr)
                                     gdb.execute("nexti", to_string=True)
                                     frame = gdb.newest_frame()
                                     continue
 
-                            f.write(f"{function_name}, {hex(pc)}: {instr}\n")
+                            f.instruction(function_name, record_pc, instr)
                         else:
                             gdb.write(f"[WARN] Disasm selhal na {hex(pc)}\n")
 
@@ -106,6 +184,10 @@ class TraceAsmARM(gdb.Command):
             except Exception as e:
                 gdb.write(f"[ERROR] Trace se nezdařil: {e}\n")
 
-            gdb.write("Analýza dokončena. Výstup v trace.log\n")
+        # Přerušený program nedobíhá (mohl by běžet donekonečna), ukončí jej až `quit`
+        if scope and not truncated:
+            scope.finish()
+
+        gdb.write("Analýza dokončena. Výstup v trace.log\n")
 
 TraceAsmARM()
@@ -30,7 +30,6 @@ def _load_blacklist_config():
         _blacklist_regexes = []
 
 def is_blacklisted_function(function_name: str) -> bool:
-    gdb.write(f"volase is lbacklisted function")
     if not _blacklist_regexes:
         _load_blacklist_config()
 
@@ -0,0 +1,182 @@
+import gdb
+import json
+import re
+
+"""
+Počty instrukcí jednotlivých volání cílové funkce bez krokování celého programu (`--count`)
+pro skripty `gdb_trace*.py`.
+
+GDB zastaví program jen na vstupu do cílové funkce a na návratových adresách jejích volání. Počet
+instrukcí volání je rozdíl čítače při návratu a při vstupu; čítač se volí podle cíle:
+    icount   QEMU spuštěné s `-icount` a záznamem běhu (`rr=record`, systémová emulace): program běží plnou
+             rychlostí i uvnitř volání a při každém zastavení se přes monitor QEMU (`info replay`)
+             přečte počet dosud vykonaných instrukcí
+    step     ostatní cíle (QEMU user-mode nemá `-icount` ani monitor): mimo volání program běží plnou
+             rychlostí, uvnitř rozpracovaného volání se krokuje `stepi` a kroky se počítají
+
+Limity (`TraceLimits`) platí pro instrukce nevnořených volání; po jejich překročení se program ukončí.
+Bare-metal program po skončení `main` neskončí, počítání proto končí návratem z `main`
+(u user-mode programu skončením procesu). Výstupem je soubor s jedním JSON objektem na řádek:
+záhlaví `{"method": ...}`, volání (`call`, `depth`, `instructions`, `complete`) a případně
+`{"truncated": <důvod>}`; načte jej `core.engine.call_counts.read_call_counts`.
+"""
+
+# Výstup `info replay`: "Recording execution '<soubor>': instruction count = <počet>"
+_ICOUNT = re.compile(r"instruction count\s*[=:]?\s*(\d+)")
+
+METHOD_ICOUNT = "icount"
+METHOD_STEP = "step"
+
+
+def read_icount():
+    """
+    Přečte počet vykonaných instrukcí z monitoru QEMU (vyžaduje `-icount` se záznamem běhu).
+    """
+    output = gdb.execute("monitor info replay", to_string=True)
+    match = _ICOUNT.search(output)
+    if not match:
+        raise gdb.GdbError(f"Čítač instrukcí QEMU není dostupný (spusťte QEMU s `-icount ...,rr=record`): {output.strip()}")
+    return int(match.group(1))
+
+
+def _read_sp():
+    return int(gdb.parse_and_eval("$sp"))
+
+
+class _ReturnBreakpoints:
+    """
+    Breakpointy na návratových adresách rozpracovaných volání (jeden na adresu, sdílený voláními).
+    """
+
+    def __init__(self):
+        self.breakpoints = {}
+
+    def add(self, address):
+        breakpoint, users = self.breakpoints.get(address, (None, 0))
+        if breakpoint is None:
+            breakpoint = gdb.Breakpoint(f"*{hex(address)}", internal=True)
+        self.breakpoints[address] = (breakpoint, users + 1)
+
+    def remove(self, address):
+        breakpoint, users = self.breakpoints[address]
+        if users > 1:
+            self.breakpoints[address] = (breakpoint, users - 1)
+        else:
+            breakpoint.delete()
+            del self.breakpoints[address]
+
+    def clear(self):
+        for breakpoint, _ in self.breakpoints.values():
+            breakpoint.delete()
+        self.breakpoints.clear()
+
+
+def _icount_available():
+    """
+    Zjistí, zda je čítač instrukcí QEMU dostupný; pokud ne, vypíše důvod přechodu na krokování volání.
+    """
+    try:
+        read_icount()
+    except (gdb.error, gdb.GdbError) as e:
+        gdb.write(f"[WARN] Čítač instrukcí QEMU není dostupný, instrukce volání se spočítají krokováním: {e}\n")
+        return False
+    return True
+
+
+def count_calls(function_name, counts_file, end_function="main", limits=None):
+    """
+    Změří počet instrukcí každého volání `function_name` a zapíše je do `counts_file`.
+
+    :param function_name: Název cílové funkce.
+    :param counts_file: Cesta k výstupnímu souboru.
+    :param end_function: Funkce, jejímž návratem počítání končí.
+    :param limits: Volitelné `TraceLimits` pro instrukce nevnořených volání.
+    :return: Počet zaznamenaných volání.
+    """
+    entry_pc = int(gdb.parse_and_eval(f"(long) &{function_name}")) & ~1
+    end_pc = int(gdb.parse_and_eval(f"(long) &{end_function}")) & ~1
+    method = METHOD_ICOUNT if _icount_available() else METHOD_STEP
+    entry_breakpoint = gdb.Breakpoint(f"*{hex(entry_pc)}", internal=True)
+    end_breakpoint = gdb.Breakpoint(f"*{hex(end_pc)}", internal=True)
+    returns = _ReturnBreakpoints()
+
+    active = []  # (návratová adresa, ukazatel zásobníku při vstupu, čítač při vstupu, záznam volání)
+    calls = 0
+    end = None  # (návratová adresa, ukazatel zásobníku) funkce `end_function`
+    count = 0
+    steps = 0
+    counted = 0  # instrukce dokončených nevnořených volání
+    truncated = None
+
+    with open(counts_file, "w") as f:
+        f.write(json.dumps({"method": method}) + "\n")
+        while True:
+            try:
+                # Při krokování se zastavuje i uvnitř volání, návratové breakpointy nejsou potřeba
+                if method == METHOD_STEP and active:
+                    gdb.execute("stepi", to_string=True)
+                    steps += 1
+                else:
+                    gdb.execute("continue", to_string=True)
+                frame = gdb.newest_frame()
+                pc = frame.pc()
+                sp = _read_sp()
+                count = read_icount() if method == METHOD_ICOUNT else steps
+            except gdb.error:
+                # Program skončil (user-mode) nebo se spojení s QEMU přerušilo
+                break
+
+            while active and pc == active[-1][0] and sp >= active[-1][1]:
+                return_address, _, start, record = active.pop()
+                if method == METHOD_ICOUNT:
+                    returns.remove(return_address)
+                record["instructions"] = count - start
+                record["complete"] = True
+                if record["depth"] == 0:
+                    counted += record["instructions"]
+                f.write(json.dumps(record) + "\n")
+
+            caller = frame.older() if pc in (entry_pc, end_pc) else None
+            if pc == entry_pc and caller is not None:
+                calls += 1
+                active.append((caller.pc(), sp, count, {"call": calls, "depth": len(active)}))
+                if method == METHOD_ICOUNT:
+                    returns.add(caller.pc())
+            elif pc == end_pc and end is None and caller is not None:
+                end = (caller.pc(), sp)
+                end_breakpoint.delete()
+                end_breakpoint = gdb.Breakpoint(f"*{hex(end[0])}", internal=True)
+            elif end is not None and pc == end[0] and sp >= end[1]:
+                break
+
+            if limits:
+                truncated = limits.exceeded(counted + (count - active[0][2] if active else 0))
+                if truncated:
+                    gdb.write(f"[WARN] Počítání volání přerušeno ({truncated}), program se ukončí.\n")
+                    break
+
+        for _, _, start, record in active:
+            record["instructions"] = count - start
+            record["complete"] = False
+            f.write(json.dumps(record) + "\n")
+        if truncated:
+            f.write(json.dumps({"truncated": truncated}) + "\n")
+
+    entry_breakpoint.delete()
+    end_breakpoint.delete()
+    returns.clear()
+    if truncated:
+        try:
+            gdb.execute("kill", to_string=True)
+        except gdb.error:
+            pass
+    gdb.write(f"[INFO] Zaznamenáno {calls} volání `{function_name}` ({method}) do {counts_file}\n")
+    return calls
+
+
+def parse_count_option(argv):
+    """
+    Odebere z argumentů příkazu volbu `--count` a vrátí `(zbylé argumenty, True/False)`.
+    """
+    rest = [arg for arg in argv if arg != "--count"]
+    return rest, len(rest) != len(argv)
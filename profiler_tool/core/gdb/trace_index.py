@@ -0,0 +1,166 @@
+import gdb
+import json
+import os
+
+"""
+Index instrukcí pro GDB skripty `gdb_trace*.py`.
+
+Index (JSON z `core.engine.disassembly.build_instruction_index`) obsahuje pro každou statickou
+adresu traceované binárky jméno funkce a text instrukce. Skript tak v každém kroku zjistí jen PC
+a vše ostatní dohledá ve slovníku. Instrukce mimo binárku (sdílené knihovny, vdso) se
+disassemblují přes GDB jen při první návštěvě dané adresy a výsledek se zapamatuje.
+
+Adresy instrukcí binárky se do trace zapisují staticky (u PIE binárky po odečtení posunu
+zavedení), stejně jako v trace sestavených z vykonaných adres (`write_trace_from_pcs`).
+
+Při krokování po základních blocích (`advance_block`) se místo jednotlivých `stepi` program
+nechá doběhnout dočasným breakpointem na poslední instrukci bloku (volání, skok, návrat nebo
+systémové volání) a do trace se zapíše jen záznam `[BLOCK] <adresa> <počet>`.
+"""
+
+
+def _find_load_bias(binary_path):
+    """
+    Zjistí posun, na který byla zavedena PIE binárka (mapování souboru s offsetem 0).
+    """
+    try:
+        mappings = gdb.execute("info proc mappings", to_string=True)
+    except gdb.error as e:
+        gdb.write(f"[WARN] Nepodařilo se získat mappingy: {e}\n")
+        return 0
+
+    for line in mappings.split("\n"):
+        parts = line.split()
+        if len(parts) >= 5 and parts[-1] == binary_path and parts[0].startswith("0x"):
+            try:
+                if int(parts[3], 16) == 0:
+                    return int(parts[0], 16)
+            except ValueError:
+                continue
+    return 0
+
+
+class InstructionIndex:
+    """
+    Převod PC na (adresa pro trace, jméno funkce, text instrukce) bez opakované disassemblace.
+    """
+
+    def __init__(self, index_path=None):
+        self.static = {}
+        self.runtime = {}
+        self.block_ends = {}
+        self.lengths = {}
+        self.load_bias = 0
+
+        if not index_path:
+            return
+        try:
+            with open(index_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            gdb.write(f"[WARN] Index instrukcí `{index_path}` nelze načíst: {e}\n")
+            return
+
+        functions = data["functions"]
+        self.static = {pc: (functions[function_id], asm) for pc, function_id, asm, _, _ in data["instructions"]}
+        self._build_blocks(data["instructions"])
+        if data.get("pie"):
+            self.load_bias = _find_load_bias(os.path.realpath(data["binary"]))
+        gdb.write(f"[INFO] Načten index {len(self.static)} instrukcí, posun zavedení {hex(self.load_bias)}\n")
+
+    def _build_blocks(self, instructions):
+        """
+        Pro každou adresu spočítá konec jejího základního bloku: `(adresa poslední instrukce, počet
+        instrukcí před ní)`. Blok končí první instrukcí, která není třídy "other", nebo na konci funkce.
+        """
+        function_ids = {}
+        for pc, function_id, _, length, iclass in sorted(instructions, reverse=True):
+            self.lengths[pc] = length
+            following = self.block_ends.get(pc + length)
+            if iclass == "other" and following is not None and function_ids.get(pc + length) == function_id:
+                self.block_ends[pc] = (following[0], following[1] + 1)
+            else:
+                self.block_ends[pc] = (pc, 0)
+            function_ids[pc] = function_id
+
+    def advance_block(self, f, pc):
+        """
+        Pokud na `pc` začíná v binárce úsek alespoň dvou instrukcí bez větvení, nechá program
+        doběhnout na jeho poslední instrukci a zapíše do trace záznam bloku.
+
+        :return: True, pokud se program posunul (volající musí znovu načíst rámec), jinak False.
+        """
+        static_pc = pc - self.load_bias
+        end = self.block_ends.get(static_pc)
+        if end is None or end[1] == 0:
+            return False
+
+        last_pc, count = end
+        breakpoint = gdb.Breakpoint(f"*{hex(last_pc + self.load_bias)}", internal=True, temporary=True)
+        try:
+            gdb.execute("continue", to_string=True)
+        finally:
+            if breakpoint.is_valid():
+                breakpoint.delete()
+
+        # Program se mohl zastavit dříve (signál, havárie) – zapíšeme jen vykonané instrukce
+        try:
+            stop_pc = gdb.newest_frame().pc() - self.load_bias
+        except gdb.error:
+            return True
+
+        executed = 0
+        address = static_pc
+        while address != stop_pc and executed < count:
+            address += self.lengths[address]
+            executed += 1
+
+        if executed:
+            f.block(static_pc, executed)
+        return True
+
+    def lookup_static(self, pc):
+        """Vrátí `(adresa pro trace, jméno funkce, text instrukce)` z indexu, nebo None."""
+        entry = self.static.get(pc - self.load_bias)
+        if entry is None:
+            return None
+        return pc - self.load_bias, entry[0], entry[1]
+
+    def lookup(self, frame, pc):
+        """
+        Vrátí `(adresa pro trace, jméno funkce, text instrukce)` pro instrukci na `pc`.
+        Jméno funkce nebo text instrukce mohou být None, pokud je GDB nezjistí.
+        """
+        entry = self.static.get(pc - self.load_bias)
+        if entry is not None:
+            return pc - self.load_bias, entry[0], entry[1]
+
+        entry = self.runtime.get(pc)
+        if entry is None:
+            disasm = frame.architecture().disassemble(pc)
+            entry = (frame.name(), disasm[0]["asm"] if disasm else None)
+            self.runtime[pc] = entry
+        return pc, entry[0], entry[1]
+
+
+def parse_index_option(argv):
+    """
+    Odebere z argumentů příkazu volbu `--index=<soubor>` a vrátí `(zbylé argumenty, cesta k indexu)`.
+    """
+    index_path = None
+    rest = []
+    for arg in argv:
+        if arg.startswith("--index="):
+            index_path = arg[len("--index="):]
+        else:
+            rest.append(arg)
+    return rest, index_path
+
+
+def parse_blocks_option(argv):
+    """
+    Odebere z argumentů příkazu přepínač `--blocks` (krokování po základních blocích)
+    a vrátí `(zbylé argumenty, True/False)`.
+    """
+    rest = [arg for arg in argv if arg != "--blocks"]
+    return rest, len(rest) != len(argv)
@@ -0,0 +1,257 @@
+import gdb
+import array
+import json
+import os
+import re
+
+"""
+Zachycení trace pomocí záznamu běhu v GDB (`record btrace` / `record full`) pro skripty `gdb_trace*.py`.
+
+Místo krokování `stepi` z Pythonu se na vstupu do cílové funkce zapne záznam a program doběhne
+plnou rychlostí (resp. rychlostí záznamu v GDB) až k odpovídajícímu návratu. Historie vykonaných
+adres se pak vypíše najednou:
+    btrace   celá historie z `gdb.current_recording().instruction_history`
+    full     přehrání záznamu od začátku (`record goto begin` a `stepi` v režimu replay,
+             bez přepínání kontextu do laděného procesu)
+
+Výstupem je soubor historie – pole 64bitových adres (little-endian) a vedle něj `<soubor>.json`
+s metadaty (funkce, metoda záznamu, adresa instrukce volání a mapování procesu). Na trace jej
+převede `core.engine.tracer` pomocí `write_trace_from_pcs`, takže blacklist i funkci zájmu lze
+při další analýze změnit bez nového spuštění programu. Záznam metodou `full` lze navíc uložit
+příkazem `record save` a později přehrát příkazem `trace-replay` (`gdb_replay.py`).
+"""
+
+RECORD_METHODS = ("auto", "btrace", "full")
+
+_LOG_SIZE = re.compile(r"Log contains (\d+) instructions")
+_END_OF_HISTORY = "No more reverse-execution history"
+
+
+def read_mappings():
+    """
+    Načte souborová mapování procesu z `info proc mappings`.
+
+    :return: Slovník cesta → [nejnižší adresa, nejvyšší adresa, adresa mapování s offsetem 0]
+             (stejný tvar jako `core.engine.ptrace_tracer.read_process_mappings`).
+    """
+    try:
+        output = gdb.execute("info proc mappings", to_string=True)
+    except gdb.error as e:
+        gdb.write(f"[WARN] Nepodařilo se získat mappingy: {e}\n")
+        return {}
+
+    mappings = {}
+    for line in output.split("\n"):
+        parts = line.split()
+        if len(parts) < 5 or not parts[0].startswith("0x") or not parts[-1].startswith("/"):
+            continue
+        try:
+            start, end, offset = int(parts[0], 16), int(parts[1], 16), int(parts[3], 16)
+        except ValueError:
+            continue
+        low, high, base = mappings.get(parts[-1], [start, end, None])
+        if offset == 0 and base is None:
+            base = start
+        mappings[parts[-1]] = [min(low, start), max(high, end), base]
+    return mappings
+
+
+def start_recording(method="auto"):
+    """
+    Zapne záznam běhu. Metoda "auto" zkusí nejprve `record btrace` (hardwarový záznam větvení,
+    jen nativní cíle) a poté `record full`.
+
+    :return: Použitá metoda ("btrace"/"full"), nebo None, pokud záznam nelze zapnout.
+    """
+    candidates = ("btrace", "full") if method == "auto" else (method,)
+    for candidate in candidates:
+        try:
+            if candidate == "full":
+                gdb.execute("set record full insn-number-max unlimited", to_string=True)
+                gdb.execute("set record full stop-at-limit off", to_string=True)
+            else:
+                for buffer_format in ("pt", "bts"):
+                    try:
+                        gdb.execute(f"set record btrace {buffer_format} buffer-size unlimited", to_string=True)
+                    except gdb.error:
+                        pass
+            gdb.execute(f"record {candidate}", to_string=True)
+            gdb.write(f"[INFO] Záznam běhu zapnut (`record {candidate}`)\n")
+            return candidate
+        except gdb.error as e:
+            gdb.write(f"[WARN] `record {candidate}` nelze použít: {e}\n")
+    return None
+
+
+def record_until_return(scope):
+    """
+    Nechá program se zapnutým záznamem doběhnout k odpovídajícímu návratu z cílové funkce.
+
+    :return: True, pokud byl návrat dosažen, jinak False (záznam selhal nebo program skončil).
+    """
+    breakpoint = gdb.Breakpoint(f"*{hex(scope.return_address)}", internal=True)
+    try:
+        while True:
+            try:
+                gdb.execute("continue", to_string=True)
+                pc = gdb.newest_frame().pc()
+            except gdb.error as e:
+                gdb.write(f"[WARN] Záznam běhu byl přerušen: {e}\n")
+                return False
+
+            if scope.is_finished(pc):
+                return True
+            if pc != scope.return_address:
+                gdb.write(f"[WARN] Program se se záznamem zastavil mimo návrat z funkce ({hex(pc)}).\n")
+                return False
+    finally:
+        if breakpoint.is_valid():
+            breakpoint.delete()
+
+
+def _btrace_pcs():
+    pcs = array.array("Q")
+    gaps = 0
+    for instruction in gdb.current_recording().instruction_history:
+        pc = getattr(instruction, "pc", None)
+        if pc is None:
+            gaps += 1
+            continue
+        pcs.append(pc)
+    if gaps:
+        gdb.write(f"[WARN] Historie btrace obsahuje {gaps} mezer (přetečení bufferu nebo nepodporovaný kód).\n")
+    pcs.append(gdb.newest_frame().pc())
+    return pcs
+
+
+def _replay_full_pcs():
+    """
+    Přehraje záznam `record full` od začátku a vrátí adresy všech pozic historie
+    (včetně aktuální pozice na jejím konci).
+    """
+    match = _LOG_SIZE.search(gdb.execute("info record", to_string=True))
+    log_size = int(match.group(1)) if match else None
+
+    gdb.execute("record goto begin", to_string=True)
+    pcs = array.array("Q")
+    at_end = False
+    while True:
+        pcs.append(gdb.newest_frame().pc())
+        # Za koncem historie by `stepi` pokračoval v živém běhu programu
+        if at_end or log_size is not None and len(pcs) > log_size:
+            break
+        try:
+            at_end = _END_OF_HISTORY in gdb.execute("stepi", to_string=True)
+        except gdb.error as e:
+            gdb.write(f"[WARN] Přehrávání záznamu skončilo předčasně: {e}\n")
+            break
+    return pcs
+
+
+def history_pcs(method):
+    """Vrátí adresy všech instrukcí zaznamenaných metodou `method` (pole `array('Q')`)."""
+    if method == "btrace":
+        return _btrace_pcs()
+    return _replay_full_pcs()
+
+
+def save_history(history_file, pcs, metadata):
+    """
+    Uloží historii adres (`history_file`) a metadata (`<history_file>.json`).
+    """
+    with open(history_file, "wb") as f:
+        pcs.tofile(f)
+    with open(f"{history_file}.json", "w") as f:
+        json.dump(metadata, f)
+
+
+def record_function(scope, history_file, method="auto", save_file=None):
+    """
+    Zaznamená jedno volání cílové funkce a vypíše jeho historii do souboru.
+
+    :param scope: `trace_scope.FunctionScope` (program stojí na vstupu do funkce).
+    :param history_file: Cesta k výstupnímu souboru historie.
+    :param method: Metoda záznamu ("auto", "btrace", "full").
+    :param save_file: Volitelná cesta, kam se záznam uloží příkazem `record save` (jen metoda "full").
+    :return: True, pokud byla historie zapsána.
+    """
+    used_method = start_recording(method)
+    if used_method is None:
+        gdb.write("[ERROR] Záznam běhu není pro tento cíl dostupný.\n")
+        return False
+
+    finished = record_until_return(scope)
+    metadata = {
+        "function": scope.function_name,
+        "method": used_method,
+        "call_pc": scope.call_pc,
+        "complete": finished,
+        "mappings": read_mappings(),
+    }
+
+    if save_file:
+        if used_method == "full":
+            try:
+                gdb.execute(f"record save {save_file}", to_string=True)
+                with open(f"{save_file}.json", "w") as f:
+                    json.dump(metadata, f)
+                gdb.write(f"[INFO] Záznam uložen do {save_file}\n")
+            except gdb.error as e:
+                gdb.write(f"[WARN] Záznam nelze uložit: {e}\n")
+        else:
+            gdb.write(f"[WARN] `record save` podporuje jen metodu `full`, záznam `{used_method}` se neuloží.\n")
+
+    pcs = history_pcs(used_method)
+    save_history(history_file, pcs, metadata)
+    gdb.write(f"[INFO] Historie {len(pcs)} instrukcí zapsána do {history_file}\n")
+
+    # Program doběhne bez záznamu
+    try:
+        if used_method == "full":
+            gdb.execute("record goto end", to_string=True)
+        gdb.execute("record stop", to_string=True)
+    except gdb.error as e:
+        gdb.write(f"[WARN] Záznam nelze ukončit: {e}\n")
+    return True
+
+
+def replay_recording(record_file, history_file):
+    """
+    Načte záznam uložený příkazem `record save` a vypíše jeho historii do souboru.
+    Metadata se převezmou ze souboru `<record_file>.json` uloženého spolu se záznamem.
+    """
+    try:
+        gdb.execute(f"record restore {record_file}", to_string=True)
+    except gdb.error as e:
+        gdb.write(f"[ERROR] Záznam `{record_file}` nelze načíst: {e}\n")
+        return False
+
+    metadata = {"method": "full", "mappings": {}}
+    if os.path.exists(f"{record_file}.json"):
+        with open(f"{record_file}.json", "r") as f:
+            metadata = json.load(f)
+
+    pcs = _replay_full_pcs()
+    save_history(history_file, pcs, metadata)
+    gdb.write(f"[INFO] Historie {len(pcs)} instrukcí ze záznamu zapsána do {history_file}\n")
+    return True
+
+
+def parse_record_options(argv):
+    """
+    Odebere z argumentů příkazu volby `--record[=<metoda>]` a `--save=<soubor>`
+    a vrátí `(zbylé argumenty, metoda záznamu nebo None, soubor pro uložení záznamu nebo None)`.
+    """
+    method = None
+    save_file = None
+    rest = []
+    for arg in argv:
+        if arg == "--record":
+            method = "auto"
+        elif arg.startswith("--record="):
+            method = arg[len("--record="):]
+        elif arg.startswith("--save="):
+            save_file = arg[len("--save="):]
+        else:
+            rest.append(arg)
+    return rest, method, save_file
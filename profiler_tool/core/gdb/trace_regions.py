@@ -0,0 +1,120 @@
+import gdb
+from regions import REGION_BEGIN_MARKER, REGION_END_MARKER, close_region
+from trace_format import REGION_BEGIN, REGION_END
+from trace_config import is_blacklisted_function
+
+"""
+Krokování uživatelských oblastí zájmu (`--regions`) pro skripty `gdb_trace*.py`.
+
+Program běží plnou rychlostí k breakpointu na vstupu do značkovací funkce `REGION_BEGIN_MARKER`
+(makro `PROFILER_REGION_BEGIN`, viz `core.engine.regions`). Jméno oblasti se přečte z registru
+prvního argumentu, značkovací funkce doběhne (`finish`) a krokuje se, dokud se neuzavře poslední
+otevřená oblast (vstupem do `REGION_END_MARKER`). Zanořené oblasti se během krokování rozpoznají
+podle vstupu do značkovacích funkcí. Mezi oblastmi je breakpoint opět aktivní a program běží
+plnou rychlostí.
+
+Krokuje se jen vlákno, které do oblasti vstoupilo; ostatní vlákna běží během `si` volně
+a jejich oblasti se zachytí, až když žádná oblast není otevřená.
+"""
+
+
+def _region_name(argument_register):
+    try:
+        return gdb.parse_and_eval(f"(const char *) {argument_register}").string()
+    except (gdb.error, UnicodeDecodeError):
+        return "?"
+
+
+def _is_running():
+    return gdb.selected_inferior().pid != 0 and any(thread.is_valid() for thread in gdb.selected_inferior().threads())
+
+
+def trace_regions(f, index, limits, argument_register, call_prefixes, skip_blacklisted=False):
+    """
+    Zapíše do trace instrukce všech oblastí zájmu až do skončení programu.
+
+    :param f: Zapisovač trace (`open_trace_writer`).
+    :param index: `InstructionIndex` binárky.
+    :param limits: `TraceLimits` (rozpočet instrukcí a časový limit platí pro všechny oblasti dohromady).
+    :param argument_register: Registr prvního argumentu funkce (`$rdi`, `$r0`, `$a0`).
+    :param call_prefixes: Začátky textu instrukcí volání, před které se zapíše řádek `[CALL]`.
+    :param skip_blacklisted: Volání funkcí podle `function_blacklist_patterns` se přejdou (`nexti`).
+    :return: Dvojice (počet oblastí, důvod přerušení limitem nebo None).
+    """
+    try:
+        begin_pc = int(gdb.parse_and_eval(f"(long) &{REGION_BEGIN_MARKER}")) & ~1
+        end_pc = int(gdb.parse_and_eval(f"(long) &{REGION_END_MARKER}")) & ~1
+    except gdb.error:
+        gdb.write(f"[ERROR] Binárka neobsahuje značky oblastí (`{REGION_BEGIN_MARKER}`), "
+                  f"přeložte ji s `-DPROFILER_REGIONS`.\n")
+        return 0, None
+
+    breakpoint = gdb.Breakpoint(f"*{hex(begin_pc)}", internal=True)
+    open_regions = []
+    regions = 0
+    truncated = None
+    region_thread = None
+    current_thread = 1
+
+    while True:
+        try:
+            if not open_regions:
+                breakpoint.enabled = True
+                gdb.execute("continue", to_string=True)
+                if not _is_running():
+                    break
+                breakpoint.enabled = False
+                region_thread = gdb.selected_thread()
+                if region_thread.num != current_thread:
+                    f.thread(region_thread.num)
+                    current_thread = region_thread.num
+            elif not region_thread.is_valid():
+                gdb.write(f"[WARN] Vlákno skončilo uvnitř oblasti `{open_regions[-1]}`.\n")
+                break
+            elif gdb.selected_thread() != region_thread:
+                region_thread.switch()
+
+            frame = gdb.newest_frame()
+            pc = frame.pc()
+
+            # Značkovací funkce se nekrokují, jen se zapíše začátek nebo konec oblasti
+            if pc in (begin_pc, end_pc):
+                name = _region_name(argument_register)
+                if pc == begin_pc:
+                    open_regions.append(name)
+                    regions += 1
+                    f.region(REGION_BEGIN, name)
+                elif close_region(open_regions, name):
+                    f.region(REGION_END, name)
+                else:
+                    gdb.write(f"[WARN] Konec oblasti `{name}` bez začátku, ignoruji.\n")
+                gdb.execute("finish", to_string=True)
+                continue
+
+            # Po překročení rozpočtu instrukcí nebo časového limitu krokování končí
+            truncated = limits.exceeded(f.instruction_count)
+            if truncated:
+                f.truncated(truncated, f.instruction_count)
+                gdb.write(f"[WARN] Trace přerušen ({truncated}) po {f.instruction_count} instrukcích.\n")
+                break
+
+            record_pc, function_name, instr = index.lookup(frame, pc)
+            if function_name and instr:
+                if instr.startswith(call_prefixes):
+                    called_function = instr.split()[-1]
+                    f.call(function_name, called_function)
+                    if skip_blacklisted and is_blacklisted_function(called_function.strip("<>")):
+                        f.instruction(function_name, record_pc, instr)
+                        gdb.execute("nexti", to_string=True)
+                        continue
+                f.instruction(function_name, record_pc, instr)
+
+            gdb.execute("si", to_string=True)
+        except gdb.error:
+            # Program skončil (uvnitř oblasti analýza oblast označí jako neukončenou)
+            break
+
+    if breakpoint.is_valid():
+        breakpoint.delete()
+    gdb.write(f"[INFO] Zachyceno {regions} průchodů oblastmi.\n")
+    return regions, truncated
@@ -0,0 +1,140 @@
+import gdb
+import json
+import os
+import signal
+import threading
+import time
+from trace_record import read_mappings
+
+"""
+Statistické vzorkování volání cílové funkce pro skripty `gdb_trace*.py` (`--sample=<interval>`).
+
+Místo krokování program běží plnou rychlostí od vstupu do cílové funkce až k odpovídajícímu
+návratu. Pomocné vlákno každých `interval` sekund pošle GDB signál SIGINT (stejně jako Ctrl-C),
+GDB program zastaví – nativně i přes GDB server QEMU – a zaznamená se PC a zásobník volání
+odvinutý unwinderem GDB. Program pak pokračuje dál.
+
+Výstupem je textový soubor vzorků (jeden vzorek na řádek, runtime adresy rámců od nejvnitřnějšího
+oddělené mezerou) a vedle něj `<soubor>.json` s metadaty (funkce, interval, mapování procesu,
+zda vzorkování skončilo návratem z funkce). Vzorky analyzuje `core.engine.sampling`.
+"""
+
+DEFAULT_MAX_DEPTH = 64
+
+
+class _Interrupter:
+    """
+    Vlákno, které během `continue` pravidelně přerušuje GDB signálem SIGINT.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.running = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            # Mimo `continue` by SIGINT přerušil Python kód skriptu
+            if self.running.is_set():
+                os.kill(os.getpid(), signal.SIGINT)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+
+def _unwind(max_depth):
+    stack = []
+    frame = gdb.newest_frame()
+    while frame is not None and len(stack) < max_depth:
+        stack.append(frame.pc())
+        try:
+            frame = frame.older()
+        except gdb.error:
+            break
+    return stack
+
+
+def sample_function(scope, samples_file, interval, max_depth=DEFAULT_MAX_DEPTH, limits=None):
+    """
+    Vzorkuje jedno volání cílové funkce a zapíše vzorky do souboru.
+
+    :param scope: `trace_scope.FunctionScope` (program stojí na vstupu do funkce).
+    :param samples_file: Cesta k výstupnímu souboru vzorků.
+    :param interval: Interval mezi vzorky v sekundách.
+    :param max_depth: Nejvyšší počet rámců jednoho vzorku.
+    :param limits: Volitelné `trace_limits.TraceLimits`; vzorkování hlídá jen časový limit.
+    :return: True, pokud vzorkování skončilo návratem z funkce (program pak může doběhnout).
+    """
+    breakpoint = gdb.Breakpoint(f"*{hex(scope.return_address)}", internal=True)
+    finished = False
+    truncated = None
+    count = 0
+
+    try:
+        with open(samples_file, "w") as f, _Interrupter(interval) as interrupter:
+            while True:
+                try:
+                    interrupter.running.set()
+                    try:
+                        gdb.execute("continue", to_string=True)
+                    finally:
+                        interrupter.running.clear()
+                    pc = gdb.newest_frame().pc()
+
+                    if scope.is_finished(pc):
+                        finished = True
+                        break
+                    if pc != scope.return_address:
+                        f.write(" ".join(hex(address) for address in _unwind(max_depth)) + "\n")
+                        count += 1
+                except KeyboardInterrupt:
+                    # SIGINT doručený těsně po zastavení programu z jiného důvodu
+                    continue
+                except gdb.error as e:
+                    gdb.write(f"[WARN] Vzorkování skončilo předčasně: {e}\n")
+                    break
+
+                if limits and limits.deadline is not None and time.monotonic() >= limits.deadline:
+                    truncated = "timeout"
+                    gdb.write(f"[WARN] Vzorkování přerušeno časovým limitem po {count} vzorcích.\n")
+                    break
+    finally:
+        if breakpoint.is_valid():
+            breakpoint.delete()
+
+    metadata = {
+        "function": scope.function_name,
+        "interval": interval,
+        "complete": finished,
+        "truncated": truncated,
+        "mappings": read_mappings(),
+    }
+    with open(f"{samples_file}.json", "w") as f:
+        json.dump(metadata, f)
+
+    gdb.write(f"[INFO] {count} vzorků zásobníku zapsáno do {samples_file}\n")
+    return finished
+
+
+def parse_sample_options(argv):
+    """
+    Odebere z argumentů příkazu volby `--sample=<interval v sekundách>` a `--depth=<rámců>`
+    a vrátí `(zbylé argumenty, interval nebo None, nejvyšší hloubka zásobníku)`.
+    """
+    interval = None
+    max_depth = DEFAULT_MAX_DEPTH
+    rest = []
+    for arg in argv:
+        if arg.startswith("--sample="):
+            interval = float(arg[len("--sample="):])
+        elif arg.startswith("--depth="):
+            max_depth = int(arg[len("--depth="):])
+        else:
+            rest.append(arg)
+    return rest, interval, max_depth
@@ -0,0 +1,135 @@
+import gdb
+
+"""
+Pomocné funkce pro trace omezený na jedno volání cílové funkce (sdíleno skripty `gdb_trace*.py`).
+
+Program doběhne plnou rychlostí k breakpointu na vstupu do funkce, krokuje se jen do jejího
+odpovídajícího návratu a poté program doběhne bez krokování. Odpovídající návrat se pozná
+podle návratové adresy a ukazatele zásobníku zaznamenaných při vstupu – rekurzivní volání
+téže funkce mají zásobník hlouběji, takže krokování neukončí.
+
+Aby analýza (`parse_trace`) fungovala beze změny, zapíše se na začátek trace instrukce volání
+z volající funkce a na konec značka `[END] <funkce>` (přes zapisovač z `trace_format`).
+"""
+
+# Délky instrukcí volání, které zkoušíme před návratovou adresou
+# (x86 `call rel32` = 5 B, ARM/Thumb-2 `bl` a RISC-V `jal` = 4 B, komprimované instrukce 2 B)
+_CALL_LENGTHS = (5, 4, 2, 6, 3, 7)
+
+
+def _read_sp():
+    return int(gdb.parse_and_eval("$sp"))
+
+
+def _find_call_instruction(arch, return_address, call_mnemonics):
+    """
+    Najde instrukci volání, která končí přesně na `return_address`.
+    Vrací dvojici `(adresa, text instrukce)`, nebo `(None, None)`.
+    """
+    for length in _CALL_LENGTHS:
+        try:
+            disasm = arch.disassemble(return_address - length)
+        except gdb.error:
+            continue
+        if disasm and disasm[0]["length"] == length and disasm[0]["asm"].split()[0] in call_mnemonics:
+            return return_address - length, disasm[0]["asm"]
+    return None, None
+
+
+class FunctionScope:
+    """
+    Stav jednoho sledovaného volání cílové funkce.
+    """
+
+    def __init__(self, function_name, entry_pc, return_address, entry_sp, caller_name, call_pc, call_instr):
+        self.function_name = function_name
+        self.entry_pc = entry_pc
+        self.return_address = return_address
+        self.entry_sp = entry_sp
+        self.caller_name = caller_name
+        self.call_pc = call_pc
+        self.call_instr = call_instr
+
+    def write_call(self, f, index=None):
+        """
+        Zapíše do trace volání cílové funkce z volající funkce.
+        S indexem instrukcí (`trace_index.InstructionIndex`) se použije adresa a text instrukce z indexu.
+        """
+        call_pc, caller_name, call_instr = self.call_pc, self.caller_name, self.call_instr
+        entry = index.lookup_static(call_pc) if index else None
+        if entry:
+            call_pc, caller_name, call_instr = entry
+        f.call(caller_name, f"<{self.function_name}>")
+        f.instruction(caller_name, call_pc, call_instr)
+
+    def write_end(self, f):
+        """Zapíše do trace značku konce sledovaného volání."""
+        f.end(self.function_name)
+
+    def is_finished(self, pc):
+        """True, pokud se program právě vrátil z odpovídajícího volání cílové funkce."""
+        return pc == self.return_address and _read_sp() >= self.entry_sp
+
+    def finish(self):
+        """Nechá program doběhnout bez krokování."""
+        try:
+            gdb.execute("continue", to_string=True)
+        except gdb.error as e:
+            gdb.write(f"[WARN] Program po ukončení trace nedoběhl: {e}\n")
+
+
+def _stopped_at_entry(function_name):
+    """
+    True, pokud program už stojí na první instrukci funkce `function_name`
+    (např. po `restart` checkpointu pořízeného na jejím vstupu).
+    """
+    try:
+        frame = gdb.newest_frame()
+        function = frame.function()
+        return frame.name() == function_name and function is not None and \
+            frame.pc() == int(function.value().address)
+    except (gdb.error, RuntimeError):
+        return False
+
+
+def run_to_function(function_name, call_mnemonics, call_template):
+    """
+    Nechá program doběhnout plnou rychlostí na první instrukci funkce `function_name`.
+    Pokud na ní program už stojí, nikam se nepokračuje.
+
+    :param function_name: Název cílové funkce.
+    :param call_mnemonics: Mnemoniky instrukcí volání dané architektury.
+    :param call_template: Šablona textu instrukce volání pro případ, že ji nelze disassemblovat
+                          (formátuje se s `addr` a `function`).
+    :return: `FunctionScope`, nebo None, pokud funkce nebyla dosažena.
+    """
+    try:
+        if not _stopped_at_entry(function_name):
+            gdb.execute(f"tbreak *{function_name}", to_string=True)
+            gdb.execute("continue", to_string=True)
+        frame = gdb.newest_frame()
+    except gdb.error as e:
+        gdb.write(f"[ERROR] Funkce `{function_name}` nebyla dosažena: {e}\n")
+        return None
+
+    if frame.name() != function_name:
+        gdb.write(f"[ERROR] Program se zastavil mimo funkci `{function_name}` ({frame.name()}).\n")
+        return None
+
+    entry_pc = frame.pc()
+    caller = frame.older()
+    if caller is None:
+        gdb.write(f"[ERROR] Nelze zjistit volající funkci `{function_name}`.\n")
+        return None
+
+    return_address = caller.pc()
+    call_pc, call_instr = _find_call_instruction(frame.architecture(), return_address, call_mnemonics)
+    if call_instr is not None and "*" in call_instr:
+        # Nepřímé volání (vstupní funkce vlákna, callback) – analýza hledá přímé volání funkce
+        call_instr = call_template.format(addr=hex(entry_pc), function=function_name)
+    elif call_instr is None:
+        call_pc = return_address
+        call_instr = call_template.format(addr=hex(entry_pc), function=function_name)
+
+    gdb.write(f"[INFO] Vstup do `{function_name}` na {hex(entry_pc)}, návrat na {hex(return_address)}\n")
+    return FunctionScope(function_name, entry_pc, return_address, _read_sp(), caller.name() or "???", call_pc, call_instr)
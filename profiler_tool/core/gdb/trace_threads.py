@@ -0,0 +1,115 @@
+import gdb
+
+"""
+Krokování všech vláken vícevláknového programu pro nativní skript `gdb_trace.py`.
+
+GDB se přepne do režimu `set scheduler-locking step`: příkaz `si` pak krokuje jen vybrané vlákno
+a ostatní vlákna stojí. Vlákna se krokují střídavě po jedné instrukci (round-robin podle čísla
+vlákna GDB – 1 = hlavní vlákno, další v pořadí vytvoření), trace tak odpovídá jednomu z možných
+proložení jejich běhu. Při přepnutí na jiné vlákno se do trace zapíše řádek `[THREAD] <číslo>`.
+
+Vlákno čekající v blokujícím systémovém volání (`futex` v `pthread_join` nebo zámku) by krokování
+se zamčeným plánovačem zablokovalo. Taková vlákna (přerušené systémové volání, které jádro po
+pokračování zopakuje, a vlákna stojící na instrukci `syscall`) se přeskakují, dokud lze krokovat
+jiné vlákno. Pokud čekají všechna vlákna (nebo vlákno čeká příliš dlouho), krok se provede
+s odemčeným plánovačem; ostatní vlákna, která se během něj probudí, přitom mohou vykonat
+několik nezaznamenaných instrukcí.
+
+Blokující volání se rozpoznávají z registrů `$orig_rax` a `$rax` (x86-64 Linux). Skripty pro ARM
+a RISC-V krokují dál jen vlákno, ve kterém program stojí.
+"""
+
+# Návratové hodnoty přerušeného systémového volání, které jádro po pokračování zopakuje
+# (-ERESTARTSYS, -ERESTARTNOINTR, -ERESTARTNOHAND, -ERESTART_RESTARTBLOCK)
+_RESTART_ERRNOS = (-512, -513, -514, -516)
+
+# Po kolika kolech bez kroku se čekající vlákno krokuje i za cenu odemčeného plánovače
+STARVATION_ROUNDS = 10000
+
+
+def _may_block(thread):
+    """
+    True, pokud by krok vlákna mohl čekat v systémovém volání (vlákno musí být vybrané).
+    """
+    try:
+        if int(gdb.parse_and_eval("$orig_rax")) >= 0 and int(gdb.parse_and_eval("$rax")) in _RESTART_ERRNOS:
+            return True
+        pc = gdb.newest_frame().pc()
+        return gdb.selected_inferior().architecture().disassemble(pc)[0]["asm"].split()[0] == "syscall"
+    except (gdb.error, IndexError):
+        return False
+
+
+class ThreadScheduler:
+    """
+    Výběr vlákna pro další krok (viz popis modulu).
+    """
+
+    def __init__(self):
+        gdb.execute("set scheduler-locking step", to_string=True)
+        self.last = None      # číslo naposledy krokovaného vlákna
+        self.unlocked = False  # další krok proběhne s odemčeným plánovačem
+        self.waiting = {}     # číslo vlákna → počet kol, ve kterých bylo přeskočeno
+
+    @staticmethod
+    def threads():
+        return sorted((thread for thread in gdb.selected_inferior().threads() if thread.is_valid()),
+                      key=lambda thread: thread.num)
+
+    def is_multithreaded(self):
+        return len(gdb.selected_inferior().threads()) > 1
+
+    def select(self):
+        """
+        Vybere vlákno, které se krokuje jako další, a přepne na něj.
+
+        :return: Vybrané vlákno, nebo None, pokud program skončil.
+        """
+        threads = self.threads()
+        if not threads:
+            return None
+
+        chosen = None
+        self.unlocked = False
+        if len(threads) == 1:
+            chosen = threads[0]
+        else:
+            # Pokračujeme vláknem s vyšším číslem než naposledy krokované
+            order = [thread for thread in threads if self.last is None or thread.num > self.last] + \
+                    [thread for thread in threads if self.last is not None and thread.num <= self.last]
+            for thread in order:
+                thread.switch()
+                if not _may_block(thread):
+                    chosen = thread
+                    break
+                self.waiting[thread.num] = self.waiting.get(thread.num, 0) + 1
+                if self.waiting[thread.num] >= STARVATION_ROUNDS:
+                    chosen = thread
+                    self.unlocked = True
+                    break
+            if chosen is None:
+                chosen = order[0]
+                self.unlocked = True
+
+        if gdb.selected_thread() != chosen:
+            chosen.switch()
+        self.waiting.pop(chosen.num, None)
+        self.last = chosen.num
+        return chosen
+
+    def step(self, command="si"):
+        """
+        Provede krok vybraného vlákna; vlákno nebo program během něj mohou skončit.
+        """
+        try:
+            if not self.unlocked:
+                gdb.execute(command, to_string=True)
+                return
+            gdb.execute("set scheduler-locking off", to_string=True)
+            try:
+                gdb.execute(command, to_string=True)
+            finally:
+                gdb.execute("set scheduler-locking step", to_string=True)
+        except gdb.error:
+            # Krokované vlákno skončilo, zbylá vlákna vybere další `select`
+            pass
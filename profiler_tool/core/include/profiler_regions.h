@@ -0,0 +1,42 @@
+#ifndef PROFILER_REGIONS_H
+#define PROFILER_REGIONS_H
+
+/*
+ * Uživatelské oblasti zájmu pro `trace-analysis --capture region`.
+ *
+ *     PROFILER_REGION_BEGIN("inner_loop");
+ *     for (...) { ... }
+ *     PROFILER_REGION_END("inner_loop");
+ *
+ * Program se mezi oblastmi nekrokuje (běží plnou rychlostí), krokují se jen instrukce mezi
+ * značkami začátku a konce oblasti (včetně volaných funkcí). Oblasti se mohou zanořovat,
+ * oblast se stejným jménem může proběhnout opakovaně (počty se sečtou).
+ *
+ * Bez `PROFILER_REGIONS` (definuje jej profiler při překladu binárky) se makra přeloží na nic,
+ * takže hlavičku lze ponechat i v produkčním kódu.
+ */
+
+#ifdef PROFILER_REGIONS
+
+/* Značkovací funkce – tracer zastaví program na jejich vstupu a jméno oblasti přečte z prvního argumentu */
+__attribute__((weak, noinline)) void profiler_region_begin(const char *name)
+{
+    __asm__ volatile ("" : : "r" (name) : "memory");
+}
+
+__attribute__((weak, noinline)) void profiler_region_end(const char *name)
+{
+    __asm__ volatile ("" : : "r" (name) : "memory");
+}
+
+#define PROFILER_REGION_BEGIN(name) profiler_region_begin(name)
+#define PROFILER_REGION_END(name) profiler_region_end(name)
+
+#else
+
+#define PROFILER_REGION_BEGIN(name) ((void) 0)
+#define PROFILER_REGION_END(name) ((void) 0)
+
+#endif // PROFILER_REGIONS
+
+#endif // PROFILER_REGIONS_H